@@ -0,0 +1,70 @@
+// SPDX-License-Identifier: MIT
+pragma solidity 0.8.8;
+
+import "../../interfaces/IConstantProductPool.sol";
+
+import "OpenZeppelin/openzeppelin-contracts@4.8.3/contracts/token/ERC20/IERC20.sol";
+import "OpenZeppelin/openzeppelin-contracts@4.8.3/contracts/token/ERC20/utils/SafeERC20.sol";
+
+/// @title Constant product pool for local markets
+/// @notice Swaps like a Uniswap V2 pair with a configurable fee: input tokens are transferred to
+/// the pool first, and swap checks that the product of the balances less the fee on the inputs
+/// has not decreased. Liquidity is added by transferring tokens to the pool and calling sync
+contract MockConstantProductPool is IConstantProductPool {
+  using SafeERC20 for IERC20;
+
+  uint256 constant FEE_DENOM = 1e6;
+
+  address public immutable override token0;
+  address public immutable override token1;
+
+  /// @dev fee charged on inputs in millionths
+  uint256 public immutable fee;
+
+  uint256 private reserve0;
+  uint256 private reserve1;
+
+  event Swap(address indexed sender, uint256 amount0In, uint256 amount1In, uint256 amount0Out, uint256 amount1Out, address indexed to);
+
+  constructor(address _token0, address _token1, uint256 _fee) {
+    require(_token0 != _token1, "Identical tokens");
+    require(_fee < FEE_DENOM, "Fee too high");
+    token0 = _token0;
+    token1 = _token1;
+    fee = _fee;
+  }
+
+  function getReserves() external view override returns (uint256, uint256) {
+    return (reserve0, reserve1);
+  }
+
+  /// @notice Sets the reserves to the pool's balances
+  function sync() external {
+    reserve0 = IERC20(token0).balanceOf(address(this));
+    reserve1 = IERC20(token1).balanceOf(address(this));
+  }
+
+  function swap(uint256 amount0Out, uint256 amount1Out, address to) external override {
+    require(amount0Out > 0 || amount1Out > 0, "Insufficient output");
+    require(amount0Out < reserve0 && amount1Out < reserve1, "Insufficient liquidity");
+
+    if (amount0Out > 0) IERC20(token0).safeTransfer(to, amount0Out);
+    if (amount1Out > 0) IERC20(token1).safeTransfer(to, amount1Out);
+
+    uint256 balance0 = IERC20(token0).balanceOf(address(this));
+    uint256 balance1 = IERC20(token1).balanceOf(address(this));
+    uint256 amount0In = balance0 > reserve0 - amount0Out ? balance0 - (reserve0 - amount0Out) : 0;
+    uint256 amount1In = balance1 > reserve1 - amount1Out ? balance1 - (reserve1 - amount1Out) : 0;
+    require(amount0In > 0 || amount1In > 0, "Insufficient input");
+
+    require(
+      (balance0 * FEE_DENOM - amount0In * fee) * (balance1 * FEE_DENOM - amount1In * fee)
+        >= reserve0 * reserve1 * FEE_DENOM * FEE_DENOM,
+      "K"
+    );
+
+    reserve0 = balance0;
+    reserve1 = balance1;
+    emit Swap(msg.sender, amount0In, amount1In, amount0Out, amount1Out, to);
+  }
+}
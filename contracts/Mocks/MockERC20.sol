@@ -0,0 +1,21 @@
+// SPDX-License-Identifier: MIT
+pragma solidity 0.8.8;
+
+import "OpenZeppelin/openzeppelin-contracts@4.8.3/contracts/token/ERC20/ERC20.sol";
+
+/// @title Mintable ERC20 for local markets
+contract MockERC20 is ERC20 {
+  uint8 private immutable _decimals;
+
+  constructor(string memory name, string memory symbol, uint8 decimals_) ERC20(name, symbol) {
+    _decimals = decimals_;
+  }
+
+  function decimals() public view override returns (uint8) {
+    return _decimals;
+  }
+
+  function mint(address to, uint256 amount) external {
+    _mint(to, amount);
+  }
+}
@@ -0,0 +1,41 @@
+// SPDX-License-Identifier: MIT
+pragma solidity 0.8.8;
+
+import "../../interfaces/IOdosExecutor.sol";
+
+import "OpenZeppelin/openzeppelin-contracts@4.8.3/contracts/token/ERC20/IERC20.sol";
+import "OpenZeppelin/openzeppelin-contracts@4.8.3/contracts/token/ERC20/utils/SafeERC20.sol";
+
+/// @title Executor that only sends outputs
+/// @notice Keeps its inputs and sends fixed amounts of its own balances to the router, so that
+/// the gas of a swap through it is the router's own work plus one transfer per output. The path
+/// is a list of outputs, each a token(20) followed by an amount(16), with the null token for ETH,
+/// and ends at the first zero amount or at the end of the path
+contract MockExecutor is IOdosExecutor {
+  using SafeERC20 for IERC20;
+
+  receive() external payable { }
+
+  function executePath(
+    bytes calldata bytecode,
+    uint256[] memory,
+    address
+  )
+    external
+    payable
+    override
+  {
+    for (uint256 pos = 0; pos + 36 <= bytecode.length; pos += 36) {
+      address token = address(bytes20(bytecode[pos:pos + 20]));
+      uint256 amount = uint128(bytes16(bytecode[pos + 20:pos + 36]));
+      if (amount == 0) {
+        break;
+      }
+      if (token == address(0)) {
+        payable(msg.sender).transfer(amount);
+      } else {
+        IERC20(token).safeTransfer(msg.sender, amount);
+      }
+    }
+  }
+}
@@ -0,0 +1,75 @@
+// SPDX-License-Identifier: MIT
+pragma solidity 0.8.8;
+
+import "OpenZeppelin/openzeppelin-contracts@4.8.3/contracts/token/ERC20/ERC20.sol";
+
+/// @title Mintable ERC20 whose transfer and balanceOf return data can be set, for testing
+/// the router's token helpers against non-standard tokens
+contract MockNonStandardERC20 is ERC20 {
+  enum Mode {
+    Standard,
+    NoReturn,
+    FalseReturn,
+    ShortReturn,
+    NonBoolReturn,
+    RevertReason,
+    RevertEmpty
+  }
+
+  Mode public mode;
+
+  constructor(string memory name, string memory symbol) ERC20(name, symbol) {}
+
+  function mint(address to, uint256 amount) external {
+    _mint(to, amount);
+  }
+
+  function setMode(Mode mode_) external {
+    mode = mode_;
+  }
+
+  /// @notice Returns less than a word in ShortReturn mode
+  function balanceOf(address account) public view override returns (uint256) {
+    uint256 balance = super.balanceOf(account);
+    if (mode == Mode.ShortReturn) {
+      assembly {
+        mstore(0, balance)
+        return(0, 0x10)
+      }
+    }
+    return balance;
+  }
+
+  function transfer(address to, uint256 amount) public override returns (bool) {
+    Mode mode_ = mode;
+    if (mode_ == Mode.RevertReason) {
+      revert("MockNonStandardERC20: transfer failed");
+    }
+    if (mode_ == Mode.RevertEmpty) {
+      revert();
+    }
+    if (mode_ == Mode.FalseReturn) {
+      return false;
+    }
+    _transfer(msg.sender, to, amount);
+
+    if (mode_ == Mode.NoReturn) {
+      assembly {
+        return(0, 0)
+      }
+    }
+    if (mode_ == Mode.ShortReturn) {
+      assembly {
+        mstore(0, 1)
+        return(0x10, 0x10)
+      }
+    }
+    if (mode_ == Mode.NonBoolReturn) {
+      assembly {
+        mstore(0, 2)
+        return(0, 0x20)
+      }
+    }
+    return true;
+  }
+}
@@ -0,0 +1,47 @@
+// SPDX-License-Identifier: MIT
+pragma solidity 0.8.8;
+
+/// @title Call aggregator for local chains
+/// @notice Implements the subset of Multicall3 used to batch reads into one eth_call, with the
+/// same ABI, so that clients can use the canonical Multicall3 deployment on live chains
+contract Multicall {
+  struct Call {
+    address target;
+    bytes callData;
+  }
+
+  struct Result {
+    bool success;
+    bytes returnData;
+  }
+
+  /// @notice Calls every target in order and returns each call's success and return data,
+  /// reverting on the first failure if requireSuccess is set
+  /// @return blockNumber the block the calls were made at
+  /// @return blockHash the hash of blockNumber
+  /// @return returnData the result of each call
+  function tryBlockAndAggregate(bool requireSuccess, Call[] calldata calls)
+    external
+    payable
+    returns (uint256 blockNumber, bytes32 blockHash, Result[] memory returnData)
+  {
+    blockNumber = block.number;
+    blockHash = blockhash(block.number);
+    returnData = new Result[](calls.length);
+    for (uint256 i = 0; i < calls.length; i++) {
+      (bool success, bytes memory result) = calls[i].target.call(calls[i].callData);
+      if (requireSuccess) {
+        require(success, "Multicall3: call failed");
+      }
+      returnData[i] = Result(success, result);
+    }
+  }
+
+  function getEthBalance(address addr) external view returns (uint256 balance) {
+    balance = addr.balance;
+  }
+
+  function getBlockNumber() external view returns (uint256 blockNumber) {
+    blockNumber = block.number;
+  }
+}
@@ -0,0 +1,153 @@
+// SPDX-License-Identifier: MIT
+pragma solidity 0.8.8;
+
+import "../interfaces/IOdosExecutor.sol";
+import "../interfaces/IConstantProductPool.sol";
+import "../interfaces/IWETH.sol";
+
+import "OpenZeppelin/openzeppelin-contracts@4.8.3/contracts/token/ERC20/IERC20.sol";
+import "OpenZeppelin/openzeppelin-contracts@4.8.3/contracts/token/ERC20/utils/SafeERC20.sol";
+
+/// @title Reference executor with a compact path interpreter
+/// @notice Runs multi-hop paths of wraps, unwraps and constant product pool swaps, so that the
+/// router can be measured on realistic routes. Amounts are held in registers, the first of which
+/// hold the input amounts, and every instruction moves the full amount of its source register.
+/// The path is a register count byte followed by instructions, where each instruction is an opcode
+/// byte followed by its operands:
+///   STOP    0x00
+///   WRAP    0x01 src dst                               wraps ETH into WETH
+///   UNWRAP  0x02 src dst                               unwraps WETH into ETH
+///   SWAP    0x03 src dst pool(20) zeroForOne(1) fee(3) swaps through a pool, fee in millionths
+///   SPLIT   0x04 src dst share(2)                      moves share / 0xFFFF of src to dst
+///   MERGE   0x05 src dst                               adds src to dst
+///   SEND    0x06 src token(20)                         sends src to the router, null token for ETH
+/// Compact swaps pad the path with zero bytes to whole words, which decode as STOP
+contract OdosPathExecutor is IOdosExecutor {
+  using SafeERC20 for IERC20;
+
+  uint8 constant STOP = 0x00;
+  uint8 constant WRAP = 0x01;
+  uint8 constant UNWRAP = 0x02;
+  uint8 constant SWAP = 0x03;
+  uint8 constant SPLIT = 0x04;
+  uint8 constant MERGE = 0x05;
+  uint8 constant SEND = 0x06;
+
+  uint256 constant FEE_DENOM = 1e6;
+  uint256 constant SHARE_DENOM = 0xFFFF;
+
+  IWETH public immutable WETH;
+
+  constructor(address _weth) {
+    WETH = IWETH(_weth);
+  }
+  receive() external payable { }
+
+  /// @notice Runs the path, sending every output to the router that called it
+  /// @param bytecode register count followed by the path's instructions
+  /// @param inputAmounts amounts of each input, loaded into the first registers
+  function executePath(
+    bytes calldata bytecode,
+    uint256[] memory inputAmounts,
+    address
+  )
+    external
+    payable
+    override
+  {
+    uint256[] memory registers = new uint256[](uint8(bytecode[0]));
+    require(inputAmounts.length <= registers.length, "Too few registers");
+    for (uint256 i = 0; i < inputAmounts.length; i++) {
+      registers[i] = inputAmounts[i];
+    }
+
+    uint256 pos = 1;
+    while (pos < bytecode.length) {
+      uint8 opcode = uint8(bytecode[pos]);
+      if (opcode == STOP) {
+        break;
+      }
+      uint256 src = uint8(bytecode[pos + 1]);
+      uint256 amount = registers[src];
+      registers[src] = 0;
+
+      if (opcode == SEND) {
+        _send(address(bytes20(bytecode[pos + 2:pos + 22])), amount);
+        pos += 22;
+        continue;
+      }
+
+      uint256 dst = uint8(bytecode[pos + 2]);
+      if (opcode == WRAP) {
+        WETH.deposit{value: amount}();
+        pos += 3;
+      }
+      else if (opcode == UNWRAP) {
+        WETH.withdraw(amount);
+        pos += 3;
+      }
+      else if (opcode == SWAP) {
+        amount = _swap(
+          address(bytes20(bytecode[pos + 3:pos + 23])),
+          uint8(bytecode[pos + 23]) != 0,
+          uint24(bytes3(bytecode[pos + 24:pos + 27])),
+          amount
+        );
+        pos += 27;
+      }
+      else if (opcode == SPLIT) {
+        uint256 moved = amount * uint16(bytes2(bytecode[pos + 3:pos + 5])) / SHARE_DENOM;
+        registers[src] = amount - moved;
+        amount = moved;
+        pos += 5;
+      }
+      else if (opcode == MERGE) {
+        pos += 3;
+      }
+      else {
+        revert("Invalid opcode");
+      }
+      registers[dst] += amount;
+    }
+  }
+
+  /// @notice Swaps amountIn through a pool, with the output computed from the pool's reserves
+  /// @param pool address of the pool
+  /// @param zeroForOne whether token0 is swapped for token1
+  /// @param fee fee charged by the pool in millionths of the input amount
+  /// @param amountIn amount of the input token to swap
+  function _swap(address pool, bool zeroForOne, uint256 fee, uint256 amountIn)
+    private
+    returns (uint256 amountOut)
+  {
+    (uint256 reserve0, uint256 reserve1) = IConstantProductPool(pool).getReserves();
+    address tokenIn;
+    uint256 reserveIn;
+    uint256 reserveOut;
+    if (zeroForOne) {
+      (tokenIn, reserveIn, reserveOut) = (IConstantProductPool(pool).token0(), reserve0, reserve1);
+    } else {
+      (tokenIn, reserveIn, reserveOut) = (IConstantProductPool(pool).token1(), reserve1, reserve0);
+    }
+
+    uint256 amountInWithFee = amountIn * (FEE_DENOM - fee);
+    amountOut = amountInWithFee * reserveOut / (reserveIn * FEE_DENOM + amountInWithFee);
+
+    IERC20(tokenIn).safeTransfer(pool, amountIn);
+    if (zeroForOne) {
+      IConstantProductPool(pool).swap(0, amountOut, address(this));
+    } else {
+      IConstantProductPool(pool).swap(amountOut, 0, address(this));
+    }
+  }
+
+  /// @notice Sends an amount of a token or ETH back to the router
+  function _send(address token, uint256 amount) private {
+    if (token == address(0)) {
+      (bool success,) = payable(msg.sender).call{value: amount}("");
+      require(success, "ETH transfer failed");
+    } else {
+      IERC20(token).safeTransfer(msg.sender, amount);
+    }
+  }
+}
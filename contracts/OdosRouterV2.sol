@@ -24,6 +24,11 @@ contract OdosRouterV2 is Ownable {
     80084422859880547211683076133703299733277748156566366325829078699459944778998;
   address[] public addressList;
 
+  // @dev constants bounding the cached addresses that can be referenced by the compact decoders
+  uint256 public constant MAX_ADDRESS_LIST_LENGTH = 0x7FFE;
+  uint256 public constant MAX_ADDRESS_TABLE_CHUNKS = 0x80;
+  uint256 public constant ADDRESS_TABLE_CHUNK_SIZE = 0x100;
+
   // @dev constants for managing referrals and fees
   uint256 public constant REFERRAL_WITH_FEE_THRESHOLD = 1 << 31;
   uint256 public constant FEE_DENOM = 1e18;
@@ -79,6 +84,24 @@ contract OdosRouterV2 is Ownable {
     address[] tokensOut,
     uint32 referralCode
   );
+  /// @dev event for swapping one token for another with indexed sender and referral code
+  event SwapIndexed(
+    address indexed sender,
+    uint32 indexed referralCode,
+    uint256 inputAmount,
+    address inputToken,
+    uint256 amountOut,
+    address outputToken,
+    int256 slippage
+  );
+  /// @dev event for swapping multiple input and/or output tokens with indexed sender and referral
+  /// code, where data packs the 2 byte input and output counts followed by each 20 byte input token
+  /// and 32 byte amount in, then each 20 byte output token and 32 byte amount out
+  event SwapMultiPacked(
+    address indexed sender,
+    uint32 indexed referralCode,
+    bytes data
+  );
   /// @dev Holds all information for a given referral
   struct referralInfo {
     uint64 referralFee;
@@ -88,6 +111,20 @@ contract OdosRouterV2 is Ownable {
   /// @dev Register referral fee and information
   mapping(uint32 => referralInfo) public referralLookup;
 
+  /// @dev Address table where addresses are cached in chunks as the bytecode of data contracts, so
+  // that a single cold account access makes a whole chunk cheap to read. It is declared after the
+  // variables above to keep their storage slots. addressTableStart is the storage slot of the first
+  // dynamic array element, which holds the address of the first chunk
+  uint256 private constant addressTableStart =
+    62514009886607029107290561805838585334079798074568712924583230797734656856475;
+  address[] public addressTable;
+
+  /// @dev Referral fees accrued to each beneficiary for each token that are yet to be claimed
+  mapping(address => mapping(address => uint256)) public referralFeesOwed;
+
+  /// @dev Total unclaimed referral fees held by the router for each token, which are not router revenue
+  mapping(address => uint256) public referralFeesReserved;
+
   /// @dev Set the null referralCode as "Unregistered" with no additional fee
   constructor() {
     referralLookup[0].referralFee = 0;
@@ -96,6 +133,17 @@ contract OdosRouterV2 is Ownable {
 
     swapMultiFee = 5e14;
   }
+  /// @notice Whether swaps emit SwapIndexed and SwapMultiPacked instead of Swap and SwapMulti, which
+  /// is only set in OdosRouterV2PackedEvents, so that swaps never read it from storage
+  function packedEvents() public pure virtual returns (bool) {
+    return false;
+  }
+  /// @notice Whether beneficiaries' shares of referral fees are credited during swaps to be claimed
+  /// later instead of transferred, which is only set in OdosRouterV2ReferralAccrual, so that swaps
+  /// never read it from storage
+  function referralFeeAccrual() public pure virtual returns (bool) {
+    return false;
+  }
   /// @dev Must exist in order for contract to receive eth
   receive() external payable { }
 
@@ -128,12 +176,45 @@ contract OdosRouterV2 is Ownable {
             result := and(shr(80, calldataload(currPos)), 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF)
             newPos := add(currPos, 22)
           }
-          // Otherwise we use the case to load in from the cached address list
+          // Otherwise we use the case to load in from the cached address list or address table
           default {
-            result := sload(add(addressListStart, sub(inputPos, 2)))
+            switch and(inputPos, 0x8000)
+            case 0 {
+              result := sload(add(addressListStart, sub(inputPos, 2)))
+            }
+            // A set top bit selects the address table, with the chunk index and offset in the lower bits
+            default {
+              extcodecopy(
+                sload(add(addressTableStart, and(shr(8, inputPos), 0x7F))),
+                0,
+                add(mul(and(inputPos, 0xFF), 20), 1),
+                20
+              )
+              result := shr(96, mload(0))
+            }
             newPos := add(currPos, 2)
           }
         }
+        // Define function to load in an amount, either as length-prefixed bytes or as a mantissa and exponent
+        function getAmount(currPos) -> result, newPos {
+          let lengthByte := shr(248, calldataload(currPos))
+
+          switch and(lengthByte, 0x80)
+          // A clear top bit means the byte is the length of the big-endian amount that follows
+          case 0 {
+            result := shr(mul(sub(32, lengthByte), 8), calldataload(add(currPos, 1)))
+            newPos := add(add(currPos, 1), lengthByte)
+          }
+          // Otherwise the low bits are the mantissa length, followed by a base 10 exponent byte and the mantissa
+          default {
+            let mantissaLength := and(lengthByte, 0x7F)
+            result := mul(
+              shr(mul(sub(32, mantissaLength), 8), calldataload(add(currPos, 2))),
+              exp(10, shr(248, calldataload(add(currPos, 1))))
+            )
+            newPos := add(add(currPos, 2), mantissaLength)
+          }
+        }
         let result := 0
         let pos := 4
 
@@ -145,21 +226,13 @@ contract OdosRouterV2 is Ownable {
         mstore(add(tokenInfo, 0x60), result)
 
         // Load in the input amount - a 0 byte means the full balance is to be used
-        let inputAmountLength := shr(248, calldataload(pos))
-        pos := add(pos, 1)
-
-        if inputAmountLength {
-          mstore(add(tokenInfo, 0x20), shr(mul(sub(32, inputAmountLength), 8), calldataload(pos)))
-          pos := add(pos, inputAmountLength)
-        }
+        result, pos := getAmount(pos)
+        mstore(add(tokenInfo, 0x20), result)
 
         // Load in the quoted output amount
-        let quoteAmountLength := shr(248, calldataload(pos))
-        pos := add(pos, 1)
-
-        let outputQuote := shr(mul(sub(32, quoteAmountLength), 8), calldataload(pos))
+        let outputQuote := 0
+        outputQuote, pos := getAmount(pos)
         mstore(add(tokenInfo, 0x80), outputQuote)
-        pos := add(pos, quoteAmountLength)
 
         // Load the slippage tolerance and use to get the minimum output amount
         {
@@ -245,7 +318,7 @@ contract OdosRouterV2 is Ownable {
     else {
       // Support rebasing tokens by allowing the user to trade the entire balance
       if (tokenInfo.inputAmount == 0) {
-        tokenInfo.inputAmount = IERC20(tokenInfo.inputToken).balanceOf(msg.sender);
+        tokenInfo.inputAmount = _balanceOf(tokenInfo.inputToken, msg.sender);
       }
       IERC20(tokenInfo.inputToken).safeTransferFrom(
         msg.sender,
@@ -335,7 +408,7 @@ contract OdosRouterV2 is Ownable {
     if (referralCode > REFERRAL_WITH_FEE_THRESHOLD) {
       referralInfo memory thisReferralInfo = referralLookup[referralCode];
 
-      _universalTransfer(
+      _payReferralFee(
         tokenInfo.outputToken,
         thisReferralInfo.beneficiary,
         amountOut * thisReferralInfo.referralFee * 8 / (FEE_DENOM * 10)
@@ -351,15 +424,27 @@ contract OdosRouterV2 is Ownable {
     // Transfer out the final output to the end user
     _universalTransfer(tokenInfo.outputToken, tokenInfo.outputReceiver, amountOut);
 
-    emit Swap(
-      msg.sender,
-      tokenInfo.inputAmount,
-      tokenInfo.inputToken,
-      amountOut,
-      tokenInfo.outputToken,
-      slippage,
-      referralCode
-    );
+    if (packedEvents()) {
+      emit SwapIndexed(
+        msg.sender,
+        referralCode,
+        tokenInfo.inputAmount,
+        tokenInfo.inputToken,
+        amountOut,
+        tokenInfo.outputToken,
+        slippage
+      );
+    } else {
+      emit Swap(
+        msg.sender,
+        tokenInfo.inputAmount,
+        tokenInfo.inputToken,
+        amountOut,
+        tokenInfo.outputToken,
+        slippage,
+        referralCode
+      );
+    }
   }
 
   /// @notice Custom decoder to swapMulti with compact calldata for efficient execution on L2s
@@ -403,20 +488,49 @@ contract OdosRouterV2 is Ownable {
             result := and(shr(80, calldataload(currPos)), 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF)
             newPos := add(currPos, 22)
           }
-          // Otherwise we use the case to load in from the cached address list
+          // Otherwise we use the case to load in from the cached address list or address table
           default {
-            result := sload(add(addressListStart, sub(inputPos, 2)))
+            switch and(inputPos, 0x8000)
+            case 0 {
+              result := sload(add(addressListStart, sub(inputPos, 2)))
+            }
+            // A set top bit selects the address table, with the chunk index and offset in the lower bits
+            default {
+              extcodecopy(
+                sload(add(addressTableStart, and(shr(8, inputPos), 0x7F))),
+                0,
+                add(mul(and(inputPos, 0xFF), 20), 1),
+                20
+              )
+              result := shr(96, mload(0))
+            }
             newPos := add(currPos, 2)
           }
         }
+        // Define function to load in an amount, either as length-prefixed bytes or as a mantissa and exponent
+        function getAmount(currPos) -> result, newPos {
+          let lengthByte := shr(248, calldataload(currPos))
+
+          switch and(lengthByte, 0x80)
+          // A clear top bit means the byte is the length of the big-endian amount that follows
+          case 0 {
+            result := shr(mul(sub(32, lengthByte), 8), calldataload(add(currPos, 1)))
+            newPos := add(add(currPos, 1), lengthByte)
+          }
+          // Otherwise the low bits are the mantissa length, followed by a base 10 exponent byte and the mantissa
+          default {
+            let mantissaLength := and(lengthByte, 0x7F)
+            result := mul(
+              shr(mul(sub(32, mantissaLength), 8), calldataload(add(currPos, 2))),
+              exp(10, shr(248, calldataload(add(currPos, 1))))
+            )
+            newPos := add(add(currPos, 2), mantissaLength)
+          }
+        }
         executor, pos := getAddress(pos)
 
-        // Load in the quoted output amount
-        let outputMinAmountLength := shr(248, calldataload(pos))
-        pos := add(pos, 1)
-
-        valueOutMin := shr(mul(sub(32, outputMinAmountLength), 8), calldataload(pos))
-        pos := add(pos, outputMinAmountLength)
+        // Load in the minimum value out
+        valueOutMin, pos := getAmount(pos)
 
         let result := 0
         let memPos := 0
@@ -430,13 +544,9 @@ contract OdosRouterV2 is Ownable {
           mstore(memPos, result)
 
           // Load in the input amount - a 0 byte means the full balance is to be used
-          let inputAmountLength := shr(248, calldataload(pos))
-          pos := add(pos, 1)
+          result, pos := getAmount(pos)
+          mstore(add(memPos, 0x20), result)
 
-          if inputAmountLength {
-             mstore(add(memPos, 0x20), shr(mul(sub(32, inputAmountLength), 8), calldataload(pos)))
-            pos := add(pos, inputAmountLength)
-          }
           result, pos := getAddress(pos)
           if eq(result, 0) { result := executor }
 
@@ -450,12 +560,9 @@ contract OdosRouterV2 is Ownable {
           result, pos := getAddress(pos)
           mstore(memPos, result)
 
-          // Load in the quoted output amount
-          let outputAmountLength := shr(248, calldataload(pos))
-          pos := add(pos, 1)
-
-          mstore(add(memPos, 0x20), shr(mul(sub(32, outputAmountLength), 8), calldataload(pos)))
-          pos := add(pos, outputAmountLength)
+          // Load in the relative value of the output
+          result, pos := getAmount(pos)
+          mstore(add(memPos, 0x20), result)
 
           result, pos := getAddress(pos)
           if eq(result, 0) { result := msgSender }
@@ -545,7 +652,7 @@ contract OdosRouterV2 is Ownable {
       } 
       else {
         if (inputs[i].amountIn == 0) {
-          inputs[i].amountIn = IERC20(inputs[i].tokenAddress).balanceOf(msg.sender);
+          inputs[i].amountIn = _balanceOf(inputs[i].tokenAddress, msg.sender);
         }
         IERC20(inputs[i].tokenAddress).safeTransferFrom(
           msg.sender,
@@ -612,7 +719,7 @@ contract OdosRouterV2 is Ownable {
         }
         else {
           if (inputs[i].amountIn == 0) {
-            inputs[i].amountIn = IERC20(inputs[i].tokenAddress).balanceOf(msg.sender);
+            inputs[i].amountIn = _balanceOf(inputs[i].tokenAddress, msg.sender);
           }
           uint256 permit_index = expected_msg_value == 0 ? i : i - 1;
 
@@ -721,7 +828,7 @@ contract OdosRouterV2 is Ownable {
         amountsOut[i] = amountsOut[i] * (FEE_DENOM - _swapMultiFee) / FEE_DENOM;
 
         if (referralCode > REFERRAL_WITH_FEE_THRESHOLD) {
-          _universalTransfer(
+          _payReferralFee(
             outputs[i].tokenAddress,
             thisReferralInfo.beneficiary,
             amountsOut[i] * thisReferralInfo.referralFee * 8 / (FEE_DENOM * 10)
@@ -738,16 +845,11 @@ contract OdosRouterV2 is Ownable {
       }
       require(valueOut >= valueOutMin, "Slippage Limit Exceeded");
     }
-    address[] memory tokensOut = new address[](outputs.length);
-    for (uint256 i = 0; i < outputs.length; i++) {
-        tokensOut[i] = outputs[i].tokenAddress;
-    }
-    emit SwapMulti(
-      msg.sender,
+    _emitSwapMulti(
       amountsIn,
       tokensIn,
       amountsOut,
-      tokensOut,
+      outputs,
       referralCode
     );
   }
@@ -783,6 +885,29 @@ contract OdosRouterV2 is Ownable {
     referralLookup[_referralCode].registered = true;
   }
 
+  /// @notice Pay out the referral fees accrued to the caller as a beneficiary
+  /// @param tokens List of token addresses to claim accrued fees for
+  /// @return amounts List of amounts of each token paid out
+  function claimReferralFees(
+    address[] calldata tokens
+  )
+    external
+    returns (uint256[] memory amounts)
+  {
+    amounts = new uint256[](tokens.length);
+
+    for (uint256 i = 0; i < tokens.length; i++) {
+      amounts[i] = referralFeesOwed[msg.sender][tokens[i]];
+
+      if (amounts[i] > 0) {
+        referralFeesOwed[msg.sender][tokens[i]] = 0;
+        referralFeesReserved[tokens[i]] -= amounts[i];
+
+        _universalTransfer(tokens[i], msg.sender, amounts[i]);
+      }
+    }
+  }
+
   /// @notice Set the fee used for swapMulti
   /// @param _swapMultiFee the new fee for swapMulti
   function setSwapMultiFee(
@@ -804,9 +929,55 @@ contract OdosRouterV2 is Ownable {
     external
     onlyOwner
   {
-    for (uint256 i = 0; i < addresses.length; i++) {
-      addressList.push(addresses[i]);
+    uint256 length = addressList.length;
+    require(length + addresses.length <= MAX_ADDRESS_LIST_LENGTH, "Address list full");
+
+    // Write all new elements before writing the array length once
+    assembly {
+      for { let i := 0 } lt(i, addresses.length) { i := add(i, 1) } {
+        sstore(
+          add(addressListStart, add(length, i)),
+          and(calldataload(add(addresses.offset, mul(i, 0x20))), 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF)
+        )
+      }
+      sstore(addressList.slot, add(length, addresses.length))
+    }
+  }
+
+  /// @notice Append a new chunk of addresses to the cached address table, stored as contract bytecode
+  /// @param addresses list of addresses to be written to the new address table chunk
+  function writeAddressTable(
+    address[] calldata addresses
+  )
+    external
+    onlyOwner
+  {
+    require(
+      addresses.length > 0 && addresses.length <= ADDRESS_TABLE_CHUNK_SIZE,
+      "Invalid chunk size"
+    );
+    require(addressTable.length < MAX_ADDRESS_TABLE_CHUNKS, "Address table full");
+
+    address chunk;
+    assembly {
+      let initCode := mload(0x40)
+      let codeLength := add(mul(addresses.length, 20), 1)
+
+      // Creation code returning everything after it as the runtime code, which starts with a STOP opcode
+      mstore(initCode, shl(168, or(or(shl(80, 0x61), shl(64, codeLength)), shl(8, 0x80600a3d393df3))))
+
+      // Tightly pack the addresses after the STOP opcode
+      for { let i := 0 } lt(i, addresses.length) { i := add(i, 1) } {
+        mstore(
+          add(add(initCode, 11), mul(i, 20)),
+          shl(96, calldataload(add(addresses.offset, mul(i, 0x20))))
+        )
+      }
+      chunk := create(0, initCode, add(codeLength, 10))
     }
+    require(chunk != address(0), "Address table write failed");
+
+    addressTable.push(chunk);
   }
 
   /// @notice Allows the owner to transfer funds held by the router contract
@@ -823,11 +994,14 @@ contract OdosRouterV2 is Ownable {
   {
     require(tokens.length == amounts.length, "Invalid funds transfer");
     for (uint256 i = 0; i < tokens.length; i++) {
+      uint256 reserved = referralFeesReserved[tokens[i]];
+
       _universalTransfer(
         tokens[i], 
         dest, 
-        amounts[i] == 0 ? _universalBalance(tokens[i]) : amounts[i]
+        amounts[i] == 0 ? _universalBalance(tokens[i]) - reserved : amounts[i]
       );
+      _checkReferralFeesReserved(tokens[i], reserved);
     }
   }
   /// @notice Directly swap funds held in router 
@@ -853,14 +1027,17 @@ contract OdosRouterV2 is Ownable {
     for (uint256 i = 0; i < inputs.length; i++) {
       tokensIn[i] = inputs[i].tokenAddress;
 
+      uint256 reserved = referralFeesReserved[tokensIn[i]];
+
       amountsIn[i] = inputs[i].amountIn == 0 ? 
-        _universalBalance(tokensIn[i]) : inputs[i].amountIn;
+        _universalBalance(tokensIn[i]) - reserved : inputs[i].amountIn;
 
       _universalTransfer(
         tokensIn[i],
         inputs[i].receiver,
         amountsIn[i]
       );
+      _checkReferralFeesReserved(tokensIn[i], reserved);
     }
     // Check outputs for duplicates and record balances before swap
     uint256[] memory balancesBefore = new uint256[](outputs.length);
@@ -889,15 +1066,88 @@ contract OdosRouterV2 is Ownable {
     }
     require(valueOut >= valueOutMin, "Slippage Limit Exceeded");
 
-    emit SwapMulti(
-      msg.sender,
+    _emitSwapMulti(
       amountsIn,
       tokensIn,
       amountsOut,
-      tokensOut,
+      outputs,
       0
     );
   }
+  /// @notice helper function to pay a beneficiary's share of a referral fee, which is either
+  /// transferred immediately or credited to be claimed later if referral fee accrual is set
+  /// @param token address of the token the fee is paid in, null for native coin
+  /// @param beneficiary address of the referral's beneficiary
+  /// @param amount of the fee to pay to the beneficiary
+  function _payReferralFee(address token, address beneficiary, uint256 amount) private {
+    if (referralFeeAccrual()) {
+      referralFeesOwed[beneficiary][token] += amount;
+      referralFeesReserved[token] += amount;
+    } else {
+      _universalTransfer(token, beneficiary, amount);
+    }
+  }
+  /// @notice helper function to make sure funds moved by the owner leave unclaimed referral fees in the router
+  /// @param token address of the token that was moved, null for native coin
+  /// @param reserved amount of unclaimed referral fees for the token
+  function _checkReferralFeesReserved(address token, uint256 reserved) private view {
+    if (reserved > 0) {
+      require(_universalBalance(token) >= reserved, "Referral fees reserved");
+    }
+  }
+  /// @notice helper function to emit the event for a multi swap in the configured format
+  /// @param amountsIn list of amounts of each input token
+  /// @param tokensIn list of input token addresses
+  /// @param amountsOut list of amounts of each output token
+  /// @param outputs list of output token structs for the path that was executed
+  /// @param referralCode referral code to specify the source of the swap
+  function _emitSwapMulti(
+    uint256[] memory amountsIn,
+    address[] memory tokensIn,
+    uint256[] memory amountsOut,
+    outputTokenInfo[] memory outputs,
+    uint32 referralCode
+  )
+    private
+  {
+    if (packedEvents()) {
+      bytes memory data = new bytes(4 + (tokensIn.length + outputs.length) * 52);
+
+      assembly {
+        let pos := add(data, 0x20)
+        mstore(pos, or(shl(240, mload(tokensIn)), shl(224, mload(outputs))))
+        pos := add(pos, 4)
+
+        // Each token is written as a full word and then overwritten after 20 bytes by its amount
+        for { let i := 0 } lt(i, mload(tokensIn)) { i := add(i, 1) } {
+          let offset := mul(add(i, 1), 0x20)
+          mstore(pos, shl(96, mload(add(tokensIn, offset))))
+          mstore(add(pos, 20), mload(add(amountsIn, offset)))
+          pos := add(pos, 52)
+        }
+        for { let i := 0 } lt(i, mload(outputs)) { i := add(i, 1) } {
+          let offset := mul(add(i, 1), 0x20)
+          mstore(pos, shl(96, mload(mload(add(outputs, offset)))))
+          mstore(add(pos, 20), mload(add(amountsOut, offset)))
+          pos := add(pos, 52)
+        }
+      }
+      emit SwapMultiPacked(msg.sender, referralCode, data);
+    } else {
+      address[] memory tokensOut = new address[](outputs.length);
+      for (uint256 i = 0; i < outputs.length; i++) {
+        tokensOut[i] = outputs[i].tokenAddress;
+      }
+      emit SwapMulti(
+        msg.sender,
+        amountsIn,
+        tokensIn,
+        amountsOut,
+        tokensOut,
+        referralCode
+      );
+    }
+  }
   /// @notice helper function to get balance of ERC20 or native coin for this contract
   /// @param token address of the token to check, null for native coin
   /// @return balance of specified coin or token
@@ -905,7 +1155,7 @@ contract OdosRouterV2 is Ownable {
     if (token == _ETH) {
       return address(this).balance;
     } else {
-      return IERC20(token).balanceOf(address(this));
+      return _balanceOf(token, address(this));
     }
   }
   /// @notice helper function to transfer ERC20 or native coin
@@ -917,7 +1167,75 @@ contract OdosRouterV2 is Ownable {
       (bool success,) = payable(to).call{value: amount}("");
       require(success, "ETH transfer failed");
     } else {
-      IERC20(token).safeTransfer(to, amount);
+      _safeTransfer(token, to, amount);
+    }
+  }
+  /// @notice helper function to get the ERC20 balance of an account without ABI encoding overhead,
+  /// reverting like IERC20.balanceOf if the call fails or returns less than a word
+  /// @param token address of the ERC20 token to check
+  /// @param account address of the account to check the balance of
+  /// @return balance of the account
+  function _balanceOf(address token, address account) private view returns (uint256 balance) {
+    assembly {
+      let ptr := mload(0x40)
+
+      // Selector for balanceOf(address)
+      mstore(ptr, 0x70a0823100000000000000000000000000000000000000000000000000000000)
+      mstore(add(ptr, 0x04), and(account, 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF))
+
+      if iszero(staticcall(gas(), token, ptr, 0x24, 0, 0x20)) {
+        returndatacopy(ptr, 0, returndatasize())
+        revert(ptr, returndatasize())
+      }
+      // Calls to accounts without code succeed with no return data
+      if lt(returndatasize(), 0x20) {
+        revert(0, 0)
+      }
+      balance := mload(0)
+    }
+  }
+  /// @notice helper function to transfer an ERC20 without ABI encoding overhead, with the same
+  /// reverts as SafeERC20.safeTransfer, including support for tokens that return no value
+  /// @param token address of the ERC20 token being transferred
+  /// @param to address to transfer to
+  /// @param amount to transfer
+  function _safeTransfer(address token, address to, uint256 amount) private {
+    // 0 on success, 1 for a failed call, 2 for a call to an account without code, 3 for a false return
+    uint256 status;
+
+    assembly {
+      let ptr := mload(0x40)
+
+      // Selector for transfer(address,uint256)
+      mstore(ptr, 0xa9059cbb00000000000000000000000000000000000000000000000000000000)
+      mstore(add(ptr, 0x04), and(to, 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF))
+      mstore(add(ptr, 0x24), amount)
+
+      switch call(gas(), token, 0, ptr, 0x44, 0, 0x20)
+      case 0 {
+        // Bubble up the revert reason if there is one
+        if returndatasize() {
+          returndatacopy(ptr, 0, returndatasize())
+          revert(ptr, returndatasize())
+        }
+        status := 1
+      }
+      default {
+        switch returndatasize()
+        case 0 {
+          status := mul(iszero(extcodesize(token)), 2)
+        }
+        default {
+          // Return data that does not decode as a bool reverts without a reason, like abi.decode
+          if or(lt(returndatasize(), 0x20), gt(mload(0), 1)) {
+            revert(0, 0)
+          }
+          status := mul(iszero(mload(0)), 3)
+        }
+      }
     }
+    require(status != 1, "SafeERC20: low-level call failed");
+    require(status != 2, "Address: call to non-contract");
+    require(status != 3, "SafeERC20: ERC20 operation did not succeed");
   }
 }
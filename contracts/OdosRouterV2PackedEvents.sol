@@ -0,0 +1,13 @@
+// SPDX-License-Identifier: MIT
+pragma solidity 0.8.8;
+
+import "./OdosRouterV2.sol";
+
+/// @title Routing contract for Odos SOR with packed swap events
+/// @notice OdosRouterV2 emitting SwapIndexed and SwapMultiPacked instead of Swap and SwapMulti, which
+/// index the sender and referral code as topics and pack the tokens and amounts of multi swaps
+contract OdosRouterV2PackedEvents is OdosRouterV2 {
+  function packedEvents() public pure override returns (bool) {
+    return true;
+  }
+}
@@ -0,0 +1,13 @@
+// SPDX-License-Identifier: MIT
+pragma solidity 0.8.8;
+
+import "./OdosRouterV2.sol";
+
+/// @title Routing contract for Odos SOR with accrued referral fees
+/// @notice OdosRouterV2 crediting beneficiaries' shares of referral fees during swaps, to be paid out
+/// in bulk with claimReferralFees, instead of transferring them on every swap
+contract OdosRouterV2ReferralAccrual is OdosRouterV2 {
+  function referralFeeAccrual() public pure override returns (bool) {
+    return true;
+  }
+}
@@ -0,0 +1,13 @@
+// SPDX-License-Identifier: UNLICENSED
+
+pragma solidity 0.8.8;
+
+/// @dev Minimal interface of a two token constant product pool. Like a Uniswap V2 pair, input
+/// tokens are transferred to the pool before swap is called, and the pool checks its invariant
+/// after paying out the requested amounts
+interface IConstantProductPool {
+  function token0() external view returns (address);
+  function token1() external view returns (address);
+  function getReserves() external view returns (uint256 reserve0, uint256 reserve1);
+  function swap(uint256 amount0Out, uint256 amount1Out, address to) external;
+}
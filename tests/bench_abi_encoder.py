@@ -0,0 +1,89 @@
+import random
+import sys
+import time
+
+from eth_abi import encode
+from lib import abi_encoder, utils
+from lib.calldata_service import ENCODERS, ENDPOINT_TYPES
+
+# Compares the time taken to encode router calls with the router's own encoders in
+# abi_encoder and with eth_abi, which web3 uses to encode contract calls, for single
+# swaps and multi swaps of up to 8 inputs and 8 outputs.
+# Run from the tests directory with `python bench_abi_encoder.py [num_calls]`
+
+CASES = [
+    ("swap", 1, 1),
+    ("swapPermit2", 1, 1),
+    ("swapMulti", 2, 2),
+    ("swapMulti", 8, 8),
+    ("swapMultiPermit2", 8, 8),
+]
+
+
+def token_infos(rng, num):
+    return [
+        (utils.random_address(), rng.randrange(1 << 128), utils.random_address())
+        for i in range(num)
+    ]
+
+
+def case_args(rng, endpoint, num_inputs, num_outputs):
+    path_definition = bytes(rng.randrange(256) for i in range(32 * (num_inputs + 2)))
+    executor = utils.random_address()
+    permit2 = (utils.random_address(), 0, (1 << 48) - 1, bytes(65))
+
+    if endpoint in ["swap", "swapPermit2"]:
+        token_info = (
+            utils.random_address(),
+            rng.randrange(1 << 128),
+            executor,
+            utils.random_address(),
+            rng.randrange(1 << 128),
+            rng.randrange(1 << 128),
+            utils.random_address(),
+        )
+        args = [token_info, path_definition, executor, 0]
+    else:
+        args = [
+            token_infos(rng, num_inputs),
+            token_infos(rng, num_outputs),
+            rng.randrange(1 << 128),
+            path_definition,
+            executor,
+            0,
+        ]
+
+    if endpoint.endswith("Permit2"):
+        args = [permit2] + args
+    return args
+
+
+def time_per_call(encoder, args, num_calls):
+    start = time.perf_counter()
+    for i in range(num_calls):
+        encoder(*args)
+    return (time.perf_counter() - start) / num_calls * 1e6
+
+
+def main(num_calls=10_000, seed=0):
+    rng = random.Random(seed)
+
+    print(f"{'endpoint':<18}{'legs':>6}{'eth_abi us':>12}{'fast us':>10}{'speedup':>9}")
+    for endpoint, num_inputs, num_outputs in CASES:
+        args = case_args(rng, endpoint, num_inputs, num_outputs)
+        selector = abi_encoder.SELECTORS[endpoint]
+        types = ENDPOINT_TYPES[endpoint]
+        assert ENCODERS[endpoint](*args) == selector + encode(types, args)
+
+        generic = time_per_call(
+            lambda *args: selector + encode(types, args), args, num_calls
+        )
+        fast = time_per_call(ENCODERS[endpoint], args, num_calls)
+        print(
+            f"{endpoint:<18}{f'{num_inputs}x{num_outputs}':>6}{generic:>12.1f}"
+            f"{fast:>10.1f}{generic / fast:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
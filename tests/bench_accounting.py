@@ -0,0 +1,230 @@
+import random
+import sys
+import time
+
+import numpy as np
+from lib import accounting
+from lib.bench import print_table
+from lib.decode_events import SwapEvent, SwapMultiEvent
+
+# Benchmarks revenue accounting on limb columns against the object array columns it
+# replaced, whose arithmetic numpy runs one Python int at a time, and end to end against
+# a plain loop over events, over a mix of swaps resembling production traffic. Both
+# sides are checked to give the same results.
+# Run from the tests directory with `python bench_accounting.py [num_events]`
+
+TOKENS = ["0x" + bytes([i]).hex() * 20 for i in range(1, 21)]
+TOKEN_DECIMALS = [6, 8, 18, 18, 18]
+REFERRAL_FEES = {
+    accounting.REFERRAL_WITH_FEE_THRESHOLD + i: fee
+    for i, fee in enumerate([int(1e14), int(5e14), int(1e15), int(2e16)], 1)
+}
+SWAP_MULTI_FEE = [(0, int(5e14)), (500_000, int(1e15))]
+BLOCKS_PER_PERIOD = 7200
+
+
+def random_amount(rng):
+    return rng.randrange(1, 10 ** (rng.choice(TOKEN_DECIMALS) + rng.randrange(0, 8)))
+
+
+def random_events(rng, num_events):
+    events = []
+    for block in sorted(rng.randrange(1_000_000) for i in range(num_events)):
+        referral_code = rng.choice([0, 0, 7] + list(REFERRAL_FEES))
+        if rng.random() < 0.7:
+            amount_out = random_amount(rng)
+            slippage = rng.randrange(-amount_out // 100, amount_out // 100 + 1)
+            event = SwapEvent(
+                "0x00", 0, TOKENS[0], amount_out, rng.choice(TOKENS), slippage, 0
+            )
+        else:
+            num_outputs = rng.randint(1, 3)
+            event = SwapMultiEvent(
+                "0x00",
+                [],
+                [],
+                [random_amount(rng) for i in range(num_outputs)],
+                rng.sample(TOKENS, num_outputs),
+                0,
+            )
+        events.append((block, event._replace(referral_code=referral_code)))
+
+    return events
+
+
+def object_revenue_columns(amount_out, slippage, referral_fee, multi_fee):
+    # The previous revenue_columns, on object arrays of Python ints that numpy operates
+    # on one element at a time
+    def min_preimage(amounts, numerators):
+        return (amounts * accounting.FEE_DENOM + numerators - 1) // numerators
+
+    after_referral_fee = amount_out + slippage
+
+    after_multi_fee = min_preimage(
+        after_referral_fee, accounting.FEE_DENOM - referral_fee
+    )
+    raw_amount_out = min_preimage(after_multi_fee, accounting.FEE_DENOM - multi_fee)
+    beneficiary_share = (
+        after_multi_fee * referral_fee * 8 // (accounting.FEE_DENOM * 10)
+    )
+
+    return {
+        "slippage": slippage,
+        "swap_multi_fee": raw_amount_out - after_multi_fee,
+        "referral_fee": after_multi_fee - after_referral_fee - beneficiary_share,
+    }
+
+
+def object_aggregate(keys, revenue):
+    # The previous aggregate, which sorts the keys of every row
+    unique_keys, groups = np.unique(keys, return_inverse=True)
+    order = np.argsort(groups, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(groups[order]) != 0])
+
+    return unique_keys, {
+        name: np.add.reduceat(values[order], starts) for name, values in revenue.items()
+    }
+
+
+def object_revenue(keys, *columns):
+    return object_aggregate(keys, object_revenue_columns(*columns))
+
+
+def limb_revenue(keys, columns):
+    return accounting.aggregate(
+        keys, accounting.revenue_columns(columns, REFERRAL_FEES, SWAP_MULTI_FEE)
+    )
+
+
+def _swap_multi_fee_at(block):
+    return [fee for first_block, fee in SWAP_MULTI_FEE if first_block <= block][-1]
+
+
+def loop_totals(events):
+    # The same formulas as accounting.revenue_columns, one row at a time
+    def min_preimage(amount, numerator):
+        return -(-amount * accounting.FEE_DENOM // numerator)
+
+    totals = {}
+    for block, event in events:
+        if isinstance(event, SwapEvent):
+            rows = [(event.output_token, event.amount_out, max(event.slippage, 0), 0)]
+        else:
+            multi_fee = _swap_multi_fee_at(block)
+            rows = [
+                (token, amount_out, 0, multi_fee)
+                for token, amount_out in zip(event.tokens_out, event.amounts_out)
+            ]
+        referral_fee = REFERRAL_FEES.get(event.referral_code, 0)
+
+        for token, amount_out, slippage, multi_fee in rows:
+            after_referral_fee = amount_out + slippage
+            after_multi_fee = min_preimage(
+                after_referral_fee, accounting.FEE_DENOM - referral_fee
+            )
+            raw_amount_out = min_preimage(
+                after_multi_fee, accounting.FEE_DENOM - multi_fee
+            )
+            beneficiary_share = (
+                after_multi_fee * referral_fee * 8 // (accounting.FEE_DENOM * 10)
+            )
+
+            total = totals.setdefault(
+                (token, block // BLOCKS_PER_PERIOD),
+                dict.fromkeys(accounting.REVENUE_COMPONENTS, 0),
+            )
+            total["slippage"] += slippage
+            total["swap_multi_fee"] += raw_amount_out - after_multi_fee
+            total["referral_fee"] += (
+                after_multi_fee - after_referral_fee - beneficiary_share
+            )
+
+    return totals
+
+
+def ledger_totals(events):
+    ledger = accounting.RevenueLedger(
+        REFERRAL_FEES,
+        SWAP_MULTI_FEE,
+        period_of=lambda blocks: blocks // BLOCKS_PER_PERIOD,
+    )
+    ledger.update(events)
+    return ledger.totals
+
+
+def best_time(function, *args, repeats=5):
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(num_events=100_000, seed=0):
+    rng = random.Random(seed)
+
+    columns_rows = []
+    totals_rows = []
+    for size in [1_000, 10_000, num_events]:
+        events = random_events(rng, size)
+
+        # Revenue totals by token and period from the same columns
+        columns = accounting.events_to_columns(events)
+        keys = np.empty(
+            len(columns["block"]), dtype=[("token", "U42"), ("period", "i8")]
+        )
+        keys["token"] = columns["token"]
+        keys["period"] = columns["block"] // BLOCKS_PER_PERIOD
+        referral_fee = accounting.referral_fee_column(
+            columns["referral_code"], REFERRAL_FEES
+        )
+        multi_fee = np.where(
+            columns["multi"],
+            [_swap_multi_fee_at(block) for block in columns["block"].tolist()],
+            0,
+        )
+        object_time, (expected_keys, expected) = best_time(
+            object_revenue,
+            keys,
+            np.array(accounting.from_limbs(columns["amount_out"]), dtype=object),
+            np.array(accounting.from_limbs(columns["slippage"]), dtype=object),
+            referral_fee.astype(object),
+            multi_fee.astype(object),
+        )
+        limb_time, (unique_keys, sums) = best_time(limb_revenue, keys, columns)
+        assert (unique_keys == expected_keys).all()
+        for name in accounting.REVENUE_COMPONENTS:
+            assert sums[name].tolist() == expected[name].tolist()
+
+        # Totals by token and period from the events, including flattening them
+        loop_time, expected = best_time(loop_totals, events)
+        ledger_time, totals = best_time(ledger_totals, events)
+        assert totals == expected
+
+        num_rows = len(columns["block"])
+        columns_rows.append(
+            [
+                num_rows,
+                f"{object_time * 1e3:.1f}",
+                f"{limb_time * 1e3:.1f}",
+                f"{object_time / limb_time:.1f}x",
+            ]
+        )
+        totals_rows.append(
+            [
+                size,
+                f"{loop_time * 1e3:.1f}",
+                f"{ledger_time * 1e3:.1f}",
+                f"{loop_time / ledger_time:.2f}x",
+            ]
+        )
+
+    print("\nrevenue_columns and aggregate")
+    print_table(["rows", "object ms", "limbs ms", "speedup"], columns_rows)
+    print("\nRevenueLedger.update against a loop over events")
+    print_table(["events", "loop ms", "ledger ms", "speedup"], totals_rows)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
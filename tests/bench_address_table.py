@@ -0,0 +1,131 @@
+import brownie
+import pytest
+from brownie import accounts
+from lib import encode_compact, utils
+from lib.bench import print_table, save_results
+
+# Compares the gas used by compact swaps reading 1, 4 and 16 cached addresses from
+# calldata, the storage address list and the bytecode address table.
+# Run from the project root with `brownie test tests/bench_address_table.py -s`
+
+LOOKUP_COUNTS = [1, 4, 16]
+
+
+@pytest.fixture(scope="module")
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def dummy_tokens():
+    return [
+        brownie.WETH9.deploy(
+            {
+                "from": accounts[0],
+            }
+        ).address
+        for i in range(6)
+    ]
+
+
+# Describes a swapMultiCompact from ETH into WETH plus untouched output tokens, such that
+# the executor, input receiver, output tokens and output receivers are num_lookups addresses
+def swap_spec(num_lookups, weth_executor, dummy_tokens):
+    if num_lookups == 1:
+        return (
+            weth_executor.address,
+            [weth_executor.WETH()],
+            [accounts[1].address],
+            [weth_executor.address],
+        )
+
+    # The input receiver is unused for ETH inputs, so any address can be read here
+    input_dest = utils.random_address()
+
+    num_outputs = (num_lookups - 2) // 2
+    output_tokens = [weth_executor.WETH()] + dummy_tokens[: num_outputs - 1]
+    output_dests = [accounts[1].address] + [
+        utils.random_address() for i in range(num_outputs - 1)
+    ]
+    cached = [weth_executor.address, input_dest]
+    for token, dest in zip(output_tokens, output_dests):
+        cached += [token, dest]
+
+    return input_dest, output_tokens, output_dests, cached
+
+
+def test_address_lookup_gas(weth_executor, dummy_tokens):
+    input_amount = int(1e18)
+
+    rows = []
+    results = {}
+
+    for num_lookups in LOOKUP_COUNTS:
+        input_dest, output_tokens, output_dests, cached = swap_spec(
+            num_lookups, weth_executor, dummy_tokens
+        )
+        gas_used = {}
+        for mode in ["calldata", "address list", "address table"]:
+            router = brownie.OdosRouterV2.deploy(
+                {
+                    "from": accounts[0],
+                },
+            )
+            address_list = cached if mode == "address list" else []
+            address_table = [cached] if mode == "address table" else []
+
+            if address_list:
+                router.writeAddressList(address_list, {"from": accounts[0]})
+            for chunk in address_table:
+                router.writeAddressTable(chunk, {"from": accounts[0]})
+
+            fee_denom = router.FEE_DENOM()
+            expected_output = (
+                input_amount * (fee_denom - router.swapMultiFee()) // fee_denom
+            )
+            compact_data = encode_compact.construct_compact_swap_multi_data(
+                "0x01",
+                ["0x0000000000000000000000000000000000000000"],
+                output_tokens,
+                [input_amount],
+                [expected_output] + [0] * (len(output_tokens) - 1),
+                [1] * len(output_tokens),
+                0.01,
+                weth_executor.address,
+                [input_dest],
+                output_dests,
+                address_list,
+                0,
+                address_table=address_table,
+            )
+            tx = accounts[0].transfer(
+                router.address,
+                input_amount,
+                data=router.signatures["swapMultiCompact"] + compact_data[2:],
+            )
+            gas_used[mode] = tx.gas_used
+
+        results[num_lookups] = gas_used
+        rows.append(
+            [
+                num_lookups,
+                gas_used["calldata"],
+                gas_used["address list"],
+                gas_used["address table"],
+                gas_used["address table"] - gas_used["address list"],
+            ]
+        )
+    print_table(
+        ["lookups", "calldata", "address list", "address table", "table - list"], rows
+    )
+    save_results("address_table", results)
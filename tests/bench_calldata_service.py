@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import brownie
+import numpy as np
+import pytest
+from brownie import accounts, web3
+from lib import calldata_service, workload
+from lib.bench import print_table, save_results
+
+# Measures the latency of building router calls with the calldata service under
+# concurrent load, with every build of a round started at the same time. Specs are drawn
+# from a synthetic workload, whose address list is written to the router, and half the
+# specs of each round repeat another spec of the round, so they are coalesced. Permit2
+# specs carry random signatures, which the service encodes but does not check.
+# Run from the project root with `brownie test tests/bench_calldata_service.py -s`
+
+NUM_ROUNDS = 20
+BUILDS_PER_ROUND = 64
+ENDPOINTS = workload.ENDPOINTS
+
+
+@pytest.fixture(scope="module")
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def swaps():
+    return workload.Workload(NUM_ROUNDS * BUILDS_PER_ROUND * 20)
+
+
+def round_specs(swaps, endpoint, round_index):
+    num_specs = BUILDS_PER_ROUND // 2
+    indices = swaps.indices(endpoint)[
+        round_index * num_specs : (round_index + 1) * num_specs
+    ]
+    return [spec for spec in swaps.specs(indices) for repeat in range(2)]
+
+
+async def timed_build(service, spec):
+    start = time.perf_counter()
+    await service.build(spec)
+    return time.perf_counter() - start
+
+
+async def run_endpoint(router, swaps, endpoint):
+    async with calldata_service.CalldataService(
+        web3.provider.endpoint_uri, router.address
+    ) as service:
+        latencies = []
+        start = time.perf_counter()
+        for round_index in range(NUM_ROUNDS):
+            latencies += await asyncio.gather(
+                *(
+                    timed_build(service, spec)
+                    for spec in round_specs(swaps, endpoint, round_index)
+                )
+            )
+        elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+        "builds_per_s": round(len(latencies) / elapsed),
+        "node_batches": service.batcher.batches,
+        "builds": service.builds,
+    }
+
+
+def test_bench_calldata_service(router, swaps):
+    router.writeAddressList(swaps.address_list, {"from": accounts[0]})
+
+    results = {
+        endpoint: asyncio.run(run_endpoint(router, swaps, endpoint))
+        for endpoint in ENDPOINTS
+    }
+
+    headers = ["endpoint", "p50 ms", "p99 ms", "builds/s", "node batches", "builds"]
+    print_table(
+        headers,
+        [
+            [
+                endpoint,
+                result["p50_ms"],
+                result["p99_ms"],
+                result["builds_per_s"],
+                result["node_batches"],
+                result["builds"],
+            ]
+            for endpoint, result in results.items()
+        ],
+    )
+    save_results("calldata_service", results)
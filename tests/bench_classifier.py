@@ -0,0 +1,172 @@
+import os
+import random
+import sys
+import time
+
+from eth_abi import encode
+from lib import abi_encoder, classifier, encode_compact, utils
+
+# Measures the throughput of the transaction classifier on a synthetic corpus of router
+# transactions, mixing every swap endpoint with a few owner calls and unknown
+# selectors, on one core and in a pool of processes.
+# Run from the tests directory with `python bench_classifier.py [num_transactions]`
+
+ROUTER = "0x19ceead7105607cd444f5ad10dd51356436095a1"
+ADDRESS_LIST_LENGTH = 200
+
+# Share of each kind of transaction in the corpus
+FUNCTION_WEIGHTS = [
+    ("swap", 0.25),
+    ("swapCompact", 0.30),
+    ("swapPermit2", 0.05),
+    ("swapMulti", 0.12),
+    ("swapMultiCompact", 0.15),
+    ("swapMultiPermit2", 0.03),
+    ("writeAddressList", 0.02),
+    ("unknown", 0.08),
+]
+
+
+def token_infos(rng, tokens, num):
+    return [
+        (rng.choice(tokens), rng.randrange(1, 1 << 96), utils.random_address())
+        for i in range(num)
+    ]
+
+
+def random_data(rng, function, address_list):
+    path_definition = bytes(rng.randrange(256) for i in range(32 * rng.randrange(1, 6)))
+    executor = address_list[0]
+    referral_code = rng.choice([0, rng.randrange(1 << 32)])
+    permit2 = (utils.random_address(), rng.randrange(1 << 32), (1 << 48) - 1, bytes(65))
+    num_inputs = rng.randrange(1, 5)
+    num_outputs = rng.randrange(1, 5)
+
+    if function in ["swap", "swapPermit2"]:
+        token_info = (
+            rng.choice(address_list),
+            rng.randrange(1, 1 << 96),
+            executor,
+            rng.choice(address_list),
+            rng.randrange(1, 1 << 96),
+            rng.randrange(1, 1 << 96),
+            utils.random_address(),
+        )
+        args = [token_info, path_definition, executor, referral_code]
+        if function == "swap":
+            return abi_encoder.encode_swap(*args)
+        return abi_encoder.encode_swap_permit2(permit2, *args)
+
+    if function in ["swapMulti", "swapMultiPermit2"]:
+        args = [
+            token_infos(rng, address_list, num_inputs),
+            token_infos(rng, address_list, num_outputs),
+            rng.randrange(1, 1 << 96),
+            path_definition,
+            executor,
+            referral_code,
+        ]
+        if function == "swapMulti":
+            return abi_encoder.encode_swap_multi(*args)
+        return abi_encoder.encode_swap_multi_permit2(permit2, *args)
+
+    if function == "swapCompact":
+        compact_data = encode_compact.construct_compact_swap_data(
+            "0x" + path_definition.hex(),
+            rng.choice(address_list),
+            rng.choice([rng.choice(address_list), utils.random_address()]),
+            rng.randrange(1, 1 << 96),
+            rng.randrange(1, 1 << 96),
+            0.005,
+            executor,
+            executor,
+            "msg.sender",
+            address_list,
+            referral_code,
+            exponent_amounts=True,
+        )
+    elif function == "swapMultiCompact":
+        compact_data = encode_compact.construct_compact_swap_multi_data(
+            "0x" + path_definition.hex(),
+            [rng.choice(address_list) for i in range(num_inputs)],
+            [rng.choice(address_list) for i in range(num_outputs)],
+            [rng.randrange(1, 1 << 96) for i in range(num_inputs)],
+            [rng.randrange(1, 1 << 96) for i in range(num_outputs)],
+            [1] * num_outputs,
+            0.005,
+            executor,
+            [executor] * num_inputs,
+            ["msg.sender"] * num_outputs,
+            address_list,
+            referral_code,
+        )
+    elif function == "writeAddressList":
+        return abi_encoder.SELECTORS[function] + encode(
+            ["address[]"], [[utils.random_address()]]
+        )
+    else:
+        return os.urandom(4 + 32 * rng.randrange(4))
+
+    return abi_encoder.SELECTORS[function] + bytes.fromhex(compact_data[2:])
+
+
+def synthetic_corpus(num_transactions, address_list, seed=0):
+    rng = random.Random(seed)
+    functions = rng.choices(
+        [function for function, weight in FUNCTION_WEIGHTS],
+        weights=[weight for function, weight in FUNCTION_WEIGHTS],
+        k=num_transactions,
+    )
+    # Calldata is drawn from a pool, since generating it is far slower than decoding it
+    pool = {
+        function: [random_data(rng, function, address_list) for i in range(200)]
+        for function, weight in FUNCTION_WEIGHTS
+    }
+    return [
+        {
+            "hash": "0x" + rng.getrandbits(256).to_bytes(32, "big").hex(),
+            "blockNumber": 17_000_000 + i // 100,
+            "from": utils.random_address() if i % 1000 == 0 else address_list[1],
+            "to": ROUTER,
+            "input": rng.choice(pool[function]),
+            "value": 0,
+        }
+        for i, function in enumerate(functions)
+    ]
+
+
+def main(num_transactions=200_000, processes=os.cpu_count()):
+    random.seed(0)
+    address_list = [utils.random_address() for i in range(ADDRESS_LIST_LENGTH)]
+    corpus = synthetic_corpus(num_transactions, address_list)
+
+    transaction_classifier = classifier.TransactionClassifier(ROUTER, address_list)
+    start = time.perf_counter()
+    records = [transaction_classifier.classify(transaction) for transaction in corpus]
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel_records = list(
+        classifier.classify_parallel(corpus, ROUTER, address_list, processes=processes)
+    )
+    parallel = time.perf_counter() - start
+    assert parallel_records == records
+
+    decoded = sum(
+        isinstance(record, classifier.SwapRecord)
+        or (record.function is not None and record.args is not None)
+        for record in records
+    )
+    print(f"{'mode':<18}{'tx':>9}{'seconds':>10}{'tx/min':>12}")
+    print(
+        f"{'1 core':<18}{num_transactions:>9}{single:>10.2f}{num_transactions / single * 60:>12,.0f}"
+    )
+    print(
+        f"{f'{processes} processes':<18}{num_transactions:>9}{parallel:>10.2f}"
+        f"{num_transactions / parallel * 60:>12,.0f}"
+    )
+    print(f"decoded {decoded} of {num_transactions} transactions")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
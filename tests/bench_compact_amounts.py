@@ -0,0 +1,77 @@
+import random
+import sys
+
+from lib.utils import encode_amount
+
+# Benchmarks the calldata size of compact amounts with and without the mantissa
+# and exponent encoding over a mix of amounts resembling production traffic.
+# Run from the tests directory with `python bench_compact_amounts.py [num_samples]`
+
+TOKEN_DECIMALS = [6, 8, 18, 18, 18]
+
+
+# Amounts typed in by users, e.g. 1.5 WETH or 2500 USDC
+def round_user_amount(rng):
+    significant_digits = rng.choice([1, 1, 2, 2, 3, 4])
+    mantissa = rng.randrange(10 ** (significant_digits - 1), 10**significant_digits)
+    return mantissa * 10 ** (rng.choice(TOKEN_DECIMALS) + rng.randrange(-2, 5))
+
+
+# Full precision amounts such as quotes, balances and minimum values out
+def precise_amount(rng):
+    return rng.randrange(1, 10 ** (rng.choice(TOKEN_DECIMALS) + rng.randrange(-2, 7)))
+
+
+# Relative values are prices scaled to integers, typically from round scales
+def relative_value(rng):
+    if rng.random() < 0.5:
+        return 10 ** rng.randrange(0, 30)
+    return rng.randrange(1, 1 << 64)
+
+
+AMOUNT_DISTRIBUTION = [
+    ("input (round)", round_user_amount, 0.30),
+    ("input (balance)", precise_amount, 0.10),
+    ("output quote", precise_amount, 0.25),
+    ("relative value", relative_value, 0.15),
+    ("value out min", precise_amount, 0.20),
+]
+
+
+def main(num_samples=100_000, seed=0):
+    rng = random.Random(seed)
+
+    totals = {name: [0, 0, 0] for name, _, _ in AMOUNT_DISTRIBUTION}
+    names = [name for name, _, _ in AMOUNT_DISTRIBUTION]
+    generators = {name: generator for name, generator, _ in AMOUNT_DISTRIBUTION}
+    weights = [weight for _, _, weight in AMOUNT_DISTRIBUTION]
+
+    for name in rng.choices(names, weights=weights, k=num_samples):
+        amount = generators[name](rng)
+
+        totals[name][0] += 1
+        totals[name][1] += len(encode_amount(amount)) // 2
+        totals[name][2] += len(encode_amount(amount, exponent_amounts=True)) // 2
+
+    print(f"{'amount type':<18}{'count':>9}{'plain':>9}{'exponent':>10}{'saved':>9}")
+
+    overall = [0, 0, 0]
+    for name, (count, plain_bytes, exponent_bytes) in totals.items():
+        overall = [
+            overall[0] + count,
+            overall[1] + plain_bytes,
+            overall[2] + exponent_bytes,
+        ]
+        print(
+            f"{name:<18}{count:>9}{plain_bytes / count:>9.2f}{exponent_bytes / count:>10.2f}"
+            f"{1 - exponent_bytes / plain_bytes:>9.1%}"
+        )
+    count, plain_bytes, exponent_bytes = overall
+    print(
+        f"{'all':<18}{count:>9}{plain_bytes / count:>9.2f}{exponent_bytes / count:>10.2f}"
+        f"{1 - exponent_bytes / plain_bytes:>9.1%}"
+    )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,288 @@
+import brownie
+import pytest
+from brownie import accounts
+from eth_account import Account
+from hexbytes import HexBytes
+from lib import encode_compact, permit2, utils
+from lib.bench import load_baseline, print_table, save_results
+
+# Measures the gas used by every router endpoint in a steady state, where the router
+# already holds a balance of each token. To compare two builds of the router, run once
+# with ODOS_BENCH_OUTPUT set on the old build and then with ODOS_BENCH_BASELINE set to
+# the same file on the new build.
+# Run from the project root with `brownie test tests/bench_endpoints.py -s`
+
+ETH = "0x0000000000000000000000000000000000000000"
+WRAP_PATH = "0x0100000000000000000000000000000000000000000000000000000000000000"
+UNWRAP_PATH = "0x0000000000000000000000000000000000000000000000000000000000000000"
+INPUT_AMOUNT = int(1e18)
+
+
+@pytest.fixture(scope="module")
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def permit2_contract():
+    return brownie.Permit2.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+
+
+@pytest.fixture(scope="module")
+def permit2_account(weth_executor, permit2_contract):
+    private_key = utils.random_private_key()
+    address = Account.from_key(private_key).address
+
+    accounts[0].transfer(address, 10 * INPUT_AMOUNT)
+
+    WETH = brownie.interface.IWETH(weth_executor.WETH())
+    WETH.deposit({"from": address, "value": 5 * INPUT_AMOUNT})
+    WETH.approve(permit2_contract.address, 2**256 - 1, {"from": address})
+
+    return {"address": address, "private_key": private_key, "nonce": 0}
+
+
+def sign_permit2(permit2_account, permit2_contract, permit2_hash):
+    message = permit2.SignableMessage(
+        HexBytes("0x1"),
+        HexBytes(permit2_contract.DOMAIN_SEPARATOR()),
+        HexBytes(permit2_hash),
+    )
+    return Account.sign_message(
+        message, private_key=permit2_account["private_key"]
+    ).signature.hex()
+
+
+def swap_args(weth_executor, referral_code):
+    return [
+        [
+            ETH,
+            INPUT_AMOUNT,
+            weth_executor.address,
+            weth_executor.WETH(),
+            1,
+            1,
+            accounts[0],
+        ],
+        WRAP_PATH,
+        weth_executor.address,
+        referral_code,
+    ]
+
+
+def swap_multi_args(weth_executor, referral_code):
+    return [
+        [[ETH, INPUT_AMOUNT, weth_executor.address]],
+        [[weth_executor.WETH(), 1, accounts[0]]],
+        1,
+        WRAP_PATH,
+        weth_executor.address,
+        referral_code,
+    ]
+
+
+def run_swap(router, env, referral_code):
+    return router.swap(
+        *swap_args(env["weth_executor"], referral_code),
+        {"value": INPUT_AMOUNT, "from": accounts[0]},
+    )
+
+
+def run_swap_compact(router, env, referral_code):
+    weth_executor = env["weth_executor"]
+    compact_data = encode_compact.construct_compact_swap_data(
+        "0x01",
+        ETH,
+        weth_executor.WETH(),
+        INPUT_AMOUNT,
+        INPUT_AMOUNT,
+        0.5,
+        weth_executor.address,
+        weth_executor.address,
+        "msg.sender",
+        [],
+        referral_code,
+    )
+    return accounts[0].transfer(
+        router.address,
+        INPUT_AMOUNT,
+        data=router.signatures["swapCompact"] + compact_data[2:],
+    )
+
+
+def run_swap_permit2(router, env, referral_code):
+    weth_executor = env["weth_executor"]
+    account = env["permit2_account"]
+    weth_address = weth_executor.WETH()
+
+    nonce = account["nonce"]
+    account["nonce"] += 1
+    deadline = (1 << 48) - 1
+
+    signature = sign_permit2(
+        account,
+        env["permit2_contract"],
+        permit2.single_permit2_hash(
+            weth_address, INPUT_AMOUNT, router.address, nonce, deadline
+        ),
+    )
+    return router.swapPermit2(
+        [env["permit2_contract"].address, nonce, deadline, signature],
+        [
+            weth_address,
+            INPUT_AMOUNT,
+            weth_executor.address,
+            ETH,
+            1,
+            1,
+            accounts[0],
+        ],
+        UNWRAP_PATH,
+        weth_executor.address,
+        referral_code,
+        {"value": 0, "from": account["address"]},
+    )
+
+
+def run_swap_multi(router, env, referral_code):
+    return router.swapMulti(
+        *swap_multi_args(env["weth_executor"], referral_code),
+        {"value": INPUT_AMOUNT, "from": accounts[0]},
+    )
+
+
+def run_swap_multi_compact(router, env, referral_code):
+    weth_executor = env["weth_executor"]
+    compact_data = encode_compact.construct_compact_swap_multi_data(
+        "0x01",
+        [ETH],
+        [weth_executor.WETH()],
+        [INPUT_AMOUNT],
+        [INPUT_AMOUNT],
+        [1],
+        0.5,
+        weth_executor.address,
+        [weth_executor.address],
+        ["msg.sender"],
+        [],
+        referral_code,
+    )
+    return accounts[0].transfer(
+        router.address,
+        INPUT_AMOUNT,
+        data=router.signatures["swapMultiCompact"] + compact_data[2:],
+    )
+
+
+def run_swap_multi_permit2(router, env, referral_code):
+    weth_executor = env["weth_executor"]
+    account = env["permit2_account"]
+    weth_address = weth_executor.WETH()
+
+    nonce = account["nonce"]
+    account["nonce"] += 1
+    deadline = (1 << 48) - 1
+
+    signature = sign_permit2(
+        account,
+        env["permit2_contract"],
+        permit2.batch_permit2_hash(
+            [weth_address], [INPUT_AMOUNT], router.address, nonce, deadline
+        ),
+    )
+    return router.swapMultiPermit2(
+        [env["permit2_contract"].address, nonce, deadline, signature],
+        [[weth_address, INPUT_AMOUNT, weth_executor.address]],
+        [[ETH, 1, accounts[0]]],
+        1,
+        UNWRAP_PATH,
+        weth_executor.address,
+        referral_code,
+        {"value": 0, "from": account["address"]},
+    )
+
+
+def run_transfer_router_funds(router, env, referral_code):
+    return router.transferRouterFunds(
+        [env["weth_executor"].WETH(), ETH],
+        [1, 1],
+        accounts[1],
+        {"from": accounts[0]},
+    )
+
+
+def run_swap_router_funds(router, env, referral_code):
+    weth_executor = env["weth_executor"]
+    return router.swapRouterFunds(
+        [[ETH, INPUT_AMOUNT // 10, weth_executor.address]],
+        [[weth_executor.WETH(), 1, accounts[1]]],
+        1,
+        WRAP_PATH,
+        weth_executor.address,
+        {"from": accounts[0]},
+    )
+
+
+ENDPOINTS = [
+    ("swap", run_swap, True),
+    ("swapCompact", run_swap_compact, True),
+    ("swapPermit2", run_swap_permit2, True),
+    ("swapMulti", run_swap_multi, True),
+    ("swapMultiCompact", run_swap_multi_compact, True),
+    ("swapMultiPermit2", run_swap_multi_permit2, True),
+    ("transferRouterFunds", run_transfer_router_funds, False),
+    ("swapRouterFunds", run_swap_router_funds, False),
+]
+
+
+def test_endpoint_gas(weth_executor, permit2_contract, permit2_account):
+    env = {
+        "weth_executor": weth_executor,
+        "permit2_contract": permit2_contract,
+        "permit2_account": permit2_account,
+    }
+    router = brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+    referral_code = router.REFERRAL_WITH_FEE_THRESHOLD() + 1
+    router.registerReferralCode(
+        referral_code, int(1e15), accounts[2], {"from": accounts[0]}
+    )
+    # Seed router balances so that every endpoint runs in a steady state
+    accounts[0].transfer(router.address, INPUT_AMOUNT)
+    run_swap(router, env, 0)
+
+    results = {}
+    for name, run, supports_referral in ENDPOINTS:
+        results[name] = run(router, env, 0).gas_used
+
+        if supports_referral:
+            results[f"{name} (referral)"] = run(router, env, referral_code).gas_used
+
+    baseline = load_baseline("endpoints") or {}
+
+    rows = []
+    for name, gas_used in results.items():
+        if name in baseline:
+            rows.append([name, baseline[name], gas_used, gas_used - baseline[name]])
+        else:
+            rows.append([name, "-", gas_used, "-"])
+
+    print_table(["endpoint", "baseline", "gas used", "delta"], rows)
+    save_results("endpoints", results)
@@ -0,0 +1,164 @@
+import time
+
+import brownie
+import pytest
+from brownie import accounts
+from eth_abi import decode
+from lib import decode_events
+from lib.bench import print_table, save_results
+
+# Compares the gas used by swaps on OdosRouterV2, which emits the original events, and
+# OdosRouterV2PackedEvents, which emits the packed events, and the decoding throughput
+# of the router log decoder against generic ABI decoding.
+# Run from the project root with `brownie test tests/bench_events.py -s`
+
+NUM_DECODES = 20_000
+
+
+@pytest.fixture(scope="module")
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def dummy_tokens():
+    return [
+        brownie.WETH9.deploy(
+            {
+                "from": accounts[0],
+            }
+        ).address
+        for i in range(3)
+    ]
+
+
+def run_swaps(router, weth_executor, dummy_tokens):
+    input_amount = int(1e18)
+    weth_address = weth_executor.WETH()
+
+    gas_used = {}
+    tx = router.swap(
+        [
+            "0x0000000000000000000000000000000000000000",
+            input_amount,
+            weth_executor.address,
+            weth_address,
+            input_amount,
+            input_amount,
+            accounts[0],
+        ],
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        0,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    )
+    gas_used["swap"] = tx.gas_used
+    logs = {"swap": tx.logs[-1]}
+
+    for output_tokens in [[weth_address], [weth_address] + dummy_tokens]:
+        tx = router.swapMulti(
+            [
+                [
+                    "0x0000000000000000000000000000000000000000",
+                    input_amount,
+                    weth_executor.address,
+                ]
+            ],
+            [[token, 1, accounts[0]] for token in output_tokens],
+            1,
+            "0x0100000000000000000000000000000000000000000000000000000000000000",
+            weth_executor.address,
+            0,
+            {
+                "value": input_amount,
+                "from": accounts[0],
+            },
+        )
+        name = f"swapMulti 1x{len(output_tokens)}"
+        gas_used[name] = tx.gas_used
+        logs[name] = tx.logs[-1]
+
+    return gas_used, logs
+
+
+def time_per_call(function, *args):
+    start = time.perf_counter()
+    for i in range(NUM_DECODES):
+        function(*args)
+    return (time.perf_counter() - start) / NUM_DECODES * 1e6
+
+
+def test_event_gas(weth_executor, dummy_tokens):
+    results = {}
+    for packed_events, container in [
+        (False, brownie.OdosRouterV2),
+        (True, brownie.OdosRouterV2PackedEvents),
+    ]:
+        router = container.deploy(
+            {
+                "from": accounts[0],
+            },
+        )
+        # Warm up the router balances so both modes pay the same storage costs
+        run_swaps(router, weth_executor, dummy_tokens)
+        results[packed_events] = run_swaps(router, weth_executor, dummy_tokens)
+
+    rows = []
+    for name, gas_used in results[False][0].items():
+        packed_gas_used = results[True][0][name]
+        rows.append([name, gas_used, packed_gas_used, packed_gas_used - gas_used])
+
+    print_table(["endpoint", "original", "packed", "delta"], rows)
+    save_results(
+        "events",
+        {str(mode): gas_used for mode, (gas_used, logs) in results.items()},
+    )
+
+    # Decoding throughput of the original and packed logs
+    abi_types = {
+        "swap": [
+            "address",
+            "uint256",
+            "address",
+            "uint256",
+            "address",
+            "int256",
+            "uint32",
+        ],
+        "swapMulti": [
+            "address",
+            "uint256[]",
+            "address[]",
+            "uint256[]",
+            "address[]",
+            "uint32",
+        ],
+    }
+    rows = []
+    for name, log in results[False][1].items():
+        packed_log = results[True][1][name]
+        data = bytes(log["data"])
+        types = abi_types["swap" if name == "swap" else "swapMulti"]
+
+        rows.append(
+            [
+                name,
+                f"{time_per_call(decode, types, data):.2f}",
+                f"{time_per_call(decode_events.decode_router_log, log):.2f}",
+                f"{time_per_call(decode_events.decode_router_log, packed_log):.2f}",
+            ]
+        )
+    print_table(["event (us/log)", "eth_abi", "original", "packed"], rows)
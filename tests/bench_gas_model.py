@@ -0,0 +1,431 @@
+import asyncio
+import os
+import random
+import time
+
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import calldata_service, gas_model, market, path_assembler, permit2, utils
+from lib.bench import print_table, save_results
+
+# Fits the gas model that the calldata service uses in place of eth_estimateGas, and
+# saves it to tests/lib/gas_model.json, or to the file in ODOS_GAS_MODEL. The router is
+# fitted to random swaps on every endpoint through MockExecutor, which only sends the
+# outputs back, and each executor's path to random swaps through it. Every balance the
+# swaps touch is funded first, so that the gas is that of a steady state, and swaps that
+# fill empty storage instead are then sent with the model's limits, which cover them
+# through the storage surcharge, to report the headroom left. Rerun this
+# whenever the router changes, since test_gas_model.py fails against a model fitted to
+# another build of it.
+# Run from the project root with `brownie test tests/bench_gas_model.py -s`
+
+ETH = "0x0000000000000000000000000000000000000000"
+WRAP_PATH = "0x0100000000000000000000000000000000000000000000000000000000000000"
+UNWRAP_PATH = "0x0000000000000000000000000000000000000000000000000000000000000000"
+
+NUM_TOKENS = 4
+NUM_ROUTER_SAMPLES = 240
+NUM_PATH_SAMPLES = 80
+NUM_FRESH_SAMPLES = 40
+NUM_MARKET_TOKENS = 6
+NUM_MARKET_POOLS = 9
+MAX_SLIPPAGE_PERCENT = 0.05
+REFERRAL_CODE = (1 << 31) + 1
+REFERRAL_FEE = int(1e16)
+DEADLINE = (1 << 48) - 1
+
+
+@pytest.fixture(scope="module")
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def mock_executor():
+    executor = brownie.MockExecutor.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+    accounts[4].transfer(executor.address, 50 * 10**18)
+    return executor
+
+
+@pytest.fixture(scope="module")
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def path_executor(weth_executor):
+    return brownie.OdosPathExecutor.deploy(
+        weth_executor.WETH(),
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def permit2_contract():
+    return brownie.Permit2.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+
+
+@pytest.fixture(scope="module")
+def tokens():
+    return [
+        brownie.MockERC20.deploy(f"Token {i}", f"TK{i}", 18, {"from": accounts[0]})
+        for i in range(NUM_TOKENS)
+    ]
+
+
+@pytest.fixture(scope="module")
+def local_market():
+    return market.deploy_market(
+        brownie.MockERC20,
+        brownie.MockConstantProductPool,
+        accounts[0],
+        NUM_MARKET_TOKENS,
+        NUM_MARKET_POOLS,
+    )
+
+
+@pytest.fixture(scope="module")
+def sender():
+    # A local account, so that it can sign Permit2 transfers
+    private_key = utils.random_private_key()
+    account = accounts.add(private_key)
+    accounts[3].transfer(account, 50 * 10**18)
+    return {"account": account, "private_key": private_key, "nonce": 1}
+
+
+def fund(token, holders, amount):
+    for holder in holders:
+        token.mint(holder, amount, {"from": accounts[0]})
+
+
+def approve(token, owner, spenders):
+    for spender in spenders:
+        token.approve(spender, 2**256 - 1, {"from": owner})
+
+
+def mock_path(output_tokens, output_amounts):
+    # An output is a token(20) followed by an amount(16)
+    return "0x" + "".join(
+        token[2:].lower() + amount.to_bytes(16, "big").hex()
+        for token, amount in zip(output_tokens, output_amounts)
+    )
+
+
+def sign(sender, permit2_contract, router, spec):
+    # Adds a Permit2 signature to a spec on a Permit2 endpoint
+    if spec.endpoint not in calldata_service.PERMIT2_ENDPOINTS:
+        return spec
+
+    nonce = sender["nonce"]
+    sender["nonce"] += 1
+    if spec.endpoint == "swapPermit2":
+        permit2_hash = permit2.single_permit2_hash(
+            spec.input_tokens[0],
+            spec.input_amounts[0],
+            router.address,
+            nonce,
+            DEADLINE,
+        )
+    else:
+        permit2_hash = permit2.batch_permit2_hash(
+            spec.input_tokens, spec.input_amounts, router.address, nonce, DEADLINE
+        )
+    signature = permit2.sign_permit2(
+        permit2_contract.DOMAIN_SEPARATOR(), permit2_hash, sender["private_key"]
+    )
+    return spec._replace(permit2=(permit2_contract.address, nonce, DEADLINE, signature))
+
+
+def router_spec(rng, sender, tokens, mock_executor):
+    endpoint = rng.choice(gas_model.ENDPOINTS)
+    token_pool = [ETH] + [token.address for token in tokens]
+
+    if endpoint.startswith("swapMulti"):
+        num_inputs = rng.randint(1, 3)
+        num_outputs = rng.randint(1, 3)
+        chosen = rng.sample(token_pool, num_inputs + num_outputs)
+        input_tokens, output_tokens = chosen[:num_inputs], chosen[num_inputs:]
+    else:
+        # Single swaps only pull ERC20s through Permit2
+        input_pool = token_pool[1:] if endpoint == "swapPermit2" else token_pool
+        input_tokens = [rng.choice(input_pool)]
+        output_tokens = [
+            rng.choice([token for token in token_pool if token != input_tokens[0]])
+        ]
+
+    output_quotes = [rng.randrange(10**12, 10**16) for token in output_tokens]
+    return calldata_service.SwapSpec(
+        endpoint=endpoint,
+        sender=sender["account"].address,
+        input_tokens=tuple(input_tokens),
+        input_amounts=tuple(rng.randrange(10**12, 10**16) for token in input_tokens),
+        output_tokens=tuple(output_tokens),
+        output_quotes=tuple(output_quotes),
+        max_slippage_percent=MAX_SLIPPAGE_PERCENT,
+        executor=mock_executor.address,
+        path_definition=mock_path(output_tokens, output_quotes),
+        referral_code=rng.choice([0, REFERRAL_CODE]),
+    )
+
+
+def weth_spec(rng, sender, weth_executor):
+    amount = rng.randrange(10**12, 10**16)
+    wrap = rng.random() < 0.5
+    tokens = [ETH, weth_executor.WETH()]
+    return calldata_service.SwapSpec(
+        endpoint=rng.choice(["swap", "swapMulti"]),
+        sender=sender["account"].address,
+        input_tokens=(tokens[not wrap],),
+        input_amounts=(amount,),
+        output_tokens=(tokens[wrap],),
+        output_quotes=(amount,),
+        max_slippage_percent=MAX_SLIPPAGE_PERCENT,
+        executor=weth_executor.address,
+        path_definition=WRAP_PATH if wrap else UNWRAP_PATH,
+    )
+
+
+def market_spec(rng, sender, path_executor, local_market):
+    token_in, token_out = rng.sample(local_market.tokens, 2)
+    route = local_market.find_route(token_in, token_out)
+    pool = local_market.pools_between(*route[:2])[0]
+    reserve_in = local_market.reserves[pool.address][
+        0 if token_in == pool.token0 else 1
+    ]
+    amount = int(reserve_in * 10 ** rng.uniform(-4, -2))
+
+    # Up to two parts of the input are sent along the same route separately
+    assembler = path_assembler.PathAssembler(1)
+    parts = [assembler.split(0, rng.random()) for i in range(rng.randint(0, 2))]
+    output = local_market.add_route(assembler, 0, token_in, token_out)
+    for part in parts:
+        local_market.add_route(assembler, part, token_in, token_out, dst=output)
+    assembler.send(output, token_out)
+    path = assembler.assemble()
+
+    return calldata_service.SwapSpec(
+        endpoint=rng.choice(["swap", "swapMulti"]),
+        sender=sender["account"].address,
+        input_tokens=(token_in,),
+        input_amounts=(amount,),
+        output_tokens=(token_out,),
+        output_quotes=(local_market.quote_path(path, [amount])[token_out],),
+        max_slippage_percent=MAX_SLIPPAGE_PERCENT,
+        executor=path_executor.address,
+        path_definition=path,
+    )
+
+
+def build(router, specs):
+    async def run():
+        async with calldata_service.CalldataService(
+            web3.provider.endpoint_uri, router.address
+        ) as service:
+            return await service.build_many(specs), await service.address_list()
+
+    return asyncio.run(run())
+
+
+def send(sender, call):
+    return sender["account"].transfer(call.to, call.value, data=call.data).gas_used
+
+
+def errors_row(name, fit):
+    return [
+        name,
+        fit.samples,
+        round(fit.max_error),
+        round(fit.p99_error),
+        round(fit.rmse),
+    ]
+
+
+def test_fit_gas_model(
+    router,
+    mock_executor,
+    weth_executor,
+    path_executor,
+    permit2_contract,
+    tokens,
+    local_market,
+    sender,
+):
+    rng = random.Random(0)
+    account = sender["account"]
+    local_market, token_contracts, pool_contracts = local_market
+    WETH = brownie.interface.IWETH(weth_executor.WETH())
+
+    # Every balance that swaps add to is nonzero beforehand, and the first word of
+    # Permit2 nonces is already in use
+    router.registerReferralCode(
+        REFERRAL_CODE, REFERRAL_FEE, accounts[2], {"from": accounts[0]}
+    )
+    for token in tokens:
+        fund(token, [account, mock_executor, router, accounts[2]], 10**30)
+        approve(token, account, [router, permit2_contract])
+    for token in token_contracts.values():
+        fund(token, [account, router], 10**30)
+        approve(token, account, [router])
+    WETH.deposit({"from": account, "value": 10**18})
+    WETH.transfer(router, 1, {"from": account})
+    approve(WETH, account, [router])
+    permit2_contract.invalidateUnorderedNonces(0, 1, {"from": account})
+    router.writeAddressList(
+        [tokens[0].address, tokens[1].address, mock_executor.address],
+        {"from": accounts[0]},
+    )
+
+    # The router's work, beyond the calldata's intrinsic gas
+    specs = [
+        sign(
+            sender,
+            permit2_contract,
+            router,
+            router_spec(rng, sender, tokens, mock_executor),
+        )
+        for i in range(NUM_ROUTER_SAMPLES)
+    ]
+    calls, address_list = build(router, specs)
+    router_rows = []
+    router_targets = []
+    for spec, call in zip(specs, calls):
+        gas_used = send(sender, call)
+        router_rows.append(gas_model.router_features(spec, address_list))
+        router_targets.append(gas_used - gas_model.intrinsic_gas(call.data))
+    router_fit = gas_model.fit_linear(router_rows, router_targets)
+    model = gas_model.GasModel(
+        router_fit, {}, gas_model.bytecode_hash(brownie.OdosRouterV2.bytecode)
+    )
+
+    # Each executor's path, beyond the router's predicted work
+    executor_fits = {}
+    samplers = {
+        "OdosWETHExecutor": lambda: weth_spec(rng, sender, weth_executor),
+        "OdosPathExecutor": lambda: market_spec(
+            rng, sender, path_executor, local_market
+        ),
+    }
+    for name, sampler in samplers.items():
+        path_rows = []
+        path_targets = []
+        for i in range(NUM_PATH_SAMPLES):
+            spec = sampler()
+            [call], address_list = build(router, [spec])
+            gas_used = send(sender, call)
+            local_market.refresh(pool_contracts)
+
+            path_rows.append(gas_model.path_features(name, spec.path_definition))
+            path_targets.append(
+                gas_used - model.router_gas(spec, call.data, address_list)
+            )
+        executor_fits[name] = gas_model.fit_linear(path_rows, path_targets)
+    model.executors = executor_fits
+
+    # Swaps to first-time receivers, with a referral fee to a beneficiary that holds
+    # none of the outputs, sent with the limits of the model
+    fresh_code = REFERRAL_CODE + 1
+    router.registerReferralCode(
+        fresh_code, REFERRAL_FEE, accounts.add().address, {"from": accounts[0]}
+    )
+    fresh_specs = []
+    for i in range(NUM_FRESH_SAMPLES):
+        fresh_spec = router_spec(rng, sender, tokens, mock_executor)
+        fresh_specs.append(
+            sign(
+                sender,
+                permit2_contract,
+                router,
+                fresh_spec._replace(
+                    output_receivers=tuple(
+                        accounts.add().address for token in fresh_spec.output_tokens
+                    ),
+                    referral_code=rng.choice([0, fresh_code]),
+                ),
+            )
+        )
+    fresh_calls, address_list = build(router, fresh_specs)
+    headroom = []
+    for spec, call in zip(fresh_specs, fresh_calls):
+        limit = model.estimate(spec, call.data, address_list).limit
+        try:
+            tx = sender["account"].transfer(
+                call.to, call.value, data=call.data, gas_limit=limit
+            )
+            headroom.append(limit - tx.gas_used)
+        except brownie.exceptions.VirtualMachineError:
+            headroom.append(None)
+    out_of_gas = sum(1 for gas in headroom if gas is None)
+    min_headroom = min((gas for gas in headroom if gas is not None), default=None)
+
+    # Time to estimate the gas of a call, against a round trip for eth_estimateGas
+    start = time.perf_counter()
+    for spec, call in zip(specs, calls):
+        model.estimate(spec, call.data, address_list)
+    estimate_us = (time.perf_counter() - start) / len(specs) * 1e6
+
+    start = time.perf_counter()
+    for call in calls[:20]:
+        web3.eth.estimate_gas(
+            {
+                "from": account.address,
+                "to": call.to,
+                "value": call.value,
+                "data": call.data,
+            }
+        )
+    estimate_gas_us = (time.perf_counter() - start) / 20 * 1e6
+
+    model.save(os.environ.get("ODOS_GAS_MODEL", gas_model.MODEL_PATH))
+
+    print_table(
+        ["model", "samples", "max error", "p99 error", "rmse"],
+        [errors_row("router", router_fit)]
+        + [errors_row(name, fit) for name, fit in executor_fits.items()],
+    )
+    print_table(
+        ["fresh storage swaps", "out of gas", "min headroom"],
+        [[len(fresh_specs), out_of_gas, min_headroom]],
+    )
+    print_table(
+        ["", "us per call"],
+        [
+            ["gas model", f"{estimate_us:.1f}"],
+            ["eth_estimateGas", f"{estimate_gas_us:.1f}"],
+        ],
+    )
+    save_results(
+        "gas_model",
+        {
+            "estimate_us": estimate_us,
+            "estimate_gas_us": estimate_gas_us,
+            "fresh_out_of_gas": out_of_gas,
+            "fresh_min_headroom": min_headroom,
+            "router": router_fit._asdict(),
+            "executors": {name: fit._asdict() for name, fit in executor_fits.items()},
+        },
+    )
@@ -0,0 +1,135 @@
+import random
+import sys
+import time
+
+from lib import abi_encoder, bench, decode_compact, encode_compact, metrics, permit2
+from lib import utils
+
+# Builds swaps stage by stage, compact encoding, ABI encoding, decoding and Permit2
+# hashing and signing, with instrumentation disabled and then enabled. Prints the cost
+# of the instrumentation per call, and the latency of every stage as recorded by the
+# metrics.
+# Run from the tests directory with `python bench_metrics.py [num_calls]`
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+
+def stages(rng):
+    address_list = [utils.random_address() for i in range(4)]
+    executor = utils.random_address()
+    path_definition = "0x" + bytes(rng.randrange(256) for i in range(64)).hex()
+    amount = rng.randrange(1 << 96)
+    token_info = (
+        address_list[0],
+        amount,
+        executor,
+        address_list[1],
+        amount,
+        amount // 2,
+        utils.random_address(),
+    )
+    compact_data = encode_compact.construct_compact_swap_data(
+        path_definition,
+        address_list[0],
+        address_list[1],
+        amount,
+        amount,
+        0.005,
+        executor,
+        executor,
+        "msg.sender",
+        address_list,
+        0,
+    )
+    permit2_hash = permit2.single_permit2_hash(
+        address_list[0], amount, executor, 0, (1 << 48) - 1
+    )
+    private_key = "0x" + bytes(rng.randrange(256) for i in range(32)).hex()
+
+    return [
+        (
+            "encode swapCompact",
+            lambda: encode_compact.construct_compact_swap_data(
+                path_definition,
+                address_list[0],
+                address_list[1],
+                amount,
+                amount,
+                0.005,
+                executor,
+                executor,
+                "msg.sender",
+                address_list,
+                0,
+            ),
+        ),
+        (
+            "encode swap",
+            lambda: abi_encoder.encode_swap(
+                token_info, bytes.fromhex(path_definition[2:]), executor, 0
+            ),
+        ),
+        (
+            "decode swapCompact",
+            lambda: decode_compact.decode_compact_swap_data(
+                compact_data[2:], address_list
+            ),
+        ),
+        (
+            "permit2 single_hash",
+            lambda: permit2.single_permit2_hash(
+                address_list[0], amount, executor, 0, (1 << 48) - 1
+            ),
+        ),
+        (
+            "permit2 sign",
+            lambda: permit2.sign_permit2("0x" + "00" * 32, permit2_hash, private_key),
+        ),
+    ]
+
+
+def time_per_call(func, num_calls):
+    start = time.perf_counter()
+    for i in range(num_calls):
+        func()
+    return (time.perf_counter() - start) / num_calls * 1e6
+
+
+def main(num_calls=2_000, seed=0):
+    rng = random.Random(seed)
+    cases = stages(rng)
+
+    rows = []
+    results = {}
+    for name, func in cases:
+        metrics.disable()
+        disabled = time_per_call(func, num_calls)
+        metrics.enable()
+        enabled = time_per_call(func, num_calls)
+        rows.append(
+            [name, f"{disabled:.2f}", f"{enabled:.2f}", f"{enabled - disabled:+.2f}"]
+        )
+        results[name] = {"disabled_us": disabled, "enabled_us": enabled}
+    bench.print_table(["stage", "disabled us", "enabled us", "overhead us"], rows)
+
+    rows = []
+    for stage, operations in metrics.snapshot()["stages"].items():
+        for operation, histogram in operations.items():
+            rows.append(
+                [
+                    stage,
+                    operation,
+                    histogram["count"],
+                    f"{histogram['sum'] / histogram['count'] * 1e6:.2f}",
+                    f"<= {histogram['p50'] * 1e6:g}",
+                    f"<= {histogram['p99'] * 1e6:g}",
+                ]
+            )
+    bench.print_table(
+        ["stage", "operation", "calls", "mean us", "p50 us", "p99 us"], rows
+    )
+    bench.save_results("metrics", results)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,149 @@
+import asyncio
+import random
+import time
+
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import prefetch
+from lib.bench import print_table, save_results
+from lib.multichain import ChainClient
+
+# Compares the round trips and time taken to read the balances, allowances and Permit2
+# nonce bitmaps of a batch of swaps one eth_call at a time, and through the prefetch
+# cache, which makes every read in one aggregated eth_call. Each batch is a set of users
+# swapping random subsets of a few tokens, a third of them through Permit2.
+# Run from the project root with `brownie test tests/bench_prefetch.py -s`
+
+ETH = "0x0000000000000000000000000000000000000000"
+NUM_TOKENS = 8
+BATCH_SIZES = [1, 10, 50, 200]
+PERMIT2_SHARE = 3
+
+
+@pytest.fixture(scope="module")
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def multicall():
+    return brownie.Multicall.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def permit2_contract():
+    return brownie.Permit2.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+
+
+@pytest.fixture(scope="module")
+def tokens():
+    return [
+        brownie.MockERC20.deploy(f"Token {i}", f"TK{i}", 18, {"from": accounts[0]})
+        for i in range(NUM_TOKENS)
+    ]
+
+
+def batch_reads(rng, batch_size, router, permit2_contract, tokens):
+    reads = []
+    for i in range(batch_size):
+        sender = accounts[i % len(accounts)].address
+        input_tokens = rng.sample([ETH] + [token.address for token in tokens], 2)
+        permit2 = None
+        if i % PERMIT2_SHARE == 0:
+            permit2 = (permit2_contract.address, rng.randrange(1 << 16))
+        reads += prefetch.swap_reads(sender, input_tokens, router.address, permit2)
+    return reads
+
+
+async def read_one_by_one(client, multicall, reads):
+    # The reads as the builder made them before, one eth_call or eth_getBalance each
+    for read in reads:
+        if read.kind == "balance" and read.target == ETH:
+            await client.request("eth_getBalance", [read.owner, "latest"])
+            continue
+        target, data = prefetch.read_call(read, multicall.address)
+        await client.call(target, "0x" + data.hex())
+    return len(reads)
+
+
+async def read_prefetched(multicall, reads):
+    async with prefetch.PrefetchCache(
+        web3.provider.endpoint_uri, multicall.address
+    ) as cache:
+        await cache.fetch(reads)
+    return cache.round_trips
+
+
+def timed(coroutine):
+    start = time.perf_counter()
+    result = asyncio.run(coroutine)
+    return result, (time.perf_counter() - start) * 1e3
+
+
+def test_prefetch(router, multicall, permit2_contract, tokens):
+    rng = random.Random(0)
+    for token in tokens:
+        for account in accounts:
+            token.mint(account, rng.randrange(1 << 80), {"from": accounts[0]})
+
+    async def one_by_one(reads):
+        client = ChainClient(
+            "bench", None, multicall.address, web3.provider.endpoint_uri
+        )
+        try:
+            return await read_one_by_one(client, multicall, reads)
+        finally:
+            await client.close()
+
+    rows = []
+    results = {}
+    for batch_size in BATCH_SIZES:
+        reads = batch_reads(rng, batch_size, router, permit2_contract, tokens)
+        naive_round_trips, naive_ms = timed(one_by_one(reads))
+        prefetch_round_trips, prefetch_ms = timed(read_prefetched(multicall, reads))
+
+        rows.append(
+            [
+                batch_size,
+                len(reads),
+                naive_round_trips,
+                prefetch_round_trips,
+                naive_round_trips - prefetch_round_trips,
+                f"{naive_ms:.1f}",
+                f"{prefetch_ms:.1f}",
+            ]
+        )
+        results[str(batch_size)] = {
+            "reads": len(reads),
+            "naive_round_trips": naive_round_trips,
+            "prefetch_round_trips": prefetch_round_trips,
+            "naive_ms": naive_ms,
+            "prefetch_ms": prefetch_ms,
+        }
+
+    print_table(
+        [
+            "swaps",
+            "reads",
+            "naive trips",
+            "prefetch trips",
+            "saved",
+            "naive ms",
+            "prefetch ms",
+        ],
+        rows,
+    )
+    save_results("prefetch", results)
@@ -0,0 +1,144 @@
+import brownie
+import pytest
+from brownie import accounts
+from lib.bench import print_table, save_results
+
+# Compares the per swap gas overhead of paying referral fees immediately on OdosRouterV2
+# against accruing them to be claimed later on OdosRouterV2ReferralAccrual, for the
+# first and a repeated swap with the code, along with the gas of the beneficiary's
+# claim and the number of repeated swaps whose savings pay for one claim.
+# Run from the project root with `brownie test tests/bench_referral_accrual.py -s`
+
+
+@pytest.fixture(scope="module")
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def swap(router, weth_executor, referral_code):
+    input_amount = int(1e18)
+    return router.swap(
+        [
+            "0x0000000000000000000000000000000000000000",
+            input_amount,
+            weth_executor.address,
+            weth_executor.WETH(),
+            1,
+            1,
+            accounts[0],
+        ],
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        referral_code,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    ).gas_used
+
+
+def swap_multi(router, weth_executor, referral_code):
+    input_amount = int(1e18)
+    return router.swapMulti(
+        [
+            [
+                "0x0000000000000000000000000000000000000000",
+                input_amount,
+                weth_executor.address,
+            ]
+        ],
+        [[weth_executor.WETH(), 1, accounts[0]]],
+        1,
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        referral_code,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    ).gas_used
+
+
+def test_referral_accrual_gas(weth_executor):
+    results = {}
+    rows = []
+
+    for name, endpoint in [("swap", swap), ("swapMulti", swap_multi)]:
+        gas_used = {}
+
+        for mode in ["none", "transfer", "accrual"]:
+            container = (
+                brownie.OdosRouterV2ReferralAccrual
+                if mode == "accrual"
+                else brownie.OdosRouterV2
+            )
+            router = container.deploy(
+                {
+                    "from": accounts[0],
+                },
+            )
+            referral_code = 0
+            if mode != "none":
+                # A fresh beneficiary for every router, so that its first fee fills
+                # empty storage in both modes
+                beneficiary = accounts.add()
+                accounts[0].transfer(beneficiary, int(1e18))
+                referral_code = router.REFERRAL_WITH_FEE_THRESHOLD() + 1
+                router.registerReferralCode(
+                    referral_code,
+                    int(1e15),
+                    beneficiary,
+                    {
+                        "from": accounts[0],
+                    },
+                )
+            # The first swap pays for a cold beneficiary, the second for a warm one
+            gas_used[mode] = [
+                endpoint(router, weth_executor, referral_code),
+                endpoint(router, weth_executor, referral_code),
+            ]
+            if mode == "accrual":
+                claim = router.claimReferralFees(
+                    [weth_executor.WETH()],
+                    {
+                        "from": beneficiary,
+                    },
+                )
+                gas_used["claim"] = claim.gas_used
+
+        results[name] = gas_used
+        # Swaps with the code between claims for the accrual to pay for the claim
+        saving = gas_used["transfer"][1] - gas_used["accrual"][1]
+        for i, swap_name in enumerate(["first", "repeat"]):
+            rows.append(
+                [
+                    f"{name} ({swap_name})",
+                    gas_used["none"][i],
+                    gas_used["transfer"][i] - gas_used["none"][i],
+                    gas_used["accrual"][i] - gas_used["none"][i],
+                    gas_used["claim"],
+                    f"{gas_used['claim'] / saving:.1f}" if saving > 0 else "-",
+                ]
+            )
+    print_table(
+        [
+            "endpoint",
+            "no referral",
+            "transfer overhead",
+            "accrual overhead",
+            "claim",
+            "swaps per claim",
+        ],
+        rows,
+    )
+    save_results("referral_accrual", results)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import rlp
+from eth_abi import encode
+from lib import calldata_service, corpus, replay, storage_layout, utils
+from lib.bench import print_table, save_results
+from lib.multichain import function_selector
+from web3 import Web3
+
+# Replays a corpus of random swaps through MockExecutor against two builds of the router
+# on parallel ganache chains, and prints the gas delta and the number of mismatched
+# outputs on every endpoint. Build B is the router in build/contracts, and build A is
+# the router artifact in ODOS_REPLAY_BASELINE, e.g. a copy of OdosRouterV2.json saved
+# before a change, or build B again if it is not set. Permit2 endpoints are left out,
+# since their signatures are bound to the router's address on the chain they were made
+# for. Needs ganache and compiled contracts.
+# Run from the tests directory with `python bench_replay.py [num_swaps] [num_chains]`
+
+BUILD_PATH = os.path.join(os.path.dirname(__file__), "..", "build", "contracts")
+ETH = "0x0000000000000000000000000000000000000000"
+
+NUM_TOKENS = 6
+NUM_SENDERS = 200
+MAX_LEGS = 4
+MAX_SLIPPAGE_PERCENT = 0.05
+REFERRAL_CODE = (1 << 31) + 1
+REFERRAL_FEE = int(1e16)
+ENDPOINTS = ["swap", "swapCompact", "swapMulti", "swapMultiCompact"]
+# MockERC20 is an OpenZeppelin ERC20, with balances and allowances in its first slots
+TOKEN_SLOTS = (0, 1)
+EXECUTOR_FUNDING = 10**40
+
+
+def bytecode(name, path=None):
+    with open(path or os.path.join(BUILD_PATH, f"{name}.json")) as f:
+        return json.load(f)["bytecode"]
+
+
+def create_address(deployer, nonce):
+    encoded = rlp.encode([bytes.fromhex(deployer[2:]), nonce])
+    return "0x" + Web3.keccak(encoded)[12:].hex()[-40:]
+
+
+def mock_path(output_tokens, output_amounts):
+    # An output is a token(20) followed by an amount(16)
+    return "0x" + "".join(
+        token[2:].lower() + amount.to_bytes(16, "big").hex()
+        for token, amount in zip(output_tokens, output_amounts)
+    )
+
+
+def swap_spec(rng, senders, tokens, executor):
+    endpoint = rng.choice(ENDPOINTS)
+    if endpoint in ["swap", "swapCompact"]:
+        num_inputs = num_outputs = 1
+    else:
+        num_inputs = rng.randint(1, MAX_LEGS - 1)
+        num_outputs = rng.randint(1, MAX_LEGS - num_inputs)
+    legs = rng.sample([ETH] + tokens, num_inputs + num_outputs)
+    output_quotes = tuple(rng.randrange(10**15, 10**20) for _ in range(num_outputs))
+    return calldata_service.SwapSpec(
+        endpoint=endpoint,
+        sender=rng.choice(senders),
+        input_tokens=tuple(legs[:num_inputs]),
+        input_amounts=tuple(rng.randrange(10**15, 10**20) for _ in range(num_inputs)),
+        output_tokens=tuple(legs[num_inputs:]),
+        output_quotes=output_quotes,
+        max_slippage_percent=MAX_SLIPPAGE_PERCENT,
+        executor=executor,
+        path_definition=mock_path(legs[num_inputs:], output_quotes),
+        referral_code=rng.choice([0, REFERRAL_CODE]),
+    )
+
+
+class Deployment:
+    """
+    The contracts that seed deploys on a fresh worker chain, at the addresses they get
+    from deployer's nonces
+    """
+
+    def __init__(self, deployer, nonce):
+        self.deployer = deployer
+        self.executor = create_address(deployer, nonce)
+        self.tokens = [
+            create_address(deployer, nonce + 1 + i) for i in range(NUM_TOKENS)
+        ]
+
+    async def seed(self, chain):
+        executor = await chain.deploy(self.deployer, bytecode("MockExecutor"))
+        tokens = []
+        for i in range(NUM_TOKENS):
+            arguments = encode(
+                ["string", "string", "uint8"], [f"Token {i}", f"TK{i}", 18]
+            )
+            tokens.append(
+                await chain.deploy(
+                    self.deployer, bytecode("MockERC20") + arguments.hex()
+                )
+            )
+        assert [executor] + tokens == [self.executor] + self.tokens
+
+        # The executor pays out every output
+        await chain.set_balance(executor, EXECUTOR_FUNDING)
+        for token in tokens:
+            await chain.set_storage(
+                token,
+                storage_layout.address_mapping_slot(TOKEN_SLOTS[0], executor),
+                EXECUTOR_FUNDING,
+            )
+
+    async def setup(self, chain, router):
+        address_list = encode(["address[]"], [self.tokens])
+        await chain.send(
+            self.deployer,
+            router,
+            "0x"
+            + function_selector("writeAddressList(address[])")
+            + address_list.hex(),
+        )
+        referral = encode(
+            ["uint32", "uint64", "address"],
+            [REFERRAL_CODE, REFERRAL_FEE, self.deployer],
+        )
+        await chain.send(
+            self.deployer,
+            router,
+            "0x"
+            + function_selector("registerReferralCode(uint32,uint64,address)")
+            + referral.hex(),
+        )
+
+
+async def run(rpc_urls, corpus_path, num_swaps, seed):
+    async with replay.DevChain(rpc_urls[0]) as chain:
+        deployer = chain.accounts[0]
+        nonce = int(
+            await chain.request("eth_getTransactionCount", [deployer, "latest"]), 16
+        )
+    deployment = Deployment(deployer, nonce)
+
+    rng = random.Random(seed)
+    senders = utils.random_addresses(NUM_SENDERS, rng)
+    specs = [
+        swap_spec(rng, senders, deployment.tokens, deployment.executor)
+        for _ in range(num_swaps)
+    ]
+    corpus.write_corpus(
+        corpus_path,
+        (
+            (
+                spec.sender,
+                sum(
+                    amount
+                    for token, amount in zip(spec.input_tokens, spec.input_amounts)
+                    if token == ETH
+                ),
+                calldata_service.encode_spec(spec, deployment.tokens),
+            )
+            for spec in specs
+        ),
+    )
+
+    engine = replay.ReplayEngine(
+        rpc_urls,
+        bytecode("OdosRouterV2", os.environ.get("ODOS_REPLAY_BASELINE")),
+        bytecode("OdosRouterV2"),
+        seed=deployment.seed,
+        setup=deployment.setup,
+        token_slots={token: TOKEN_SLOTS for token in deployment.tokens},
+    )
+    with corpus.Corpus(corpus_path) as calls:
+        start = time.perf_counter()
+        results = await engine.replay(calls)
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def main(num_swaps=2_000, num_chains=4, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        corpus_path = os.path.join(directory, "corpus.bin")
+        with replay.worker_chains(num_chains) as rpc_urls:
+            results, elapsed = asyncio.run(run(rpc_urls, corpus_path, num_swaps, seed))
+
+    report = replay.compare(results)
+    failed = sum(not result.a.success for result in results)
+    print(
+        f"replayed {num_swaps:,} swaps twice on {num_chains} chains in {elapsed:.1f}s, "
+        f"{failed} failed on build A"
+    )
+    print_table(
+        [
+            "endpoint",
+            "calls",
+            "gas A",
+            "gas B",
+            "mean delta",
+            "max delta",
+            "mismatches",
+        ],
+        [
+            [
+                function,
+                row["calls"],
+                f"{row['gas_a']:.0f}" if row["gas_a"] is not None else "-",
+                f"{row['gas_b']:.0f}" if row["gas_b"] is not None else "-",
+                f"{row['mean_delta']:+.1f}" if row["mean_delta"] is not None else "-",
+                f"{row['max_delta']:+d}" if row["max_delta"] is not None else "-",
+                row["mismatches"],
+            ]
+            for function, row in report.items()
+        ],
+    )
+    save_results("replay", report)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
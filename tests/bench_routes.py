@@ -0,0 +1,109 @@
+import brownie
+import pytest
+from brownie import accounts
+from lib import market, path_assembler
+from lib.bench import print_table, save_results
+
+# Measures the gas used by swaps routed through a local market of constant product
+# pools, by number of hops and with the input split over two routes, and checks that
+# the router's amount out matches the quoter's exactly. The market's pools form a chain,
+# so the route between the first token and the n-th token takes n hops.
+# Run from the project root with `brownie test tests/bench_routes.py -s`
+
+NUM_TOKENS = 6
+HOPS = [1, 2, 3, 4, 5]
+
+
+@pytest.fixture(scope="module")
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def path_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosPathExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def local_market():
+    return market.deploy_market(
+        brownie.MockERC20,
+        brownie.MockConstantProductPool,
+        accounts[0],
+        NUM_TOKENS,
+        NUM_TOKENS - 1,
+        liquidity="uniform",
+    )
+
+
+def run_route(router, path_executor, local_market, hops, split):
+    local_market, token_contracts, pool_contracts = local_market
+    token_in = local_market.tokens[0]
+    token_out = local_market.find_route(token_in, local_market.tokens[hops])[-1]
+    first_pool = local_market.pools_between(token_in, local_market.tokens[1])[0]
+    amount = (
+        local_market.reserves[first_pool.address][
+            0 if token_in == first_pool.token0 else 1
+        ]
+        // 1000
+    )
+
+    assembler = path_assembler.PathAssembler(1)
+    if split:
+        part = assembler.split(0, 0.5)
+        output = local_market.add_route(assembler, 0, token_in, token_out)
+        local_market.add_route(assembler, part, token_in, token_out, dst=output)
+    else:
+        output = local_market.add_route(assembler, 0, token_in, token_out)
+    assembler.send(output, token_out)
+    path = assembler.assemble()
+    quote = local_market.quote_path(path, [amount])[token_out]
+
+    token_contracts[token_in].mint(accounts[0], amount, {"from": accounts[0]})
+    token_contracts[token_in].approve(router.address, amount, {"from": accounts[0]})
+    tx = router.swap(
+        [token_in, amount, path_executor, token_out, quote, quote, accounts[0]],
+        path,
+        path_executor,
+        0,
+        {"from": accounts[0]},
+    )
+    local_market.refresh(pool_contracts)
+    return tx.gas_used, tx.return_value == quote
+
+
+def test_bench_routes(router, path_executor, local_market):
+    # Warm up the router's and every token's storage, as in steady state
+    for hops in HOPS:
+        run_route(router, path_executor, local_market, hops, False)
+
+    results = {}
+    for hops in HOPS:
+        for split in [False, True]:
+            gas_used, exact = run_route(
+                router, path_executor, local_market, hops, split
+            )
+            results[f"{hops}{' split' if split else ''}"] = {
+                "gas": gas_used,
+                "exact": exact,
+            }
+
+    print_table(
+        ["route", "gas", "exact quote"],
+        [[route, result["gas"], result["exact"]] for route, result in results.items()],
+    )
+    save_results("routes", results)
@@ -0,0 +1,112 @@
+import random
+import sys
+import time
+
+import numpy as np
+from lib.decode_events import SwapEvent
+from lib.slippage_monitor import SlippageMonitor, relative_slippage
+
+# Streams synthetic Swap events through one slippage monitor per chain and prints the
+# cost of an update, the items held per sketch, the time to merge the chains' monitors
+# and to query a merged window, and the rank error of the merged quantiles of the
+# busiest pairs against the exact quantiles of their events.
+# Run from the tests directory with `python bench_slippage_monitor.py [num_events]`
+
+SENDER = "0x" + "11" * 20
+NUM_TOKENS = 100
+NUM_REFERRAL_CODES = 20
+NUM_CHAINS = 4
+BLOCKS_PER_WINDOW = 7200
+QS = np.linspace(0.01, 0.99, 99)
+
+
+def chain_events(rng, tokens, biases, num_events):
+    # Popular tokens are drawn more often
+    weights = [1 / (rank + 1) for rank in range(NUM_TOKENS)]
+    events = []
+    for i in range(num_events):
+        pair = tuple(rng.choices(range(NUM_TOKENS), weights, k=2))
+        while pair[0] == pair[1]:
+            pair = tuple(rng.choices(range(NUM_TOKENS), weights, k=2))
+        quote = rng.randrange(10**15, 10**21)
+        slippage = int(quote * rng.gauss(biases[pair[0]], 5) / 10_000)
+        events.append(
+            (
+                i // 10,
+                SwapEvent(
+                    SENDER,
+                    10**18,
+                    tokens[pair[0]],
+                    quote + min(slippage, 0),
+                    tokens[pair[1]],
+                    slippage,
+                    rng.randrange(NUM_REFERRAL_CODES),
+                ),
+            )
+        )
+    return events
+
+
+def main(num_events=400_000, k=200, seed=0):
+    rng = random.Random(seed)
+    tokens = ["0x" + rng.randbytes(20).hex() for _ in range(NUM_TOKENS)]
+    biases = [rng.uniform(-5, 15) for _ in range(NUM_TOKENS)]
+    chains = [
+        chain_events(rng, tokens, biases, num_events // NUM_CHAINS)
+        for _ in range(NUM_CHAINS)
+    ]
+
+    monitors = []
+    start = time.perf_counter()
+    for events in chains:
+        monitor = SlippageMonitor(k, window_of=lambda block: block // BLOCKS_PER_WINDOW)
+        monitor.update(events)
+        monitors.append(monitor)
+    update = (time.perf_counter() - start) / num_events * 1e6
+
+    sketches = [
+        sketch
+        for monitor in monitors
+        for key_windows in monitor.sketches.values()
+        for sketch in key_windows.values()
+    ]
+    items = [sum(len(items) for items in sketch.levels) for sketch in sketches]
+
+    start = time.perf_counter()
+    merged = SlippageMonitor(k)
+    for monitor in monitors:
+        merged.merge(monitor)
+    merge = time.perf_counter() - start
+
+    values = {}
+    for events in chains:
+        for block, event in events:
+            values.setdefault((event.input_token, event.output_token), []).append(
+                relative_slippage(event)
+            )
+    busiest = sorted(values, key=lambda pair: -len(values[pair]))[:10]
+
+    start = time.perf_counter()
+    estimates = [merged.quantiles("pair", pair, QS) for pair in busiest]
+    query = (time.perf_counter() - start) / len(busiest) * 1e3
+
+    errors = []
+    for pair, pair_estimates in zip(busiest, estimates):
+        exact = np.sort(values[pair])
+        ranks = np.searchsorted(exact, pair_estimates, side="right") / len(exact)
+        errors.append(np.abs(ranks - QS).max())
+
+    print(
+        f"{'events':<28}{num_events:>12,}\n"
+        f"{'update us/event':<28}{update:>12.2f}\n"
+        f"{'sketches':<28}{len(sketches):>12,}\n"
+        f"{'mean items per sketch':<28}{np.mean(items):>12.1f}\n"
+        f"{'max items per sketch':<28}{max(items):>12,}\n"
+        f"{'merge chains ms':<28}{merge * 1e3:>12.1f}\n"
+        f"{'query ms':<28}{query:>12.2f}\n"
+        f"{'max rank error':<28}{max(errors):>12.4f}"
+    )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
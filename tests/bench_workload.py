@@ -0,0 +1,69 @@
+import sys
+import time
+
+import numpy as np
+from lib import classifier, workload
+
+# Generates a synthetic workload and prints its shape: the share of each endpoint, leg
+# counts, token popularity, address list coverage and referral usage. Then encodes a
+# sample of its swaps on every endpoint and decodes them again with the transaction
+# classifier, checking that every swap round trips.
+# Run from the tests directory with `python bench_workload.py [num_swaps] [num_samples]`
+
+ROUTER = "0x19ceead7105607cd444f5ad10dd51356436095a1"
+
+
+def main(num_swaps=1_000_000, num_samples=2_000, seed=0):
+    start = time.perf_counter()
+    swaps = workload.Workload(num_swaps, seed=seed)
+    generate = time.perf_counter() - start
+
+    legs = np.concatenate([swaps.input_tokens, swaps.output_tokens])
+    token_counts = np.bincount(legs, minlength=len(swaps.tokens))
+    print(f"generated {num_swaps:,} swaps in {generate:.2f}s")
+    print(
+        f"{'ETH legs':<24}{token_counts[0] / len(legs):>8.1%}\n"
+        f"{'top 10 token legs':<24}{token_counts[:10].sum() / len(legs):>8.1%}\n"
+        f"{'address list coverage':<24}{swaps.address_list_coverage():>8.1%}\n"
+        f"{'with referral code':<24}{np.mean(swaps.referral_codes > 0):>8.1%}\n"
+        f"{'round input amounts':<24}"
+        f"{np.mean(swaps.input_amounts % 10 ** 3 == 0):>8.1%}"
+    )
+
+    transaction_classifier = classifier.TransactionClassifier(
+        ROUTER, swaps.address_list
+    )
+    print()
+    print(
+        f"{'endpoint':<18}{'share':>7}{'legs':>6}{'bytes':>7}"
+        f"{'encode us':>11}{'decode us':>11}"
+    )
+    for endpoint in workload.ENDPOINTS:
+        indices = swaps.indices(endpoint)
+        sample = indices[:num_samples]
+
+        start = time.perf_counter()
+        transactions = list(swaps.transactions(ROUTER, sample))
+        encode = (time.perf_counter() - start) / len(sample) * 1e6
+
+        start = time.perf_counter()
+        records = [transaction_classifier.classify(tx) for tx in transactions]
+        decode = (time.perf_counter() - start) / len(sample) * 1e6
+
+        for i, record in zip(sample, records):
+            spec = swaps.spec(i)
+            assert record.function == endpoint
+            assert [token for token, amount, receiver in record.inputs] == list(
+                spec.input_tokens
+            )
+
+        legs = np.mean(swaps.input_counts[indices] + swaps.output_counts[indices])
+        size = np.mean([len(tx["input"]) // 2 - 1 for tx in transactions])
+        print(
+            f"{endpoint:<18}{len(indices) / num_swaps:>7.1%}{legs:>6.2f}{size:>7.0f}"
+            f"{encode:>11.1f}{decode:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
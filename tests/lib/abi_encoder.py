@@ -0,0 +1,238 @@
+from lib.metrics import instrumented
+from web3 import Web3
+
+# Encodes calls to the router's swap endpoints without a generic ABI encoder. The layout
+# of every endpoint's arguments is fixed, so each encoder computes the size of the call
+# up front and writes the static head and the dynamic tail straight into one buffer.
+# The output is byte-identical to eth_abi's, and amounts that do not fit in their type
+# raise an OverflowError
+
+SWAP_TOKEN_INFO = "(address,uint256,address,address,uint256,uint256,address)"
+INPUT_TOKEN_INFO = "(address,uint256,address)"
+OUTPUT_TOKEN_INFO = "(address,uint256,address)"
+PERMIT2_INFO = "(address,uint256,uint256,bytes)"
+
+
+def function_selector(signature):
+    return Web3.keccak(text=signature)[:4].hex()[-8:]
+
+
+SIGNATURES = {
+    "swap": f"swap({SWAP_TOKEN_INFO},bytes,address,uint32)",
+    "swapPermit2": f"swapPermit2({PERMIT2_INFO},{SWAP_TOKEN_INFO},bytes,address,uint32)",
+    "swapMulti": (
+        f"swapMulti({INPUT_TOKEN_INFO}[],{OUTPUT_TOKEN_INFO}[],uint256,bytes,address,uint32)"
+    ),
+    "swapMultiPermit2": (
+        f"swapMultiPermit2({PERMIT2_INFO},{INPUT_TOKEN_INFO}[],{OUTPUT_TOKEN_INFO}[],"
+        "uint256,bytes,address,uint32)"
+    ),
+    "swapCompact": "swapCompact()",
+    "swapMultiCompact": "swapMultiCompact()",
+    "registerReferralCode": "registerReferralCode(uint32,uint64,address)",
+    "claimReferralFees": "claimReferralFees(address[])",
+    "setSwapMultiFee": "setSwapMultiFee(uint256)",
+    "writeAddressList": "writeAddressList(address[])",
+    "writeAddressTable": "writeAddressTable(address[])",
+    "transferRouterFunds": "transferRouterFunds(address[],uint256[],address)",
+    "swapRouterFunds": (
+        f"swapRouterFunds({INPUT_TOKEN_INFO}[],{OUTPUT_TOKEN_INFO}[],uint256,bytes,address)"
+    ),
+    "transferOwnership": "transferOwnership(address)",
+    "renounceOwnership": "renounceOwnership()",
+    # Public getters
+    "owner": "owner()",
+    "addressList": "addressList(uint256)",
+    "addressTable": "addressTable(uint256)",
+    "swapMultiFee": "swapMultiFee()",
+    "referralLookup": "referralLookup(uint32)",
+    "referralFeesOwed": "referralFeesOwed(address,address)",
+    "referralFeesReserved": "referralFeesReserved(address)",
+}
+SELECTORS = {
+    name: bytes.fromhex(function_selector(signature))
+    for name, signature in SIGNATURES.items()
+}
+
+UINT32_MAX = (1 << 32) - 1
+
+
+class _Buffer:
+    # Fixed size buffer of 32 byte words following a 4 byte selector
+
+    __slots__ = ["data"]
+
+    def __init__(self, selector, num_words):
+        self.data = bytearray(4 + 32 * num_words)
+        self.data[:4] = selector
+
+    def uint(self, word, value):
+        self.data[4 + 32 * word : 36 + 32 * word] = value.to_bytes(32, "big")
+
+    def address(self, word, address):
+        address = bytes.fromhex(address[2:])
+        if len(address) != 20:
+            raise ValueError(f"Invalid address {address.hex()}")
+        self.data[16 + 32 * word : 36 + 32 * word] = address
+
+    def bytes(self, word, value):
+        # Writes the length of value followed by value, zero padded to whole words
+        self.uint(word, len(value))
+        self.data[36 + 32 * word : 36 + 32 * word + len(value)] = value
+
+
+def _bytes_words(value):
+    return 1 + (len(value) + 31) // 32
+
+
+def _check_uint32(value):
+    if value > UINT32_MAX:
+        raise OverflowError(f"{value} does not fit in uint32")
+    return value
+
+
+def _write_token_info(buffer, word, token_info):
+    # swapTokenInfo is static, so it is encoded in place
+    (
+        input_token,
+        input_amount,
+        input_receiver,
+        output_token,
+        output_quote,
+        output_min,
+        output_receiver,
+    ) = token_info
+    buffer.address(word, input_token)
+    buffer.uint(word + 1, input_amount)
+    buffer.address(word + 2, input_receiver)
+    buffer.address(word + 3, output_token)
+    buffer.uint(word + 4, output_quote)
+    buffer.uint(word + 5, output_min)
+    buffer.address(word + 6, output_receiver)
+
+
+def _write_token_infos(buffer, word, token_infos):
+    # inputTokenInfo[] and outputTokenInfo[] are both arrays of (address, uint256,
+    # address) tuples
+    buffer.uint(word, len(token_infos))
+    for token, amount, receiver in token_infos:
+        buffer.address(word + 1, token)
+        buffer.uint(word + 2, amount)
+        buffer.address(word + 3, receiver)
+        word += 3
+
+
+def _permit2_words(permit2):
+    return 4 + _bytes_words(permit2[3])
+
+
+def _write_permit2(buffer, word, permit2):
+    contract, nonce, deadline, signature = permit2
+    buffer.address(word, contract)
+    buffer.uint(word + 1, nonce)
+    buffer.uint(word + 2, deadline)
+    buffer.uint(word + 3, 4 * 32)
+    buffer.bytes(word + 4, signature)
+
+
+@instrumented("encode", "swap")
+def encode_swap(token_info, path_definition, executor, referral_code):
+    """
+    Calldata of swap, taking swapTokenInfo as a tuple and pathDefinition as bytes
+    """
+    buffer = _Buffer(SELECTORS["swap"], 10 + _bytes_words(path_definition))
+    _write_token_info(buffer, 0, token_info)
+    buffer.uint(7, 10 * 32)
+    buffer.address(8, executor)
+    buffer.uint(9, _check_uint32(referral_code))
+    buffer.bytes(10, path_definition)
+    return bytes(buffer.data)
+
+
+@instrumented("encode", "swapPermit2")
+def encode_swap_permit2(permit2, token_info, path_definition, executor, referral_code):
+    """
+    Calldata of swapPermit2, taking permit2Info as a tuple whose signature is bytes
+    """
+    permit2_words = _permit2_words(permit2)
+    buffer = _Buffer(
+        SELECTORS["swapPermit2"], 11 + permit2_words + _bytes_words(path_definition)
+    )
+    buffer.uint(0, 11 * 32)
+    _write_token_info(buffer, 1, token_info)
+    buffer.uint(8, (11 + permit2_words) * 32)
+    buffer.address(9, executor)
+    buffer.uint(10, _check_uint32(referral_code))
+    _write_permit2(buffer, 11, permit2)
+    buffer.bytes(11 + permit2_words, path_definition)
+    return bytes(buffer.data)
+
+
+def _multi_words(inputs, outputs, path_definition):
+    return 2 + 3 * len(inputs) + 3 * len(outputs) + _bytes_words(path_definition)
+
+
+def _write_multi(
+    buffer, head, tail, inputs, outputs, value_out_min, path_definition, executor
+):
+    # Writes the arguments shared by every multi swap, with their head at word head and
+    # their dynamic tail starting at word tail. Offsets are relative to the first word of
+    # the arguments
+    outputs_word = tail + 1 + 3 * len(inputs)
+    path_word = outputs_word + 1 + 3 * len(outputs)
+
+    buffer.uint(head, tail * 32)
+    buffer.uint(head + 1, outputs_word * 32)
+    buffer.uint(head + 2, value_out_min)
+    buffer.uint(head + 3, path_word * 32)
+    buffer.address(head + 4, executor)
+
+    _write_token_infos(buffer, tail, inputs)
+    _write_token_infos(buffer, outputs_word, outputs)
+    buffer.bytes(path_word, path_definition)
+
+
+@instrumented("encode", "swapMulti")
+def encode_swap_multi(
+    inputs, outputs, value_out_min, path_definition, executor, referral_code
+):
+    """
+    Calldata of swapMulti, taking inputs and outputs as lists of (token, amount or
+    relative value, receiver) tuples
+    """
+    buffer = _Buffer(
+        SELECTORS["swapMulti"], 6 + _multi_words(inputs, outputs, path_definition)
+    )
+    _write_multi(
+        buffer, 0, 6, inputs, outputs, value_out_min, path_definition, executor
+    )
+    buffer.uint(5, _check_uint32(referral_code))
+    return bytes(buffer.data)
+
+
+@instrumented("encode", "swapMultiPermit2")
+def encode_swap_multi_permit2(
+    permit2, inputs, outputs, value_out_min, path_definition, executor, referral_code
+):
+    """
+    Calldata of swapMultiPermit2, taking permit2Info as a tuple whose signature is bytes
+    """
+    permit2_words = _permit2_words(permit2)
+    buffer = _Buffer(
+        SELECTORS["swapMultiPermit2"],
+        7 + permit2_words + _multi_words(inputs, outputs, path_definition),
+    )
+    buffer.uint(0, 7 * 32)
+    _write_multi(
+        buffer,
+        1,
+        7 + permit2_words,
+        inputs,
+        outputs,
+        value_out_min,
+        path_definition,
+        executor,
+    )
+    buffer.uint(6, _check_uint32(referral_code))
+    _write_permit2(buffer, 7, permit2)
+    return bytes(buffer.data)
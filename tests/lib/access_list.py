@@ -0,0 +1,499 @@
+from functools import lru_cache
+
+from lib import storage_layout
+from lib.utils import ADDRESS_TABLE_FLAG, decode_amount
+from web3 import Web3
+
+# Builds EIP-2930 access lists for compact router swaps from the router's storage
+# layout, and estimates the gas they save. Accesses are kept as a dict of lowercase
+# address -> set of storage slots, where an empty set means only the account is touched
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+# Gas costs from EIP-2929 and EIP-2930
+ACCESS_LIST_ADDRESS_COST = 2400
+ACCESS_LIST_STORAGE_KEY_COST = 1900
+COLD_ACCOUNT_ACCESS_COST = 2600
+COLD_SLOAD_COST = 2100
+WARM_ACCESS_COST = 100
+
+REFERRAL_WITH_FEE_THRESHOLD = 1 << 31
+
+SWAP_COMPACT_SELECTOR = Web3.keccak(text="swapCompact()")[:4].hex()[-8:]
+SWAP_MULTI_COMPACT_SELECTOR = Web3.keccak(text="swapMultiCompact()")[:4].hex()[-8:]
+
+# Addresses that are warm at the start of every transaction, other than the sender and
+# the router, which are passed in by the caller
+PRECOMPILES = ["0x" + i.to_bytes(20, "big").hex() for i in range(1, 10)]
+
+# Slot math is cached since the same tokens, holders and referral codes repeat across
+# the quotes of a batch
+_address_list_slot = lru_cache(maxsize=None)(storage_layout.address_list_slot)
+_address_table_slot = lru_cache(maxsize=None)(storage_layout.address_table_slot)
+_referral_lookup_slot = lru_cache(maxsize=None)(storage_layout.referral_lookup_slot)
+_address_mapping_slot = lru_cache(maxsize=None)(storage_layout.address_mapping_slot)
+
+
+def add_access(accesses, address, *slots):
+    accesses.setdefault(address.lower(), set()).update(slots)
+
+
+def merge_accesses(*all_accesses):
+    merged = {}
+    for accesses in all_accesses:
+        for address, slots in accesses.items():
+            add_access(merged, address, *slots)
+
+    return merged
+
+
+# Reads an address code from compact swap data the same way the router's getAddress does,
+# recording the router slots and address table chunks that the lookup touches
+def _read_address(index, data, router, address_list, address_table, chunks, accesses):
+    code = int(data[index : index + 4], 16)
+
+    if code == 0:
+        return ETH, index + 4
+    elif code == 1:
+        return "0x" + data[index + 4 : index + 44].lower(), index + 44
+    elif code & ADDRESS_TABLE_FLAG:
+        chunk_index = (code >> 8) & 0x7F
+        add_access(accesses, router, _address_table_slot(chunk_index))
+        if chunks is not None:
+            add_access(accesses, chunks[chunk_index])
+
+        return address_table[chunk_index][code & 0xFF].lower(), index + 4
+    else:
+        add_access(accesses, router, _address_list_slot(code - 2))
+
+        return address_list[code - 2].lower(), index + 4
+
+
+def _strip_compact_data(compact_data, selector):
+    data = compact_data[2:] if compact_data.startswith("0x") else compact_data
+
+    # Accept either the compact data alone or the full transaction data
+    if data[:8].lower() == selector:
+        return data[8:]
+    return data
+
+
+def _balance_access(accesses, balance_slots, token, holder):
+    if token == ETH:
+        return
+    add_access(accesses, token)
+
+    if balance_slots is not None and token in balance_slots:
+        add_access(accesses, token, _address_mapping_slot(balance_slots[token], holder))
+
+
+# Accesses made by the router's transferFrom of an input token, which reads the sender's
+# allowance for the router as well as both balances
+def _transfer_from_access(
+    accesses, balance_slots, allowance_slots, token, sender, router, dest
+):
+    _balance_access(accesses, balance_slots, token, sender)
+    _balance_access(accesses, balance_slots, token, dest)
+
+    if token != ETH and allowance_slots is not None and token in allowance_slots:
+        add_access(
+            accesses,
+            token,
+            _address_mapping_slot(
+                _address_mapping_slot(allowance_slots[token], sender), router
+            ),
+        )
+
+
+# Accesses made after the path is executed, for one output token of either swap
+def _output_accesses(
+    accesses,
+    router,
+    token,
+    receiver,
+    referral_code,
+    referral_info,
+    referral_fee_accrual,
+    balance_slots,
+):
+    _balance_access(accesses, balance_slots, token, router)
+    _balance_access(accesses, balance_slots, token, receiver)
+    if token == ETH:
+        add_access(accesses, receiver)
+
+    if referral_code > REFERRAL_WITH_FEE_THRESHOLD:
+        # The fee goes to the code's beneficiary, which only the lookup knows
+        if referral_info is None:
+            raise ValueError(
+                f"referral_info is required for referral code {referral_code}, "
+                "which takes a fee"
+            )
+        beneficiary = referral_info["beneficiary"].lower()
+
+        if referral_fee_accrual:
+            add_access(
+                accesses,
+                router,
+                storage_layout.referral_fees_owed_slot(beneficiary, token),
+                storage_layout.referral_fees_reserved_slot(token),
+            )
+        else:
+            _balance_access(accesses, balance_slots, token, beneficiary)
+            if token == ETH:
+                add_access(accesses, beneficiary)
+
+
+def compact_swap_accesses(
+    compact_swap_data,
+    router,
+    sender,
+    address_list,
+    address_table=None,
+    address_table_chunks=None,
+    referral_info=None,
+    referral_fee_accrual=False,
+    balance_slots=None,
+    allowance_slots=None,
+):
+    """
+    Predicts the accounts and storage slots touched by swapCompact, apart from those
+    touched by the executor while it runs the path. referral_info is the beneficiary
+    info of the swap's referral code as returned by storage_layout.unpack_referral_info,
+    and is required when the code takes a fee. address_table_chunks the addresses of the router's address table chunks,
+    balance_slots maps tokens to the slot of their balanceOf mapping and
+    allowance_slots maps tokens to the slot of their allowance mapping
+    """
+    router = router.lower()
+    sender = sender.lower()
+    data = _strip_compact_data(compact_swap_data, SWAP_COMPACT_SELECTOR)
+    accesses = {}
+
+    def read_address(index):
+        return _read_address(
+            index,
+            data,
+            router,
+            address_list,
+            address_table,
+            address_table_chunks,
+            accesses,
+        )
+
+    input_token, index = read_address(0)
+    output_token, index = read_address(index)
+
+    input_amount, index = decode_amount(index, data)
+    output_quote, index = decode_amount(index, data)
+    index += 6
+
+    executor, index = read_address(index)
+    input_dest, index = read_address(index)
+    if input_dest == ETH:
+        input_dest = executor
+
+    output_dest, index = read_address(index)
+    if output_dest == ETH:
+        output_dest = sender
+
+    referral_code = int(data[index : index + 8], 16)
+
+    add_access(accesses, executor)
+    _transfer_from_access(
+        accesses,
+        balance_slots,
+        allowance_slots,
+        input_token,
+        sender,
+        router,
+        input_dest,
+    )
+
+    if referral_code > REFERRAL_WITH_FEE_THRESHOLD:
+        add_access(accesses, router, _referral_lookup_slot(referral_code))
+
+    _output_accesses(
+        accesses,
+        router,
+        output_token,
+        output_dest,
+        referral_code,
+        referral_info,
+        referral_fee_accrual,
+        balance_slots,
+    )
+    return accesses
+
+
+def compact_swap_multi_accesses(
+    compact_swap_multi_data,
+    router,
+    sender,
+    address_list,
+    address_table=None,
+    address_table_chunks=None,
+    referral_info=None,
+    referral_fee_accrual=False,
+    balance_slots=None,
+    allowance_slots=None,
+):
+    """
+    Predicts the accounts and storage slots touched by swapMultiCompact, apart from those
+    touched by the executor while it runs the path. Takes the same arguments as
+    compact_swap_accesses
+    """
+    router = router.lower()
+    sender = sender.lower()
+    data = _strip_compact_data(compact_swap_multi_data, SWAP_MULTI_COMPACT_SELECTOR)
+    accesses = {}
+
+    def read_address(index):
+        return _read_address(
+            index,
+            data,
+            router,
+            address_list,
+            address_table,
+            address_table_chunks,
+            accesses,
+        )
+
+    num_inputs = int(data[0:2], 16)
+    num_outputs = int(data[2:4], 16)
+
+    executor, index = read_address(4)
+    value_out_min, index = decode_amount(index, data)
+
+    inputs = []
+    for i in range(num_inputs):
+        token, index = read_address(index)
+        amount, index = decode_amount(index, data)
+        dest, index = read_address(index)
+        inputs.append((token, executor if dest == ETH else dest))
+
+    outputs = []
+    for i in range(num_outputs):
+        token, index = read_address(index)
+        relative_value, index = decode_amount(index, data)
+        dest, index = read_address(index)
+        outputs.append((token, sender if dest == ETH else dest))
+
+    referral_code = int(data[index : index + 8], 16)
+
+    add_access(accesses, executor)
+    for token, dest in inputs:
+        _transfer_from_access(
+            accesses, balance_slots, allowance_slots, token, sender, router, dest
+        )
+
+    add_access(accesses, router, storage_layout.SWAP_MULTI_FEE_SLOT)
+    if referral_code > REFERRAL_WITH_FEE_THRESHOLD:
+        add_access(accesses, router, _referral_lookup_slot(referral_code))
+
+    for token, receiver in outputs:
+        _output_accesses(
+            accesses,
+            router,
+            token,
+            receiver,
+            referral_code,
+            referral_info,
+            referral_fee_accrual,
+            balance_slots,
+        )
+    return accesses
+
+
+def entry_gas_effect(address, num_slots, warm_addresses):
+    """
+    Gas saved by an access list entry for an address and num_slots of its storage slots,
+    all of which the transaction touches. Negative when the entry costs more than it saves
+    """
+    saved = num_slots * (COLD_SLOAD_COST - WARM_ACCESS_COST)
+    if address.lower() not in warm_addresses:
+        saved += COLD_ACCOUNT_ACCESS_COST - WARM_ACCESS_COST
+
+    return saved - ACCESS_LIST_ADDRESS_COST - num_slots * ACCESS_LIST_STORAGE_KEY_COST
+
+
+def _warm_addresses(sender, router):
+    return {sender.lower(), router.lower(), *PRECOMPILES}
+
+
+def build_access_list(accesses, sender, router, prune=True):
+    """
+    Converts accesses to an access list for a transaction from sender to the router.
+    An entry saves 100 gas for each slot and, unless the address is already warm, 100 for
+    the address, but costs 2400 for the address. With prune set, entries that would cost
+    more than they save are dropped, which leaves out the router's own slots unless a
+    swap reads at least 25 of them
+    """
+    warm_addresses = _warm_addresses(sender, router)
+
+    access_list = []
+    for address, slots in sorted(accesses.items()):
+        if prune and entry_gas_effect(address, len(slots), warm_addresses) <= 0:
+            continue
+
+        access_list.append(
+            {
+                "address": Web3.to_checksum_address(address),
+                "storageKeys": [
+                    "0x" + slot.to_bytes(32, "big").hex() for slot in sorted(slots)
+                ],
+            }
+        )
+    return access_list
+
+
+def net_gas_effect(access_list, sender, router):
+    """
+    Gas saved by an access list, assuming the transaction touches every entry in it
+    """
+    warm_addresses = _warm_addresses(sender, router)
+
+    return sum(
+        entry_gas_effect(entry["address"], len(entry["storageKeys"]), warm_addresses)
+        for entry in access_list
+    )
+
+
+def batch_access_lists(
+    swaps,
+    router,
+    sender,
+    address_list,
+    prune=True,
+    **kwargs,
+):
+    """
+    Builds access lists for a batch of quotes. swaps is a list of (compact data, multi)
+    pairs and the remaining arguments are shared by every swap in the batch. Returns a
+    list of (access list, net gas effect) pairs in the same order
+    """
+    results = []
+    for compact_data, multi in swaps:
+        if multi:
+            accesses = compact_swap_multi_accesses(
+                compact_data, router, sender, address_list, **kwargs
+            )
+        else:
+            accesses = compact_swap_accesses(
+                compact_data, router, sender, address_list, **kwargs
+            )
+        access_list = build_access_list(accesses, sender, router, prune)
+        results.append((access_list, net_gas_effect(access_list, sender, router)))
+
+    return results
+
+
+def _stack_address(value):
+    return "0x" + (int(value, 16) & ((1 << 160) - 1)).to_bytes(20, "big").hex()
+
+
+def trace_accesses(web3, tx_hash):
+    """
+    Reads the accounts and storage slots a mined transaction touched from a
+    debug_traceTransaction struct log trace, which covers the executor and token
+    contracts that compact_swap_accesses cannot predict
+    """
+    tx_hash = Web3.to_hex(tx_hash)
+    tx = web3.eth.get_transaction(tx_hash)
+    trace = web3.manager.request_blocking(
+        "debug_traceTransaction",
+        [tx_hash, {"disableMemory": True, "disableStorage": True}],
+    )
+    accesses = {}
+
+    # Address whose storage is used by each call frame, indexed by depth - 1
+    contexts = [tx["to"].lower()]
+    next_context = None
+
+    for step in trace["structLogs"]:
+        depth = step["depth"]
+        while len(contexts) > depth:
+            contexts.pop()
+        if len(contexts) < depth:
+            contexts.append(next_context)
+
+        op = step["op"]
+        stack = step["stack"]
+
+        if op in ("SLOAD", "SSTORE"):
+            add_access(accesses, contexts[-1], int(stack[-1], 16))
+        elif op in ("BALANCE", "EXTCODESIZE", "EXTCODECOPY", "EXTCODEHASH"):
+            add_access(accesses, _stack_address(stack[-1]))
+        elif op in ("CALL", "STATICCALL", "CALLCODE", "DELEGATECALL"):
+            address = _stack_address(stack[-2])
+            add_access(accesses, address)
+
+            # Code run by DELEGATECALL and CALLCODE uses the caller's storage
+            if op in ("CALL", "STATICCALL"):
+                next_context = address
+            else:
+                next_context = contexts[-1]
+
+    return accesses
+
+
+def find_balance_slot(web3, token, holder, max_slot=64):
+    """
+    Finds the slot of a token's balanceOf mapping by probing storage for the balance of a
+    holder with a nonzero balance. Returns None if the balance is zero or not stored in a
+    Solidity mapping in the first max_slot slots
+    """
+    balance = int.from_bytes(
+        web3.eth.call(
+            {
+                "to": Web3.to_checksum_address(token),
+                "data": "0x70a08231" + bytes(12).hex() + holder[2:].lower(),
+            }
+        ),
+        "big",
+    )
+    if balance == 0:
+        return None
+
+    for slot in range(max_slot):
+        value = web3.eth.get_storage_at(
+            Web3.to_checksum_address(token),
+            storage_layout.address_mapping_slot(slot, holder),
+        )
+        if int.from_bytes(value, "big") == balance:
+            return slot
+
+    return None
+
+
+def find_allowance_slot(web3, token, owner, spender, max_slot=64):
+    """
+    Finds the slot of a token's allowance mapping by probing storage for the allowance
+    of an owner and spender with a nonzero allowance. Returns None if the allowance is
+    zero or not stored in a nested Solidity mapping in the first max_slot slots
+    """
+    allowance = int.from_bytes(
+        web3.eth.call(
+            {
+                "to": Web3.to_checksum_address(token),
+                "data": "0xdd62ed3e"
+                + bytes(12).hex()
+                + owner[2:].lower()
+                + bytes(12).hex()
+                + spender[2:].lower(),
+            }
+        ),
+        "big",
+    )
+    if allowance == 0:
+        return None
+
+    for slot in range(max_slot):
+        value = web3.eth.get_storage_at(
+            Web3.to_checksum_address(token),
+            storage_layout.address_mapping_slot(
+                storage_layout.address_mapping_slot(slot, owner), spender
+            ),
+        )
+        if int.from_bytes(value, "big") == allowance:
+            return slot
+
+    return None
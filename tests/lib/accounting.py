@@ -0,0 +1,400 @@
+from itertools import repeat
+
+import numpy as np
+from lib.decode_events import SwapEvent, decode_router_log
+
+# Reconciles the revenue kept by the router per token and period from its swap events.
+# Events are flattened into one row per output token and held in numpy columns. Amounts
+# are uint256, so amount columns are split into 32 bit limbs held in a (limbs, rows)
+# uint64 array, least significant limb first, with limbs that are zero in every row
+# dropped from the top. Every operation works a limb at a time across all rows, so the
+# integer formulas in _swap and _swapMulti are applied exactly without a Python loop
+# over rows, and limb sums are only joined into Python ints once per group when totals
+# are aggregated
+
+FEE_DENOM = 10**18
+REFERRAL_WITH_FEE_THRESHOLD = 1 << 31
+
+# Revenue components, all in units of the output token
+REVENUE_COMPONENTS = ["slippage", "swap_multi_fee", "referral_fee"]
+
+LIMB_BITS = 32
+
+_LIMB_MASK = np.uint64((1 << LIMB_BITS) - 1)
+_LIMB_SHIFT = np.uint64(LIMB_BITS)
+
+
+def _trim(limbs):
+    # Drops the top limbs that are zero in every row, keeping at least one
+    nonzero = np.flatnonzero(limbs.any(axis=1))
+    return limbs[: nonzero[-1] + 1 if len(nonzero) else 1]
+
+
+def _pad(limbs, num_limbs):
+    if len(limbs) >= num_limbs:
+        return limbs
+    padding = np.zeros((num_limbs - len(limbs), limbs.shape[1]), dtype=np.uint64)
+    return np.concatenate([limbs, padding])
+
+
+def to_limbs(values):
+    """
+    Splits a list of non-negative Python ints into a limb column
+    """
+    num_limbs = max(1, -(-max(values, default=0).bit_length() // LIMB_BITS))
+    data = b"".join(map(int.to_bytes, values, repeat(num_limbs * 4), repeat("little")))
+    limbs = np.frombuffer(data, dtype="<u4").reshape(len(values), num_limbs)
+    return limbs.T.astype(np.uint64)
+
+
+def from_limbs(limbs):
+    """
+    Joins a limb column back into a list of Python ints
+    """
+    data = np.ascontiguousarray(limbs.T, dtype="<u4").tobytes()
+    width = len(limbs) * 4
+    return [
+        int.from_bytes(data[i : i + width], "little")
+        for i in range(0, len(data), width)
+    ]
+
+
+def _carry(limbs):
+    # Moves the bits above LIMB_BITS of each limb into the next one, in place
+    for k in range(len(limbs) - 1):
+        limbs[k + 1] += limbs[k] >> _LIMB_SHIFT
+        limbs[k] &= _LIMB_MASK
+    return limbs
+
+
+def add(x, y):
+    num_limbs = max(len(x), len(y)) + 1
+    return _trim(_carry(_pad(x, num_limbs) + _pad(y, num_limbs)))
+
+
+def sub(x, y):
+    """
+    x - y for limb columns with x >= y in every row
+    """
+    limbs = x.astype(np.int64) - _pad(y, len(x)).astype(np.int64)
+    for k in range(len(limbs) - 1):
+        # A negative limb borrows 1 from the next one
+        limbs[k + 1] += limbs[k] >> LIMB_BITS
+        limbs[k] &= (1 << LIMB_BITS) - 1
+    return _trim(limbs.astype(np.uint64))
+
+
+def _mul(x, factors):
+    # x times a factor below 2**61 per row, with each limb product split in two words
+    factors = np.asarray(factors, dtype=np.uint64)
+    low = x * (factors & _LIMB_MASK)
+    high = x * (factors >> _LIMB_SHIFT)
+
+    product = np.zeros((len(x) + 2, x.shape[1]), dtype=np.uint64)
+    product[:-2] = low & _LIMB_MASK
+    product[1:-1] += (low >> _LIMB_SHIFT) + (high & _LIMB_MASK)
+    product[2:] += high >> _LIMB_SHIFT
+    return _trim(_carry(product))
+
+
+def _divmod(x, divisors):
+    # Long division of x by a divisor below 2**61 per row, one limb at a time. Each
+    # quotient limb is estimated in floating point, which is off by at most 1, and then
+    # corrected with the exact remainder
+    divisors = np.broadcast_to(np.asarray(divisors, dtype=np.int64), x.shape[1:])
+    reciprocals = 1 / divisors.astype(np.float64)
+    divisors_high = divisors >> LIMB_BITS
+    divisors_low = (divisors & ((1 << LIMB_BITS) - 1)).astype(np.uint64)
+
+    quotient = np.empty_like(x)
+    remainder = np.zeros(x.shape[1:], dtype=np.int64)
+    for k in range(len(x) - 1, -1, -1):
+        limb = x[k].astype(np.int64)
+        estimate = remainder * float(1 << LIMB_BITS)
+        estimate += limb
+        estimate *= reciprocals
+        estimate = np.minimum(estimate.astype(np.int64), (1 << LIMB_BITS) - 1)
+
+        # remainder * 2**32 + limb - estimate * divisor, which is within one divisor of
+        # the true remainder and so fits in an int64
+        low_product = estimate.astype(np.uint64) * divisors_low
+        remainder -= estimate * divisors_high
+        remainder -= (low_product >> _LIMB_SHIFT).astype(np.int64)
+        remainder <<= LIMB_BITS
+        remainder += limb
+        remainder -= (low_product & _LIMB_MASK).astype(np.int64)
+
+        under = remainder < 0
+        estimate -= under
+        remainder += under * divisors
+        over = remainder >= divisors
+        estimate += over
+        remainder -= over * divisors
+
+        quotient[k] = estimate
+    return quotient, remainder
+
+
+def mul_div(x, numerators, denominators, round_up=False):
+    """
+    x * numerator // denominator for each row of a limb column, or the ceiling with
+    round_up set. Numerators and denominators are below 2**61 and may be scalars or a
+    column of int64 values
+    """
+    quotient, remainder = _divmod(_mul(x, numerators), denominators)
+    if round_up:
+        # A nonzero remainder means the denominator is above 1, so the quotient is at
+        # most half the product and rounding it up cannot carry past its top limb
+        quotient[0] += remainder != 0
+        _carry(quotient)
+    return _trim(quotient)
+
+
+def min_preimage(amounts, numerators):
+    """
+    Smallest x with x * numerator // FEE_DENOM == amount, for each row. This is the raw
+    amount before a fee of FEE_DENOM - numerator was taken, and is within 1 wei of it
+    whenever the fee is at most half of FEE_DENOM
+    """
+    return mul_div(amounts, FEE_DENOM, numerators, round_up=True)
+
+
+def events_to_columns(events, exclude_senders=()):
+    """
+    Flattens (block number, SwapEvent or SwapMultiEvent) pairs into columns with a row per
+    output token. Events from exclude_senders, such as the owner's swapRouterFunds calls,
+    are skipped. slippage is the positive slippage kept by swap, or 0
+    """
+    exclude_senders = {sender.lower() for sender in exclude_senders}
+
+    blocks = []
+    tokens = []
+    amounts_out = []
+    slippages = []
+    referral_codes = []
+    multi = []
+
+    for block, event in events:
+        if exclude_senders and event.sender.lower() in exclude_senders:
+            continue
+
+        if isinstance(event, SwapEvent):
+            blocks.append(block)
+            tokens.append(event.output_token.lower())
+            amounts_out.append(event.amount_out)
+            slippages.append(max(event.slippage, 0))
+            referral_codes.append(event.referral_code)
+            multi.append(False)
+        else:
+            num_outputs = len(event.tokens_out)
+            blocks.extend([block] * num_outputs)
+            tokens.extend(token.lower() for token in event.tokens_out)
+            amounts_out.extend(event.amounts_out)
+            slippages.extend([0] * num_outputs)
+            referral_codes.extend([event.referral_code] * num_outputs)
+            multi.extend([True] * num_outputs)
+
+    return {
+        "block": np.array(blocks, dtype=np.int64),
+        "token": np.array(tokens, dtype="U42"),
+        "amount_out": to_limbs(amounts_out),
+        "slippage": to_limbs(slippages),
+        "referral_code": np.array(referral_codes, dtype=np.int64),
+        "multi": np.array(multi, dtype=bool),
+    }
+
+
+def logs_to_events(logs):
+    """
+    Decodes router logs into the (block number, event) pairs read by events_to_columns
+    """
+    events = []
+    for log in logs:
+        event = decode_router_log(log)
+        if event is not None:
+            events.append((log["blockNumber"], event))
+
+    return events
+
+
+def referral_fee_column(referral_codes, referral_fees):
+    """
+    referralFee of each row's referral code, or 0 for codes without a fee, including
+    codes above the threshold that are missing from referral_fees
+    """
+    codes, inverse = np.unique(referral_codes, return_inverse=True)
+    fees = np.array(
+        [
+            referral_fees.get(code, 0) if code > REFERRAL_WITH_FEE_THRESHOLD else 0
+            for code in codes.tolist()
+        ],
+        dtype=np.int64,
+    )
+    return fees[inverse]
+
+
+def _swap_multi_fee_column(blocks, swap_multi_fee):
+    # A fee schedule is a list of (first block, fee) pairs in block order
+    if isinstance(swap_multi_fee, int):
+        return np.full(len(blocks), swap_multi_fee, dtype=np.int64)
+
+    first_blocks = np.array([block for block, fee in swap_multi_fee], dtype=np.int64)
+    fees = np.array([fee for block, fee in swap_multi_fee], dtype=np.int64)
+
+    return fees[np.searchsorted(first_blocks, blocks, side="right") - 1]
+
+
+def revenue_columns(columns, referral_fees, swap_multi_fee):
+    """
+    Computes the revenue components of each row as limb columns. referral_fees maps
+    referral codes with a fee to their referralFee, and swap_multi_fee is either the fee
+    or a schedule of (first block, fee) pairs
+    """
+    referral_fee = referral_fee_column(columns["referral_code"], referral_fees)
+    multi_fee = np.where(
+        columns["multi"],
+        _swap_multi_fee_column(columns["block"], swap_multi_fee),
+        0,
+    )
+
+    # Swap caps the amount out at the quote and keeps the positive slippage
+    after_referral_fee = add(columns["amount_out"], columns["slippage"])
+
+    # Undo the referral fee and then the swapMultiFee to recover the raw amount out
+    after_multi_fee = min_preimage(after_referral_fee, FEE_DENOM - referral_fee)
+    raw_amount_out = min_preimage(after_multi_fee, FEE_DENOM - multi_fee)
+
+    # The beneficiary's share is paid out of the referral fee, and the rest of the fee
+    # is kept. 8 / (FEE_DENOM * 10) is taken as 1 / (FEE_DENOM * 10 // 8) to keep the
+    # denominator below 2**61
+    beneficiary_share = mul_div(after_multi_fee, referral_fee, FEE_DENOM * 10 // 8)
+
+    return {
+        "slippage": columns["slippage"],
+        "swap_multi_fee": sub(raw_amount_out, after_multi_fee),
+        "referral_fee": sub(
+            sub(after_multi_fee, after_referral_fee), beneficiary_share
+        ),
+    }
+
+
+def _join_limb_sums(sums):
+    # Limb sums of fewer than 2**32 rows fit in uint64, and are shifted into place and
+    # added as Python ints once per group
+    totals = np.zeros(sums.shape[1], dtype=object)
+    for k in range(len(sums)):
+        totals += sums[k].astype(object) << (LIMB_BITS * k)
+    return totals
+
+
+def _group_rows(keys):
+    # Numbers the distinct keys of the rows. Key fields are numbered one at a time, with
+    # string fields such as token addresses numbered through a dict, which is much faster
+    # than sorting long strings when few of them are distinct
+    groups = np.zeros(len(keys), dtype=np.int64)
+    for name in keys.dtype.names or [None]:
+        values = keys if name is None else keys[name]
+        if values.dtype.kind == "U":
+            numbers = {}
+            field_groups = np.array(
+                [numbers.setdefault(value, len(numbers)) for value in values.tolist()],
+                dtype=np.int64,
+            )
+        else:
+            field_groups = np.unique(values, return_inverse=True)[1].reshape(-1)
+
+        groups = np.unique(
+            groups * (field_groups.max() + 1) + field_groups, return_inverse=True
+        )[1].reshape(-1)
+
+    return groups
+
+
+def aggregate(keys, revenue):
+    """
+    Sums limb columns of revenue components over rows with the same key. Returns the
+    unique keys in sorted order and a dict of summed components, as object arrays of
+    Python ints
+    """
+    if len(keys) == 0:
+        return keys[:0], {name: np.array([], dtype=object) for name in revenue}
+
+    groups = _group_rows(keys)
+    order = np.argsort(groups, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(groups[order]) != 0])
+
+    # Sort the few distinct keys rather than every row
+    unique_keys = keys[order[starts]]
+    key_order = np.argsort(unique_keys, kind="stable")
+
+    return unique_keys[key_order], {
+        name: _join_limb_sums(np.add.reduceat(values[:, order], starts, axis=1))[
+            key_order
+        ]
+        for name, values in revenue.items()
+    }
+
+
+class RevenueLedger:
+    """
+    Running per token and period totals of router revenue, updated incrementally as new
+    blocks of events arrive. period_of maps an array of block numbers to an array of
+    integer periods, e.g. blocks // 7200 for days on Ethereum
+    """
+
+    def __init__(
+        self,
+        referral_fees,
+        swap_multi_fee,
+        period_of=lambda blocks: blocks,
+        exclude_senders=(),
+    ):
+        self.referral_fees = referral_fees
+        self.swap_multi_fee = swap_multi_fee
+        self.period_of = period_of
+        self.exclude_senders = exclude_senders
+        self.last_block = -1
+        self.totals = {}
+
+    def update(self, events):
+        """
+        Adds (block number, event) pairs, which must cover whole blocks. Blocks at or
+        below the last block already added are skipped, so overlapping ranges can be
+        passed safely
+        """
+        columns = events_to_columns(
+            [item for item in events if item[0] > self.last_block],
+            self.exclude_senders,
+        )
+        if len(columns["block"]) == 0:
+            return
+
+        revenue = revenue_columns(columns, self.referral_fees, self.swap_multi_fee)
+
+        keys = np.empty(
+            len(columns["block"]), dtype=[("token", "U42"), ("period", "i8")]
+        )
+        keys["token"] = columns["token"]
+        keys["period"] = self.period_of(columns["block"])
+        unique_keys, sums = aggregate(keys, revenue)
+
+        for i, (token, period) in enumerate(unique_keys.tolist()):
+            total = self.totals.setdefault(
+                (token, period), dict.fromkeys(REVENUE_COMPONENTS, 0)
+            )
+            for name in REVENUE_COMPONENTS:
+                total[name] += sums[name][i]
+
+        self.last_block = max(self.last_block, int(columns["block"].max()))
+
+    def token_totals(self):
+        """
+        Total revenue of each token over all periods
+        """
+        totals = {}
+        for (token, period), total in self.totals.items():
+            token_total = totals.setdefault(token, dict.fromkeys(REVENUE_COMPONENTS, 0))
+            for name in REVENUE_COMPONENTS:
+                token_total[name] += total[name]
+
+        return totals
@@ -0,0 +1,42 @@
+import json
+import os
+
+
+# Prints rows of benchmark results as an aligned table
+def print_table(headers, rows):
+    rows = [[str(value) for value in row] for row in rows]
+    widths = [
+        max(len(str(header)), *(len(row[i]) for row in rows))
+        for i, header in enumerate(headers)
+    ]
+    print()
+    print("  ".join(str(header).rjust(widths[i]) for i, header in enumerate(headers)))
+    for row in rows:
+        print("  ".join(value.rjust(widths[i]) for i, value in enumerate(row)))
+
+
+# Saves benchmark results to the file in ODOS_BENCH_OUTPUT, if set, so that runs
+# against different builds of the contracts can be compared with compare_results
+def save_results(name, results):
+    output_path = os.environ.get("ODOS_BENCH_OUTPUT")
+    if output_path is None:
+        return
+
+    all_results = {}
+    if os.path.exists(output_path):
+        with open(output_path, "r") as f:
+            all_results = json.load(f)
+
+    all_results[name] = results
+    with open(output_path, "w") as f:
+        json.dump(all_results, f, indent=2, sort_keys=True)
+
+
+# Loads the results of a benchmark saved by a previous run from the file in ODOS_BENCH_BASELINE
+def load_baseline(name):
+    baseline_path = os.environ.get("ODOS_BENCH_BASELINE")
+    if baseline_path is None or not os.path.exists(baseline_path):
+        return None
+
+    with open(baseline_path, "r") as f:
+        return json.load(f).get(name)
@@ -0,0 +1,536 @@
+import asyncio
+import time
+from typing import NamedTuple, Optional, Tuple
+
+from lib import abi_encoder, encode_compact, limits, metrics, prefetch, storage_layout
+from lib.multichain import ChainClient, RPCError, function_selector
+from web3 import Web3
+
+# Async service that turns swap specs into ready to send router calls for any of the six
+# swap endpoints. Identical specs that are in flight at the same time share one build,
+# and the node reads of builds started within a short window are sent as a single
+# JSON-RPC batch
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+SWAP_TOKEN_INFO = "(address,uint256,address,address,uint256,uint256,address)"
+INPUT_TOKEN_INFO = "(address,uint256,address)"
+OUTPUT_TOKEN_INFO = "(address,uint256,address)"
+PERMIT2_INFO = "(address,uint256,uint256,bytes)"
+
+ENDPOINT_TYPES = {
+    "swap": [SWAP_TOKEN_INFO, "bytes", "address", "uint32"],
+    "swapPermit2": [PERMIT2_INFO, SWAP_TOKEN_INFO, "bytes", "address", "uint32"],
+    "swapMulti": [
+        INPUT_TOKEN_INFO + "[]",
+        OUTPUT_TOKEN_INFO + "[]",
+        "uint256",
+        "bytes",
+        "address",
+        "uint32",
+    ],
+    "swapMultiPermit2": [
+        PERMIT2_INFO,
+        INPUT_TOKEN_INFO + "[]",
+        OUTPUT_TOKEN_INFO + "[]",
+        "uint256",
+        "bytes",
+        "address",
+        "uint32",
+    ],
+    "swapCompact": [],
+    "swapMultiCompact": [],
+}
+ENDPOINT_SELECTORS = {
+    endpoint: abi_encoder.SELECTORS[endpoint].hex() for endpoint in ENDPOINT_TYPES
+}
+ENCODERS = {
+    "swap": abi_encoder.encode_swap,
+    "swapPermit2": abi_encoder.encode_swap_permit2,
+    "swapMulti": abi_encoder.encode_swap_multi,
+    "swapMultiPermit2": abi_encoder.encode_swap_multi_permit2,
+}
+COMPACT_ENDPOINTS = ["swapCompact", "swapMultiCompact"]
+PERMIT2_ENDPOINTS = ["swapPermit2", "swapMultiPermit2"]
+
+BALANCE_OF_SELECTOR = function_selector("balanceOf(address)")
+ALLOWANCE_SELECTOR = function_selector("allowance(address,address)")
+NONCE_BITMAP_SELECTOR = function_selector("nonceBitmap(address,uint256)")
+
+# Gas hints for the router's own work, excluding the executor's path, as a base cost per
+# endpoint plus a cost per input and output token. These are upper bounds with every
+# token and account cold
+BASE_GAS = {
+    "swap": 60_000,
+    "swapCompact": 60_000,
+    "swapPermit2": 90_000,
+    "swapMulti": 70_000,
+    "swapMultiCompact": 70_000,
+    "swapMultiPermit2": 100_000,
+}
+INPUT_GAS = 35_000
+OUTPUT_GAS = 40_000
+
+
+class SwapSpec(NamedTuple):
+    endpoint: str
+    sender: str
+    input_tokens: Tuple[str, ...]
+    input_amounts: Tuple[int, ...]
+    output_tokens: Tuple[str, ...]
+    output_quotes: Tuple[int, ...]
+    max_slippage_percent: float
+    executor: str
+    path_definition: str
+    referral_code: int = 0
+    # Defaults to the executor for every input
+    input_receivers: Optional[Tuple[str, ...]] = None
+    # Defaults to the sender for every output
+    output_receivers: Optional[Tuple[str, ...]] = None
+    # Defaults to 1 for every output, only used by multi swaps
+    relative_values: Optional[Tuple[int, ...]] = None
+    # (Permit2 contract, nonce, deadline, signature), only used by Permit2 endpoints
+    permit2: Optional[Tuple] = None
+
+
+class RouterCall(NamedTuple):
+    to: str
+    data: str
+    value: int
+    gas: int
+    # ERC20 inputs whose allowance for the router, or for the Permit2 contract on Permit2
+    # endpoints, is below the input amount
+    approvals_needed: Tuple[str, ...]
+    # Inputs the sender holds less of than the input amount
+    shortfalls: Tuple[str, ...]
+    # Whether the Permit2 nonce of a Permit2 endpoint is already used, so that the
+    # signature would be rejected
+    permit2_nonce_used: bool = False
+
+
+class _ReadBatcher:
+    # Collects the reads made within window seconds of the first one and sends them as a
+    # single batch, with identical reads sent once
+
+    def __init__(self, client, window):
+        self.client = client
+        self.window = window
+        self.pending = {}
+        self.batches = 0
+
+    def read(self, method, params):
+        key = (method, repr(params))
+        if key not in self.pending:
+            if not self.pending:
+                asyncio.get_running_loop().call_later(
+                    self.window, lambda: asyncio.ensure_future(self._flush())
+                )
+            self.pending[key] = (
+                method,
+                params,
+                asyncio.get_running_loop().create_future(),
+            )
+        return self.pending[key][2]
+
+    async def _flush(self):
+        pending = list(self.pending.values())
+        self.pending = {}
+        self.batches += 1
+
+        try:
+            results = await self.client.request_batch(
+                [(method, params) for method, params, future in pending]
+            )
+        except Exception as e:
+            for method, params, future in pending:
+                future.set_exception(e)
+            return
+
+        for (method, params, future), result in zip(pending, results):
+            if isinstance(result, RPCError):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def _output_min(output_quote, max_slippage_percent):
+    # The same minimum the compact decoder derives from the slippage tolerance
+    return limits.output_mins(
+        [output_quote], limits.slippage_tolerances([max_slippage_percent])
+    )[0]
+
+
+def _value_out_min(spec, relative_values):
+    value = sum(
+        relative_value * quote
+        for relative_value, quote in zip(relative_values, spec.output_quotes)
+    )
+    return _output_min(value, spec.max_slippage_percent)
+
+
+def _encode(spec, input_receivers, output_receivers, relative_values):
+    path_definition = bytes.fromhex(spec.path_definition[2:])
+    executor = Web3.to_checksum_address(spec.executor)
+
+    if spec.endpoint in ["swap", "swapPermit2"]:
+        args = [
+            (
+                spec.input_tokens[0],
+                spec.input_amounts[0],
+                input_receivers[0],
+                spec.output_tokens[0],
+                spec.output_quotes[0],
+                _output_min(spec.output_quotes[0], spec.max_slippage_percent),
+                output_receivers[0],
+            ),
+            path_definition,
+            executor,
+            spec.referral_code,
+        ]
+    else:
+        args = [
+            list(zip(spec.input_tokens, spec.input_amounts, input_receivers)),
+            list(zip(spec.output_tokens, relative_values, output_receivers)),
+            _value_out_min(spec, relative_values),
+            path_definition,
+            executor,
+            spec.referral_code,
+        ]
+
+    if spec.endpoint in PERMIT2_ENDPOINTS:
+        contract, nonce, deadline, signature = spec.permit2
+        args = [(contract, nonce, deadline, bytes.fromhex(signature[2:]))] + args
+
+    return "0x" + ENCODERS[spec.endpoint](*args).hex()
+
+
+def _encode_compact(
+    spec,
+    address_list,
+    address_table,
+    input_receivers,
+    output_receivers,
+    relative_values,
+):
+    # The compact encoders match addresses against the address list and table as
+    # strings, and mark a sender receiver with a placeholder
+    address_list = [address.lower() for address in address_list]
+    address_table = [[address.lower() for address in chunk] for chunk in address_table]
+    executor = spec.executor.lower()
+    input_tokens = [token.lower() for token in spec.input_tokens]
+    output_tokens = [token.lower() for token in spec.output_tokens]
+    input_dests = [receiver.lower() for receiver in input_receivers]
+    output_dests = [
+        "msg.sender" if receiver == spec.sender else receiver.lower()
+        for receiver in output_receivers
+    ]
+
+    if spec.endpoint == "swapCompact":
+        compact_data = encode_compact.construct_compact_swap_data(
+            spec.path_definition,
+            input_tokens[0],
+            output_tokens[0],
+            spec.input_amounts[0],
+            spec.output_quotes[0],
+            spec.max_slippage_percent,
+            executor,
+            input_dests[0],
+            output_dests[0],
+            address_list,
+            spec.referral_code,
+            address_table=address_table,
+        )
+    else:
+        compact_data = encode_compact.construct_compact_swap_multi_data(
+            spec.path_definition,
+            input_tokens,
+            output_tokens,
+            list(spec.input_amounts),
+            list(spec.output_quotes),
+            list(relative_values),
+            spec.max_slippage_percent,
+            executor,
+            input_dests,
+            output_dests,
+            address_list,
+            spec.referral_code,
+            address_table=address_table,
+        )
+
+    return "0x" + ENDPOINT_SELECTORS[spec.endpoint] + compact_data[2:]
+
+
+def encode_spec(spec, address_list=(), address_table=()):
+    """
+    Calldata of the router call for a spec, without reading anything from the node.
+    Compact endpoints are encoded against address_list, the router's address list, and
+    address_table, its address table chunks
+    """
+    input_receivers = spec.input_receivers or (spec.executor,) * len(spec.input_tokens)
+    output_receivers = spec.output_receivers or (spec.sender,) * len(spec.output_tokens)
+    relative_values = spec.relative_values or (1,) * len(spec.output_tokens)
+
+    if spec.endpoint in COMPACT_ENDPOINTS:
+        return _encode_compact(
+            spec,
+            address_list,
+            address_table,
+            input_receivers,
+            output_receivers,
+            relative_values,
+        )
+    return _encode(spec, input_receivers, output_receivers, relative_values)
+
+
+class CalldataService:
+    """
+    Builds router calls for swap specs against the router at router_address, reading
+    allowances, balances and the address list from the node at rpc_url. Reads made
+    within batch_window seconds of each other share a batch, and the address list is
+    reread at most every address_list_ttl seconds. With a prefetch.PrefetchCache, the
+    balances, allowances and Permit2 nonce bitmaps of every spec passed to build_many
+    are fetched together in one aggregated eth_call at the latest block first, and only
+    those builds use them, so a build never reads a value older than the head. With a gas_model.GasModel, the gas of each call is the
+    model's limit for the whole call, including the paths of executors named in
+    executor_names by address, instead of the hint for the router's own work
+    """
+
+    def __init__(
+        self,
+        rpc_url,
+        router_address,
+        batch_window=0.002,
+        address_list_ttl=60,
+        prefetch_cache=None,
+        gas_model=None,
+        executor_names=None,
+    ):
+        self.router = Web3.to_checksum_address(router_address)
+        self.client = ChainClient("router", None, self.router, rpc_url)
+        self.batcher = _ReadBatcher(self.client, batch_window)
+        self.address_list_ttl = address_list_ttl
+        self.prefetch_cache = prefetch_cache
+        self.gas_model = gas_model
+        self.executor_names = {
+            address.lower(): name for address, name in (executor_names or {}).items()
+        }
+
+        self.in_flight = {}
+        self.builds = 0
+        self._address_list = None
+        self._address_list_time = 0
+
+    async def close(self):
+        await self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _call(self, to, data):
+        result = await self.batcher.read(
+            "eth_call", [{"to": to, "data": data}, "latest"]
+        )
+        return int(result, 16) if result != "0x" else 0
+
+    async def _balance(self, token, account, prefetched):
+        cached = prefetched.get(prefetch.balance_read(token, account))
+        if cached is not None:
+            return cached
+        if token == ETH:
+            return int(
+                await self.batcher.read("eth_getBalance", [account, "latest"]), 16
+            )
+        return await self._call(
+            token, "0x" + BALANCE_OF_SELECTOR + bytes(12).hex() + account[2:].lower()
+        )
+
+    async def _allowance(self, token, owner, spender, prefetched):
+        cached = prefetched.get(prefetch.allowance_read(token, owner, spender))
+        if cached is not None:
+            return cached
+        return await self._call(
+            token,
+            "0x"
+            + ALLOWANCE_SELECTOR
+            + bytes(12).hex()
+            + owner[2:].lower()
+            + bytes(12).hex()
+            + spender[2:].lower(),
+        )
+
+    async def _nonce_bitmap(self, permit2_contract, owner, nonce, prefetched):
+        cached = prefetched.get(
+            prefetch.nonce_bitmap_read(permit2_contract, owner, nonce)
+        )
+        if cached is not None:
+            return cached
+        return await self._call(
+            permit2_contract,
+            "0x"
+            + NONCE_BITMAP_SELECTOR
+            + bytes(12).hex()
+            + owner[2:].lower()
+            + (nonce >> 8).to_bytes(32, "big").hex(),
+        )
+
+    async def _read_slot(self, slot):
+        return int(
+            await self.batcher.read(
+                "eth_getStorageAt", [self.router, hex(slot), "latest"]
+            ),
+            16,
+        )
+
+    async def address_list(self):
+        """
+        The router's address list, cached for address_list_ttl seconds. A read that
+        fails is not cached
+        """
+        now = time.monotonic()
+        if (
+            self._address_list is None
+            or now - self._address_list_time > self.address_list_ttl
+        ):
+            self._address_list_time = now
+            self._address_list = asyncio.ensure_future(self._read_address_list())
+            self._address_list.add_done_callback(self._evict_failed_address_list)
+
+        return await self._address_list
+
+    def _evict_failed_address_list(self, future):
+        # A failed read is not kept for the rest of the TTL, so the next build reads the
+        # list again instead of raising the same error
+        if self._address_list is future and (
+            future.cancelled() or future.exception() is not None
+        ):
+            self._address_list = None
+
+    async def _read_address_list(self):
+        length = await self._read_slot(storage_layout.ADDRESS_LIST_SLOT)
+        values = await asyncio.gather(
+            *(
+                self._read_slot(storage_layout.address_list_slot(i))
+                for i in range(length)
+            )
+        )
+        return [Web3.to_checksum_address(value.to_bytes(20, "big")) for value in values]
+
+    async def build(self, spec, prefetched=None):
+        """
+        Builds the router call for a spec. A spec that is already being built waits for
+        and shares that build. prefetched maps prefetch reads to values fetched for this
+        build at the latest block, and every other value is read from the node
+        """
+        if spec not in self.in_flight:
+            self.in_flight[spec] = asyncio.ensure_future(
+                self._build(spec, prefetched or {})
+            )
+            self.in_flight[spec].add_done_callback(
+                lambda f: self.in_flight.pop(spec, None)
+            )
+
+        return await asyncio.shield(self.in_flight[spec])
+
+    async def build_many(self, specs):
+        prefetched = {}
+        if self.prefetch_cache is not None:
+            reads = [
+                read
+                for spec in specs
+                for read in prefetch.swap_reads(
+                    spec.sender,
+                    spec.input_tokens,
+                    self.router,
+                    spec.permit2 if spec.endpoint in PERMIT2_ENDPOINTS else None,
+                )
+            ]
+            # Fetched at the latest block, which also clears values of older blocks
+            values = await self.prefetch_cache.fetch(reads)
+            prefetched = {
+                read: value for read, value in zip(reads, values) if value is not None
+            }
+        return await asyncio.gather(*(self.build(spec, prefetched) for spec in specs))
+
+    async def _build(self, spec, prefetched):
+        self.builds += 1
+        with metrics.timer("build", spec.endpoint):
+            return await self._build_call(spec, prefetched)
+
+    async def _build_call(self, spec, prefetched):
+        # Permit2 endpoints pull tokens through Permit2, which needs the allowance instead
+        spender = spec.permit2[0] if spec.endpoint in PERMIT2_ENDPOINTS else self.router
+        erc20_inputs = [
+            (token, amount)
+            for token, amount in zip(spec.input_tokens, spec.input_amounts)
+            if token != ETH
+        ]
+        reads = [
+            self._balance(token, spec.sender, prefetched)
+            for token, amount in zip(spec.input_tokens, spec.input_amounts)
+        ]
+        reads += [
+            self._allowance(token, spec.sender, spender, prefetched)
+            for token, amount in erc20_inputs
+        ]
+        if spec.endpoint in PERMIT2_ENDPOINTS:
+            reads.append(
+                self._nonce_bitmap(spender, spec.sender, spec.permit2[1], prefetched)
+            )
+        if spec.endpoint in COMPACT_ENDPOINTS:
+            reads.append(self.address_list())
+
+        results = await asyncio.gather(*reads)
+
+        balances = results[: len(spec.input_tokens)]
+        shortfalls = tuple(
+            token
+            for token, amount, balance in zip(
+                spec.input_tokens, spec.input_amounts, balances
+            )
+            if balance < amount
+        )
+        allowances = results[
+            len(spec.input_tokens) : len(spec.input_tokens) + len(erc20_inputs)
+        ]
+        approvals_needed = tuple(
+            token
+            for (token, amount), allowance in zip(erc20_inputs, allowances)
+            if allowance < amount
+        )
+
+        permit2_nonce_used = spec.endpoint in PERMIT2_ENDPOINTS and prefetch.nonce_used(
+            results[-1], spec.permit2[1]
+        )
+        address_list = results[-1] if spec.endpoint in COMPACT_ENDPOINTS else ()
+        data = encode_spec(spec, address_list)
+
+        value = sum(
+            amount
+            for token, amount in zip(spec.input_tokens, spec.input_amounts)
+            if token == ETH
+        )
+        if self.gas_model is not None:
+            gas = self.gas_model.estimate(
+                spec,
+                data,
+                address_list,
+                self.executor_names.get(spec.executor.lower()),
+            ).limit
+        else:
+            gas = (
+                BASE_GAS[spec.endpoint]
+                + INPUT_GAS * len(spec.input_tokens)
+                + OUTPUT_GAS * len(spec.output_tokens)
+            )
+        return RouterCall(
+            self.router,
+            data,
+            value,
+            gas,
+            approvals_needed,
+            shortfalls,
+            permit2_nonce_used,
+        )
@@ -0,0 +1,385 @@
+import multiprocessing
+from typing import NamedTuple, Optional, Tuple
+
+from eth_abi import decode
+from lib.abi_encoder import SELECTORS, SIGNATURES
+from lib.metrics import instrumented
+from lib.utils import ADDRESS_TABLE_FLAG, EXPONENT_AMOUNT_FLAG
+
+# Classifies transactions sent to the router and decodes them into records. Transactions
+# are dispatched on their selector, swaps are decoded by hand from either the ABI or the
+# compact layout, with compact address codes resolved against a local mirror of the
+# router's address list and address table, and every other router function is decoded
+# with eth_abi. Blocks can be classified as a stream, or in several processes for
+# backfills
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+FUNCTIONS = {selector: name for name, selector in SELECTORS.items()}
+
+
+class SwapRecord(NamedTuple):
+    hash: str
+    block: int
+    sender: str
+    function: str
+    value: int
+    # (token, amount, receiver) for every input
+    inputs: Tuple[Tuple[str, int, str], ...]
+    # (token, quote, receiver) for the output of a single swap, or (token, relative
+    # value, receiver) for every output of a multi swap
+    outputs: Tuple[Tuple[str, int, str], ...]
+    # outputMin of a single swap, or valueOutMin of a multi swap
+    min_out: int
+    executor: str
+    referral_code: int
+    path_definition: bytes
+    # (Permit2 contract, nonce, deadline, signature) of Permit2 swaps
+    permit2: Optional[Tuple[str, int, int, bytes]] = None
+
+
+class CallRecord(NamedTuple):
+    hash: str
+    block: int
+    sender: str
+    # The router function called, or None if the selector is unknown
+    function: Optional[str]
+    value: int
+    # The decoded arguments, or None if they could not be decoded
+    args: Optional[tuple]
+
+
+def _split_types(signature):
+    # Splits the argument types of a signature at the commas outside of tuples
+    arguments = signature[signature.index("(") + 1 : -1]
+    types = []
+    depth = 0
+    start = 0
+    for i, char in enumerate(arguments):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            types.append(arguments[start:i])
+            start = i + 1
+    if arguments:
+        types.append(arguments[start:])
+    return types
+
+
+ARGUMENT_TYPES = {
+    name: _split_types(signature) for name, signature in SIGNATURES.items()
+}
+
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        return int(value, 16)
+    return value
+
+
+# ABI layout, where data excludes the selector and word indices are relative to start
+
+
+def _word(data, start, index):
+    end = start + index * 32 + 32
+    if end > len(data):
+        raise ValueError("Calldata too short")
+    return int.from_bytes(data[end - 32 : end], "big")
+
+
+def _abi_address(data, start, index):
+    end = start + index * 32 + 32
+    if end > len(data):
+        raise ValueError("Calldata too short")
+    return "0x" + data[end - 20 : end].hex()
+
+
+def _abi_bytes(data, start, offset):
+    length = _word(data, start + offset, 0)
+    if start + offset + 32 + length > len(data):
+        raise ValueError("Calldata too short")
+    return data[start + offset + 32 : start + offset + 32 + length]
+
+
+def _abi_token_infos(data, offset):
+    length = _word(data, offset, 0)
+    return tuple(
+        (
+            _abi_address(data, offset, 1 + 3 * i),
+            _word(data, offset, 2 + 3 * i),
+            _abi_address(data, offset, 3 + 3 * i),
+        )
+        for i in range(length)
+    )
+
+
+def _abi_permit2(data, offset):
+    return (
+        _abi_address(data, offset, 0),
+        _word(data, offset, 1),
+        _word(data, offset, 2),
+        _abi_bytes(data, offset, _word(data, offset, 3)),
+    )
+
+
+def _decode_swap(data, head):
+    # Decodes swap's arguments, which start at word head of swapPermit2
+    inputs = (
+        (
+            _abi_address(data, 0, head),
+            _word(data, 0, head + 1),
+            _abi_address(data, 0, head + 2),
+        ),
+    )
+    outputs = (
+        (
+            _abi_address(data, 0, head + 3),
+            _word(data, 0, head + 4),
+            _abi_address(data, 0, head + 6),
+        ),
+    )
+    return (
+        inputs,
+        outputs,
+        _word(data, 0, head + 5),
+        _abi_address(data, 0, head + 8),
+        _word(data, 0, head + 9),
+        _abi_bytes(data, 0, _word(data, 0, head + 7)),
+    )
+
+
+def _decode_swap_multi(data, head):
+    # Decodes swapMulti's arguments, which start at word head of swapMultiPermit2
+    return (
+        _abi_token_infos(data, _word(data, 0, head)),
+        _abi_token_infos(data, _word(data, 0, head + 1)),
+        _word(data, 0, head + 2),
+        _abi_address(data, 0, head + 4),
+        _word(data, 0, head + 5),
+        _abi_bytes(data, 0, _word(data, 0, head + 3)),
+    )
+
+
+# Compact layout, read the same way as the router's getAddress and getAmount
+
+
+def _compact_address(data, pos, address_list, address_table):
+    code = (data[pos] << 8) | data[pos + 1]
+    if code == 0:
+        return ETH, pos + 2
+    if code == 1:
+        if pos + 22 > len(data):
+            raise ValueError("Calldata too short")
+        return "0x" + data[pos + 2 : pos + 22].hex(), pos + 22
+    if code & ADDRESS_TABLE_FLAG:
+        return address_table[(code >> 8) & 0x7F][code & 0xFF], pos + 2
+    return address_list[code - 2], pos + 2
+
+
+def _compact_amount(data, pos):
+    length = data[pos]
+    if length & EXPONENT_AMOUNT_FLAG:
+        length &= 0x7F
+        exponent = data[pos + 1]
+        mantissa = int.from_bytes(data[pos + 2 : pos + 2 + length], "big")
+        return mantissa * 10**exponent, pos + 2 + length
+    return int.from_bytes(data[pos + 1 : pos + 1 + length], "big"), pos + 1 + length
+
+
+def _compact_tail(data, pos):
+    referral_code = int.from_bytes(data[pos : pos + 4], "big")
+    num_words = data[pos + 4]
+    path_definition = data[pos + 5 : pos + 5 + 32 * num_words]
+    if len(path_definition) != 32 * num_words:
+        raise ValueError("Calldata too short")
+    return referral_code, path_definition
+
+
+def _decode_swap_compact(data, sender, address_list, address_table):
+    input_token, pos = _compact_address(data, 0, address_list, address_table)
+    output_token, pos = _compact_address(data, pos, address_list, address_table)
+    input_amount, pos = _compact_amount(data, pos)
+    output_quote, pos = _compact_amount(data, pos)
+    tolerance = int.from_bytes(data[pos : pos + 3], "big")
+    executor, pos = _compact_address(data, pos + 3, address_list, address_table)
+    input_receiver, pos = _compact_address(data, pos, address_list, address_table)
+    output_receiver, pos = _compact_address(data, pos, address_list, address_table)
+    referral_code, path_definition = _compact_tail(data, pos)
+
+    if input_receiver == ETH:
+        input_receiver = executor
+    if output_receiver == ETH:
+        output_receiver = sender
+    return (
+        ((input_token, input_amount, input_receiver),),
+        ((output_token, output_quote, output_receiver),),
+        output_quote * (0xFFFFFF - tolerance) // 0xFFFFFF,
+        executor,
+        referral_code,
+        path_definition,
+    )
+
+
+def _decode_swap_multi_compact(data, sender, address_list, address_table):
+    num_inputs = data[0]
+    num_outputs = data[1]
+    executor, pos = _compact_address(data, 2, address_list, address_table)
+    value_out_min, pos = _compact_amount(data, pos)
+
+    inputs = []
+    for i in range(num_inputs):
+        token, pos = _compact_address(data, pos, address_list, address_table)
+        amount, pos = _compact_amount(data, pos)
+        receiver, pos = _compact_address(data, pos, address_list, address_table)
+        inputs.append((token, amount, executor if receiver == ETH else receiver))
+
+    outputs = []
+    for i in range(num_outputs):
+        token, pos = _compact_address(data, pos, address_list, address_table)
+        relative_value, pos = _compact_amount(data, pos)
+        receiver, pos = _compact_address(data, pos, address_list, address_table)
+        outputs.append((token, relative_value, sender if receiver == ETH else receiver))
+
+    referral_code, path_definition = _compact_tail(data, pos)
+    return (
+        tuple(inputs),
+        tuple(outputs),
+        value_out_min,
+        executor,
+        referral_code,
+        path_definition,
+    )
+
+
+class TransactionClassifier:
+    """
+    Classifies and decodes the transactions sent to the router at router_address.
+    address_list and address_table mirror the router's, and can be replaced as they
+    are written on chain
+    """
+
+    def __init__(self, router_address, address_list=(), address_table=None):
+        self.router = router_address.lower()
+        self.address_list = [address.lower() for address in address_list]
+        self.address_table = [
+            [address.lower() for address in chunk] for chunk in address_table or []
+        ]
+
+    @instrumented("decode", "transaction")
+    def classify(self, transaction):
+        """
+        Decodes a transaction, given as a dict in the format of eth_getTransactionByHash,
+        into a SwapRecord or CallRecord. Calls that fail to decode, such as those made
+        with malformed calldata, are returned as a CallRecord without arguments
+        """
+        data = _to_bytes(transaction["input"])
+        tx_hash = transaction["hash"]
+        tx_hash = tx_hash if isinstance(tx_hash, str) else "0x" + bytes(tx_hash).hex()
+        block = _to_int(transaction["blockNumber"])
+        sender = transaction["from"].lower()
+        value = _to_int(transaction["value"])
+
+        function = FUNCTIONS.get(data[:4])
+        if function is None:
+            return CallRecord(tx_hash, block, sender, None, value, None)
+
+        data = data[4:]
+        permit2 = None
+        try:
+            if function == "swap":
+                fields = _decode_swap(data, 0)
+            elif function == "swapMulti":
+                fields = _decode_swap_multi(data, 0)
+            elif function == "swapCompact":
+                fields = _decode_swap_compact(
+                    data, sender, self.address_list, self.address_table
+                )
+            elif function == "swapMultiCompact":
+                fields = _decode_swap_multi_compact(
+                    data, sender, self.address_list, self.address_table
+                )
+            elif function == "swapPermit2":
+                permit2 = _abi_permit2(data, _word(data, 0, 0))
+                fields = _decode_swap(data, 1)
+            elif function == "swapMultiPermit2":
+                permit2 = _abi_permit2(data, _word(data, 0, 0))
+                fields = _decode_swap_multi(data, 1)
+            else:
+                args = tuple(decode(ARGUMENT_TYPES[function], data))
+                return CallRecord(tx_hash, block, sender, function, value, args)
+        except Exception:
+            return CallRecord(tx_hash, block, sender, function, value, None)
+
+        return SwapRecord(tx_hash, block, sender, function, value, *fields, permit2)
+
+    def classify_block(self, block):
+        """
+        Records of the transactions in a block, fetched with full transactions, that
+        were sent to the router
+        """
+        return [
+            self.classify(transaction)
+            for transaction in block["transactions"]
+            if (transaction.get("to") or "").lower() == self.router
+        ]
+
+    def stream(self, blocks):
+        """
+        Yields the records of every router transaction in an iterable of blocks
+        """
+        for block in blocks:
+            yield from self.classify_block(block)
+
+
+_worker_classifier = None
+
+
+def _init_worker(router_address, address_list, address_table):
+    global _worker_classifier
+    _worker_classifier = TransactionClassifier(
+        router_address, address_list, address_table
+    )
+
+
+def _classify_chunk(transactions):
+    return [_worker_classifier.classify(transaction) for transaction in transactions]
+
+
+def classify_parallel(
+    transactions,
+    router_address,
+    address_list=(),
+    address_table=None,
+    processes=None,
+    chunk_size=2_000,
+):
+    """
+    Classifies router transactions in a pool of processes, for backfills. Yields the
+    records in the order of transactions, which may be any iterable
+    """
+
+    def chunks():
+        chunk = []
+        for transaction in transactions:
+            chunk.append(transaction)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    with multiprocessing.Pool(
+        processes,
+        initializer=_init_worker,
+        initargs=(router_address, list(address_list), address_table),
+    ) as pool:
+        for records in pool.imap(_classify_chunk, chunks()):
+            yield from records
@@ -0,0 +1,187 @@
+import mmap
+import struct
+from typing import NamedTuple
+
+import numpy as np
+from lib.abi_encoder import SELECTORS
+
+# Corpus of recorded router calls, stored in one file that is read through mmap. The
+# file is a header, the calldata of every call concatenated, and an index of fixed width
+# records giving the offset and length of each call's calldata, its sender and its
+# value, so that any call can be read without parsing the ones before it and a corpus
+# much larger than memory can be streamed
+
+MAGIC = b"ODOSCRP1"
+# Magic, number of calls and offset of the index
+HEADER = struct.Struct("<8sQQ")
+# 64 bytes per call, with the value as a big endian uint256
+INDEX_DTYPE = np.dtype(
+    [
+        ("offset", "<u8"),
+        ("length", "<u4"),
+        ("sender", "S20"),
+        ("value", "S32"),
+    ]
+)
+INDEX_ALIGNMENT = 8
+
+FUNCTIONS = {selector: name for name, selector in SELECTORS.items()}
+
+
+class CorpusEntry(NamedTuple):
+    sender: str
+    value: int
+    data: bytes
+
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        return int(value, 16)
+    return int(value)
+
+
+class CorpusWriter:
+    """
+    Writes calls to a corpus file one at a time, with the index written on close
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(bytes(HEADER.size))
+        self.offset = HEADER.size
+        self.index = []
+
+    def add(self, sender, value, data):
+        data = _to_bytes(data)
+        self.file.write(data)
+        self.index.append((self.offset, len(data), _to_bytes(sender), value))
+        self.offset += len(data)
+
+    def close(self):
+        if self.file.closed:
+            return
+        padding = -self.offset % INDEX_ALIGNMENT
+        self.file.write(bytes(padding))
+        index_offset = self.offset + padding
+
+        index = np.zeros(len(self.index), dtype=INDEX_DTYPE)
+        if self.index:
+            offsets, lengths, senders, values = zip(*self.index)
+            index["offset"] = offsets
+            index["length"] = lengths
+            index["sender"] = senders
+            index["value"] = [value.to_bytes(32, "big") for value in values]
+        self.file.write(index.tobytes())
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, len(self.index), index_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_corpus(path, calls):
+    """
+    Writes (sender, value, calldata) calls to a corpus file, with calldata as bytes or
+    hex
+    """
+    with CorpusWriter(path) as writer:
+        for sender, value, data in calls:
+            writer.add(sender, value, data)
+
+
+def write_transactions(path, transactions, router=None):
+    """
+    Writes transactions in the format of eth_getTransactionByHash to a corpus file, only
+    keeping those sent to router if it is given
+    """
+    write_corpus(
+        path,
+        (
+            (
+                transaction["from"],
+                _to_int(transaction["value"]),
+                transaction["input"],
+            )
+            for transaction in transactions
+            if router is None or (transaction.get("to") or "").lower() == router.lower()
+        ),
+    )
+
+
+class Corpus:
+    """
+    Read only view of a corpus file. index is a structured array over the file's index,
+    and calls are only copied out of the file when they are read
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, index_offset = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC:
+            self.mmap.close()
+            raise ValueError(f"{path} is not a corpus file")
+        self.index = np.frombuffer(self.mmap, INDEX_DTYPE, count, index_offset)
+
+    def close(self):
+        # The index holds a view of the map, which has to be released first
+        self.index = None
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        # Fixed width bytes fields come back with trailing zero bytes stripped
+        offset, length, sender, value = self.index[i].item()
+        return CorpusEntry(
+            "0x" + sender.ljust(20, b"\0").hex(),
+            int.from_bytes(value.ljust(32, b"\0"), "big"),
+            self.mmap[offset : offset + length],
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def selectors(self):
+        """
+        First 4 bytes of every call as an array of uint32, with 0 for calls shorter than
+        a selector
+        """
+        data = np.frombuffer(self.mmap, np.uint8)
+        offsets = self.index["offset"].astype(np.int64)
+        has_selector = self.index["length"] >= 4
+        selectors = np.zeros(len(self), dtype=np.uint32)
+        for i in range(4):
+            selectors[has_selector] = (selectors[has_selector] << 8) | data[
+                offsets[has_selector] + i
+            ]
+        return selectors
+
+    def endpoints(self):
+        """
+        Name of the router function of every call, or None if its selector is unknown
+        """
+        return [
+            FUNCTIONS.get(int(selector).to_bytes(4, "big"))
+            for selector in self.selectors()
+        ]
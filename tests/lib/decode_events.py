@@ -0,0 +1,171 @@
+from typing import List, NamedTuple
+
+from lib.metrics import instrumented
+from web3 import Web3
+
+SWAP_TOPIC = Web3.keccak(
+    text="Swap(address,uint256,address,uint256,address,int256,uint32)"
+)
+SWAP_MULTI_TOPIC = Web3.keccak(
+    text="SwapMulti(address,uint256[],address[],uint256[],address[],uint32)"
+)
+SWAP_INDEXED_TOPIC = Web3.keccak(
+    text="SwapIndexed(address,uint32,uint256,address,uint256,address,int256)"
+)
+SWAP_MULTI_PACKED_TOPIC = Web3.keccak(text="SwapMultiPacked(address,uint32,bytes)")
+
+
+# Common record for Swap and SwapIndexed events
+class SwapEvent(NamedTuple):
+    sender: str
+    input_amount: int
+    input_token: str
+    amount_out: int
+    output_token: str
+    slippage: int
+    referral_code: int
+
+
+# Common record for SwapMulti and SwapMultiPacked events
+class SwapMultiEvent(NamedTuple):
+    sender: str
+    amounts_in: List[int]
+    tokens_in: List[str]
+    amounts_out: List[int]
+    tokens_out: List[str]
+    referral_code: int
+
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def _word(data, index):
+    return int.from_bytes(data[index * 32 : index * 32 + 32], "big")
+
+
+def _address(data, start):
+    return "0x" + data[start : start + 20].hex()
+
+
+def _topic_address(topic):
+    return "0x" + topic[12:].hex()
+
+
+def decode_swap(data):
+    return SwapEvent(
+        _address(data, 12),
+        _word(data, 1),
+        _address(data, 76),
+        _word(data, 3),
+        _address(data, 140),
+        int.from_bytes(data[160:192], "big", signed=True),
+        _word(data, 6),
+    )
+
+
+def decode_swap_indexed(topics, data):
+    return SwapEvent(
+        _topic_address(topics[1]),
+        _word(data, 0),
+        _address(data, 44),
+        _word(data, 2),
+        _address(data, 108),
+        int.from_bytes(data[128:160], "big", signed=True),
+        int.from_bytes(topics[2], "big"),
+    )
+
+
+def _decode_array(data, offset, decode_element):
+    length = int.from_bytes(data[offset : offset + 32], "big")
+    return [decode_element(data, offset + 32 * (i + 1)) for i in range(length)]
+
+
+def _amount_element(data, start):
+    return int.from_bytes(data[start : start + 32], "big")
+
+
+def _address_element(data, start):
+    return _address(data, start + 12)
+
+
+def decode_swap_multi(data):
+    return SwapMultiEvent(
+        _address(data, 12),
+        _decode_array(data, _word(data, 1), _amount_element),
+        _decode_array(data, _word(data, 2), _address_element),
+        _decode_array(data, _word(data, 3), _amount_element),
+        _decode_array(data, _word(data, 4), _address_element),
+        _word(data, 5),
+    )
+
+
+# Unpacks the payload of a SwapMultiPacked event, which is the 2 byte input and output counts
+# followed by each 20 byte token and 32 byte amount for the inputs and then the outputs
+def unpack_swap_multi(payload):
+    num_inputs = int.from_bytes(payload[0:2], "big")
+    num_outputs = int.from_bytes(payload[2:4], "big")
+
+    tokens = []
+    amounts = []
+    for start in range(4, 4 + (num_inputs + num_outputs) * 52, 52):
+        tokens.append("0x" + payload[start : start + 20].hex())
+        amounts.append(int.from_bytes(payload[start + 20 : start + 52], "big"))
+
+    return (
+        amounts[:num_inputs],
+        tokens[:num_inputs],
+        amounts[num_inputs:],
+        tokens[num_inputs:],
+    )
+
+
+def decode_swap_multi_packed(topics, data):
+    # The payload is ABI encoded as dynamic bytes behind an offset and length
+    length = _word(data, 1)
+    amounts_in, tokens_in, amounts_out, tokens_out = unpack_swap_multi(
+        data[64 : 64 + length]
+    )
+    return SwapMultiEvent(
+        _topic_address(topics[1]),
+        amounts_in,
+        tokens_in,
+        amounts_out,
+        tokens_out,
+        int.from_bytes(topics[2], "big"),
+    )
+
+
+# Decodes a router log (as returned by eth_getLogs or in a receipt) into a SwapEvent or
+# SwapMultiEvent regardless of the event format, or returns None for any other log
+@instrumented("decode", "router_log")
+def decode_router_log(log):
+    topics = [_to_bytes(topic) for topic in log["topics"]]
+    if not topics:
+        return None
+
+    data = _to_bytes(log["data"])
+    topic = topics[0]
+
+    if topic == SWAP_TOPIC:
+        return decode_swap(data)
+    elif topic == SWAP_MULTI_TOPIC:
+        return decode_swap_multi(data)
+    elif topic == SWAP_INDEXED_TOPIC:
+        return decode_swap_indexed(topics, data)
+    elif topic == SWAP_MULTI_PACKED_TOPIC:
+        return decode_swap_multi_packed(topics, data)
+
+    return None
+
+
+def decode_router_logs(logs):
+    events = []
+    for log in logs:
+        event = decode_router_log(log)
+        if event is not None:
+            events.append(event)
+
+    return events
@@ -1,10 +1,13 @@
 import math
 import random
 
+from lib.limits import slippage_tolerance, value_out_mins
+from lib.metrics import instrumented
 from lib.utils import encode_address, encode_amount, encode_bytes, encode_bytes_string
 from web3 import Web3
 
 
+@instrumented("encode", "swapCompact")
 def construct_compact_swap_data(
     path_def_bytes,
     input_token,
@@ -17,26 +20,30 @@ def construct_compact_swap_data(
     output_dest,
     address_list,
     referral_code,
+    exponent_amounts=False,
+    address_table=None,
 ):
     compact_router_data = "0x"
 
-    compact_router_data += encode_address(input_token, address_list)
-    compact_router_data += encode_address(output_token, address_list)
-    compact_router_data += encode_amount(input_amount)
+    compact_router_data += encode_address(input_token, address_list, address_table)
+    compact_router_data += encode_address(output_token, address_list, address_table)
+    compact_router_data += encode_amount(input_amount, exponent_amounts)
 
-    compact_router_data += encode_amount(output_quote)
-    compact_router_data += encode_bytes_string(int(0xFFFFFF * max_slippage_percent), 3)
-    compact_router_data += encode_address(executor, address_list)
+    compact_router_data += encode_amount(output_quote, exponent_amounts)
+    compact_router_data += encode_bytes_string(
+        slippage_tolerance(max_slippage_percent), 3
+    )
+    compact_router_data += encode_address(executor, address_list, address_table)
 
     if input_dest == executor:
         compact_router_data += "0000"
     else:
-        compact_router_data += encode_address(input_dest, address_list)
+        compact_router_data += encode_address(input_dest, address_list, address_table)
 
     if output_dest == "msg.sender":
         compact_router_data += "0000"
     else:
-        compact_router_data += encode_address(output_dest, address_list)
+        compact_router_data += encode_address(output_dest, address_list, address_table)
 
     compact_router_data += encode_bytes_string(referral_code, 4)
     compact_router_data += encode_bytes(path_def_bytes)
@@ -44,6 +51,7 @@ def construct_compact_swap_data(
     return compact_router_data
 
 
+@instrumented("encode", "swapMultiCompact")
 def construct_compact_swap_multi_data(
     path_def_bytes,
     input_tokens,
@@ -57,39 +65,42 @@ def construct_compact_swap_multi_data(
     output_dests,
     address_list,
     referral_code,
+    exponent_amounts=False,
+    address_table=None,
 ):
     compact_router_data = "0x"
 
     compact_router_data += encode_bytes_string(len(input_tokens), 1)
     compact_router_data += encode_bytes_string(len(output_tokens), 1)
 
-    compact_router_data += encode_address(executor, address_list)
+    compact_router_data += encode_address(executor, address_list, address_table)
 
-    value_out_min = int(
-        (1 - max_slippage_percent)
-        * sum(
-            [relative_values[i] * output_quotes[i] for i in range(len(output_quotes))]
-        )
-    )
-    compact_router_data += encode_amount(value_out_min)
+    value_out_min = value_out_mins(
+        output_quotes, relative_values, [0], [slippage_tolerance(max_slippage_percent)]
+    )[0]
+    compact_router_data += encode_amount(value_out_min, exponent_amounts)
 
     for i, input_token in enumerate(input_tokens):
-        compact_router_data += encode_address(input_token, address_list)
-        compact_router_data += encode_amount(input_amounts[i])
+        compact_router_data += encode_address(input_token, address_list, address_table)
+        compact_router_data += encode_amount(input_amounts[i], exponent_amounts)
 
         if input_dests[i] == executor:
             compact_router_data += "0000"
         else:
-            compact_router_data += encode_address(input_dests[i], address_list)
+            compact_router_data += encode_address(
+                input_dests[i], address_list, address_table
+            )
 
     for i, output_token in enumerate(output_tokens):
-        compact_router_data += encode_address(output_token, address_list)
-        compact_router_data += encode_amount(relative_values[i])
+        compact_router_data += encode_address(output_token, address_list, address_table)
+        compact_router_data += encode_amount(relative_values[i], exponent_amounts)
 
         if output_dests[i] == "msg.sender":
             compact_router_data += "0000"
         else:
-            compact_router_data += encode_address(output_dests[i], address_list)
+            compact_router_data += encode_address(
+                output_dests[i], address_list, address_table
+            )
 
     compact_router_data += encode_bytes_string(referral_code, 4)
     compact_router_data += encode_bytes(path_def_bytes)
@@ -0,0 +1,281 @@
+import json
+import os
+from typing import NamedTuple
+
+import numpy as np
+from lib import path_assembler
+from web3 import Web3
+
+# Predicts the gas of router calls offline, instead of waiting on eth_estimateGas for every
+# swap. A call's gas is its intrinsic gas, which follows exactly from its calldata, plus
+# the router's own work, which is linear in a handful of features of the swap, plus the
+# work of the executor's path. The router's coefficients are fitted by least squares to
+# swaps through MockExecutor, which only sends the outputs back, and each executor's path
+# coefficients are fitted to the gas its swaps use beyond the router's prediction. Every
+# fit records its error on held out swaps, which bounds the estimates. The fits sample a
+# steady state where every balance a swap writes is already nonzero, so gas limits add a
+# worst-case surcharge for the storage a swap can newly fill: a first-time receiver's
+# balance, an empty ETH receiver or an empty referral fee slot. The model is fitted by
+# bench_gas_model.py and saved along with a hash of the router's bytecode, so that a
+# model fitted to an older build of the router can be detected
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "gas_model.json")
+
+TX_BASE_GAS = 21_000
+ZERO_BYTE_GAS = 4
+NONZERO_BYTE_GAS = 16
+
+REFERRAL_WITH_FEE_THRESHOLD = 1 << 31
+
+# Extra gas of an SSTORE from zero to nonzero over one from nonzero to nonzero, and of a
+# call with value to an empty account, from EIP-2200 and the yellow paper
+SSTORE_SET_SURCHARGE = 20_000 - 2_900
+NEW_ACCOUNT_GAS = 25_000
+
+ENDPOINTS = [
+    "swap",
+    "swapCompact",
+    "swapPermit2",
+    "swapMulti",
+    "swapMultiCompact",
+    "swapMultiPermit2",
+]
+COMPACT_ENDPOINTS = ["swapCompact", "swapMultiCompact"]
+
+# Features of the router's work. Every swap has one input and one output, so only the
+# inputs and outputs beyond the first are counted
+ROUTER_FEATURES = ENDPOINTS + [
+    "extra_inputs",
+    "extra_outputs",
+    "eth_inputs",
+    "eth_outputs",
+    "referral_fee",
+    "address_list_hits",
+]
+
+# Features of each executor's path, from its path definition
+PATH_FEATURES = {
+    "OdosWETHExecutor": ["wrap", "unwrap"],
+    "OdosPathExecutor": ["base"]
+    + [name for name, layout in path_assembler.INSTRUCTIONS.values()],
+}
+
+
+def intrinsic_gas(data):
+    """
+    Gas charged for a call before it executes, from its calldata as bytes or hex
+    """
+    if isinstance(data, str):
+        data = bytes.fromhex(data[2:] if data.startswith("0x") else data)
+    zero_bytes = data.count(0)
+    return (
+        TX_BASE_GAS
+        + ZERO_BYTE_GAS * zero_bytes
+        + NONZERO_BYTE_GAS * (len(data) - zero_bytes)
+    )
+
+
+def address_list_hits(spec, address_list):
+    """
+    Addresses of a compact swap that the router reads from its address list, given the
+    address list the calldata was encoded with
+    """
+    if spec.endpoint not in COMPACT_ENDPOINTS:
+        return 0
+    address_list = {address.lower() for address in address_list}
+    addresses = list(spec.input_tokens) + list(spec.output_tokens) + [spec.executor]
+    # Receivers that default to the executor and the sender are not encoded
+    addresses += [
+        receiver
+        for receiver in spec.input_receivers or ()
+        if receiver.lower() != spec.executor.lower()
+    ]
+    addresses += [
+        receiver
+        for receiver in spec.output_receivers or ()
+        if receiver.lower() != spec.sender.lower()
+    ]
+    return sum(
+        1 for address in addresses if address != ETH and address.lower() in address_list
+    )
+
+
+def router_features(spec, address_list=()):
+    """
+    Features of the router's work for a calldata_service.SwapSpec
+    """
+    features = dict.fromkeys(ROUTER_FEATURES, 0)
+    features[spec.endpoint] = 1
+    features["extra_inputs"] = len(spec.input_tokens) - 1
+    features["extra_outputs"] = len(spec.output_tokens) - 1
+    features["eth_inputs"] = sum(1 for token in spec.input_tokens if token == ETH)
+    features["eth_outputs"] = sum(1 for token in spec.output_tokens if token == ETH)
+    features["referral_fee"] = int(spec.referral_code > REFERRAL_WITH_FEE_THRESHOLD)
+    features["address_list_hits"] = address_list_hits(spec, address_list)
+    return features
+
+
+def path_features(executor, path_definition):
+    """
+    Features of the path of an executor named in PATH_FEATURES
+    """
+    if isinstance(path_definition, str):
+        path_definition = bytes.fromhex(path_definition[2:])
+    features = dict.fromkeys(PATH_FEATURES[executor], 0)
+
+    if executor == "OdosWETHExecutor":
+        features["wrap" if path_definition[0] == 1 else "unwrap"] = 1
+    elif executor == "OdosPathExecutor":
+        features["base"] = 1
+        num_registers, instructions = path_assembler.disassemble(path_definition.hex())
+        for name, operands in instructions:
+            features[name] += 1
+    return features
+
+
+def storage_surcharge(spec):
+    """
+    Largest gas a swap can use beyond the steady state the model is fitted to. Each
+    ERC20 input may be the first of its token held by its receiver, and a Permit2 swap
+    may use the first nonce of a bitmap word. Each output's receiver may hold none of
+    it, or be an empty account for ETH, and the router may hold none of an ERC20
+    output. A referral fee either pays a beneficiary holding none of the output or,
+    with referral fee accrual, fills the empty owed and reserved slots, which costs the
+    most of the two
+    """
+    surcharge = sum(SSTORE_SET_SURCHARGE for token in spec.input_tokens if token != ETH)
+    if spec.endpoint in ["swapPermit2", "swapMultiPermit2"]:
+        surcharge += SSTORE_SET_SURCHARGE
+
+    referral_fee = spec.referral_code > REFERRAL_WITH_FEE_THRESHOLD
+    for token in spec.output_tokens:
+        if token == ETH:
+            surcharge += NEW_ACCOUNT_GAS
+        else:
+            surcharge += 2 * SSTORE_SET_SURCHARGE
+        if referral_fee:
+            surcharge += 2 * SSTORE_SET_SURCHARGE
+    return surcharge
+
+
+class LinearFit(NamedTuple):
+    coefficients: dict
+    # Absolute errors on held out samples: the largest, the 99th percentile and the root
+    # mean square
+    max_error: float
+    p99_error: float
+    rmse: float
+    samples: int
+
+    def predict(self, features):
+        return sum(
+            self.coefficients[name] * value for name, value in features.items() if value
+        )
+
+
+def fit_linear(feature_rows, targets, holdout=0.2, seed=0):
+    """
+    Fits targets as a linear function of feature_rows, dicts of the same features, and
+    measures the error on a random holdout share of the samples, which are then
+    included in the final fit
+    """
+    names = list(feature_rows[0])
+    X = np.array([[row[name] for name in names] for row in feature_rows], dtype=float)
+    y = np.array(targets, dtype=float)
+
+    rng = np.random.default_rng(seed)
+    held_out = rng.random(len(y)) < holdout
+    if held_out.any() and not held_out.all():
+        train = ~held_out
+    else:
+        # Too few samples to hold any out, so the error is measured in sample
+        held_out = train = np.ones(len(y), dtype=bool)
+
+    solution = np.linalg.lstsq(X[train], y[train], rcond=None)[0]
+    errors = np.abs(X[held_out] @ solution - y[held_out])
+
+    solution = np.linalg.lstsq(X, y, rcond=None)[0]
+    return LinearFit(
+        {name: float(value) for name, value in zip(names, solution)},
+        float(errors.max()),
+        float(np.percentile(errors, 99)),
+        float(np.sqrt(np.mean(errors**2))),
+        len(y),
+    )
+
+
+class GasEstimate(NamedTuple):
+    gas: int
+    # Gas limit that covers the estimate's error bound and the storage surcharge
+    limit: int
+
+
+class GasModel:
+    """
+    Fitted router and executor path models, with the hash of the router bytecode they
+    were fitted to
+    """
+
+    def __init__(self, router, executors, bytecode_hash):
+        self.router = router
+        self.executors = executors
+        self.bytecode_hash = bytecode_hash
+
+    def is_current(self, bytecode):
+        return bytecode_hash(bytecode) == self.bytecode_hash
+
+    def router_gas(self, spec, data, address_list=()):
+        """
+        Intrinsic gas of a call and the router's predicted work
+        """
+        return intrinsic_gas(data) + self.router.predict(
+            router_features(spec, address_list)
+        )
+
+    def estimate(self, spec, data, address_list=(), executor=None):
+        """
+        Gas of a call built from spec, with the path of executor, named as in
+        PATH_FEATURES, if its path model was fitted. The limit adds the largest held out
+        error of each model used and the swap's storage surcharge
+        """
+        gas = self.router_gas(spec, data, address_list)
+        bound = self.router.max_error + storage_surcharge(spec)
+        if executor in self.executors:
+            path_fit = self.executors[executor]
+            gas += path_fit.predict(path_features(executor, spec.path_definition))
+            bound += path_fit.max_error
+        return GasEstimate(round(gas), round(gas + bound))
+
+    def to_dict(self):
+        return {
+            "bytecode_hash": self.bytecode_hash,
+            "router": self.router._asdict(),
+            "executors": {name: fit._asdict() for name, fit in self.executors.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, model):
+        return cls(
+            LinearFit(**model["router"]),
+            {name: LinearFit(**fit) for name, fit in model["executors"].items()},
+            model["bytecode_hash"],
+        )
+
+    def save(self, path=MODEL_PATH):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+
+def load(path=MODEL_PATH):
+    with open(path, "r") as f:
+        return GasModel.from_dict(json.load(f))
+
+
+def bytecode_hash(bytecode):
+    if isinstance(bytecode, str):
+        bytecode = bytes.fromhex(
+            bytecode[2:] if bytecode.startswith("0x") else bytecode
+        )
+    return "0x" + bytes(Web3.keccak(bytecode)).hex()
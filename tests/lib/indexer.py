@@ -0,0 +1,326 @@
+import json
+import os
+
+import numpy as np
+from lib.decode_events import (
+    SWAP_INDEXED_TOPIC,
+    SWAP_MULTI_PACKED_TOPIC,
+    SWAP_MULTI_TOPIC,
+    SWAP_TOPIC,
+    SwapEvent,
+    decode_router_log,
+)
+from web3 import Web3
+
+# Incrementally indexes router swap events into an append-only columnar store on disk.
+# Each column is a flat binary file that is memory-mapped when read. Events have fixed
+# width columns, and the input and output tokens and amounts of every event are stored
+# as legs in a second set of columns, indexed by each event's input and output offsets.
+# A Swap has one input and one output leg, and a SwapMulti one leg per token
+
+SWAP_KIND = 0
+SWAP_MULTI_KIND = 1
+
+ROUTER_TOPICS = [
+    Web3.to_hex(topic)
+    for topic in [
+        SWAP_TOPIC,
+        SWAP_MULTI_TOPIC,
+        SWAP_INDEXED_TOPIC,
+        SWAP_MULTI_PACKED_TOPIC,
+    ]
+]
+
+# (dtype, bytes per row) of every column. Addresses and uint256 amounts are raw
+# big-endian bytes, read as rows of uint8
+EVENT_COLUMNS = {
+    "block": (np.uint64, 1),
+    "log_index": (np.uint32, 1),
+    "kind": (np.uint8, 1),
+    "sender": (np.uint8, 20),
+    "referral_code": (np.uint32, 1),
+    "slippage": (np.uint8, 32),
+    "input_offset": (np.uint64, 1),
+    "output_offset": (np.uint64, 1),
+}
+LEG_COLUMNS = {
+    "token": (np.uint8, 20),
+    "amount": (np.uint8, 32),
+}
+
+
+def _address_bytes(address):
+    return bytes.fromhex(address[2:])
+
+
+def bytes_to_ints(column, signed=False):
+    """
+    Converts a column of big-endian byte rows, such as leg amounts, to Python ints
+    """
+    return [int.from_bytes(row.tobytes(), "big", signed=signed) for row in column]
+
+
+def bytes_to_addresses(column):
+    return ["0x" + row.tobytes().hex() for row in column]
+
+
+class EventStore:
+    """
+    Columnar store of the events of one chain in a directory, with a checkpoint of the
+    next block to index and the number of rows written. Rows past the checkpoint, left
+    by an interrupted append, are truncated when the store is opened
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        self.checkpoint = {"next_block": 0, "events": 0, "legs": 0}
+        if os.path.exists(self._checkpoint_path()):
+            with open(self._checkpoint_path(), "r") as f:
+                self.checkpoint = json.load(f)
+
+        for name, (dtype, width) in EVENT_COLUMNS.items():
+            self._truncate(name, dtype, width, self.checkpoint["events"])
+        for name, (dtype, width) in LEG_COLUMNS.items():
+            self._truncate(name, dtype, width, self.checkpoint["legs"])
+
+    def _checkpoint_path(self):
+        return os.path.join(self.path, "checkpoint.json")
+
+    def _column_path(self, name):
+        return os.path.join(self.path, name + ".bin")
+
+    def _truncate(self, name, dtype, width, rows):
+        column_path = self._column_path(name)
+        with open(column_path, "ab") as f:
+            f.truncate(rows * width * np.dtype(dtype).itemsize)
+
+    def append(self, columns, legs, next_block):
+        """
+        Appends event and leg columns, with offsets relative to the legs being appended,
+        and moves the checkpoint to next_block once every column is on disk
+        """
+        num_events = len(columns["block"])
+        num_legs = len(legs["token"])
+
+        columns = dict(columns)
+        columns["input_offset"] = columns["input_offset"] + self.checkpoint["legs"]
+        columns["output_offset"] = columns["output_offset"] + self.checkpoint["legs"]
+
+        for names, values in [(EVENT_COLUMNS, columns), (LEG_COLUMNS, legs)]:
+            for name, (dtype, width) in names.items():
+                with open(self._column_path(name), "ab") as f:
+                    f.write(np.ascontiguousarray(values[name], dtype=dtype).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        checkpoint = {
+            "next_block": next_block,
+            "events": self.checkpoint["events"] + num_events,
+            "legs": self.checkpoint["legs"] + num_legs,
+        }
+        temp_path = self._checkpoint_path() + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_path, self._checkpoint_path())
+
+        self.checkpoint = checkpoint
+
+    def _load(self, name, dtype, width, rows):
+        if rows == 0:
+            return np.empty((0, width) if width > 1 else 0, dtype=dtype)
+
+        column = np.memmap(
+            self._column_path(name), dtype=dtype, mode="r", shape=(rows * width,)
+        )
+        return column.reshape(rows, width) if width > 1 else column
+
+    def events(self):
+        """
+        Memory-mapped event columns, without copying them into memory
+        """
+        return {
+            name: self._load(name, dtype, width, self.checkpoint["events"])
+            for name, (dtype, width) in EVENT_COLUMNS.items()
+        }
+
+    def legs(self):
+        """
+        Memory-mapped leg columns, without copying them into memory
+        """
+        return {
+            name: self._load(name, dtype, width, self.checkpoint["legs"])
+            for name, (dtype, width) in LEG_COLUMNS.items()
+        }
+
+    def event_legs(self, index):
+        """
+        Slices of the leg columns holding the inputs and outputs of one event
+        """
+        events = self.events()
+        legs = self.legs()
+
+        input_offset = int(events["input_offset"][index])
+        output_offset = int(events["output_offset"][index])
+        if index + 1 < self.checkpoint["events"]:
+            end_offset = int(events["input_offset"][index + 1])
+        else:
+            end_offset = self.checkpoint["legs"]
+
+        inputs = {
+            name: column[input_offset:output_offset] for name, column in legs.items()
+        }
+        outputs = {
+            name: column[output_offset:end_offset] for name, column in legs.items()
+        }
+        return inputs, outputs
+
+
+def logs_to_columns(logs):
+    """
+    Decodes router logs into event and leg columns, with offsets starting from 0
+    """
+    blocks = []
+    log_indices = []
+    kinds = []
+    senders = []
+    referral_codes = []
+    slippages = []
+    input_offsets = []
+    output_offsets = []
+    tokens = []
+    amounts = []
+
+    for log in logs:
+        event = decode_router_log(log)
+        if event is None:
+            continue
+
+        blocks.append(log["blockNumber"])
+        log_indices.append(log["logIndex"])
+        senders.append(_address_bytes(event.sender))
+        referral_codes.append(event.referral_code)
+        input_offsets.append(len(tokens))
+
+        if isinstance(event, SwapEvent):
+            kinds.append(SWAP_KIND)
+            slippages.append(event.slippage.to_bytes(32, "big", signed=True))
+            inputs = [(event.input_token, event.input_amount)]
+            outputs = [(event.output_token, event.amount_out)]
+        else:
+            kinds.append(SWAP_MULTI_KIND)
+            slippages.append(bytes(32))
+            inputs = list(zip(event.tokens_in, event.amounts_in))
+            outputs = list(zip(event.tokens_out, event.amounts_out))
+
+        for token, amount in inputs:
+            tokens.append(_address_bytes(token))
+            amounts.append(amount.to_bytes(32, "big"))
+
+        output_offsets.append(len(tokens))
+        for token, amount in outputs:
+            tokens.append(_address_bytes(token))
+            amounts.append(amount.to_bytes(32, "big"))
+
+    def byte_rows(rows, width):
+        return np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(-1, width)
+
+    columns = {
+        "block": np.array(blocks, dtype=np.uint64),
+        "log_index": np.array(log_indices, dtype=np.uint32),
+        "kind": np.array(kinds, dtype=np.uint8),
+        "sender": byte_rows(senders, 20),
+        "referral_code": np.array(referral_codes, dtype=np.uint32),
+        "slippage": byte_rows(slippages, 32),
+        "input_offset": np.array(input_offsets, dtype=np.uint64),
+        "output_offset": np.array(output_offsets, dtype=np.uint64),
+    }
+    legs = {
+        "token": byte_rows(tokens, 20),
+        "amount": byte_rows(amounts, 32),
+    }
+    return columns, legs
+
+
+class RouterIndexer:
+    """
+    Indexes the swap events of a router into an EventStore. Logs are fetched in block
+    ranges whose size adapts to the number of logs returned, halving when a node rejects
+    or nearly fills a request and doubling when a range is sparse
+    """
+
+    def __init__(
+        self,
+        web3,
+        router,
+        store,
+        start_block=0,
+        confirmations=0,
+        chunk_size=2_000,
+        max_chunk_size=100_000,
+        target_logs=5_000,
+    ):
+        self.web3 = web3
+        self.router = Web3.to_checksum_address(router)
+        self.store = store
+        self.confirmations = confirmations
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.target_logs = target_logs
+
+        if store.checkpoint["next_block"] < start_block:
+            store.checkpoint["next_block"] = start_block
+
+    def _get_logs(self, from_block, to_block):
+        return self.web3.eth.get_logs(
+            {
+                "address": self.router,
+                "fromBlock": from_block,
+                "toBlock": to_block,
+                "topics": [ROUTER_TOPICS],
+            }
+        )
+
+    def run(self, to_block=None):
+        """
+        Indexes from the checkpoint up to to_block, or the latest block less the
+        confirmations. Returns the number of events added
+        """
+        if to_block is None:
+            to_block = self.web3.eth.block_number - self.confirmations
+
+        num_events = 0
+        from_block = self.store.checkpoint["next_block"]
+
+        while from_block <= to_block:
+            chunk_end = min(from_block + self.chunk_size - 1, to_block)
+            try:
+                logs = self._get_logs(from_block, chunk_end)
+            except ValueError:
+                # Nodes reject ranges with too many logs, so retry with a smaller range
+                if self.chunk_size == 1:
+                    raise
+                self.chunk_size = max(self.chunk_size // 2, 1)
+                continue
+
+            columns, legs = logs_to_columns(logs)
+            self.store.append(columns, legs, chunk_end + 1)
+            num_events += len(columns["block"])
+
+            if len(logs) > self.target_logs:
+                self.chunk_size = max(self.chunk_size // 2, 1)
+            elif len(logs) < self.target_logs // 2:
+                self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+
+            from_block = chunk_end + 1
+
+        return num_events
+
+
+def open_store(root, chain_id):
+    """
+    Opens the store of a chain in its own directory under root, so that every chain
+    has a separate checkpoint
+    """
+    return EventStore(os.path.join(root, str(chain_id)))
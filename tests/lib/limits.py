@@ -0,0 +1,128 @@
+import math
+from fractions import Fraction
+
+import numpy as np
+
+# Turns quotes into the slippage limits of router calls with integer arithmetic only, so
+# that the limits are exactly the ones the router derives on chain. Slippage tolerances
+# are 24 bit fractions of 0xFFFFFF, as read by the compact decoders, and rounded up so
+# that a limit is never tighter than the intended tolerance. Amounts are object arrays
+# of Python ints, so whole batches are computed as column operations without overflow
+
+FEE_DENOM = 10**18
+TOLERANCE_DENOM = 0xFFFFFF
+
+# Multiple of its quote that an output may reach without valueOut overflowing on chain,
+# when choosing relative values
+RELATIVE_VALUE_HEADROOM = 1 << 32
+
+
+def _amounts(values):
+    return np.array(values, dtype=object).reshape(-1)
+
+
+def _fraction(value):
+    # Floats are read as the decimal they were written as, so 0.01 is exactly 1 / 100
+    if isinstance(value, float):
+        return Fraction(repr(value))
+    return Fraction(value)
+
+
+def slippage_tolerances(max_slippage_percents):
+    """
+    24 bit tolerances for fractional slippage limits, e.g. 0.005 for 0.5%, rounded up
+    """
+    tolerances = []
+    for max_slippage_percent in np.ravel(max_slippage_percents).tolist():
+        fraction = _fraction(max_slippage_percent)
+        if not 0 <= fraction <= 1:
+            raise ValueError(f"Slippage limit {max_slippage_percent} is not in [0, 1]")
+        tolerances.append(math.ceil(fraction * TOLERANCE_DENOM))
+    return np.array(tolerances, dtype=np.int64)
+
+
+def slippage_tolerance(max_slippage_percent):
+    return int(slippage_tolerances([max_slippage_percent])[0])
+
+
+def output_mins(quotes, tolerances):
+    """
+    Minimum outputs for quotes at 24 bit tolerances, computed as swapCompact does
+    """
+    tolerances = _amounts(np.ravel(tolerances).tolist())
+    return _amounts(quotes) * (TOLERANCE_DENOM - tolerances) // TOLERANCE_DENOM
+
+
+def net_amounts(amounts, swap_multi_fee=0, referral_fee=0):
+    """
+    Amounts left to the receiver of an executor's outputs after the swapMultiFee, for
+    multi swaps, and the referral fee, rounded down at each step as the router does
+    """
+    amounts = _amounts(amounts)
+    if swap_multi_fee:
+        amounts = amounts * (FEE_DENOM - swap_multi_fee) // FEE_DENOM
+    if referral_fee:
+        amounts = amounts * (FEE_DENOM - referral_fee) // FEE_DENOM
+    return amounts
+
+
+def value_out_mins(quotes, relative_values, offsets, tolerances):
+    """
+    valueOutMin of each multi swap in a batch, where the quotes and relative values of
+    every swap's outputs are concatenated and offsets holds the index of each swap's
+    first output
+    """
+    values = _amounts(quotes) * _amounts(relative_values)
+    totals = np.add.reduceat(values, np.asarray(offsets, dtype=np.int64))
+    return output_mins(totals, tolerances)
+
+
+def _round_significant(value, significant_digits):
+    # Rounds a positive float to an int with at most significant_digits nonzero leading
+    # digits, which the compact encoding stores as a short mantissa and exponent
+    exponent = math.floor(math.log10(value)) - significant_digits + 1
+    if exponent <= 0:
+        return max(round(value), 1)
+    return round(value / 10**exponent) * 10**exponent
+
+
+def relative_values(
+    prices,
+    quotes,
+    offsets,
+    significant_digits=3,
+    headroom=RELATIVE_VALUE_HEADROOM,
+):
+    """
+    Integer relative values for the outputs of a batch of multi swaps, proportional to
+    prices, the value of one unit of each output token. The values of each swap are
+    scaled by the largest power of 10 for which valueOut cannot overflow even if every
+    output reaches headroom times its quote, and rounded to significant_digits so that
+    they encode as a short mantissa and exponent
+    """
+    prices = np.asarray(prices, dtype=np.float64).reshape(-1)
+    quotes = _amounts(quotes)
+    if np.any(prices <= 0):
+        raise ValueError("Prices must be positive")
+
+    bounds = list(offsets) + [len(prices)]
+    values = []
+    for start, end in zip(bounds, bounds[1:]):
+        value_bound = float(np.sum(prices[start:end] * quotes[start:end].astype(float)))
+        scale = math.floor(math.log10((1 << 255) / (headroom * max(value_bound, 1))))
+
+        while True:
+            swap_values = [
+                _round_significant(price * 10.0**scale, significant_digits)
+                for price in prices[start:end]
+            ]
+            total = sum(
+                headroom * quote * value
+                for quote, value in zip(quotes[start:end], swap_values)
+            )
+            if total < 1 << 256:
+                break
+            scale -= 1
+        values.extend(swap_values)
+
+    return _amounts(values)
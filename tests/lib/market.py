@@ -0,0 +1,245 @@
+import itertools
+import math
+import random
+from typing import NamedTuple
+
+from lib import path_assembler
+
+# Local market of mock ERC20s and constant product pools, with a quoter that computes the
+# exact outputs of OdosPathExecutor paths through it. Every token gets a reference price,
+# and each pool is seeded at those prices with a depth drawn from a liquidity
+# distribution, so that routes through the market behave like routes through a real one
+
+FEE_DENOM = path_assembler.FEE_DENOM
+FEE_TIERS = [100, 500, 3_000, 10_000]
+TOKEN_DECIMALS = [6, 8, 18, 18, 18]
+
+
+# Liquidity distributions, giving the value of each side of a pool in reference units
+LIQUIDITY_DISTRIBUTIONS = {
+    "uniform": lambda rng: rng.uniform(1e5, 1e7),
+    "lognormal": lambda rng: rng.lognormvariate(math.log(1e6), 1.5),
+    # A few deep pools and a long tail of shallow ones
+    "pareto": lambda rng: min(1e4 * rng.paretovariate(0.8), 1e9),
+}
+
+
+class Pool(NamedTuple):
+    address: str
+    token0: str
+    token1: str
+    fee: int
+
+
+def get_amount_out(amount_in, reserve_in, reserve_out, fee):
+    """
+    Output of a swap through a pool, rounded down the same way as OdosPathExecutor
+    """
+    amount_in_with_fee = amount_in * (FEE_DENOM - fee)
+    return (
+        amount_in_with_fee
+        * reserve_out
+        // (reserve_in * FEE_DENOM + amount_in_with_fee)
+    )
+
+
+class Market:
+    """
+    Tokens and pools of a local market, with the reserves of every pool mirrored so
+    that paths can be quoted without calling the chain
+    """
+
+    def __init__(self, tokens, pools, reserves, prices, decimals):
+        self.tokens = tokens
+        self.pools = pools
+        self.reserves = reserves
+        self.prices = prices
+        self.decimals = decimals
+
+        self.pools_by_pair = {}
+        for pool in pools.values():
+            self.pools_by_pair.setdefault(
+                frozenset([pool.token0, pool.token1]), []
+            ).append(pool)
+
+    def refresh(self, pool_contracts):
+        """
+        Rereads the reserves of every pool from their contracts, e.g. after a swap
+        """
+        for address, pool_contract in pool_contracts.items():
+            self.reserves[address] = list(pool_contract.getReserves())
+
+    def pools_between(self, token_in, token_out):
+        return self.pools_by_pair.get(frozenset([token_in, token_out]), [])
+
+    def find_route(self, token_in, token_out):
+        """
+        Tokens along one of the routes with the fewest hops from token_in to token_out,
+        or None if the tokens are not connected
+        """
+        previous = {token_in: None}
+        queue = [token_in]
+        for token in queue:
+            if token == token_out:
+                route = [token]
+                while previous[route[-1]] is not None:
+                    route.append(previous[route[-1]])
+                return route[::-1]
+
+            for pair in self.pools_by_pair:
+                if token in pair:
+                    (other,) = pair - {token}
+                    if other not in previous:
+                        previous[other] = token
+                        queue.append(other)
+        return None
+
+    def add_swap(self, assembler, src, token_in, token_out, pool=None, dst=None):
+        """
+        Adds a swap of src from token_in to token_out to a path, through pool or the
+        deepest pool between the tokens. Returns the register the output is written to
+        """
+        if pool is None:
+            pool = max(
+                self.pools_between(token_in, token_out),
+                key=lambda pool: self.value(
+                    pool.token0, self.reserves[pool.address][0]
+                ),
+            )
+        return assembler.swap(src, pool.address, token_in == pool.token0, pool.fee, dst)
+
+    def add_route(self, assembler, src, token_in, token_out, dst=None):
+        """
+        Adds swaps of src along the route with the fewest hops from token_in to
+        token_out to a path. Returns the register the output is written to
+        """
+        route = self.find_route(token_in, token_out)
+        for i, (hop_in, hop_out) in enumerate(zip(route, route[1:])):
+            src = self.add_swap(
+                assembler,
+                src,
+                hop_in,
+                hop_out,
+                dst=dst if i == len(route) - 2 else None,
+            )
+        return src
+
+    def quote_path(self, path, input_amounts):
+        """
+        Runs a path the same way as OdosPathExecutor, against a copy of the reserves.
+        Returns the amount sent to the router of each token, with the null address for
+        ETH
+        """
+        num_registers, instructions = path_assembler.disassemble(path)
+        registers = list(input_amounts) + [0] * (num_registers - len(input_amounts))
+        reserves = {
+            address: list(reserve) for address, reserve in self.reserves.items()
+        }
+        outputs = {}
+
+        for name, operands in instructions:
+            src = operands[0]
+            amount = registers[src]
+            registers[src] = 0
+
+            if name == "send":
+                token = operands[1]
+                outputs[token] = outputs.get(token, 0) + amount
+                continue
+
+            dst = operands[1]
+            if name == "swap":
+                pool_address, zero_for_one, fee = operands[2:]
+                pool_reserves = reserves[pool_address]
+                i, o = (0, 1) if zero_for_one else (1, 0)
+                amount_out = get_amount_out(
+                    amount, pool_reserves[i], pool_reserves[o], fee
+                )
+                pool_reserves[i] += amount
+                pool_reserves[o] -= amount_out
+                amount = amount_out
+            elif name == "split":
+                moved = amount * operands[2] // path_assembler.SHARE_DENOM
+                registers[src] = amount - moved
+                amount = moved
+            registers[dst] += amount
+
+        return outputs
+
+    def value(self, token, amount):
+        """
+        Value of an amount of a token at its reference price
+        """
+        return amount * self.prices[token] / 10 ** self.decimals[token]
+
+
+def deploy_market(
+    token_contract,
+    pool_contract,
+    deployer,
+    num_tokens,
+    num_pools,
+    liquidity="lognormal",
+    seed=0,
+):
+    """
+    Deploys num_tokens mock ERC20s and num_pools pools between distinct pairs of them,
+    from deployer. Returns the Market, and the token and pool contracts by lowercase
+    address. token_contract and pool_contract are the MockERC20 and
+    MockConstantProductPool contract containers, and liquidity names a distribution in
+    LIQUIDITY_DISTRIBUTIONS or is a function of a random.Random
+    """
+    pairs = list(itertools.combinations(range(num_tokens), 2))
+    if num_pools > len(pairs):
+        raise ValueError(f"At most {len(pairs)} pools between {num_tokens} tokens")
+
+    rng = random.Random(seed)
+    depth = LIQUIDITY_DISTRIBUTIONS.get(liquidity, liquidity)
+
+    tokens = []
+    prices = {}
+    decimals = {}
+    token_contracts = {}
+    for i in range(num_tokens):
+        token_decimals = rng.choice(TOKEN_DECIMALS)
+        token = token_contract.deploy(
+            f"Token {i}", f"TK{i}", token_decimals, {"from": deployer}
+        )
+        address = token.address.lower()
+        tokens.append(address)
+        prices[address] = 10 ** rng.uniform(-2, 4)
+        decimals[address] = token_decimals
+        token_contracts[address] = token
+
+    # Every token is in at least one pool when there are enough pools to connect them
+    rng.shuffle(pairs)
+    pairs.sort(key=lambda pair: pair[1] - pair[0] != 1)
+
+    pools = {}
+    reserves = {}
+    pool_contracts = {}
+    for a, b in pairs[:num_pools]:
+        token0, token1 = sorted([tokens[a], tokens[b]])
+        pool = pool_contract.deploy(
+            token0, token1, rng.choice(FEE_TIERS), {"from": deployer}
+        )
+
+        value = depth(rng)
+        pool_reserves = [
+            int(value / prices[token] * 10 ** decimals[token])
+            for token in [token0, token1]
+        ]
+        for token, reserve in zip([token0, token1], pool_reserves):
+            token_contracts[token].mint(pool.address, reserve, {"from": deployer})
+        pool.sync({"from": deployer})
+
+        address = pool.address.lower()
+        pools[address] = Pool(address, token0, token1, pool.fee())
+        reserves[address] = pool_reserves
+        pool_contracts[address] = pool
+
+    return (
+        Market(tokens, pools, reserves, prices, decimals),
+        token_contracts,
+        pool_contracts,
+    )
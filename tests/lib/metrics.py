@@ -0,0 +1,310 @@
+import bisect
+import functools
+import http.server
+import inspect
+import os
+import threading
+from time import perf_counter
+
+# Latency histograms and error counters for the client libraries, recorded per stage
+# (encode, decode, permit2, rpc, ...) and operation within the stage, such as the
+# endpoint encoded or the JSON-RPC method called. Instrumentation is off unless
+# ODOS_METRICS is set or enable() is called, and while off an instrumented function
+# costs one flag check. Metrics can be read in process with snapshot() or exposed to
+# Prometheus in its text format
+
+PREFIX = "odos_client"
+
+# Upper bounds of the latency buckets in seconds, from encoding a call to a slow node
+BUCKETS = [
+    0.000_005,
+    0.000_01,
+    0.000_025,
+    0.000_05,
+    0.000_1,
+    0.000_25,
+    0.000_5,
+    0.001,
+    0.002_5,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+]
+
+_enabled = bool(os.environ.get("ODOS_METRICS"))
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+class Histogram:
+    """
+    Latencies of one operation, with the count of each bucket kept separately and
+    accumulated when read
+    """
+
+    __slots__ = ["counts", "count", "sum", "errors"]
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding quantile q, or None if nothing was observed
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(BUCKETS + [float("inf")], self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    """
+    Histograms of every (stage, operation) pair seen, and a count of the requests of
+    each JSON-RPC method, including the requests sent within batches
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.rpc_requests = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage, operation):
+        key = (stage, operation)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        return histogram
+
+    def count_rpc(self, method, count=1):
+        self.rpc_requests[method] = self.rpc_requests.get(method, 0) + count
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.rpc_requests = {}
+
+    def snapshot(self):
+        """
+        The current metrics as plain data, which benchmarks can diff or save with their
+        results
+        """
+        with self._lock:
+            histograms = list(self.histograms.items())
+        stages = {}
+        for (stage, operation), histogram in sorted(histograms):
+            stages.setdefault(stage, {})[operation] = {
+                "count": histogram.count,
+                "errors": histogram.errors,
+                "sum": histogram.sum,
+                "p50": histogram.quantile(0.5),
+                "p99": histogram.quantile(0.99),
+                "buckets": list(histogram.counts),
+            }
+        return {"stages": stages, "rpc_requests": dict(self.rpc_requests)}
+
+    def render(self):
+        """
+        The current metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+        lines = [
+            f"# HELP {PREFIX}_seconds Latency of client operations",
+            f"# TYPE {PREFIX}_seconds histogram",
+        ]
+        for (stage, operation), histogram in histograms:
+            labels = f'stage="{stage}",operation="{operation}"'
+            total = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                total += count
+                lines.append(
+                    f'{PREFIX}_seconds_bucket{{{labels},le="{bound}"}} {total}'
+                )
+            lines.append(
+                f'{PREFIX}_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}'
+            )
+            lines.append(f"{PREFIX}_seconds_sum{{{labels}}} {histogram.sum!r}")
+            lines.append(f"{PREFIX}_seconds_count{{{labels}}} {histogram.count}")
+
+        lines += [
+            f"# HELP {PREFIX}_errors_total Client operations that raised",
+            f"# TYPE {PREFIX}_errors_total counter",
+        ]
+        for (stage, operation), histogram in histograms:
+            lines.append(
+                f'{PREFIX}_errors_total{{stage="{stage}",operation="{operation}"}} '
+                f"{histogram.errors}"
+            )
+
+        lines += [
+            f"# HELP {PREFIX}_rpc_requests_total JSON-RPC requests sent, by method",
+            f"# TYPE {PREFIX}_rpc_requests_total counter",
+        ]
+        for method, count in sorted(self.rpc_requests.items()):
+            lines.append(f'{PREFIX}_rpc_requests_total{{method="{method}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Timer:
+    __slots__ = ["histogram", "start"]
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe(perf_counter() - self.start)
+        if exc_type is not None:
+            self.histogram.errors += 1
+        return False
+
+
+class _NullTimer:
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(stage, operation):
+    """
+    Context manager that records the time spent in its block, for operations whose
+    label is only known at the call site
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(REGISTRY.histogram(stage, operation))
+
+
+def instrumented(stage, operation=None):
+    """
+    Decorator that records the latency of every call to a function or coroutine
+    function, labelled with its name unless operation is given
+    """
+
+    def decorator(func):
+        operation_name = operation or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await func(*args, **kwargs)
+                histogram = REGISTRY.histogram(stage, operation_name)
+                start = perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException:
+                    histogram.errors += 1
+                    raise
+                finally:
+                    histogram.observe(perf_counter() - start)
+
+            return async_wrapper
+
+        # Timed inline rather than with _Timer, which costs as much again as the timing
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            histogram = REGISTRY.histogram(stage, operation_name)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                histogram.errors += 1
+                raise
+            finally:
+                histogram.observe(perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def count_rpc(method, count=1):
+    if _enabled:
+        REGISTRY.count_rpc(method, count)
+
+
+def snapshot():
+    return REGISTRY.snapshot()
+
+
+def reset():
+    REGISTRY.reset()
+
+
+def render():
+    return REGISTRY.render()
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """
+    Serves the metrics to Prometheus from a background thread, and enables them.
+    Returns the server, which can be stopped with shutdown()
+    """
+    enable()
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
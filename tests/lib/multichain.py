@@ -0,0 +1,273 @@
+import asyncio
+import itertools
+
+import aiohttp
+from lib import metrics, storage_layout
+from lib.abi_encoder import SELECTORS, function_selector
+
+# Async client for reading the router on every chain it is deployed on. Each chain gets
+# its own pooled HTTP session, and fan-out reads run on all chains concurrently with a
+# timeout per chain, so one slow node does not hold up the others.
+# The deployed routers predate the storage changes in this repo, so reads go through the
+# public getters, except for the address list whose slot has not moved
+
+# Chain name -> (chain id, router address), as listed in the README
+DEPLOYMENTS = {
+    "Ethereum": (1, "0xCf5540fFFCdC3d510B18bFcA6d2b9987b0772559"),
+    "Optimism": (10, "0xCa423977156BB05b13A2BA3b76Bc5419E2fE9680"),
+    "BNB": (56, "0x89b8AA89FDd0507a99d334CBe3C808fAFC7d850E"),
+    "Polygon PoS": (137, "0x4E3288c9ca110bCC82bf38F09A7b425c095d92Bf"),
+    "Sonic": (146, "0xaC041Df48dF9791B0654f1Dbbf2CC8450C5f2e9D"),
+    "Fantom": (250, "0xD0c22A5435F4E8E5770C1fAFb5374015FC12F7cD"),
+    "Fraxtal": (252, "0x56c85a254DD12eE8D9C04049a4ab62769Ce98210"),
+    "ZKSync Era": (324, "0x4bBa932E9792A2b917D47830C93a9BC79320E4f7"),
+    "Mantle": (5000, "0xD9F4e85489aDCD0bAF0Cd63b4231c6af58c26745"),
+    "Base": (8453, "0x19cEeAd7105607Cd444F5ad10dd51356436095a1"),
+    "Mode": (34443, "0x7E15EB462cdc67Cf92Af1f7102465a8F8c784874"),
+    "Arbitrum": (42161, "0xa669e7A0d4b3e4Fa48af2dE86BD4CD7126Be4e13"),
+    "Avalanche": (43114, "0x88de50B233052e4Fb783d4F6db78Cc34fEa3e9FC"),
+    "Linea": (59144, "0x2d8879046f1559E53eb052E949e9544bCB72f414"),
+    "Scroll": (534352, "0xbFe03C9E20a9Fc0b37de01A172F207004935E0b1"),
+}
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+BALANCE_OF_SELECTOR = function_selector("balanceOf(address)")
+
+
+class RPCError(Exception):
+    def __init__(self, message, error=None):
+        super().__init__(message)
+        # The JSON-RPC error object returned by the node, if any
+        self.error = error
+
+
+def _word(data, index):
+    return int.from_bytes(data[index * 32 : index * 32 + 32], "big")
+
+
+def _address_word(data, index):
+    return "0x" + data[index * 32 + 12 : index * 32 + 32].hex()
+
+
+class ChainClient:
+    """
+    Reads the router on one chain over a pooled HTTP session, with at most
+    max_connections requests in flight
+    """
+
+    def __init__(self, name, chain_id, router, rpc_url, max_connections=8):
+        self.name = name
+        self.chain_id = chain_id
+        self.router = router
+        self.rpc_url = rpc_url
+        self.max_connections = max_connections
+
+        self._session = None
+        self._ids = itertools.count()
+
+    async def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, method, params):
+        session = await self._get_session()
+        payload = {
+            "jsonrpc": "2.0",
+            "id": next(self._ids),
+            "method": method,
+            "params": params,
+        }
+        metrics.count_rpc(method)
+        with metrics.timer("rpc", method):
+            async with session.post(self.rpc_url, json=payload) as response:
+                result = await response.json(content_type=None)
+
+            if "error" in result:
+                raise RPCError(f"{self.name}: {result['error']}", result["error"])
+        return result["result"]
+
+    async def request_batch(self, requests):
+        """
+        Sends (method, params) pairs as a single JSON-RPC batch. Returns the results in
+        order, with an RPCError in place of each request that failed
+        """
+        session = await self._get_session()
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": next(self._ids),
+                "method": method,
+                "params": params,
+            }
+            for method, params in requests
+        ]
+        for method, params in requests:
+            metrics.count_rpc(method)
+        with metrics.timer("rpc", "batch"):
+            async with session.post(self.rpc_url, json=payload) as response:
+                results = await response.json(content_type=None)
+
+        # Batch responses may come back in any order
+        results = {result["id"]: result for result in results}
+        return [
+            (
+                RPCError(
+                    f"{self.name}: {results[request['id']]['error']}",
+                    results[request["id"]]["error"],
+                )
+                if "error" in results[request["id"]]
+                else results[request["id"]]["result"]
+            )
+            for request in payload
+        ]
+
+    async def call(self, to, data, block="latest"):
+        result = await self.request("eth_call", [{"to": to, "data": data}, block])
+        return bytes.fromhex(result[2:])
+
+    async def get_storage_at(self, slot, block="latest"):
+        result = await self.request("eth_getStorageAt", [self.router, hex(slot), block])
+        return int(result, 16)
+
+    async def owner(self):
+        return _address_word(
+            await self.call(self.router, "0x" + SELECTORS["owner"].hex()), 0
+        )
+
+    async def swap_multi_fee(self):
+        return _word(
+            await self.call(self.router, "0x" + SELECTORS["swapMultiFee"].hex()), 0
+        )
+
+    async def referral_lookup(self, referral_code):
+        data = await self.call(
+            self.router,
+            "0x"
+            + SELECTORS["referralLookup"].hex()
+            + referral_code.to_bytes(32, "big").hex(),
+        )
+        return {
+            "referralFee": _word(data, 0),
+            "beneficiary": _address_word(data, 1),
+            "registered": bool(_word(data, 2)),
+        }
+
+    async def address_list(self):
+        length = await self.get_storage_at(storage_layout.ADDRESS_LIST_SLOT)
+        values = await asyncio.gather(
+            *(
+                self.get_storage_at(storage_layout.address_list_slot(i))
+                for i in range(length)
+            )
+        )
+        return ["0x" + value.to_bytes(20, "big").hex() for value in values]
+
+    async def address_table(self):
+        length = await self.get_storage_at(storage_layout.ADDRESS_TABLE_SLOT)
+        chunks = await asyncio.gather(
+            *(
+                self.get_storage_at(storage_layout.address_table_slot(i))
+                for i in range(length)
+            )
+        )
+        codes = await asyncio.gather(
+            *(
+                self.request(
+                    "eth_getCode", ["0x" + chunk.to_bytes(20, "big").hex(), "latest"]
+                )
+                for chunk in chunks
+            )
+        )
+        # Each chunk's code is a STOP opcode followed by its packed addresses
+        return [
+            ["0x" + code[i : i + 40] for i in range(4, len(code), 40)] for code in codes
+        ]
+
+    async def token_balance(self, token):
+        if token == ETH:
+            result = await self.request("eth_getBalance", [self.router, "latest"])
+            return int(result, 16)
+
+        data = await self.call(
+            token,
+            "0x" + BALANCE_OF_SELECTOR + bytes(12).hex() + self.router[2:].lower(),
+        )
+        return _word(data, 0)
+
+    async def token_balances(self, tokens):
+        balances = await asyncio.gather(
+            *(self.token_balance(token) for token in tokens)
+        )
+        return dict(zip(tokens, balances))
+
+
+class MultiChainClient:
+    """
+    Router clients for every chain with an RPC URL in rpc_urls, keyed by chain name.
+    Fan-out reads return a dict of chain name to result, where a chain that failed or
+    did not answer within timeout seconds maps to the exception it raised
+    """
+
+    def __init__(
+        self, rpc_urls, deployments=DEPLOYMENTS, timeout=10, max_connections=8
+    ):
+        self.timeout = timeout
+        self.clients = {
+            name: ChainClient(name, chain_id, router, rpc_urls[name], max_connections)
+            for name, (chain_id, router) in deployments.items()
+            if name in rpc_urls
+        }
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        await asyncio.gather(*(client.close() for client in self.clients.values()))
+
+    async def _read(self, client, read):
+        try:
+            return await asyncio.wait_for(read(client), self.timeout)
+        except Exception as e:
+            return e
+
+    async def fan_out(self, read):
+        """
+        Runs read, an async function of a ChainClient, on every chain concurrently
+        """
+        names = list(self.clients)
+        results = await asyncio.gather(
+            *(self._read(self.clients[name], read) for name in names)
+        )
+        return dict(zip(names, results))
+
+    async def owners(self):
+        return await self.fan_out(lambda client: client.owner())
+
+    async def swap_multi_fees(self):
+        return await self.fan_out(lambda client: client.swap_multi_fee())
+
+    async def referral_lookups(self, referral_code):
+        return await self.fan_out(lambda client: client.referral_lookup(referral_code))
+
+    async def address_lists(self):
+        return await self.fan_out(lambda client: client.address_list())
+
+    async def token_balances(self, tokens_by_chain):
+        """
+        Reads the router's balance of the tokens listed for each chain in tokens_by_chain
+        """
+        return await self.fan_out(
+            lambda client: client.token_balances(tokens_by_chain.get(client.name, []))
+        )
@@ -0,0 +1,133 @@
+# Assembles paths for OdosPathExecutor. A path is a register count byte followed by
+# instructions, each an opcode byte followed by its operands. The first registers hold
+# the input amounts in the order they are passed to the router, and every instruction
+# moves the full amount of its source register
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+STOP = 0x00
+WRAP = 0x01
+UNWRAP = 0x02
+SWAP = 0x03
+SPLIT = 0x04
+MERGE = 0x05
+SEND = 0x06
+
+FEE_DENOM = 10**6
+SHARE_DENOM = 0xFFFF
+MAX_REGISTERS = 0xFF
+
+# Opcode -> (name, operand layout), where "r" is a register byte, "a" a 20 byte address,
+# "b" a flag byte, "f" a 3 byte fee and "s" a 2 byte share
+INSTRUCTIONS = {
+    WRAP: ("wrap", "rr"),
+    UNWRAP: ("unwrap", "rr"),
+    SWAP: ("swap", "rrabf"),
+    SPLIT: ("split", "rrs"),
+    MERGE: ("merge", "rr"),
+    SEND: ("send", "ra"),
+}
+OPERAND_LENGTHS = {"r": 1, "a": 20, "b": 1, "f": 3, "s": 2}
+
+
+def _operand_bytes(kind, value):
+    if kind == "a":
+        return bytes.fromhex(value[2:])
+    return value.to_bytes(OPERAND_LENGTHS[kind], "big")
+
+
+class PathAssembler:
+    """
+    Builds a path one instruction at a time. Instructions that produce an amount write
+    it to dst, or to a new register if dst is None, and return the register written
+    """
+
+    def __init__(self, num_inputs):
+        self.num_registers = num_inputs
+        self.instructions = []
+
+    def register(self):
+        """
+        Allocates a new register, which starts at 0
+        """
+        if self.num_registers == MAX_REGISTERS:
+            raise ValueError("Too many registers")
+        self.num_registers += 1
+        return self.num_registers - 1
+
+    def _add(self, opcode, *operands):
+        self.instructions.append((opcode, operands))
+
+    def _dst(self, dst):
+        return self.register() if dst is None else dst
+
+    def wrap(self, src, dst=None):
+        dst = self._dst(dst)
+        self._add(WRAP, src, dst)
+        return dst
+
+    def unwrap(self, src, dst=None):
+        dst = self._dst(dst)
+        self._add(UNWRAP, src, dst)
+        return dst
+
+    def swap(self, src, pool, zero_for_one, fee, dst=None):
+        """
+        Swaps through a constant product pool, where fee is in millionths of the input
+        """
+        dst = self._dst(dst)
+        self._add(SWAP, src, dst, pool, int(zero_for_one), fee)
+        return dst
+
+    def split(self, src, fraction, dst=None):
+        """
+        Moves a fraction of src to dst, leaving the rest in src. The fraction is rounded
+        to the nearest multiple of 1 / 0xFFFF
+        """
+        dst = self._dst(dst)
+        self._add(SPLIT, src, dst, round(fraction * SHARE_DENOM))
+        return dst
+
+    def merge(self, src, dst):
+        self._add(MERGE, src, dst)
+        return dst
+
+    def send(self, src, token):
+        """
+        Sends src to the router, with the null address for ETH
+        """
+        self._add(SEND, src, token)
+
+    def assemble(self):
+        path = bytearray([self.num_registers])
+        for opcode, operands in self.instructions:
+            path.append(opcode)
+            for kind, value in zip(INSTRUCTIONS[opcode][1], operands):
+                path += _operand_bytes(kind, value)
+        return "0x" + path.hex()
+
+
+def disassemble(path):
+    """
+    Reads a path back into its register count and a list of (name, operands)
+    instructions, stopping at the first STOP as the executor does
+    """
+    path = bytes.fromhex(path[2:] if path.startswith("0x") else path)
+    instructions = []
+
+    pos = 1
+    while pos < len(path) and path[pos] != STOP:
+        name, layout = INSTRUCTIONS[path[pos]]
+        pos += 1
+
+        operands = []
+        for kind in layout:
+            length = OPERAND_LENGTHS[kind]
+            if kind == "a":
+                operands.append("0x" + path[pos : pos + length].hex())
+            else:
+                operands.append(int.from_bytes(path[pos : pos + length], "big"))
+            pos += length
+        instructions.append((name, tuple(operands)))
+
+    return path[0], instructions
@@ -2,6 +2,8 @@ import math
 import random
 from typing import NamedTuple
 
+from eth_account import Account
+from lib.metrics import instrumented
 from lib.utils import encode_bytes_string
 from web3 import Web3
 
@@ -39,6 +41,7 @@ def permit_transfer_from_hash(type_hash, permissions_hash, spender, nonce, deadl
     ).hex()
 
 
+@instrumented("permit2", "single_hash")
 def single_permit2_hash(
     input_token, input_amount, permit2_spender, permit2_nonce, permit2_deadline
 ):
@@ -55,6 +58,7 @@ def single_permit2_hash(
     )
 
 
+@instrumented("permit2", "batch_hash")
 def batch_permit2_hash(
     input_tokens, input_amounts, permit2_spender, permit2_nonce, permit2_deadline
 ):
@@ -84,3 +88,21 @@ def batch_permit2_hash(
         permit2_nonce,
         permit2_deadline,
     )
+
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+@instrumented("permit2", "sign")
+def sign_permit2(domain_separator, permit2_hash, private_key):
+    """
+    EIP-712 signature of a Permit2 hash, as the signature of a Permit2 swap
+    """
+    message = SignableMessage(
+        b"\x01", _to_bytes(domain_separator), _to_bytes(permit2_hash)
+    )
+    signed_message = Account.sign_message(message, private_key=private_key)
+    return "0x" + bytes(signed_message.signature).hex()
@@ -0,0 +1,208 @@
+import asyncio
+from typing import NamedTuple, Optional
+
+from eth_abi import decode, encode
+from lib.abi_encoder import SELECTORS
+from lib.multichain import ChainClient, function_selector
+from web3 import Web3
+
+# Per-block cache of the account state that swap builds depend on: input token balances,
+# which the router also reads when an input amount is 0, allowances for the router or the
+# Permit2 contract, Permit2 nonce bitmaps and the referral fees reserved in the router.
+# Every read missing from the cache is
+# gathered into one eth_call to a Multicall3 contract, pinned to a block, and the cache
+# is cleared as soon as a newer block is seen
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+# Canonical Multicall3 deployment, at the same address on every chain
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+BALANCE_OF_SELECTOR = function_selector("balanceOf(address)")
+ALLOWANCE_SELECTOR = function_selector("allowance(address,address)")
+NONCE_BITMAP_SELECTOR = function_selector("nonceBitmap(address,uint256)")
+GET_ETH_BALANCE_SELECTOR = function_selector("getEthBalance(address)")
+TRY_BLOCK_AND_AGGREGATE_SELECTOR = function_selector(
+    "tryBlockAndAggregate(bool,(address,bytes)[])"
+)
+
+
+class Read(NamedTuple):
+    # "balance", "allowance", "nonce_bitmap" or "referral_fees_reserved"
+    kind: str
+    # The token, the Permit2 contract for nonce bitmaps or the router for reserves
+    target: str
+    # The holder, or the token of a reserve
+    owner: str
+    # The spender of an allowance, or the word position of a nonce bitmap
+    argument: Optional[object] = None
+
+
+def balance_read(token, owner):
+    return Read("balance", token.lower(), owner.lower())
+
+
+def allowance_read(token, owner, spender):
+    return Read("allowance", token.lower(), owner.lower(), spender.lower())
+
+
+def nonce_bitmap_read(permit2, owner, nonce):
+    """
+    Read of the Permit2 nonce bitmap word holding nonce
+    """
+    return Read("nonce_bitmap", permit2.lower(), owner.lower(), nonce >> 8)
+
+
+def referral_fees_reserved_read(router, token):
+    """
+    Read of the referral fees reserved in the router for token
+    """
+    return Read("referral_fees_reserved", router.lower(), token.lower())
+
+
+def nonce_used(bitmap, nonce):
+    return bool(bitmap >> (nonce & 0xFF) & 1)
+
+
+def swap_reads(sender, input_tokens, router, permit2=None):
+    """
+    Reads that a swap from sender depends on: the balance of every input, the allowance
+    of every ERC20 input for the router, or for the Permit2 contract along with the
+    nonce's bitmap when permit2 is given as (Permit2 contract, nonce, ...)
+    """
+    reads = [balance_read(token, sender) for token in input_tokens]
+    spender = router if permit2 is None else permit2[0]
+    reads += [
+        allowance_read(token, sender, spender) for token in input_tokens if token != ETH
+    ]
+    if permit2 is not None:
+        reads.append(nonce_bitmap_read(permit2[0], sender, permit2[1]))
+    return reads
+
+
+def _address_word(address):
+    return bytes(12) + bytes.fromhex(address[2:])
+
+
+def read_call(read, multicall):
+    """
+    (target, calldata) of the call that makes a read, where ETH balances are read
+    through the multicall
+    """
+    owner = _address_word(read.owner)
+    if read.kind == "balance" and read.target == ETH:
+        return multicall, bytes.fromhex(GET_ETH_BALANCE_SELECTOR) + owner
+    if read.kind == "balance":
+        return read.target, bytes.fromhex(BALANCE_OF_SELECTOR) + owner
+    if read.kind == "allowance":
+        spender = _address_word(read.argument)
+        return read.target, bytes.fromhex(ALLOWANCE_SELECTOR) + owner + spender
+    if read.kind == "nonce_bitmap":
+        word = read.argument.to_bytes(32, "big")
+        return read.target, bytes.fromhex(NONCE_BITMAP_SELECTOR) + owner + word
+    if read.kind == "referral_fees_reserved":
+        return read.target, SELECTORS["referralFeesReserved"] + owner
+    raise ValueError(f"Unknown read {read.kind}")
+
+
+def encode_aggregate(reads, multicall):
+    """
+    Calldata of the tryBlockAndAggregate call making every read
+    """
+    calls = [read_call(read, multicall) for read in reads]
+    return bytes.fromhex(TRY_BLOCK_AND_AGGREGATE_SELECTOR) + encode(
+        ["bool", "(address,bytes)[]"], [False, calls]
+    )
+
+
+def decode_aggregate(data):
+    """
+    Block number and read values of a tryBlockAndAggregate result, with None for reads
+    that failed, such as balances of addresses that are not tokens
+    """
+    block, block_hash, results = decode(["uint256", "bytes32", "(bool,bytes)[]"], data)
+    return block, [
+        int.from_bytes(result[:32], "big") if success and len(result) >= 32 else None
+        for success, result in results
+    ]
+
+
+class PrefetchCache:
+    """
+    Values of reads at the latest block seen, fetched through the Multicall3 contract at
+    multicall_address from the node at rpc_url, with at most max_reads reads per eth_call.
+    round_trips counts the requests sent to the node and reads the reads asked for, so
+    that reads - round_trips is the number of round trips saved over one eth_call per read
+    """
+
+    def __init__(self, rpc_url, multicall_address=MULTICALL3_ADDRESS, max_reads=500):
+        self.multicall = Web3.to_checksum_address(multicall_address)
+        self.client = ChainClient("prefetch", None, self.multicall, rpc_url)
+        self.max_reads = max_reads
+
+        self.block = None
+        self.values = {}
+        self.round_trips = 0
+        self.reads = 0
+
+    async def close(self):
+        await self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def invalidate(self, block):
+        """
+        Clears the cache if block is newer than the cached block, e.g. on a new head
+        """
+        if self.block is None or block > self.block:
+            self.values = {}
+            self.block = block
+
+    def cached(self, read):
+        """
+        Value of a read at the cached block, or None if it has not been fetched
+        """
+        return self.values.get(read)
+
+    async def latest_block(self):
+        self.round_trips += 1
+        return int(await self.client.request("eth_blockNumber", []), 16)
+
+    async def _aggregate(self, reads, block):
+        self.round_trips += 1
+        result = await self.client.call(
+            self.multicall,
+            "0x" + encode_aggregate(reads, self.multicall.lower()).hex(),
+            hex(block),
+        )
+        return decode_aggregate(result)[1]
+
+    async def fetch(self, reads, block=None):
+        """
+        Values of reads at block, or the latest block, in order. Reads already fetched at
+        the block are served from the cache and the rest are fetched together
+        """
+        if block is None:
+            block = await self.latest_block()
+        self.invalidate(block)
+        self.reads += len(reads)
+
+        # Reads of older blocks are fetched but not cached
+        values = self.values if block == self.block else {}
+        missing = list(dict.fromkeys(read for read in reads if read not in values))
+
+        chunks = [
+            missing[i : i + self.max_reads]
+            for i in range(0, len(missing), self.max_reads)
+        ]
+        results = await asyncio.gather(
+            *(self._aggregate(chunk, block) for chunk in chunks)
+        )
+        for chunk, chunk_values in zip(chunks, results):
+            values.update(zip(chunk, chunk_values))
+
+        return [values[read] for read in reads]
@@ -0,0 +1,190 @@
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+from lib import accounting
+from lib.abi_encoder import SELECTORS
+from web3 import Web3
+
+# Client side mirror of the router's referralLookup, and an index of swap volume and
+# referral fees by referral code. A code is registered at most once and never changed,
+# so a code read as registered is cached for that block and every later one, and a code
+# read as unregistered for that block and every earlier one. Codes are read through the
+# public referralLookup getter rather than from storage, so the registry works the same
+# on every deployed router whatever its storage layout
+
+
+class ReferralRegistry:
+    def __init__(self, web3, router):
+        self.web3 = web3
+        self.router = Web3.to_checksum_address(router)
+
+        # code -> referral info, and the earliest block it was read as registered at
+        self.registered = {}
+        self.registered_at = {}
+        # code -> the latest block it was read as unregistered at
+        self.unregistered = {}
+        self.reads = 0
+
+    def _read(self, referral_code, block):
+        self.reads += 1
+        data = self.web3.eth.call(
+            {
+                "to": self.router,
+                "data": "0x"
+                + SELECTORS["referralLookup"].hex()
+                + referral_code.to_bytes(32, "big").hex(),
+            },
+            block_identifier=block,
+        )
+        return {
+            "referralFee": int.from_bytes(data[0:32], "big"),
+            "beneficiary": "0x" + data[44:64].hex(),
+            "registered": bool(int.from_bytes(data[64:96], "big")),
+        }
+
+    def lookup(self, referral_code, block=None):
+        """
+        Returns the referral info of a code as returned by referralLookup, or None if the
+        code is not registered as of block, which defaults to the latest block
+        """
+        if referral_code in self.registered and (
+            block is None or block >= self.registered_at[referral_code]
+        ):
+            return self.registered[referral_code]
+
+        if block is None:
+            block = self.web3.eth.block_number
+        if self.unregistered.get(referral_code, -1) >= block:
+            return None
+
+        referral_info = self._read(referral_code, block)
+        if referral_info["registered"]:
+            self.registered[referral_code] = referral_info
+            self.registered_at[referral_code] = min(
+                block, self.registered_at.get(referral_code, block)
+            )
+            return referral_info
+
+        self.unregistered[referral_code] = block
+        return None
+
+    def referral_fee(self, referral_code, block=None):
+        """
+        Fee charged on swaps with a code, which is 0 for informative and unregistered codes
+        """
+        if referral_code <= accounting.REFERRAL_WITH_FEE_THRESHOLD:
+            return 0
+
+        referral_info = self.lookup(referral_code, block)
+        return 0 if referral_info is None else referral_info["referralFee"]
+
+
+class _Series:
+    # Running totals of one referral code and token, by nondecreasing period
+    def __init__(self):
+        self.periods = []
+        self.volume = []
+        self.fees = []
+
+    def add(self, period, volume, fees):
+        total_volume = self.volume[-1] if self.volume else 0
+        total_fees = self.fees[-1] if self.fees else 0
+
+        if self.periods and self.periods[-1] == period:
+            self.volume[-1] += volume
+            self.fees[-1] += fees
+        else:
+            self.periods.append(period)
+            self.volume.append(total_volume + volume)
+            self.fees.append(total_fees + fees)
+
+    def _total(self, totals, index):
+        return totals[index - 1] if index > 0 else 0
+
+    def between(self, from_period, to_period):
+        start = bisect_left(self.periods, from_period)
+        end = bisect_right(self.periods, to_period)
+
+        return (
+            self._total(self.volume, end) - self._total(self.volume, start),
+            self._total(self.fees, end) - self._total(self.fees, start),
+        )
+
+
+class ReferralIndex:
+    """
+    Volume and referral fees per referral code, output token and period, updated
+    incrementally from (block number, event) pairs. Totals are kept as running sums by
+    period, so the totals over any range of periods are read without rescanning events.
+    Volume is the amount received by users and fees are the full referral fee, including
+    the beneficiary's share. Codes are looked up at each event's block, which needs an
+    archive node for codes the registry has not yet seen registered by that block
+    """
+
+    def __init__(self, registry, period_of=lambda blocks: blocks):
+        self.registry = registry
+        self.period_of = period_of
+        self.last_block = -1
+        self.series = {}
+
+    def update(self, events):
+        """
+        Adds (block number, event) pairs in block order, which must cover whole blocks.
+        Blocks at or below the last block already added are skipped
+        """
+        columns = accounting.events_to_columns(
+            [(block, event) for block, event in events if block > self.last_block]
+        )
+        if len(columns["block"]) == 0:
+            return
+
+        # Each event is charged the fee of its code as of its own block, since a code
+        # used before it was registered pays no fee
+        rows = list(zip(columns["referral_code"].tolist(), columns["block"].tolist()))
+        referral_fees = {
+            (code, block): self.registry.referral_fee(code, block)
+            for code, block in dict.fromkeys(rows)
+        }
+        referral_fee = np.array([referral_fees[row] for row in rows], dtype=np.int64)
+
+        # Undo the referral fee taken from each amount out. Swap takes the fee before it
+        # caps the amount out at the quote, so positive slippage is added back first
+        after_referral_fee = accounting.add(columns["amount_out"], columns["slippage"])
+        fees = accounting.sub(
+            accounting.min_preimage(
+                after_referral_fee, accounting.FEE_DENOM - referral_fee
+            ),
+            after_referral_fee,
+        )
+
+        keys = np.empty(
+            len(columns["block"]),
+            dtype=[("period", "i8"), ("referral_code", "i8"), ("token", "U42")],
+        )
+        keys["period"] = self.period_of(columns["block"])
+        keys["referral_code"] = columns["referral_code"]
+        keys["token"] = columns["token"]
+
+        unique_keys, sums = accounting.aggregate(
+            keys, {"volume": columns["amount_out"], "fees": fees}
+        )
+        for i, (period, referral_code, token) in enumerate(unique_keys.tolist()):
+            code_series = self.series.setdefault(referral_code, {})
+            code_series.setdefault(token, _Series()).add(
+                period, sums["volume"][i], sums["fees"][i]
+            )
+
+        self.last_block = max(self.last_block, int(columns["block"].max()))
+
+    def totals(self, referral_code, from_period, to_period):
+        """
+        Volume and fees by output token for a referral code, over periods from
+        from_period to to_period inclusive
+        """
+        totals = {}
+        for token, series in self.series.get(referral_code, {}).items():
+            volume, fees = series.between(from_period, to_period)
+            if volume or fees:
+                totals[token] = {"volume": volume, "fees": fees}
+
+        return totals
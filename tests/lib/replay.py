@@ -0,0 +1,421 @@
+import asyncio
+import contextlib
+import socket
+import subprocess
+import time
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from lib import classifier, decode_events, storage_layout
+from lib.multichain import ChainClient, RPCError
+
+# Replays a corpus of router calls against two builds of the router on local development
+# chains and compares their gas and outputs. Each worker chain is seeded and
+# snapshotted, then build A is deployed and set up and every call of the worker's share
+# of the corpus is sent from its recorded sender. The chain is then reverted to the
+# snapshot and build B is deployed by the same account with the same nonce, so at the
+# same address, and the same calls are sent again. Calls are sent one at a time so that
+# both builds see the same state before every call, and the corpus is split into
+# contiguous shares across worker chains, which run in parallel
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+# ETH given to every sender on top of the call's value, to pay for gas
+GAS_FUNDING = 10**24
+GAS_LIMIT = 5_000_000
+
+PERMIT2_FUNCTIONS = ["swapPermit2", "swapMultiPermit2"]
+
+# Node specific methods of local development chains, by the name in web3_clientVersion
+DIALECTS = {
+    "ganache": {
+        "set_balance": "evm_setAccountBalance",
+        "set_storage": "evm_setAccountStorageAt",
+        "impersonate": None,
+    },
+    "anvil": {
+        "set_balance": "anvil_setBalance",
+        "set_storage": "anvil_setStorageAt",
+        "impersonate": "anvil_impersonateAccount",
+    },
+    "hardhat": {
+        "set_balance": "hardhat_setBalance",
+        "set_storage": "hardhat_setStorageAt",
+        "impersonate": "hardhat_impersonateAccount",
+    },
+}
+
+# Launches a ganache chain with the same accounts and chain id as Brownie's development
+# network, so that corpora recorded there replay with the same addresses and signatures
+GANACHE_COMMAND = [
+    "ganache",
+    "--server.port",
+    "{port}",
+    "--wallet.mnemonic",
+    "brownie",
+    "--wallet.totalAccounts",
+    "10",
+    "--chain.chainId",
+    "1337",
+    "--miner.blockGasLimit",
+    "30000000",
+    "--logging.quiet",
+]
+
+
+def _hex_word(value):
+    return "0x" + value.to_bytes(32, "big").hex()
+
+
+class DevChain:
+    """
+    Client for a local development chain at rpc_url, with its node specific methods for
+    setting balances and storage, impersonating accounts and snapshots
+    """
+
+    def __init__(self, rpc_url):
+        self.rpc_url = rpc_url
+        self.client = ChainClient("replay", None, None, rpc_url)
+        self.dialect = None
+        self.accounts = []
+        self.impersonated = set()
+
+    async def connect(self):
+        version = (await self.request("web3_clientVersion", [])).lower()
+        self.dialect = next(
+            (name for name in DIALECTS if name in version and name != "ganache"),
+            "ganache",
+        )
+        self.accounts = [
+            account.lower() for account in await self.request("eth_accounts", [])
+        ]
+        return self
+
+    async def close(self):
+        await self.client.close()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def request(self, method, params):
+        return await self.client.request(method, params)
+
+    async def set_balance(self, address, amount):
+        await self.request(
+            DIALECTS[self.dialect]["set_balance"], [address, hex(amount)]
+        )
+
+    async def set_storage(self, address, slot, value):
+        method = DIALECTS[self.dialect]["set_storage"]
+        # Ganache takes the slot as given, the others as a quantity
+        slot = _hex_word(slot) if self.dialect == "ganache" else hex(slot)
+        await self.request(method, [address, slot, _hex_word(value)])
+
+    async def impersonate(self, address):
+        address = address.lower()
+        if address in self.accounts or address in self.impersonated:
+            return
+        method = DIALECTS[self.dialect]["impersonate"]
+        if method is None:
+            await self.request("evm_addAccount", [address, ""])
+            await self.request("personal_unlockAccount", [address, "", 0])
+        else:
+            await self.request(method, [address])
+        self.impersonated.add(address)
+
+    async def snapshot(self):
+        return await self.request("evm_snapshot", [])
+
+    async def revert(self, snapshot):
+        await self.request("evm_revert", [snapshot])
+
+    async def send(self, sender, to, data, value=0, gas=GAS_LIMIT):
+        """
+        Sends a transaction and returns its receipt, or None if the node rejected it
+        without mining it
+        """
+        if isinstance(data, str):
+            # Compiled bytecode is stored without the prefix
+            data = data if data.startswith("0x") else "0x" + data
+        else:
+            data = "0x" + bytes(data).hex()
+        transaction = {
+            "from": sender,
+            "data": data,
+            "value": hex(value),
+            "gas": hex(gas),
+        }
+        if to is not None:
+            transaction["to"] = to
+        try:
+            tx_hash = await self.request("eth_sendTransaction", [transaction])
+        except RPCError as e:
+            # Ganache can report reverts as errors, with the hash of the mined
+            # transaction
+            data = (e.error or {}).get("data")
+            tx_hash = data.get("hash") if isinstance(data, dict) else None
+            if tx_hash is None:
+                return None
+        return await self.request("eth_getTransactionReceipt", [tx_hash])
+
+    async def deploy(self, sender, bytecode):
+        receipt = await self.send(sender, None, bytecode)
+        if receipt is None or int(receipt["status"], 16) != 1:
+            raise RPCError(f"Deployment from {sender} failed")
+        return receipt["contractAddress"].lower()
+
+
+class CallResult(NamedTuple):
+    success: bool
+    gas_used: Optional[int]
+    # amountOut, or every amount of amountsOut, from the router's swap event
+    amounts_out: Tuple[int, ...]
+
+
+class ReplayResult(NamedTuple):
+    index: int
+    # The router function called, or None if the selector is unknown
+    function: Optional[str]
+    a: CallResult
+    b: CallResult
+
+    @property
+    def gas_delta(self):
+        if self.a.gas_used is None or self.b.gas_used is None:
+            return None
+        return self.b.gas_used - self.a.gas_used
+
+    @property
+    def mismatch(self):
+        return (
+            self.a.success != self.b.success or self.a.amounts_out != self.b.amounts_out
+        )
+
+
+def call_result(receipt):
+    if receipt is None:
+        return CallResult(False, None, ())
+    amounts_out = ()
+    for event in decode_events.decode_router_logs(receipt["logs"]):
+        if isinstance(event, decode_events.SwapEvent):
+            amounts_out += (event.amount_out,)
+        else:
+            amounts_out += tuple(event.amounts_out)
+    return CallResult(
+        int(receipt["status"], 16) == 1, int(receipt["gasUsed"], 16), amounts_out
+    )
+
+
+async def read_address_cache(chain, router):
+    """
+    The router's address list and address table, as the classifier mirrors them
+    """
+    client = ChainClient("replay", None, router, chain.rpc_url)
+    try:
+        return await asyncio.gather(client.address_list(), client.address_table())
+    finally:
+        await client.close()
+
+
+class ReplayEngine:
+    """
+    Replays corpus.Corpus calls against the builds of the router with creation bytecode
+    bytecode_a and bytecode_b, on the development chains at rpc_urls. seed(chain) is
+    awaited once on every chain to deploy and fund whatever the calls need, and
+    setup(chain, router) after each build is deployed, e.g. to write the address list
+    and table, which are then read back to classify the calls. Before every call its
+    sender is impersonated and given ETH for the call, and each ERC20 input in
+    token_slots, which maps tokens to their balanceOf and allowance mapping slots, is
+    set to the input amount, with an allowance for the router or for the Permit2
+    contract at permit2
+    """
+
+    def __init__(
+        self,
+        rpc_urls,
+        bytecode_a,
+        bytecode_b,
+        seed=None,
+        setup=None,
+        token_slots=None,
+        permit2=None,
+        gas_limit=GAS_LIMIT,
+    ):
+        self.rpc_urls = rpc_urls
+        self.bytecodes = [bytecode_a, bytecode_b]
+        self.seed = seed
+        self.setup = setup
+        self.token_slots = {
+            token.lower(): slots for token, slots in (token_slots or {}).items()
+        }
+        self.permit2 = permit2
+        self.gas_limit = gas_limit
+
+    async def replay(self, corpus, indices=None):
+        """
+        Results of replaying the calls of corpus at indices, or every call, in order
+        """
+        if indices is None:
+            indices = np.arange(len(corpus))
+        shares = np.array_split(np.asarray(indices), len(self.rpc_urls))
+        results = await asyncio.gather(
+            *(
+                self._replay_share(rpc_url, corpus, share)
+                for rpc_url, share in zip(self.rpc_urls, shares)
+                if len(share)
+            )
+        )
+        return [result for share_results in results for result in share_results]
+
+    async def _replay_share(self, rpc_url, corpus, indices):
+        async with DevChain(rpc_url) as chain:
+            deployer = chain.accounts[0]
+            if self.seed is not None:
+                await self.seed(chain)
+
+            snapshot = await chain.snapshot()
+            runs = []
+            routers = []
+            for bytecode in self.bytecodes:
+                router = await chain.deploy(deployer, bytecode)
+                if self.setup is not None:
+                    await self.setup(chain, router)
+                routers.append(router)
+                runs.append(await self._run(chain, router, corpus, indices))
+
+                # Snapshots are used up by reverting to them
+                await chain.revert(snapshot)
+                snapshot = await chain.snapshot()
+
+        if routers[0] != routers[1]:
+            raise ValueError(f"Builds deployed at {routers[0]} and {routers[1]}")
+
+        functions = corpus.endpoints()
+        return [
+            ReplayResult(int(i), functions[i], a, b) for i, a, b in zip(indices, *runs)
+        ]
+
+    async def _fund(self, chain, router, entry, record):
+        await chain.impersonate(entry.sender)
+        await chain.set_balance(entry.sender, entry.value + GAS_FUNDING)
+        if not isinstance(record, classifier.SwapRecord):
+            return
+
+        spender = self.permit2 if record.function in PERMIT2_FUNCTIONS else router
+        for token, amount, receiver in record.inputs:
+            if token == ETH or token.lower() not in self.token_slots:
+                continue
+            balance_slot, allowance_slot = self.token_slots[token.lower()]
+            owner_allowances = storage_layout.address_mapping_slot(
+                allowance_slot, entry.sender
+            )
+            await chain.set_storage(
+                token,
+                storage_layout.address_mapping_slot(balance_slot, entry.sender),
+                amount,
+            )
+            await chain.set_storage(
+                token,
+                storage_layout.address_mapping_slot(owner_allowances, spender),
+                amount,
+            )
+
+    async def _run(self, chain, router, corpus, indices):
+        transaction_classifier = classifier.TransactionClassifier(
+            router, *await read_address_cache(chain, router)
+        )
+        results = []
+        for i in indices:
+            entry = corpus[int(i)]
+            record = transaction_classifier.classify(
+                {
+                    "hash": bytes(32),
+                    "blockNumber": 0,
+                    "from": entry.sender,
+                    "value": entry.value,
+                    "input": entry.data,
+                }
+            )
+            await self._fund(chain, router, entry, record)
+            receipt = await chain.send(
+                entry.sender, router, entry.data, entry.value, self.gas_limit
+            )
+            results.append(call_result(receipt))
+        return results
+
+
+def compare(results):
+    """
+    Per router function: the calls replayed, the mean gas of each build over the calls
+    that succeeded on both, the mean and largest gas delta of build B over build A, and
+    the number of calls whose success or outputs differ
+    """
+    report = {}
+    for function in sorted({str(result.function) for result in results}):
+        function_results = [
+            result for result in results if str(result.function) == function
+        ]
+        deltas = [
+            result.gas_delta
+            for result in function_results
+            if result.a.success and result.b.success
+        ]
+        gas_a = [
+            result.a.gas_used
+            for result in function_results
+            if result.a.success and result.b.success
+        ]
+        report[function] = {
+            "calls": len(function_results),
+            "gas_a": float(np.mean(gas_a)) if gas_a else None,
+            "gas_b": float(np.mean(gas_a) + np.mean(deltas)) if deltas else None,
+            "mean_delta": float(np.mean(deltas)) if deltas else None,
+            "max_delta": max(deltas, key=abs) if deltas else None,
+            "mismatches": sum(result.mismatch for result in function_results),
+        }
+    return report
+
+
+def _wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+@contextlib.contextmanager
+def worker_chains(num_chains, base_port=8600, command=GANACHE_COMMAND, timeout=60):
+    """
+    Launches num_chains development chains on consecutive ports from base_port, with
+    command formatted with each port, and yields their RPC URLs. The chains are stopped
+    on exit
+    """
+    processes = []
+    try:
+        for port in range(base_port, base_port + num_chains):
+            processes.append(
+                subprocess.Popen(
+                    [part.format(port=port) for part in command],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            )
+        for port in range(base_port, base_port + num_chains):
+            _wait_for_port(port, timeout)
+        yield [
+            f"http://127.0.0.1:{port}"
+            for port in range(base_port, base_port + num_chains)
+        ]
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
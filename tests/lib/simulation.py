@@ -0,0 +1,267 @@
+import asyncio
+from typing import NamedTuple, Optional, Tuple
+
+from eth_abi import decode
+from lib import metrics, storage_layout
+from lib.calldata_service import ENDPOINT_SELECTORS, PERMIT2_ENDPOINTS
+from lib.multichain import ChainClient, RPCError, function_selector
+from web3 import Web3
+
+# Simulates router calls with eth_call before they are sent, so that a quote can be
+# checked against its outputMin or valueOutMin at the latest block. Calls are sent in
+# concurrent JSON-RPC batches, senders are funded and approved through state overrides so
+# that any address can be simulated, and results are cached per block.
+# Permit2 endpoints still check the signature against the sender, so they can only be
+# simulated for the signer, but the signer needs no balance, approval or unused nonce
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+ERROR_SELECTOR = function_selector("Error(string)")
+PANIC_SELECTOR = function_selector("Panic(uint256)")
+
+# Endpoints returning uint256[] amountsOut, every other endpoint returns uint256 amountOut
+MULTI_SELECTORS = {
+    ENDPOINT_SELECTORS[endpoint]
+    for endpoint in ["swapMulti", "swapMultiPermit2", "swapMultiCompact"]
+}
+
+# Endpoints transferring ERC20 inputs with a Permit2 signature
+PERMIT2_SELECTORS = {ENDPOINT_SELECTORS[endpoint] for endpoint in PERMIT2_ENDPOINTS}
+
+# Permit2 declares nonceBitmap before any other variable, EIP712 only has immutables
+PERMIT2_NONCE_BITMAP_SLOT = 0
+
+# ETH given to every simulated sender on top of the call's value, to pay for gas
+GAS_FUNDING = 10**24
+
+
+class Simulation(NamedTuple):
+    sender: str
+    data: str
+    value: int = 0
+    # (token, amount) pairs the sender is given and approves the router for, or the
+    # Permit2 contract on Permit2 endpoints
+    funding: Tuple[Tuple[str, int], ...] = ()
+
+
+class SimulationResult(NamedTuple):
+    success: bool
+    block: int
+    # amountOut, or every amount of amountsOut, if the call succeeded
+    amounts_out: Optional[Tuple[int, ...]]
+    # The decoded revert reason if the call reverted
+    revert_reason: Optional[str]
+
+
+def decode_revert_reason(revert_data):
+    """
+    Decodes the revert data of a call: the message of an Error(string), the code of a
+    Panic(uint256), or the raw data of a custom error
+    """
+    if len(revert_data) < 4:
+        return ""
+    selector = revert_data[:4].hex()
+    if selector == ERROR_SELECTOR:
+        return decode(["string"], revert_data[4:])[0]
+    if selector == PANIC_SELECTOR:
+        return f"Panic({hex(decode(['uint256'], revert_data[4:])[0])})"
+    return "0x" + revert_data.hex()
+
+
+def _revert_data(error):
+    # Nodes return revert data either as the error's data, or nested in it
+    data = (error or {}).get("data")
+    if isinstance(data, dict):
+        data = data.get("result", data.get("data"))
+    if isinstance(data, str) and data.startswith("0x"):
+        return bytes.fromhex(data[2:])
+    return None
+
+
+def decode_permit2(data):
+    """
+    The (Permit2 contract, nonce) of the permit2Info of a Permit2 endpoint's calldata,
+    or None for other endpoints
+    """
+    if data[2:10] not in PERMIT2_SELECTORS:
+        return None
+    args = bytes.fromhex(data[10:])
+    # permit2Info holds the signature, so the first word is the offset of the tuple
+    offset = int.from_bytes(args[:32], "big")
+    return (
+        "0x" + args[offset + 12 : offset + 32].hex(),
+        int.from_bytes(args[offset + 32 : offset + 64], "big"),
+    )
+
+
+def _word_hex(value):
+    return "0x" + value.to_bytes(32, "big").hex()
+
+
+def decode_amounts_out(data, result):
+    if data[2:10] in MULTI_SELECTORS:
+        return tuple(decode(["uint256[]"], result)[0])
+    return (decode(["uint256"], result)[0],)
+
+
+class SimulationEngine:
+    """
+    Simulates calls to the router at router_address against the node at rpc_url, with
+    up to batch_size calls per JSON-RPC batch and max_batches batches in flight.
+    token_slots maps each ERC20 that may be funded to the storage slots of its balanceOf
+    and allowance mappings, which can be found with access_list.find_balance_slot and
+    access_list.find_allowance_slot
+    """
+
+    def __init__(
+        self, rpc_url, router_address, token_slots=None, batch_size=50, max_batches=8
+    ):
+        self.router = Web3.to_checksum_address(router_address)
+        self.client = ChainClient("router", None, self.router, rpc_url)
+        self.token_slots = {
+            token.lower(): slots for token, slots in (token_slots or {}).items()
+        }
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(max_batches)
+
+        # Results of the latest block simulated, keyed by (block, sender, data, value,
+        # funding)
+        self.cache = {}
+        self.cache_block = None
+        self.calls = 0
+
+    async def close(self):
+        await self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def state_overrides(self, simulation):
+        """
+        State overrides giving the sender ETH for the call's value and gas, and each
+        funded token's amount along with an allowance for the router. On Permit2
+        endpoints the allowance is for the Permit2 contract instead, and the word of the
+        sender's nonce bitmap holding the permit's nonce is cleared
+        """
+        overrides = {
+            simulation.sender: {"balance": hex(simulation.value + GAS_FUNDING)}
+        }
+        permit2 = decode_permit2(simulation.data)
+        spender = self.router if permit2 is None else permit2[0]
+        for token, amount in simulation.funding:
+            if token == ETH:
+                continue
+            if token.lower() not in self.token_slots:
+                raise ValueError(f"Unknown balance and allowance slots for {token}")
+
+            balance_slot, allowance_slot = self.token_slots[token.lower()]
+            owner_allowances = storage_layout.address_mapping_slot(
+                allowance_slot, simulation.sender
+            )
+            state_diff = overrides.setdefault(token, {}).setdefault("stateDiff", {})
+            for slot in [
+                storage_layout.address_mapping_slot(balance_slot, simulation.sender),
+                storage_layout.address_mapping_slot(owner_allowances, spender),
+            ]:
+                state_diff[_word_hex(slot)] = _word_hex(amount)
+
+        if permit2 is not None:
+            permit2_contract, nonce = permit2
+            sender_bitmap = storage_layout.address_mapping_slot(
+                PERMIT2_NONCE_BITMAP_SLOT, simulation.sender
+            )
+            nonce_slot = storage_layout.keccak_slot(
+                (nonce >> 8).to_bytes(32, "big"), sender_bitmap.to_bytes(32, "big")
+            )
+            overrides.setdefault(permit2_contract, {}).setdefault("stateDiff", {})[
+                _word_hex(nonce_slot)
+            ] = _word_hex(0)
+        return overrides
+
+    def _request(self, simulation, block):
+        transaction = {
+            "from": simulation.sender,
+            "to": self.router,
+            "data": simulation.data,
+            "value": hex(simulation.value),
+        }
+        return (
+            "eth_call",
+            [transaction, hex(block), self.state_overrides(simulation)],
+        )
+
+    def _result(self, simulation, block, result):
+        if isinstance(result, RPCError):
+            revert_data = _revert_data(result.error)
+            if revert_data is not None:
+                reason = decode_revert_reason(revert_data)
+            else:
+                reason = (result.error or {}).get("message", str(result))
+            return SimulationResult(False, block, None, reason)
+
+        amounts_out = decode_amounts_out(simulation.data, bytes.fromhex(result[2:]))
+        return SimulationResult(True, block, amounts_out, None)
+
+    async def _simulate_batch(self, simulations, block):
+        async with self.semaphore:
+            self.calls += len(simulations)
+            results = await self.client.request_batch(
+                [self._request(simulation, block) for simulation in simulations]
+            )
+        return [
+            self._result(simulation, block, result)
+            for simulation, result in zip(simulations, results)
+        ]
+
+    @metrics.instrumented("simulate")
+    async def simulate_many(self, simulations, block=None):
+        """
+        Simulates every call at block, or the latest block, and returns their results
+        in order. Calls already simulated at the block are read from the cache
+        """
+        if block is None:
+            block = int(await self.client.request("eth_blockNumber", []), 16)
+
+        # Only the latest block's results are kept, since older blocks are not reused
+        if self.cache_block is None or block > self.cache_block:
+            self.cache = {}
+            self.cache_block = block
+
+        keys = [(block,) + tuple(simulation) for simulation in simulations]
+        missing = list(
+            {
+                key: simulation
+                for key, simulation in zip(keys, simulations)
+                if key not in self.cache
+            }.items()
+        )
+
+        batches = await asyncio.gather(
+            *(
+                self._simulate_batch(
+                    [
+                        simulation
+                        for key, simulation in missing[i : i + self.batch_size]
+                    ],
+                    block,
+                )
+                for i in range(0, len(missing), self.batch_size)
+            )
+        )
+
+        results = dict(self.cache)
+        for batch, i in zip(batches, range(0, len(missing), self.batch_size)):
+            for (key, simulation), result in zip(
+                missing[i : i + self.batch_size], batch
+            ):
+                results[key] = result
+                if block == self.cache_block:
+                    self.cache[key] = result
+
+        return [results[key] for key in keys]
+
+    async def simulate(self, simulation, block=None):
+        return (await self.simulate_many([simulation], block))[0]
@@ -0,0 +1,339 @@
+import itertools
+import math
+import random
+
+import numpy as np
+from lib.decode_events import SwapEvent
+
+# Streaming monitor of quote accuracy. Swap events record the slippage of each single
+# swap, its output after referral fees less the output quote, and positive slippage is
+# kept by the router as revenue. The monitor keeps the distribution of the relative
+# slippage, in basis points of the quote, per token pair, referral code and executor and
+# per window of blocks, each in a KLL quantile sketch of bounded size. Sketches of the
+# same key can be merged across windows or across monitors, e.g. one per chain, without
+# the events they were built from
+
+DIMENSIONS = ["pair", "referral_code", "executor"]
+BASIS_POINTS = 10_000
+
+# Each level's capacity is this fraction of the capacity of the level above it
+CAPACITY_RATIO = 2 / 3
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch of a stream of numbers. Items are kept in levels, where an item
+    at level h stands for 2**h items of the stream. When the levels are full, the lowest
+    full level is sorted and every other item, starting from a random one of the first
+    two, is promoted to the level above, so the sketch holds O(k) items however long the
+    stream. Ranks are within about 1.7/k of the stream's, and count, min and max are
+    exact
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.rng = random.Random(seed)
+        self.levels = []
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._size = 0
+        self._max_size = 0
+        self._grow()
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return int(math.ceil(self.k * CAPACITY_RATIO**depth)) + 1
+
+    def _grow(self):
+        self.levels.append([])
+        self._max_size = sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def _compress(self):
+        for level, items in enumerate(self.levels):
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self.levels):
+                self._grow()
+            items.sort()
+            # An odd item out stays at its level
+            start = len(items) % 2
+            self.levels[level + 1].extend(items[start + self.rng.getrandbits(1) :: 2])
+            del items[start:]
+            self._size = sum(len(items) for items in self.levels)
+            if self._size < self._max_size:
+                return
+
+    def update(self, value):
+        self.levels[0].append(value)
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update_many(self, values):
+        values = [float(value) for value in values]
+        if not values:
+            return
+        self.count += len(values)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+        # Added a level's capacity at a time, so that no level grows far past its own
+        step = self._capacity(0)
+        for start in range(0, len(values), step):
+            chunk = values[start : start + step]
+            self.levels[0].extend(chunk)
+            self._size += len(chunk)
+            while self._size >= self._max_size:
+                self._compress()
+
+    def merge(self, other):
+        """
+        Adds the items of another sketch, which is left unchanged
+        """
+        while len(self.levels) < len(other.levels):
+            self._grow()
+        for items, other_items in zip(self.levels, other.levels):
+            items.extend(other_items)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._size = sum(len(items) for items in self.levels)
+        while self._size >= self._max_size:
+            self._compress()
+
+    def copy(self):
+        sketch = KLLSketch(self.k)
+        sketch.merge(self)
+        return sketch
+
+    def _weighted_items(self):
+        values = np.array([value for items in self.levels for value in items])
+        weights = np.concatenate(
+            [np.full(len(items), 1 << level) for level, items in enumerate(self.levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs):
+        """
+        Estimates of the quantiles qs of the stream, with the exact min and max for 0
+        and 1, or None for each if the stream is empty
+        """
+        if self.count == 0:
+            return [None] * len(qs)
+        values, cumulative = self._weighted_items()
+        ranks = np.searchsorted(cumulative, np.asarray(qs) * cumulative[-1])
+        return [
+            self.min if q <= 0 else self.max if q >= 1 else float(values[rank])
+            for q, rank in zip(qs, ranks)
+        ]
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def rank(self, value):
+        """
+        Estimate of the fraction of the stream at or below value
+        """
+        if self.count == 0:
+            return None
+        values, cumulative = self._weighted_items()
+        index = np.searchsorted(values, value, side="right")
+        return float(cumulative[index - 1] / cumulative[-1]) if index else 0.0
+
+    def to_dict(self):
+        return {
+            "k": self.k,
+            "levels": [list(items) for items in self.levels],
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, state, seed=None):
+        sketch = cls(state["k"], seed)
+        while len(sketch.levels) < len(state["levels"]):
+            sketch._grow()
+        sketch.levels = [list(items) for items in state["levels"]]
+        sketch.count = state["count"]
+        sketch.min = state["min"]
+        sketch.max = state["max"]
+        sketch._size = sum(len(items) for items in sketch.levels)
+        return sketch
+
+
+def relative_slippage(event):
+    """
+    Slippage of a Swap event in basis points of its output quote, or None if the quote
+    is zero. The event's output is capped at the quote when the slippage is positive, so
+    the quote is the output less any negative slippage
+    """
+    quote = event.amount_out - min(event.slippage, 0)
+    if quote <= 0:
+        return None
+    return event.slippage * BASIS_POINTS / quote
+
+
+def _key(dimension, event, executor):
+    if dimension == "pair":
+        return (event.input_token.lower(), event.output_token.lower())
+    elif dimension == "referral_code":
+        return event.referral_code
+    return executor.lower() if executor is not None else None
+
+
+class SlippageMonitor:
+    """
+    Sketches of the relative slippage of decoded router events, per key of each
+    dimension and per window of blocks. window_of maps a block number to an integer
+    window, e.g. block // 7200 for days on Ethereum, and only the latest max_windows
+    windows are kept if it is set. Multi swaps have no slippage and are skipped
+    """
+
+    def __init__(self, k=200, window_of=lambda block: 0, max_windows=None, seed=None):
+        self.k = k
+        self.window_of = window_of
+        self.max_windows = max_windows
+        self.rng = random.Random(seed)
+        self.last_block = -1
+        # (dimension, key) -> window -> KLLSketch
+        self.sketches = {}
+
+    def _sketch(self, dimension, key, window):
+        windows = self.sketches.setdefault((dimension, key), {})
+        sketch = windows.get(window)
+        if sketch is None:
+            sketch = windows[window] = KLLSketch(self.k, self.rng.getrandbits(64))
+        return sketch
+
+    def update(self, events, executors=None):
+        """
+        Adds (block number, event) pairs, which must cover whole blocks, with the
+        executor of each event in executors if they are known, e.g. from the
+        transactions' classifier.SwapRecord. Blocks at or below the last block already
+        added are skipped, so overlapping ranges can be passed safely
+        """
+        if executors is None:
+            executors = itertools.repeat(None)
+        values = {}
+        last_block = self.last_block
+        for (block, event), executor in zip(events, executors):
+            if block <= self.last_block:
+                continue
+            last_block = max(last_block, block)
+            if not isinstance(event, SwapEvent):
+                continue
+            value = relative_slippage(event)
+            if value is None:
+                continue
+            window = self.window_of(block)
+            for dimension in DIMENSIONS:
+                key = _key(dimension, event, executor)
+                if key is not None:
+                    values.setdefault((dimension, key, window), []).append(value)
+
+        for (dimension, key, window), key_values in values.items():
+            self._sketch(dimension, key, window).update_many(key_values)
+        self.last_block = last_block
+        self._evict()
+
+    def _evict(self):
+        if self.max_windows is None:
+            return
+        windows = sorted(
+            {window for key_windows in self.sketches.values() for window in key_windows}
+        )
+        if len(windows) <= self.max_windows:
+            return
+        oldest = windows[-self.max_windows]
+        for key, key_windows in list(self.sketches.items()):
+            for window in [window for window in key_windows if window < oldest]:
+                del key_windows[window]
+            if not key_windows:
+                del self.sketches[key]
+
+    def merge(self, other):
+        """
+        Adds the sketches of another monitor, e.g. of another chain or one that read
+        another range of blocks, which is left unchanged. The last block added is not
+        changed, since the other monitor's blocks may be of another chain
+        """
+        for (dimension, key), key_windows in other.sketches.items():
+            for window, sketch in key_windows.items():
+                self._sketch(dimension, key, window).merge(sketch)
+        self._evict()
+
+    def keys(self, dimension):
+        return [
+            key for key_dimension, key in self.sketches if key_dimension == dimension
+        ]
+
+    def sketch(self, dimension, key, windows=None):
+        """
+        The sketch of a key over windows, or over every window kept, merged into a new
+        sketch. None if the key has no events in those windows
+        """
+        merged = None
+        for window, sketch in self.sketches.get((dimension, key), {}).items():
+            if windows is not None and window not in windows:
+                continue
+            if merged is None:
+                merged = sketch.copy()
+            else:
+                merged.merge(sketch)
+        return merged
+
+    def quantiles(self, dimension, key, qs, windows=None):
+        sketch = self.sketch(dimension, key, windows)
+        if sketch is None:
+            return [None] * len(qs)
+        return sketch.quantiles(qs)
+
+    def summary(self, dimension, qs=(0.5, 0.9, 0.99), windows=None):
+        """
+        Per key of dimension: the number of swaps, the share with positive slippage and
+        the quantiles qs of the relative slippage in basis points
+        """
+        summary = {}
+        for key in self.keys(dimension):
+            sketch = self.sketch(dimension, key, windows)
+            if sketch is None:
+                continue
+            summary[key] = {
+                "count": sketch.count,
+                "positive": 1 - sketch.rank(0),
+                "quantiles": dict(zip(qs, sketch.quantiles(qs))),
+            }
+        return summary
+
+    def to_dict(self):
+        """
+        The monitor's sketches as plain data, which can be saved as JSON and merged into
+        another monitor after from_dict
+        """
+        return {
+            "k": self.k,
+            "last_block": self.last_block,
+            "sketches": [
+                [dimension, key, window, sketch.to_dict()]
+                for (dimension, key), key_windows in self.sketches.items()
+                for window, sketch in key_windows.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, state, window_of=lambda block: 0, max_windows=None, seed=None):
+        monitor = cls(state["k"], window_of, max_windows, seed)
+        monitor.last_block = state["last_block"]
+        for dimension, key, window, sketch in state["sketches"]:
+            # Pairs come back from JSON as lists
+            key = tuple(key) if isinstance(key, list) else key
+            monitor.sketches.setdefault((dimension, key), {})[window] = (
+                KLLSketch.from_dict(sketch, monitor.rng.getrandbits(64))
+            )
+        monitor._evict()
+        return monitor
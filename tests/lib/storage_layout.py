@@ -0,0 +1,106 @@
+from web3 import Web3
+
+# Storage layout of OdosRouterV2. Values are packed into a slot starting from the
+# lowest order bytes, in declaration order. The first four slots are the same as in the
+# routers already deployed, and variables added since are declared after them.
+# packedEvents and referralFeeAccrual are pure functions overridden by the router's
+# variants, so they take no slot
+
+OWNER_SLOT = 0
+ADDRESS_LIST_SLOT = 1
+SWAP_MULTI_FEE_SLOT = 2
+REFERRAL_LOOKUP_SLOT = 3
+ADDRESS_TABLE_SLOT = 4
+REFERRAL_FEES_OWED_SLOT = 5
+REFERRAL_FEES_RESERVED_SLOT = 6
+
+# (name, slot, byte offset in the slot, byte size, read by)
+STORAGE_LAYOUT = [
+    ("_owner", OWNER_SLOT, 0, 20, "owner functions"),
+    ("addressList", ADDRESS_LIST_SLOT, 0, 32, "compact swaps, per entry"),
+    ("swapMultiFee", SWAP_MULTI_FEE_SLOT, 0, 32, "multi swaps"),
+    (
+        "referralLookup",
+        REFERRAL_LOOKUP_SLOT,
+        0,
+        32,
+        "swaps with referral fees, per code",
+    ),
+    ("addressTable", ADDRESS_TABLE_SLOT, 0, 32, "compact swaps, per chunk"),
+    ("referralFeesOwed", REFERRAL_FEES_OWED_SLOT, 0, 32, "referral fee accrual"),
+    (
+        "referralFeesReserved",
+        REFERRAL_FEES_RESERVED_SLOT,
+        0,
+        32,
+        "referral fee accrual",
+    ),
+]
+
+
+def _word(value):
+    return value.to_bytes(32, "big")
+
+
+def _address_word(address):
+    return bytes(12) + bytes.fromhex(address[2:])
+
+
+def keccak_slot(*words):
+    return int.from_bytes(Web3.keccak(b"".join(words)), "big")
+
+
+# Slot of an element of a dynamic array stored at array_slot
+def array_element_slot(array_slot, index):
+    return keccak_slot(_word(array_slot)) + index
+
+
+def address_list_slot(index):
+    return array_element_slot(ADDRESS_LIST_SLOT, index)
+
+
+def address_table_slot(chunk_index):
+    return array_element_slot(ADDRESS_TABLE_SLOT, chunk_index)
+
+
+# Slot holding the packed referralFee, beneficiary and registered fields of a referral code
+def referral_lookup_slot(referral_code):
+    return keccak_slot(_word(referral_code), _word(REFERRAL_LOOKUP_SLOT))
+
+
+def referral_fees_owed_slot(beneficiary, token):
+    return keccak_slot(
+        _address_word(token),
+        _word(keccak_slot(_address_word(beneficiary), _word(REFERRAL_FEES_OWED_SLOT))),
+    )
+
+
+def referral_fees_reserved_slot(token):
+    return keccak_slot(_address_word(token), _word(REFERRAL_FEES_RESERVED_SLOT))
+
+
+# Slot of the value of key in a Solidity mapping(address => ...) stored at mapping_slot,
+# e.g. the balanceOf mapping of an ERC20
+def address_mapping_slot(mapping_slot, key):
+    return keccak_slot(_address_word(key), _word(mapping_slot))
+
+
+def unpack_referral_info(value):
+    return {
+        "referralFee": value & ((1 << 64) - 1),
+        "beneficiary": "0x"
+        + ((value >> 64) & ((1 << 160) - 1)).to_bytes(20, "big").hex(),
+        "registered": bool((value >> 224) & 0xFF),
+    }
+
+
+def layout_report():
+    lines = [f"{'variable':<22}{'slot':>6}{'offset':>8}{'bytes':>7}  read by"]
+    for name, slot, offset, size, read_by in STORAGE_LAYOUT:
+        lines.append(f"{name:<22}{slot:>6}{offset:>8}{size:>7}  {read_by}")
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(layout_report())
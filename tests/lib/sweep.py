@@ -0,0 +1,229 @@
+from lib import prefetch
+from lib.access_list import COLD_ACCOUNT_ACCESS_COST, COLD_SLOAD_COST, WARM_ACCESS_COST
+
+# Plans and submits sweeps of the revenue held by the router with transferRouterFunds and
+# swapRouterFunds. Every sweep uses an amount of 0, which the router reads as its full
+# balance of the token less any referral fees reserved for beneficiaries
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+TX_BASE_GAS = 21_000
+CALLDATA_WORD_GAS = 32 * 16
+SSTORE_SET_GAS = 20_000
+SSTORE_RESET_GAS = 2_900
+CALL_VALUE_GAS = 9_000
+NEW_ACCOUNT_GAS = 25_000
+LOG_GAS = 375
+LOG_TOPIC_GAS = 375
+LOG_DATA_GAS = 8
+
+# Opcodes of the router and of an OpenZeppelin ERC20 around the costs listed below, with
+# room to spare for tokens with hooks or fee logic
+EXECUTION_OVERHEAD_GAS = 5_000
+
+# Worst-case gas model of a sweep from the EIP-2929 and EIP-2200 gas schedule, with every
+# token, slot and receiver cold, every calldata byte nonzero and every receiver's balance
+# starting at zero. test_sweep checks it against sweeps of fresh tokens to a fresh
+# receiver. The base cost covers the transaction, the ABI head of the call and the
+# onlyOwner check
+TRANSFER_ROUTER_FUNDS_BASE_GAS = (
+    TX_BASE_GAS + 6 * CALLDATA_WORD_GAS + COLD_SLOAD_COST + EXECUTION_OVERHEAD_GAS
+)
+# An ERC20 costs its token and amount words, the cold referralFeesReserved slot, a cold
+# balanceOf of the router, the transfer from the router's balance to a new balance and
+# its Transfer event, and the warm balance check after the transfer
+ERC20_SWEEP_GAS = (
+    2 * CALLDATA_WORD_GAS
+    + COLD_SLOAD_COST
+    + COLD_ACCOUNT_ACCESS_COST
+    + COLD_SLOAD_COST
+    + SSTORE_RESET_GAS
+    + COLD_SLOAD_COST
+    + SSTORE_SET_GAS
+    + LOG_GAS
+    + 3 * LOG_TOPIC_GAS
+    + 32 * LOG_DATA_GAS
+    + 2 * WARM_ACCESS_COST
+    + EXECUTION_OVERHEAD_GAS
+)
+# ETH costs its words, the cold referralFeesReserved slot and a call with value to a
+# cold, empty receiver
+ETH_SWEEP_GAS = (
+    2 * CALLDATA_WORD_GAS
+    + COLD_SLOAD_COST
+    + COLD_ACCOUNT_ACCESS_COST
+    + CALL_VALUE_GAS
+    + NEW_ACCOUNT_GAS
+    + EXECUTION_OVERHEAD_GAS
+)
+# A swap of router funds also calls a cold executor, pays out one ERC20 output and emits
+# SwapMulti, whose data is taken as 16 words
+SWAP_ROUTER_FUNDS_BASE_GAS = (
+    TRANSFER_ROUTER_FUNDS_BASE_GAS
+    + COLD_ACCOUNT_ACCESS_COST
+    + ERC20_SWEEP_GAS
+    + LOG_GAS
+    + LOG_TOPIC_GAS
+    + 16 * 32 * LOG_DATA_GAS
+)
+
+# Default gas cap of a single sweep, well below the block gas limit of every chain the
+# router is deployed on
+MAX_SWEEP_GAS = 10_000_000
+
+
+async def read_sweepable_balances(cache, router, tokens, block=None):
+    """
+    Reads the amount of each token that a sweep with an amount of 0 would move, which is
+    the router's balance less the referral fees reserved in it, at block or the latest
+    block. Every balance and reserve is read through cache, a prefetch.PrefetchCache, so
+    that the reads are batched into one eth_call per max_reads reads. Reads that fail,
+    such as balances of addresses that are not tokens, count as 0
+    """
+    reads = [prefetch.balance_read(token, router) for token in tokens] + [
+        prefetch.referral_fees_reserved_read(router, token) for token in tokens
+    ]
+    values = [value or 0 for value in await cache.fetch(reads, block)]
+
+    return {
+        token: balance - reserved
+        for token, balance, reserved in zip(
+            tokens, values[: len(tokens)], values[len(tokens) :]
+        )
+    }
+
+
+def filter_dust(amounts, prices, min_value):
+    """
+    Drops tokens whose sweepable amount is worth less than min_value, where prices maps a
+    token to the value of one base unit. Tokens without a price are treated as dust.
+    Returns (token, amount, value) tuples in order of decreasing value
+    """
+    sweeps = []
+    for token, amount in amounts.items():
+        if amount <= 0 or token not in prices:
+            continue
+
+        value = amount * prices[token]
+        if value >= min_value:
+            sweeps.append((token, amount, value))
+
+    return sorted(sweeps, key=lambda sweep: sweep[2], reverse=True)
+
+
+def sweep_gas(token):
+    return ETH_SWEEP_GAS if token == ETH else ERC20_SWEEP_GAS
+
+
+def pack_batches(tokens, base_gas, max_gas=MAX_SWEEP_GAS, max_tokens=None):
+    """
+    Packs tokens into batches in the given order, so that the modelled gas of each batch
+    stays under max_gas. Returns a list of (tokens, modelled gas) pairs
+    """
+    batches = []
+    batch = []
+    batch_gas = base_gas
+
+    for token in tokens:
+        token_gas = sweep_gas(token)
+        full = max_tokens is not None and len(batch) >= max_tokens
+
+        if batch and (batch_gas + token_gas > max_gas or full):
+            batches.append((batch, batch_gas))
+            batch = []
+            batch_gas = base_gas
+
+        batch.append(token)
+        batch_gas += token_gas
+
+    if batch:
+        batches.append((batch, batch_gas))
+
+    return batches
+
+
+def plan_transfers(sweeps, dest, max_gas=MAX_SWEEP_GAS):
+    """
+    Builds the transferRouterFunds calls that send every token in sweeps to dest
+    """
+    return [
+        ("transferRouterFunds", [tokens, [0] * len(tokens), dest], gas)
+        for tokens, gas in pack_batches(
+            [token for token, amount, value in sweeps],
+            TRANSFER_ROUTER_FUNDS_BASE_GAS,
+            max_gas,
+        )
+    ]
+
+
+def plan_swaps(sweeps, quote, max_gas=MAX_SWEEP_GAS, max_inputs=None):
+    """
+    Builds the swapRouterFunds calls that swap every token in sweeps. quote is called
+    with the input tokens and amounts of each batch and returns (outputs, valueOutMin,
+    pathDefinition, executor, path gas) for the batch, where path gas is the gas the
+    executor is expected to use. Batches whose path pushes them over max_gas are split
+    in half and quoted again
+    """
+    amounts = {token: amount for token, amount, value in sweeps}
+
+    calls = []
+    pending = pack_batches(
+        list(amounts), SWAP_ROUTER_FUNDS_BASE_GAS, max_gas, max_inputs
+    )
+    while pending:
+        tokens, gas = pending.pop(0)
+        outputs, value_out_min, path_definition, executor, path_gas = quote(
+            tokens, [amounts[token] for token in tokens]
+        )
+        if gas + path_gas > max_gas and len(tokens) > 1:
+            half = len(tokens) // 2
+            pending[:0] = pack_batches(
+                tokens[:half], SWAP_ROUTER_FUNDS_BASE_GAS, max_gas
+            ) + pack_batches(tokens[half:], SWAP_ROUTER_FUNDS_BASE_GAS, max_gas)
+            continue
+
+        calls.append(
+            (
+                "swapRouterFunds",
+                [
+                    [[token, 0, executor] for token in tokens],
+                    outputs,
+                    value_out_min,
+                    path_definition,
+                    executor,
+                ],
+                gas + path_gas,
+            )
+        )
+
+    return calls
+
+
+def submit_calls(web3, router_contract, calls, sender, private_key=None, wait=True):
+    """
+    Submits calls with consecutive nonces without waiting for each one to be mined, so
+    that a whole sweep can land in a single block. Transactions are signed with
+    private_key if given, and otherwise sent from an account unlocked on the node.
+    Returns the receipts in order if wait is set, and the transaction hashes otherwise
+    """
+    nonce = web3.eth.get_transaction_count(sender, "pending")
+
+    tx_hashes = []
+    for i, (function_name, args, gas) in enumerate(calls):
+        tx = getattr(router_contract.functions, function_name)(*args).build_transaction(
+            {
+                "from": sender,
+                "nonce": nonce + i,
+                "gas": gas,
+            }
+        )
+        if private_key is None:
+            tx_hashes.append(web3.eth.send_transaction(tx))
+        else:
+            signed_tx = web3.eth.account.sign_transaction(tx, private_key)
+            tx_hashes.append(web3.eth.send_raw_transaction(signed_tx.rawTransaction))
+
+    if not wait:
+        return tx_hashes
+
+    return [web3.eth.wait_for_transaction_receipt(tx_hash) for tx_hash in tx_hashes]
@@ -5,31 +5,17 @@ from web3 import Web3
 
 
 def random_hex_string(num_bytes):
-    hex_string = "0x"
-
-    for i in range(num_bytes * 2):
-        hex_string += random.choice(
-            [
-                "0",
-                "1",
-                "2",
-                "3",
-                "4",
-                "5",
-                "6",
-                "7",
-                "8",
-                "9",
-                "a",
-                "b",
-                "c",
-                "d",
-                "e",
-                "f",
-            ]
-        )
-
-    return hex_string
+    return "0x" + random.randbytes(num_bytes).hex()
+
+
+def random_hex_strings(num, num_bytes, rng=random):
+    """
+    num random hex strings of num_bytes bytes each, cut from one block of random bytes
+    drawn from rng, a random.Random or the random module
+    """
+    block = rng.randbytes(num * num_bytes).hex()
+    width = 2 * num_bytes
+    return ["0x" + block[i : i + width] for i in range(0, len(block), width)]
 
 
 def random_private_key():
@@ -40,6 +26,10 @@ def random_address():
     return random_hex_string(20)
 
 
+def random_addresses(num, rng=random):
+    return random_hex_strings(num, 20, rng)
+
+
 # Encodes an unsigned integer as bytes to be decoded by the smart contract
 def encode_bytes_list(num, length):
     assert num < (1 << (length * 8)), "Number too big to be encoded"
@@ -50,17 +40,29 @@ def encode_bytes_string(num, length):
     return bytes(encode_bytes_list(num, length)).hex()
 
 
-def encode_address(address, address_list):
+# Flag set in the 2 byte code of an address cached in the address table rather than the address list
+ADDRESS_TABLE_FLAG = 0x8000
+
+
+def encode_address(address, address_list, address_table=None):
 
     # If address is cached in the address list, encode its position plus 2 for the two special cases
     if address in address_list:
         return encode_bytes_string(address_list.index(address) + 2, 2)
-    elif address == "0x0000000000000000000000000000000000000000":
+
+    # If address is cached in an address table chunk, encode the chunk index and offset in the chunk
+    for chunk_index, chunk in enumerate(address_table or []):
+        if address in chunk:
+            return encode_bytes_string(
+                ADDRESS_TABLE_FLAG | (chunk_index << 8) | chunk.index(address), 2
+            )
+
+    if address == "0x0000000000000000000000000000000000000000":
         return "0000"
     else:
         return "0001" + address[2:]
 
-def decode_address(start_index, byte_string, address_list):
+def decode_address(start_index, byte_string, address_list, address_table=None):
 
     token_id = byte_string[start_index:start_index+4]
 
@@ -69,24 +71,71 @@ def decode_address(start_index, byte_string, address_list):
     elif token_id == "0001":
         end_index = start_index + 44
         return "0x" + byte_string[start_index+4:end_index], end_index
+    elif int(token_id, 16) & ADDRESS_TABLE_FLAG:
+        chunk_index = (int(token_id, 16) >> 8) & 0x7F
+        return address_table[chunk_index][int(token_id, 16) & 0xFF], start_index + 4
     else:
         address_list_index = int(token_id, 16) - 2
         return address_list[address_list_index], start_index + 4
 
-def encode_amount(amount):
+# Flag set in the length byte of an amount encoded as a mantissa and base 10 exponent
+EXPONENT_AMOUNT_FLAG = 0x80
+
+
+def encode_amount(amount, exponent_amounts=False):
     if amount == 0:
         return "00"
-    else:
-        byte_length = max(math.ceil(math.log2(amount) / 8), 1)
 
-        return encode_bytes_string(byte_length, 1) + encode_bytes_string(
-            amount, byte_length
-        )
+    byte_length = (amount.bit_length() + 7) // 8
+
+    encoded_amount = encode_bytes_string(byte_length, 1) + encode_bytes_string(
+        amount, byte_length
+    )
+    if exponent_amounts:
+        encoded_exponent_amount = encode_exponent_amount(amount)
+
+        # Only use the mantissa and exponent when it is strictly shorter
+        if len(encoded_exponent_amount) < len(encoded_amount):
+            return encoded_exponent_amount
+
+    return encoded_amount
+
+
+# Encodes a nonzero amount as a mantissa scaled by a power of 10, which is
+# much shorter than the plain encoding for round amounts like 1e18
+def encode_exponent_amount(amount):
+    mantissa = amount
+    exponent = 0
+
+    while mantissa % 10 == 0:
+        mantissa //= 10
+        exponent += 1
+
+    mantissa_length = (mantissa.bit_length() + 7) // 8
+
+    return (
+        encode_bytes_string(EXPONENT_AMOUNT_FLAG | mantissa_length, 1)
+        + encode_bytes_string(exponent, 1)
+        + encode_bytes_string(mantissa, mantissa_length)
+    )
 
 def decode_amount(start_index, byte_string):
 
     length = int(byte_string[start_index:start_index+2], 16)
 
+    if length & EXPONENT_AMOUNT_FLAG:
+        mantissa_length = length & 0x7F
+        exponent = int(byte_string[start_index + 2:start_index + 4], 16)
+
+        end_index = start_index + 4 + mantissa_length * 2
+
+        if mantissa_length == 0:
+            return 0, end_index
+
+        mantissa = int(byte_string[start_index + 4: end_index], 16)
+
+        return mantissa * 10 ** exponent, end_index
+
     if length == 0:
         return 0, start_index + 2
 
@@ -0,0 +1,295 @@
+import random
+from typing import NamedTuple, Tuple
+
+import numpy as np
+from lib import utils
+from lib.calldata_service import ENDPOINT_TYPES, SwapSpec, encode_spec
+
+# Generates reproducible synthetic swap workloads shaped like production traffic, as
+# columnar arrays. Tokens are drawn from a Zipf-like popularity distribution, with ETH
+# the most popular, swap values are log-normal, multi swaps have geometric leg counts,
+# and referral codes, slippage limits and the address list are drawn at configurable
+# rates. Legs are stored flat with an offsets array per side, so that millions of swaps
+# fit in a few arrays, and each swap is only turned into a SwapSpec, calldata or a
+# transaction when it is read
+
+ETH = "0x0000000000000000000000000000000000000000"
+EXECUTOR = "0x0000000000000000000000000000000000001dea"
+PERMIT2 = "0x000000000022D473030F116dDEE9F6B43aC78BA3"
+
+ENDPOINTS = list(ENDPOINT_TYPES)
+MULTI_ENDPOINTS = ["swapMulti", "swapMultiPermit2", "swapMultiCompact"]
+REFERRAL_WITH_FEE_THRESHOLD = 1 << 31
+
+# Bytes of path definition per input and output of a swap
+PATH_BYTES_PER_LEG = 64
+DEADLINE = (1 << 48) - 1
+
+
+class WorkloadConfig(NamedTuple):
+    num_tokens: int = 2_000
+    num_senders: int = 100_000
+    # The k-th most popular token is drawn with probability proportional to 1 / k**s,
+    # and likewise for senders
+    token_zipf_exponent: float = 1.1
+    sender_zipf_exponent: float = 0.8
+    # Share of swaps on each endpoint, in the order of ENDPOINTS
+    endpoint_shares: Tuple[float, ...] = (0.28, 0.06, 0.13, 0.03, 0.33, 0.17)
+    # Multi swaps have 1 input and 1 output plus a geometric number of extra legs on
+    # each side, each with this probability, up to max_legs per side
+    extra_leg_probability: float = 0.35
+    max_legs: int = 6
+    # Swap values in reference units, and token prices, are log-normal
+    median_value: float = 500.0
+    value_sigma: float = 2.0
+    price_sigma: float = 3.0
+    # Share of input amounts typed by hand, rounded to 2 significant digits
+    round_amount_share: float = 0.3
+    # Share of the input value lost to fees and price impact in the quotes
+    quote_discount: float = 0.003
+    # Share of swaps with a referral code, and share of those codes with a fee
+    referral_share: float = 0.15
+    referral_fee_share: float = 0.5
+    num_referral_codes: int = 1_000
+    # The address list holds this many of the most popular ERC20s
+    address_list_size: int = 256
+    slippage_percents: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.03)
+    slippage_shares: Tuple[float, ...] = (0.1, 0.4, 0.3, 0.2)
+
+
+def zipf_probabilities(num, exponent):
+    """
+    Probabilities of ranks 1 to num under a finite Zipf distribution
+    """
+    weights = np.arange(1, num + 1, dtype=float) ** -exponent
+    return weights / weights.sum()
+
+
+def _leg_counts(rng, multi, config):
+    extra = rng.geometric(1 - config.extra_leg_probability, len(multi)) - 1
+    return np.where(multi, 1 + np.minimum(extra, config.max_legs - 1), 1)
+
+
+def _offsets(counts):
+    return np.concatenate([[0], np.cumsum(counts)])
+
+
+def _repeated_rows(legs):
+    # Rows of a padded token matrix, with -1 for missing legs, that draw a token twice
+    ordered = np.sort(legs, axis=1)
+    return ((ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] >= 0)).any(axis=1)
+
+
+def _draw_legs(rng, input_counts, output_counts, permit2_singles, probabilities):
+    # Draws the tokens of every swap as a matrix of inputs then outputs, padded with
+    # -1, redrawing swaps that use a token twice or that pull ETH through swapPermit2
+    width = int(input_counts.max() + output_counts.max())
+    columns = np.arange(width)
+    max_inputs = int(input_counts.max())
+    present = (columns < input_counts[:, None]) | (
+        (columns >= max_inputs) & (columns < max_inputs + output_counts[:, None])
+    )
+
+    legs = np.full(present.shape, -1, dtype=np.int32)
+    redraw = np.ones(len(input_counts), dtype=bool)
+    while redraw.any():
+        rows = np.flatnonzero(redraw)
+        draws = rng.choice(len(probabilities), (len(rows), width), p=probabilities)
+        legs[rows] = np.where(present[rows], draws, -1)
+        redraw[rows] = _repeated_rows(legs[rows]) | (
+            permit2_singles[rows] & (legs[rows, 0] == 0)
+        )
+
+    input_tokens = legs[:, :max_inputs][present[:, :max_inputs]]
+    output_tokens = legs[:, max_inputs:][present[:, max_inputs:]]
+    return input_tokens, output_tokens
+
+
+def _round_amounts(amounts):
+    # Rounds to 2 significant digits
+    scale = 10.0 ** (np.floor(np.log10(amounts)) - 1)
+    return np.maximum(np.round(amounts / scale) * scale, 1)
+
+
+class Workload:
+    """
+    Columns of num_swaps synthetic swaps. Tokens and senders are stored as indices into
+    tokens and senders, and the legs of swap i are input_tokens and input_amounts in
+    input_offsets[i]:input_offsets[i + 1], and likewise for outputs. Amounts are float64
+    columns of whole base units, exact up to 2**53
+    """
+
+    def __init__(self, num_swaps, config=WorkloadConfig(), seed=0):
+        self.config = config
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        addresses = random.Random(seed)
+
+        # Tokens, by decreasing popularity
+        self.tokens = [ETH] + utils.random_addresses(config.num_tokens - 1, addresses)
+        self.senders = utils.random_addresses(config.num_senders, addresses)
+        self.decimals = rng.choice([6, 8, 18], config.num_tokens, p=[0.15, 0.05, 0.8])
+        self.decimals[0] = 18
+        self.prices = rng.lognormal(0, config.price_sigma, config.num_tokens)
+        self.address_list = self.tokens[1 : config.address_list_size + 1]
+
+        self.endpoints = rng.choice(
+            len(ENDPOINTS), num_swaps, p=config.endpoint_shares
+        ).astype(np.uint8)
+        multi = np.isin(
+            self.endpoints, [ENDPOINTS.index(endpoint) for endpoint in MULTI_ENDPOINTS]
+        )
+        self.input_counts = _leg_counts(rng, multi, config)
+        self.output_counts = _leg_counts(rng, multi, config)
+        self.input_offsets = _offsets(self.input_counts)
+        self.output_offsets = _offsets(self.output_counts)
+
+        self.input_tokens, self.output_tokens = _draw_legs(
+            rng,
+            self.input_counts,
+            self.output_counts,
+            self.endpoints == ENDPOINTS.index("swapPermit2"),
+            zipf_probabilities(config.num_tokens, config.token_zipf_exponent),
+        )
+        self.sender_indices = rng.choice(
+            config.num_senders,
+            num_swaps,
+            p=zipf_probabilities(config.num_senders, config.sender_zipf_exponent),
+        ).astype(np.int32)
+
+        # The value of a swap is split evenly between its inputs, and between its
+        # outputs by random shares, less the quote discount
+        values = rng.lognormal(
+            np.log(config.median_value), config.value_sigma, num_swaps
+        )
+        input_values = np.repeat(values / self.input_counts, self.input_counts)
+        input_amounts = np.maximum(
+            np.floor(
+                input_values
+                / self.prices[self.input_tokens]
+                * 10.0 ** self.decimals[self.input_tokens]
+            ),
+            1,
+        )
+        rounded = rng.random(len(input_amounts)) < config.round_amount_share
+        input_amounts[rounded] = _round_amounts(input_amounts[rounded])
+        self.input_amounts = input_amounts
+
+        shares = rng.exponential(1, len(self.output_tokens))
+        shares /= np.repeat(
+            np.add.reduceat(shares, self.output_offsets[:-1]), self.output_counts
+        )
+        output_values = (
+            np.repeat(values, self.output_counts) * shares * (1 - config.quote_discount)
+        )
+        self.output_quotes = np.maximum(
+            np.floor(
+                output_values
+                / self.prices[self.output_tokens]
+                * 10.0 ** self.decimals[self.output_tokens]
+            ),
+            1,
+        )
+
+        codes = np.concatenate(
+            [
+                rng.integers(1, REFERRAL_WITH_FEE_THRESHOLD, config.num_referral_codes),
+                rng.integers(
+                    REFERRAL_WITH_FEE_THRESHOLD + 1, 1 << 32, config.num_referral_codes
+                ),
+            ]
+        )
+        with_fee = rng.random(num_swaps) < config.referral_fee_share
+        code_indices = rng.integers(0, config.num_referral_codes, num_swaps)
+        self.referral_codes = np.where(
+            rng.random(num_swaps) < config.referral_share,
+            codes[code_indices + with_fee * config.num_referral_codes],
+            0,
+        ).astype(np.uint32)
+        self.slippage_percents = rng.choice(
+            config.slippage_percents, num_swaps, p=config.slippage_shares
+        )
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def endpoint(self, i):
+        return ENDPOINTS[self.endpoints[i]]
+
+    def indices(self, endpoint):
+        """
+        Indices of the swaps on an endpoint
+        """
+        return np.flatnonzero(self.endpoints == ENDPOINTS.index(endpoint))
+
+    def address_list_coverage(self):
+        """
+        Share of ERC20 legs whose token is in the address list
+        """
+        legs = np.concatenate([self.input_tokens, self.output_tokens])
+        legs = legs[legs != 0]
+        return float(np.mean(legs <= self.config.address_list_size))
+
+    def spec(self, i, executor=EXECUTOR):
+        """
+        SwapSpec of swap i through executor. Path definitions and Permit2 signatures
+        are random bytes, drawn the same way every time the swap is read
+        """
+        i = int(i)
+        inputs = slice(self.input_offsets[i], self.input_offsets[i + 1])
+        outputs = slice(self.output_offsets[i], self.output_offsets[i + 1])
+        rng = random.Random(self.seed << 64 | i)
+        endpoint = self.endpoint(i)
+
+        permit2 = None
+        if endpoint in ["swapPermit2", "swapMultiPermit2"]:
+            permit2 = (PERMIT2, i, DEADLINE, "0x" + rng.randbytes(65).hex())
+        num_legs = self.input_counts[i] + self.output_counts[i]
+
+        return SwapSpec(
+            endpoint=endpoint,
+            sender=self.senders[self.sender_indices[i]],
+            input_tokens=tuple(
+                self.tokens[token] for token in self.input_tokens[inputs]
+            ),
+            input_amounts=tuple(int(amount) for amount in self.input_amounts[inputs]),
+            output_tokens=tuple(
+                self.tokens[token] for token in self.output_tokens[outputs]
+            ),
+            output_quotes=tuple(int(quote) for quote in self.output_quotes[outputs]),
+            max_slippage_percent=float(self.slippage_percents[i]),
+            executor=executor,
+            path_definition="0x" + rng.randbytes(PATH_BYTES_PER_LEG * num_legs).hex(),
+            referral_code=int(self.referral_codes[i]),
+            permit2=permit2,
+        )
+
+    def specs(self, indices=None, executor=EXECUTOR):
+        for i in range(len(self)) if indices is None else indices:
+            yield self.spec(i, executor)
+
+    def calldata(self, i, executor=EXECUTOR):
+        """
+        Calldata of swap i, with compact swaps encoded against the address list
+        """
+        return encode_spec(self.spec(i, executor), self.address_list)
+
+    def transactions(self, router, indices=None, executor=EXECUTOR):
+        """
+        Swaps as transactions to router, in the format of eth_getTransactionByHash, for
+        the transaction classifier
+        """
+        for i in range(len(self)) if indices is None else indices:
+            spec = self.spec(i, executor)
+            yield {
+                "hash": "0x" + int(i).to_bytes(32, "big").hex(),
+                "blockNumber": int(i),
+                "from": spec.sender,
+                "to": router,
+                "value": sum(
+                    amount
+                    for token, amount in zip(spec.input_tokens, spec.input_amounts)
+                    if token == ETH
+                ),
+                "input": encode_spec(spec, self.address_list),
+            }
@@ -0,0 +1,106 @@
+import random
+
+import brownie
+import pytest
+from brownie import accounts
+from eth_abi import encode
+from lib import abi_encoder, calldata_service, utils
+
+
+@pytest.fixture(scope="module")
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def random_amount(rng):
+    return rng.randrange(0, 1 << rng.choice([8, 64, 128, 256]))
+
+
+def random_token_infos(rng, num):
+    return [
+        (utils.random_address(), random_amount(rng), utils.random_address())
+        for i in range(num)
+    ]
+
+
+def random_args(rng, num_inputs, num_outputs):
+    token_info = (
+        utils.random_address(),
+        random_amount(rng),
+        utils.random_address(),
+        utils.random_address(),
+        random_amount(rng),
+        random_amount(rng),
+        utils.random_address(),
+    )
+    permit2 = (
+        utils.random_address(),
+        random_amount(rng),
+        random_amount(rng),
+        bytes(rng.randrange(256) for i in range(rng.choice([0, 64, 65]))),
+    )
+    path_definition = bytes(rng.randrange(256) for i in range(rng.randrange(200)))
+    executor = utils.random_address()
+    referral_code = rng.randrange(1 << 32)
+    inputs = random_token_infos(rng, num_inputs)
+    outputs = random_token_infos(rng, num_outputs)
+    value_out_min = random_amount(rng)
+
+    return {
+        "swap": [token_info, path_definition, executor, referral_code],
+        "swapPermit2": [permit2, token_info, path_definition, executor, referral_code],
+        "swapMulti": [
+            inputs,
+            outputs,
+            value_out_min,
+            path_definition,
+            executor,
+            referral_code,
+        ],
+        "swapMultiPermit2": [
+            permit2,
+            inputs,
+            outputs,
+            value_out_min,
+            path_definition,
+            executor,
+            referral_code,
+        ],
+    }
+
+
+def test_selectors(router):
+    for name, selector in abi_encoder.SELECTORS.items():
+        assert "0x" + selector.hex() == router.signatures[name]
+
+
+@pytest.mark.parametrize("num_inputs,num_outputs", [(0, 0), (1, 1), (3, 2), (8, 8)])
+def test_matches_eth_abi(num_inputs, num_outputs):
+    rng = random.Random(num_inputs * 10 + num_outputs)
+    for i in range(20):
+        for endpoint, args in random_args(rng, num_inputs, num_outputs).items():
+            assert calldata_service.ENCODERS[endpoint](*args) == abi_encoder.SELECTORS[
+                endpoint
+            ] + encode(calldata_service.ENDPOINT_TYPES[endpoint], args)
+
+
+def test_matches_web3(router):
+    args = random_args(random.Random(0), 2, 3)
+    for endpoint in ["swap", "swapMulti"]:
+        assert "0x" + calldata_service.ENCODERS[endpoint](
+            *args[endpoint]
+        ).hex() == getattr(router, endpoint).encode_input(*args[endpoint])
+
+
+def test_out_of_range():
+    args = random_args(random.Random(0), 1, 1)
+    with pytest.raises(OverflowError):
+        abi_encoder.encode_swap(*args["swap"][:3], 1 << 32)
+    with pytest.raises(OverflowError):
+        abi_encoder.encode_swap_multi(
+            args["swapMulti"][0], args["swapMulti"][1], 1 << 256, *args["swapMulti"][3:]
+        )
@@ -0,0 +1,232 @@
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import access_list, encode_compact, storage_layout
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def swap_compact(router, weth_executor, address_list):
+    input_amount = int(1e18)
+
+    compact_router_data = encode_compact.construct_compact_swap_data(
+        "0x01",
+        "0x0000000000000000000000000000000000000000",
+        weth_executor.WETH(),
+        input_amount,
+        input_amount,
+        0.01,
+        weth_executor.address,
+        weth_executor.address,
+        "msg.sender",
+        address_list,
+        0,
+    )
+    tx = accounts[0].transfer(
+        router.address,
+        input_amount,
+        data=router.signatures["swapCompact"] + compact_router_data[2:],
+    )
+    return compact_router_data, tx
+
+
+def test_find_balance_slot(weth_executor):
+    weth_address = weth_executor.WETH()
+    brownie.interface.IWETH(weth_address).deposit(
+        {"from": accounts[0], "value": int(1e18)}
+    )
+
+    # WETH9 declares balanceOf after name, symbol and decimals
+    assert access_list.find_balance_slot(web3, weth_address, accounts[0].address) == 3
+    assert (
+        access_list.find_balance_slot(web3, weth_address, accounts[1].address) is None
+    )
+
+
+def test_find_allowance_slot(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    brownie.interface.IERC20(weth_address).approve(
+        router.address, int(1e18), {"from": accounts[0]}
+    )
+
+    # WETH9 declares allowance after balanceOf
+    assert (
+        access_list.find_allowance_slot(
+            web3, weth_address, accounts[0].address, router.address
+        )
+        == 4
+    )
+    assert (
+        access_list.find_allowance_slot(
+            web3, weth_address, accounts[1].address, router.address
+        )
+        is None
+    )
+
+
+def test_compact_swap_accesses(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    address_list = [weth_address, weth_executor.address]
+    router.writeAddressList(address_list, {"from": accounts[0]})
+
+    compact_router_data, tx = swap_compact(router, weth_executor, address_list)
+
+    predicted = access_list.compact_swap_accesses(
+        compact_router_data,
+        router.address,
+        accounts[0].address,
+        address_list,
+        balance_slots={weth_address: 3},
+    )
+    traced = access_list.trace_accesses(web3, tx.txid)
+
+    # Every predicted access is made by the swap
+    for address, slots in predicted.items():
+        assert address in traced
+        assert slots <= traced[address]
+
+
+def test_input_allowance_access(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    address_list = [weth_address, weth_executor.address]
+
+    compact_router_data = encode_compact.construct_compact_swap_data(
+        "0x01",
+        weth_address,
+        "0x0000000000000000000000000000000000000000",
+        int(1e18),
+        int(1e18),
+        0.01,
+        weth_executor.address,
+        weth_executor.address,
+        "msg.sender",
+        address_list,
+        0,
+    )
+    accesses = access_list.compact_swap_accesses(
+        compact_router_data,
+        router.address,
+        accounts[0].address,
+        address_list,
+        balance_slots={weth_address: 3},
+        allowance_slots={weth_address: 4},
+    )
+    allowance_slot = storage_layout.address_mapping_slot(
+        storage_layout.address_mapping_slot(4, accounts[0].address), router.address
+    )
+
+    # transferFrom reads the sender's allowance for the router next to both balances
+    assert accesses[weth_address.lower()] == {
+        storage_layout.address_mapping_slot(3, accounts[0].address),
+        storage_layout.address_mapping_slot(3, weth_executor.address),
+        storage_layout.address_mapping_slot(3, router.address),
+        allowance_slot,
+    }
+
+
+def test_fee_referral_requires_info(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    address_list = [weth_address, weth_executor.address]
+    referral_code = 2**31 + 1
+
+    compact_router_data = encode_compact.construct_compact_swap_data(
+        "0x01",
+        "0x0000000000000000000000000000000000000000",
+        weth_address,
+        int(1e18),
+        int(1e18),
+        0.01,
+        weth_executor.address,
+        weth_executor.address,
+        "msg.sender",
+        address_list,
+        referral_code,
+    )
+    # A code that takes a fee pays a beneficiary that only the referral info has
+    with pytest.raises(ValueError, match="referral_info is required"):
+        access_list.compact_swap_accesses(
+            compact_router_data,
+            router.address,
+            accounts[0].address,
+            address_list,
+        )
+
+    beneficiary = accounts[5].address
+    accesses = access_list.compact_swap_accesses(
+        compact_router_data,
+        router.address,
+        accounts[0].address,
+        address_list,
+        referral_info={"beneficiary": beneficiary},
+        balance_slots={weth_address: 3},
+    )
+    assert storage_layout.address_mapping_slot(3, beneficiary) in (
+        accesses[weth_address.lower()]
+    )
+
+
+def test_build_access_list(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    address_list = [weth_address, weth_executor.address]
+
+    compact_router_data = encode_compact.construct_compact_swap_data(
+        "0x01",
+        "0x0000000000000000000000000000000000000000",
+        weth_address,
+        int(1e18),
+        int(1e18),
+        0.01,
+        weth_executor.address,
+        weth_executor.address,
+        "msg.sender",
+        address_list,
+        0,
+    )
+    accesses = access_list.compact_swap_accesses(
+        compact_router_data,
+        router.address,
+        accounts[0].address,
+        address_list,
+        balance_slots={weth_address: 3},
+    )
+    full_list = access_list.build_access_list(
+        accesses, accounts[0].address, router.address, prune=False
+    )
+    pruned_list = access_list.build_access_list(
+        accesses, accounts[0].address, router.address
+    )
+
+    # The router is already warm, so listing its few slots costs more than it saves
+    assert router.address in [entry["address"] for entry in full_list]
+    assert router.address not in [entry["address"] for entry in pruned_list]
+
+    # The executor and WETH with the router's and sender's balance slots are kept
+    assert (
+        access_list.net_gas_effect(pruned_list, accounts[0].address, router.address)
+        == 2 * 100 + 2 * 100
+    )
+    assert access_list.net_gas_effect(
+        pruned_list, accounts[0].address, router.address
+    ) > access_list.net_gas_effect(full_list, accounts[0].address, router.address)
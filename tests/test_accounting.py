@@ -0,0 +1,169 @@
+import random
+
+import brownie
+import numpy as np
+import pytest
+from brownie import accounts, web3
+from lib import accounting
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def test_limbs():
+    values = [0, 1, (1 << 32) - 1, 1 << 32, (1 << 256) - 1]
+    assert accounting.from_limbs(accounting.to_limbs(values)) == values
+
+    smaller = [0, 0, 1, (1 << 32) - 1, 1 << 255]
+    x = accounting.to_limbs(values)
+    y = accounting.to_limbs(smaller)
+    assert accounting.from_limbs(accounting.add(x, y)) == [
+        a + b for a, b in zip(values, smaller)
+    ]
+    assert accounting.from_limbs(accounting.sub(x, y)) == [
+        a - b for a, b in zip(values, smaller)
+    ]
+
+
+def test_mul_div():
+    rng = random.Random(0)
+    for bits in [16, 64, 128, 256]:
+        values = [rng.randrange(1 << bits) for i in range(200)]
+        numerators = [rng.randrange(1 << 61) for value in values]
+        denominators = [rng.randrange(1, 1 << 61) for value in values]
+        args = (
+            accounting.to_limbs(values),
+            np.array(numerators, dtype=np.int64),
+            np.array(denominators, dtype=np.int64),
+        )
+
+        assert accounting.from_limbs(accounting.mul_div(*args)) == [
+            value * numerator // denominator
+            for value, numerator, denominator in zip(values, numerators, denominators)
+        ]
+        assert accounting.from_limbs(accounting.mul_div(*args, round_up=True)) == [
+            -(-value * numerator // denominator)
+            for value, numerator, denominator in zip(values, numerators, denominators)
+        ]
+
+
+def test_min_preimage():
+    numerators = accounting.FEE_DENOM - np.array(
+        [0, 1, int(5e14), int(1e15), int(3e16)], dtype=np.int64
+    )
+    for i in range(200):
+        raw_amounts = [random.randrange(1 << 128) for numerator in numerators]
+        amounts = [
+            raw_amount * int(numerator) // accounting.FEE_DENOM
+            for raw_amount, numerator in zip(raw_amounts, numerators)
+        ]
+        preimages = accounting.from_limbs(
+            accounting.min_preimage(accounting.to_limbs(amounts), numerators)
+        )
+
+        # The preimage gives back the same amount and is at most 1 wei below the raw amount
+        for raw_amount, amount, preimage, numerator in zip(
+            raw_amounts, amounts, preimages, numerators
+        ):
+            assert preimage * int(numerator) // accounting.FEE_DENOM == amount
+            assert 0 <= raw_amount - preimage <= 1
+
+
+def test_referral_fee_column():
+    threshold = accounting.REFERRAL_WITH_FEE_THRESHOLD
+    codes = np.array([0, 7, threshold + 1, threshold + 2, threshold + 1])
+
+    # Codes below the threshold and unknown codes above it take no fee
+    assert accounting.referral_fee_column(
+        codes, {7: 5, threshold + 1: int(1e15)}
+    ).tolist() == [0, 0, int(1e15), 0, int(1e15)]
+
+
+def test_revenue_ledger(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    input_amount = int(1e18)
+    referral_code = router.REFERRAL_WITH_FEE_THRESHOLD() + 1
+    referral_fee = int(1e15)
+
+    router.registerReferralCode(
+        referral_code, referral_fee, accounts[2], {"from": accounts[0]}
+    )
+    start_block = web3.eth.block_number
+
+    # Positive slippage on a swap with a referral fee
+    router.swap(
+        [
+            "0x0000000000000000000000000000000000000000",
+            input_amount,
+            weth_executor.address,
+            weth_address,
+            input_amount // 2,
+            input_amount // 2,
+            accounts[0],
+        ],
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        referral_code,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    )
+    # The swapMultiFee on a multi swap
+    router.swapMulti(
+        [
+            [
+                "0x0000000000000000000000000000000000000000",
+                input_amount,
+                weth_executor.address,
+            ]
+        ],
+        [[weth_address, 1, accounts[0]]],
+        1,
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        0,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    )
+    logs = web3.eth.get_logs(
+        {"address": router.address, "fromBlock": start_block + 1, "toBlock": "latest"}
+    )
+    ledger = accounting.RevenueLedger(
+        {referral_code: referral_fee}, router.swapMultiFee()
+    )
+    ledger.update(accounting.logs_to_events(logs))
+
+    # Adding the same blocks again does not count them twice
+    ledger.update(accounting.logs_to_events(logs))
+
+    totals = ledger.token_totals()[weth_address.lower()]
+    assert totals["slippage"] > 0
+    assert totals["swap_multi_fee"] > 0
+    assert totals["referral_fee"] > 0
+
+    WETH = brownie.interface.IWETH(weth_address)
+    assert sum(totals.values()) == WETH.balanceOf(router.address)
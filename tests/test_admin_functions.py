@@ -1,7 +1,7 @@
 import brownie
 import pytest
 from lib import utils
-from brownie import accounts
+from brownie import accounts, web3
 
 
 @pytest.fixture
@@ -160,6 +160,72 @@ def test_write_address_list(router, weth_executor):
         assert address == router.addressList(i)
 
 
+def test_write_address_list_append(router, weth_executor):
+
+    first_addresses = [utils.random_address() for i in range(3)]
+    second_addresses = [utils.random_address() for i in range(2)]
+
+    for addresses_to_write in [first_addresses, second_addresses]:
+        router.writeAddressList(
+            addresses_to_write,
+            {
+                "from": accounts[0],
+            },
+        )
+    for i, address in enumerate(first_addresses + second_addresses):
+        assert address == router.addressList(i)
+
+    with brownie.reverts():
+        router.addressList(len(first_addresses) + len(second_addresses))
+
+
+def test_write_address_table_protected(router, weth_executor):
+    addresses_to_write = [utils.random_address() for i in range(3)]
+    with brownie.reverts("Ownable: caller is not the owner"):
+        router.writeAddressTable(
+            addresses_to_write,
+            {
+                "from": accounts[1],
+            },
+        )
+
+
+def test_write_address_table_invalid_size(router, weth_executor):
+    chunk_size = router.ADDRESS_TABLE_CHUNK_SIZE()
+
+    for addresses_to_write in [
+        [],
+        [utils.random_address() for i in range(chunk_size + 1)],
+    ]:
+        with brownie.reverts("Invalid chunk size"):
+            router.writeAddressTable(
+                addresses_to_write,
+                {
+                    "from": accounts[0],
+                },
+            )
+
+
+def test_write_address_table(router, weth_executor):
+
+    address_table = [
+        [utils.random_address() for i in range(3)],
+        [utils.random_address() for i in range(router.ADDRESS_TABLE_CHUNK_SIZE())],
+    ]
+    for chunk in address_table:
+        router.writeAddressTable(
+            chunk,
+            {
+                "from": accounts[0],
+            },
+        )
+    # Each chunk is a data contract starting with a STOP opcode followed by the packed addresses
+    for i, chunk in enumerate(address_table):
+        assert web3.eth.get_code(router.addressTable(i)).hex() == "0x00" + "".join(
+            address[2:] for address in chunk
+        )
+
+
 def test_transfer_funds_protected(router, weth_executor):
     with brownie.reverts("Ownable: caller is not the owner"):
         router.transferRouterFunds(
@@ -248,3 +314,25 @@ def test_set_multi_swap_fee(router, weth_executor):
         },
     )
     assert router.swapMultiFee() == new_multi_swap_fee
+
+
+def test_packed_events(router, weth_executor):
+    assert not router.packedEvents()
+
+    packed_router = brownie.OdosRouterV2PackedEvents.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+    assert packed_router.packedEvents()
+
+
+def test_referral_fee_accrual(router, weth_executor):
+    assert not router.referralFeeAccrual()
+
+    accrual_router = brownie.OdosRouterV2ReferralAccrual.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+    assert accrual_router.referralFeeAccrual()
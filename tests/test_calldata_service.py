@@ -0,0 +1,197 @@
+import asyncio
+
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import calldata_service, permit2, utils
+
+ETH = "0x0000000000000000000000000000000000000000"
+WRAP_PATH = "0x01"
+UNWRAP_PATH = "0x00"
+INPUT_AMOUNT = int(1e18)
+DEADLINE = (1 << 48) - 1
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def permit2_contract():
+    return brownie.Permit2.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+
+
+@pytest.fixture
+def permit2_account(weth_executor, permit2_contract):
+    account = accounts.add(utils.random_private_key())
+    accounts[0].transfer(account, 10 * INPUT_AMOUNT)
+
+    WETH = brownie.interface.IWETH(weth_executor.WETH())
+    WETH.deposit({"from": account, "value": 5 * INPUT_AMOUNT})
+    WETH.approve(permit2_contract.address, 2**256 - 1, {"from": account})
+    return account
+
+
+def wrap_spec(weth_executor, endpoint, input_amount=INPUT_AMOUNT):
+    return calldata_service.SwapSpec(
+        endpoint=endpoint,
+        sender=accounts[0].address,
+        input_tokens=(ETH,),
+        input_amounts=(input_amount,),
+        output_tokens=(weth_executor.WETH(),),
+        output_quotes=(input_amount,),
+        max_slippage_percent=0.01,
+        executor=weth_executor.address,
+        path_definition=WRAP_PATH,
+    )
+
+
+def unwrap_permit2_spec(router, weth_executor, permit2_contract, account, endpoint):
+    # Spends the account's WETH through a Permit2 signature for the router
+    weth_address = weth_executor.WETH()
+    nonce = 0
+    if endpoint == "swapPermit2":
+        permit2_hash = permit2.single_permit2_hash(
+            weth_address, INPUT_AMOUNT, router.address, nonce, DEADLINE
+        )
+    else:
+        permit2_hash = permit2.batch_permit2_hash(
+            [weth_address], [INPUT_AMOUNT], router.address, nonce, DEADLINE
+        )
+    signature = permit2.sign_permit2(
+        permit2_contract.DOMAIN_SEPARATOR(), permit2_hash, account.private_key
+    )
+
+    return calldata_service.SwapSpec(
+        endpoint=endpoint,
+        sender=account.address,
+        input_tokens=(weth_address,),
+        input_amounts=(INPUT_AMOUNT,),
+        output_tokens=(ETH,),
+        output_quotes=(INPUT_AMOUNT,),
+        max_slippage_percent=0.01,
+        executor=weth_executor.address,
+        path_definition=UNWRAP_PATH,
+        permit2=(permit2_contract.address, nonce, DEADLINE, signature),
+    )
+
+
+def build_many(router, specs):
+    async def build():
+        async with calldata_service.CalldataService(
+            web3.provider.endpoint_uri, router.address
+        ) as service:
+            calls = await service.build_many(specs)
+        return service, calls
+
+    return asyncio.run(build())
+
+
+@pytest.mark.parametrize("endpoint", list(calldata_service.ENDPOINT_TYPES))
+def test_build_and_send(
+    router, weth_executor, permit2_contract, permit2_account, endpoint
+):
+    router.writeAddressList(
+        [weth_executor.WETH(), weth_executor.address], {"from": accounts[0]}
+    )
+    WETH = brownie.interface.IWETH(weth_executor.WETH())
+
+    # Permit2 endpoints unwrap the signer's WETH, and the others wrap ETH
+    if endpoint in calldata_service.PERMIT2_ENDPOINTS:
+        sender = permit2_account
+        spec = unwrap_permit2_spec(
+            router, weth_executor, permit2_contract, permit2_account, endpoint
+        )
+        value, weth_delta = 0, -INPUT_AMOUNT
+    else:
+        sender = accounts[0]
+        spec = wrap_spec(weth_executor, endpoint)
+        value, weth_delta = INPUT_AMOUNT, INPUT_AMOUNT
+
+    service, [call] = build_many(router, [spec])
+
+    assert call.to == router.address
+    assert call.value == value
+    assert call.approvals_needed == ()
+    assert call.shortfalls == ()
+
+    balance_before = WETH.balanceOf(sender)
+    tx = sender.transfer(call.to, call.value, data=call.data)
+    assert WETH.balanceOf(sender) - balance_before == weth_delta
+    assert tx.gas_used < call.gas + 50_000
+
+
+def test_erc20_checks(router, weth_executor):
+    spec = wrap_spec(weth_executor, "swap")._replace(
+        sender=accounts[1].address,
+        input_tokens=(weth_executor.WETH(),),
+        output_tokens=(ETH,),
+        path_definition="0x00",
+    )
+
+    service, [call] = build_many(router, [spec])
+
+    assert call.value == 0
+    assert call.approvals_needed == (weth_executor.WETH(),)
+    assert call.shortfalls == (weth_executor.WETH(),)
+
+
+def test_coalescing(router, weth_executor):
+    spec = wrap_spec(weth_executor, "swap")
+    other_spec = wrap_spec(weth_executor, "swap", INPUT_AMOUNT // 2)
+
+    service, calls = build_many(router, [spec, spec, other_spec])
+
+    # Identical specs share one build, and the reads of every build share one batch
+    assert service.builds == 2
+    assert service.batcher.batches == 1
+    assert calls[0] == calls[1]
+    assert calls[0] != calls[2]
+
+
+def test_address_list_read_failure():
+    service = calldata_service.CalldataService("http://localhost:0", ETH)
+    results = [calldata_service.RPCError("node unavailable"), [ETH]]
+
+    async def read_address_list():
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    service._read_address_list = read_address_list
+
+    async def run():
+        with pytest.raises(calldata_service.RPCError):
+            await service.address_list()
+        # The failed read is evicted, so the next call reads the list again within the TTL
+        assert await service.address_list() == [ETH]
+        assert await service.address_list() == [ETH]
+        await service.close()
+
+    asyncio.run(run())
+    assert results == []
@@ -0,0 +1,161 @@
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import classifier, encode_compact, limits
+
+ETH = "0x0000000000000000000000000000000000000000"
+INPUT_AMOUNT = int(1e18)
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def send_transactions(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    address_list = [weth_address, weth_executor.address]
+
+    txs = [router.writeAddressList(address_list, {"from": accounts[0]})]
+    txs.append(
+        router.swap(
+            [
+                ETH,
+                INPUT_AMOUNT,
+                weth_executor.address,
+                weth_address,
+                INPUT_AMOUNT,
+                INPUT_AMOUNT,
+                accounts[0],
+            ],
+            "0x01",
+            weth_executor.address,
+            0,
+            {"value": INPUT_AMOUNT, "from": accounts[0]},
+        )
+    )
+    txs.append(
+        router.swapMulti(
+            [[ETH, INPUT_AMOUNT, weth_executor.address]],
+            [[weth_address, 1, accounts[1]]],
+            INPUT_AMOUNT,
+            "0x01",
+            weth_executor.address,
+            7,
+            {"value": INPUT_AMOUNT, "from": accounts[0]},
+        )
+    )
+    compact_data = encode_compact.construct_compact_swap_data(
+        "0x01",
+        ETH,
+        weth_address,
+        INPUT_AMOUNT,
+        INPUT_AMOUNT,
+        0.01,
+        weth_executor.address,
+        weth_executor.address,
+        "msg.sender",
+        address_list,
+        0,
+    )
+    txs.append(
+        accounts[0].transfer(
+            router.address,
+            INPUT_AMOUNT,
+            data=router.signatures["swapCompact"] + compact_data[2:],
+        )
+    )
+    return address_list, txs
+
+
+def test_classify_transactions(router, weth_executor):
+    address_list, txs = send_transactions(router, weth_executor)
+    transaction_classifier = classifier.TransactionClassifier(
+        router.address, address_list
+    )
+    weth_address = weth_executor.WETH().lower()
+    executor = weth_executor.address.lower()
+    sender = accounts[0].address.lower()
+
+    records = [
+        transaction_classifier.classify(web3.eth.get_transaction(tx.txid)) for tx in txs
+    ]
+
+    assert records[0].function == "writeAddressList"
+    assert [address.lower() for address in records[0].args[0]] == [
+        weth_address,
+        executor,
+    ]
+
+    swap, swap_multi, swap_compact = records[1:]
+    assert swap.function == "swap"
+    assert swap.inputs == ((ETH, INPUT_AMOUNT, executor),)
+    assert swap.outputs == ((weth_address, INPUT_AMOUNT, sender),)
+    assert swap.min_out == INPUT_AMOUNT
+
+    assert swap_multi.function == "swapMulti"
+    assert swap_multi.outputs == ((weth_address, 1, accounts[1].address.lower()),)
+    assert swap_multi.referral_code == 7
+
+    # The compact swap decodes to the same swap, apart from its minimum output
+    assert swap_compact.function == "swapCompact"
+    assert swap_compact.inputs == swap.inputs
+    assert swap_compact.outputs == swap.outputs
+    assert swap_compact.executor == executor
+    assert (
+        swap_compact.min_out
+        == INPUT_AMOUNT * (0xFFFFFF - limits.slippage_tolerance(0.01)) // 0xFFFFFF
+    )
+
+    blocks = [web3.eth.get_block(tx.block_number, True) for tx in txs]
+    assert list(transaction_classifier.stream(blocks)) == records
+    assert (
+        list(
+            classifier.classify_parallel(
+                [dict(web3.eth.get_transaction(tx.txid)) for tx in txs],
+                router.address,
+                address_list,
+                processes=2,
+                chunk_size=1,
+            )
+        )
+        == records
+    )
+
+
+def test_malformed_calldata(router):
+    transaction_classifier = classifier.TransactionClassifier(router.address)
+    transaction = {
+        "hash": "0x" + bytes(32).hex(),
+        "blockNumber": 1,
+        "from": accounts[0].address,
+        "to": router.address,
+        "value": 0,
+    }
+
+    record = transaction_classifier.classify(
+        dict(transaction, input=router.signatures["swapCompact"] + "0002")
+    )
+    assert record.function == "swapCompact" and record.args is None
+
+    record = transaction_classifier.classify(dict(transaction, input="0x12345678"))
+    assert record.function is None
@@ -0,0 +1,83 @@
+import pytest
+from lib import corpus, replay, workload
+
+ROUTER = "0x19ceead7105607cd444f5ad10dd51356436095a1"
+
+
+def test_round_trip(tmp_path):
+    swaps = workload.Workload(2_000)
+    transactions = list(swaps.transactions(ROUTER))
+    path = tmp_path / "corpus.bin"
+    corpus.write_transactions(path, transactions, ROUTER)
+
+    with corpus.Corpus(path) as calls:
+        assert len(calls) == len(transactions)
+        for entry, transaction in zip(calls, transactions):
+            assert entry.sender == transaction["from"].lower()
+            assert entry.value == transaction["value"]
+            assert entry.data == bytes.fromhex(transaction["input"][2:])
+        assert calls.endpoints() == [
+            workload.ENDPOINTS[endpoint] for endpoint in swaps.endpoints
+        ]
+
+
+def test_edge_cases(tmp_path):
+    # Zero bytes at the end of senders and values survive the fixed width index
+    calls = [
+        ("0x" + "11" * 19 + "00", 2**255, b"\x01\x02"),
+        ("0x" + "00" * 20, 0, b""),
+        ("0x" + "ab" * 20, 256, "0x83bd37f9" + "00" * 31),
+    ]
+    path = tmp_path / "corpus.bin"
+    corpus.write_corpus(path, calls)
+
+    with corpus.Corpus(path) as entries:
+        assert len(entries) == 3
+        assert entries[0] == corpus.CorpusEntry(calls[0][0], 2**255, b"\x01\x02")
+        assert entries[1] == corpus.CorpusEntry(calls[1][0], 0, b"")
+        assert entries[2].data == bytes.fromhex(calls[2][2][2:])
+        assert list(entries.selectors()) == [0, 0, 0x83BD37F9]
+        assert entries.index["offset"][0] == corpus.HEADER.size
+        assert entries.index.dtype.itemsize == 64
+
+    corpus.write_corpus(path, [])
+    with corpus.Corpus(path) as entries:
+        assert len(entries) == 0
+        assert entries.endpoints() == []
+
+
+def test_not_a_corpus(tmp_path):
+    path = tmp_path / "corpus.bin"
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        corpus.Corpus(path)
+
+
+def test_compare():
+    def result(index, function, a, b):
+        return replay.ReplayResult(
+            index, function, replay.CallResult(*a), replay.CallResult(*b)
+        )
+
+    results = [
+        result(0, "swap", (True, 100_000, (5,)), (True, 99_000, (5,))),
+        result(1, "swap", (True, 110_000, (7,)), (True, 107_000, (7,))),
+        result(2, "swap", (True, 120_000, (9,)), (True, 121_000, (8,))),
+        result(3, "swapMulti", (False, 50_000, ()), (True, 150_000, (1, 2))),
+        result(4, None, (False, None, ()), (False, None, ())),
+    ]
+    report = replay.compare(results)
+
+    assert report["swap"] == {
+        "calls": 3,
+        "gas_a": 110_000,
+        "gas_b": 109_000,
+        "mean_delta": -1_000,
+        "max_delta": -3_000,
+        "mismatches": 1,
+    }
+    assert report["swapMulti"]["calls"] == 1
+    assert report["swapMulti"]["gas_a"] is None
+    assert report["swapMulti"]["mismatches"] == 1
+    assert report["None"]["mismatches"] == 0
+    assert results[3].gas_delta == 100_000 and results[4].gas_delta is None
@@ -0,0 +1,328 @@
+import asyncio
+import os
+import random
+
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import calldata_service, gas_model, path_assembler
+
+ETH = "0x0000000000000000000000000000000000000000"
+WETH = "0x2222222222222222222222222222222222222222"
+EXECUTOR = "0x3333333333333333333333333333333333333333"
+SENDER = "0x4444444444444444444444444444444444444444"
+WRAP_PATH = "0x0100000000000000000000000000000000000000000000000000000000000000"
+INPUT_AMOUNT = int(1e18)
+
+
+def spec(endpoint="swap", **kwargs):
+    fields = dict(
+        endpoint=endpoint,
+        sender=SENDER,
+        input_tokens=(ETH,),
+        input_amounts=(INPUT_AMOUNT,),
+        output_tokens=(WETH,),
+        output_quotes=(INPUT_AMOUNT,),
+        max_slippage_percent=0.01,
+        executor=EXECUTOR,
+        path_definition=WRAP_PATH,
+    )
+    fields.update(kwargs)
+    return calldata_service.SwapSpec(**fields)
+
+
+def synthetic_model(rng, noise):
+    # Router and path gas as known linear functions of random features, plus noise
+    coefficients = {
+        name: rng.randrange(1_000, 50_000) for name in gas_model.ROUTER_FEATURES
+    }
+    rows = []
+    targets = []
+    for i in range(200):
+        endpoint = rng.choice(gas_model.ENDPOINTS)
+        row = gas_model.router_features(
+            spec(
+                endpoint,
+                input_tokens=(ETH,) * rng.randint(1, 3),
+                output_tokens=(WETH,) * rng.randint(1, 3),
+                referral_code=rng.choice([0, (1 << 31) + 1]),
+            )
+        )
+        rows.append(row)
+        targets.append(
+            sum(coefficients[name] * value for name, value in row.items())
+            + rng.uniform(-noise, noise)
+        )
+    return coefficients, rows, targets
+
+
+def test_intrinsic_gas():
+    assert gas_model.intrinsic_gas(b"") == 21_000
+    assert gas_model.intrinsic_gas("0x0001ff00") == 21_000 + 2 * 4 + 2 * 16
+    assert gas_model.intrinsic_gas("0001ff00") == gas_model.intrinsic_gas(
+        bytes.fromhex("0001ff00")
+    )
+
+
+def test_router_features():
+    features = gas_model.router_features(
+        spec(
+            "swapMultiCompact",
+            input_tokens=(ETH, WETH),
+            input_amounts=(1, 1),
+            output_tokens=(SENDER, ETH, EXECUTOR),
+            output_quotes=(1, 1, 1),
+            referral_code=(1 << 31) + 1,
+        ),
+        [WETH, EXECUTOR, ETH],
+    )
+    assert list(features) == gas_model.ROUTER_FEATURES
+    assert features["swapMultiCompact"] == 1
+    assert features["swap"] == 0
+    assert features["extra_inputs"] == 1
+    assert features["extra_outputs"] == 2
+    assert features["eth_inputs"] == 1
+    assert features["eth_outputs"] == 1
+    assert features["referral_fee"] == 1
+    # WETH, the executor as an output and the executor itself, but never ETH
+    assert features["address_list_hits"] == 3
+
+    # Only compact swaps read the address list, and codes up to the threshold have no fee
+    features = gas_model.router_features(spec(referral_code=1 << 31), [WETH])
+    assert features["address_list_hits"] == 0
+    assert features["referral_fee"] == 0
+
+
+def test_path_features():
+    assert gas_model.path_features("OdosWETHExecutor", WRAP_PATH) == {
+        "wrap": 1,
+        "unwrap": 0,
+    }
+    assert gas_model.path_features("OdosWETHExecutor", "0x" + "00" * 32) == {
+        "wrap": 0,
+        "unwrap": 1,
+    }
+
+    assembler = path_assembler.PathAssembler(1)
+    part = assembler.split(0, 0.5)
+    output = assembler.swap(0, EXECUTOR, True, 3_000)
+    assembler.swap(part, EXECUTOR, True, 3_000, dst=output)
+    assembler.send(output, WETH)
+    features = gas_model.path_features("OdosPathExecutor", assembler.assemble())
+    assert features["base"] == 1
+    assert features["split"] == 1
+    assert features["swap"] == 2
+    assert features["send"] == 1
+    assert features["wrap"] == 0
+
+
+def test_storage_surcharge():
+    set_surcharge = gas_model.SSTORE_SET_SURCHARGE
+    # The receiver's and the router's balances of the output
+    assert gas_model.storage_surcharge(spec()) == 2 * set_surcharge
+    # An empty ETH receiver, and the executor's balance of the input
+    assert (
+        gas_model.storage_surcharge(
+            spec(input_tokens=(WETH,), output_tokens=(ETH,), path_definition="0x00")
+        )
+        == gas_model.NEW_ACCOUNT_GAS + set_surcharge
+    )
+    # The owed and reserved slots of a referral fee on each output, and a Permit2 nonce
+    assert gas_model.storage_surcharge(
+        spec(
+            "swapMultiPermit2",
+            input_tokens=(WETH,),
+            output_tokens=(ETH, SENDER),
+            output_quotes=(1, 1),
+            referral_code=(1 << 31) + 1,
+        )
+    ) == (
+        2 * set_surcharge
+        + gas_model.NEW_ACCOUNT_GAS
+        + 2 * set_surcharge
+        + 2 * 2 * set_surcharge
+    )
+
+
+def test_fit_linear():
+    rng = random.Random(0)
+    coefficients, rows, targets = synthetic_model(rng, 0)
+    fit = gas_model.fit_linear(rows, targets)
+    # The endpoints one-hots sum to 1, so only predictions are identified
+    for row, target in zip(rows, targets):
+        assert fit.predict(row) == pytest.approx(target, abs=1e-6)
+    assert fit.max_error < 1e-6
+    assert fit.samples == len(rows)
+
+    coefficients, rows, targets = synthetic_model(rng, 500)
+    fit = gas_model.fit_linear(rows, targets)
+    assert fit.rmse <= fit.max_error <= 1_000
+    assert fit.p99_error <= fit.max_error
+
+
+def test_estimate():
+    rng = random.Random(1)
+    coefficients, rows, targets = synthetic_model(rng, 500)
+    router_fit = gas_model.fit_linear(rows, targets)
+    path_fit = gas_model.LinearFit({"wrap": 30_000, "unwrap": 40_000}, 100, 90, 50, 80)
+    model = gas_model.GasModel(
+        router_fit, {"OdosWETHExecutor": path_fit}, gas_model.bytecode_hash("0x00")
+    )
+
+    swap = spec(referral_code=(1 << 31) + 1)
+    data = "0x" + "01" * 100 + "00" * 100
+    router_gas = (
+        21_000
+        + 100 * 16
+        + 100 * 4
+        + router_fit.predict(gas_model.router_features(swap))
+    )
+    surcharge = gas_model.storage_surcharge(swap)
+    assert model.estimate(swap, data) == (
+        round(router_gas),
+        round(router_gas + router_fit.max_error + surcharge),
+    )
+    assert model.estimate(swap, data, executor="OdosWETHExecutor") == (
+        round(router_gas + 30_000),
+        round(router_gas + 30_000 + router_fit.max_error + 100 + surcharge),
+    )
+
+    # Models round trip through their saved form
+    assert gas_model.GasModel.from_dict(model.to_dict()).to_dict() == model.to_dict()
+    assert model.is_current("00")
+    assert not model.is_current("0x01")
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def weth_executor():
+    weth = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        weth.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def fitted_model():
+    path = os.environ.get("ODOS_GAS_MODEL", gas_model.MODEL_PATH)
+    if not os.path.exists(path):
+        pytest.skip("No fitted gas model, run bench_gas_model.py to fit one")
+    model = gas_model.load(path)
+    assert model.is_current(
+        brownie.OdosRouterV2.bytecode
+    ), "The gas model was fitted to another build of the router, rerun bench_gas_model.py"
+    return model
+
+
+def test_fitted_limits(router, weth_executor, fitted_model):
+    # Swaps with the fitted model's gas limits go through
+    swap = spec(
+        sender=accounts[0].address,
+        output_tokens=(weth_executor.WETH(),),
+        executor=weth_executor.address,
+    )
+
+    async def build():
+        async with calldata_service.CalldataService(
+            web3.provider.endpoint_uri,
+            router.address,
+            gas_model=fitted_model,
+            executor_names={weth_executor.address: "OdosWETHExecutor"},
+        ) as service:
+            return await service.build_many([swap, swap._replace(endpoint="swapMulti")])
+
+    for call in asyncio.run(build()):
+        tx = accounts[0].transfer(
+            call.to, call.value, data=call.data, gas_limit=call.gas
+        )
+        assert tx.status == 1
+        assert tx.gas_used <= call.gas
+
+
+def build(router, weth_executor, model, specs):
+    async def run():
+        async with calldata_service.CalldataService(
+            web3.provider.endpoint_uri,
+            router.address,
+            gas_model=model,
+            executor_names={weth_executor.address: "OdosWETHExecutor"},
+        ) as service:
+            return await service.build_many(specs)
+
+    return asyncio.run(run())
+
+
+def test_service_gas_model(router, weth_executor):
+    # Fits a small model to steady state wraps, where the sender and the beneficiary
+    # already hold WETH, and sends swaps that fill empty storage with its gas limits
+    referral_code = (1 << 31) + 1
+    router.registerReferralCode(
+        referral_code, int(1e15), accounts[2], {"from": accounts[0]}
+    )
+    swap = spec(
+        sender=accounts[0].address,
+        output_tokens=(weth_executor.WETH(),),
+        executor=weth_executor.address,
+    )
+    warmup = [swap, swap._replace(referral_code=referral_code)]
+    for call in build(router, weth_executor, None, warmup):
+        accounts[0].transfer(call.to, call.value, data=call.data)
+
+    rng = random.Random(2)
+    samples = [
+        swap._replace(
+            endpoint=rng.choice(["swap", "swapMulti"]),
+            input_amounts=(amount,),
+            output_quotes=(amount,),
+            referral_code=rng.choice([0, referral_code]),
+        )
+        for amount in [rng.randrange(10**12, 10**16) for i in range(20)]
+    ]
+    rows = []
+    targets = []
+    for sample, call in zip(samples, build(router, weth_executor, None, samples)):
+        tx = accounts[0].transfer(call.to, call.value, data=call.data)
+        rows.append(gas_model.router_features(sample))
+        targets.append(tx.gas_used - gas_model.intrinsic_gas(call.data))
+    model = gas_model.GasModel(
+        gas_model.fit_linear(rows, targets),
+        {},
+        gas_model.bytecode_hash(brownie.OdosRouterV2.bytecode),
+    )
+
+    # A first-time receiver, and a referral fee to a beneficiary without WETH
+    fresh_code = referral_code + 1
+    router.registerReferralCode(
+        fresh_code, int(1e15), accounts.add().address, {"from": accounts[0]}
+    )
+    fresh_swaps = [
+        swap._replace(endpoint=endpoint, output_receivers=(accounts.add().address,))
+        for endpoint in ["swap", "swapMulti"]
+    ]
+    fresh_swaps += [
+        fresh_swap._replace(referral_code=fresh_code) for fresh_swap in fresh_swaps
+    ]
+    for fresh_swap, call in zip(
+        fresh_swaps, build(router, weth_executor, model, fresh_swaps)
+    ):
+        assert call.gas == model.estimate(fresh_swap, call.data).limit
+        tx = accounts[0].transfer(
+            call.to, call.value, data=call.data, gas_limit=call.gas
+        )
+        assert tx.status == 1
+        assert tx.gas_used <= call.gas
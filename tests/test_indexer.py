@@ -0,0 +1,124 @@
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import indexer
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def swap(router, weth_executor, input_amount):
+    return router.swap(
+        [
+            "0x0000000000000000000000000000000000000000",
+            input_amount,
+            weth_executor.address,
+            weth_executor.WETH(),
+            input_amount,
+            input_amount,
+            accounts[0],
+        ],
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        0,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    )
+
+
+def swap_multi(router, weth_executor, input_amount):
+    return router.swapMulti(
+        [
+            [
+                "0x0000000000000000000000000000000000000000",
+                input_amount,
+                weth_executor.address,
+            ]
+        ],
+        [[weth_executor.WETH(), 1, accounts[0]]],
+        1,
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        0,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    )
+
+
+def test_index_events(router, weth_executor, tmp_path):
+    start_block = web3.eth.block_number
+
+    swap(router, weth_executor, int(1e18))
+    swap_multi(router, weth_executor, int(2e18))
+
+    store = indexer.open_store(tmp_path, web3.eth.chain_id)
+    assert (
+        indexer.RouterIndexer(
+            web3, router.address, store, start_block, chunk_size=1
+        ).run()
+        == 2
+    )
+
+    events = store.events()
+    assert list(events["kind"]) == [indexer.SWAP_KIND, indexer.SWAP_MULTI_KIND]
+    assert (
+        indexer.bytes_to_addresses(events["sender"])
+        == [accounts[0].address.lower()] * 2
+    )
+
+    inputs, outputs = store.event_legs(0)
+    assert indexer.bytes_to_ints(inputs["amount"]) == [int(1e18)]
+    assert indexer.bytes_to_addresses(outputs["token"]) == [
+        weth_executor.WETH().lower()
+    ]
+
+    inputs, outputs = store.event_legs(1)
+    assert indexer.bytes_to_ints(inputs["amount"]) == [int(2e18)]
+    assert indexer.bytes_to_addresses(outputs["token"]) == [
+        weth_executor.WETH().lower()
+    ]
+
+
+def test_index_resume(router, weth_executor, tmp_path):
+    start_block = web3.eth.block_number
+
+    swap(router, weth_executor, int(1e18))
+
+    store = indexer.open_store(tmp_path, web3.eth.chain_id)
+    indexer.RouterIndexer(web3, router.address, store, start_block).run()
+    assert store.checkpoint["next_block"] == web3.eth.block_number + 1
+
+    swap(router, weth_executor, int(3e18))
+
+    # A reopened store resumes from its checkpoint without indexing any event twice
+    store = indexer.open_store(tmp_path, web3.eth.chain_id)
+    assert indexer.RouterIndexer(web3, router.address, store, start_block).run() == 1
+
+    events = store.events()
+    assert len(events["block"]) == 2
+    assert indexer.bytes_to_ints(store.event_legs(1)[0]["amount"]) == [int(3e18)]
@@ -0,0 +1,143 @@
+import brownie
+import pytest
+from brownie import accounts
+from lib import limits
+from lib.utils import encode_amount
+
+ETH = "0x0000000000000000000000000000000000000000"
+PATH_DEFINITION = "0x0100000000000000000000000000000000000000000000000000000000000000"
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def test_slippage_tolerances():
+    # 0.01 * 0xFFFFFF = 167772.15, which truncating would tighten to 167772
+    assert limits.slippage_tolerance(0.01) == 167773
+    assert limits.slippage_tolerance(0) == 0
+    assert limits.slippage_tolerance(1) == 0xFFFFFF
+    assert list(limits.slippage_tolerances([0.005, 0.5])) == [83887, 8388608]
+
+    with pytest.raises(ValueError):
+        limits.slippage_tolerance(1.01)
+    with pytest.raises(ValueError):
+        limits.slippage_tolerance(-0.01)
+
+
+def test_output_mins():
+    quotes = [int(1e18), 3 * 10**30, 0xFFFFFF, 1]
+    tolerances = limits.slippage_tolerances([0.01, 0.003, 1, 0.5])
+
+    assert list(limits.output_mins(quotes, tolerances)) == [
+        quote * (0xFFFFFF - int(tolerance)) // 0xFFFFFF
+        for quote, tolerance in zip(quotes, tolerances)
+    ]
+    # The limit is never tighter than the tolerance it was given
+    for quote, output_min in zip(quotes, limits.output_mins(quotes, tolerances)):
+        assert output_min <= quote
+
+
+def test_net_amounts():
+    amounts = [int(1e18), 12345, 2**255]
+    swap_multi_fee = int(5e14)
+    referral_fee = int(1e16)
+
+    assert list(limits.net_amounts(amounts)) == amounts
+    assert list(limits.net_amounts(amounts, swap_multi_fee, referral_fee)) == [
+        amount
+        * (limits.FEE_DENOM - swap_multi_fee)
+        // limits.FEE_DENOM
+        * (limits.FEE_DENOM - referral_fee)
+        // limits.FEE_DENOM
+        for amount in amounts
+    ]
+
+
+def test_value_out_mins():
+    quotes = [100, 200, 3 * 10**40, 7]
+    relative_values = [10**20, 3 * 10**20, 10**9, 5]
+    tolerances = limits.slippage_tolerances([0.01, 0.02])
+
+    value_out_mins = limits.value_out_mins(quotes, relative_values, [0, 2], tolerances)
+    assert list(value_out_mins) == [
+        (100 * 10**20 + 200 * 3 * 10**20) * (0xFFFFFF - int(tolerances[0])) // 0xFFFFFF,
+        (3 * 10**49 + 35) * (0xFFFFFF - int(tolerances[1])) // 0xFFFFFF,
+    ]
+
+
+def test_relative_values():
+    # An 18 decimal token at 3000, a 6 decimal token at 1 and an 8 decimal token at
+    # 60000, per smallest unit
+    prices = [3000e-18, 1e-6, 60000e-8, 1e-6]
+    quotes = [5 * 10**18, 15_000 * 10**6, 10**8, 2**200]
+    offsets = [0, 3]
+
+    relative_values = limits.relative_values(prices, quotes, offsets)
+
+    assert relative_values[0] * 10**18 == 3000 * relative_values[1] * 10**6
+    assert relative_values[2] * 10**8 == 60000 * relative_values[1] * 10**6
+    for start, end in [(0, 3), (3, 4)]:
+        total = sum(
+            limits.RELATIVE_VALUE_HEADROOM * quote * relative_value
+            for quote, relative_value in zip(
+                quotes[start:end], relative_values[start:end]
+            )
+        )
+        assert total < 2**256
+    # Three significant digits encode as a short mantissa and exponent
+    for relative_value in relative_values:
+        assert len(encode_amount(int(relative_value), exponent_amounts=True)) == 6
+
+    with pytest.raises(ValueError):
+        limits.relative_values([1, 0], [1, 1], [0])
+
+
+def test_swap_multi_exact_limit(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    input_amount = int(1e18)
+    max_slippage_percent = 0.0001
+
+    (quote,) = limits.net_amounts([input_amount], router.swapMultiFee())
+    tolerance = limits.slippage_tolerance(max_slippage_percent)
+    (value_out_min,) = limits.value_out_mins([quote], [1], [0], [tolerance])
+
+    def swap_multi(value_out_min):
+        return router.swapMulti(
+            [[ETH, input_amount, weth_executor.address]],
+            [[weth_address, 1, accounts[0]]],
+            value_out_min,
+            PATH_DEFINITION,
+            weth_executor.address,
+            0,
+            {
+                "value": input_amount,
+                "from": accounts[0],
+            },
+        )
+
+    # The limit computed from the exact output is the tightest one that passes
+    swap_multi(limits.value_out_mins([quote], [1], [0], [0])[0])
+    swap_multi(value_out_min)
+    with brownie.reverts("Slippage Limit Exceeded"):
+        swap_multi(quote + 1)
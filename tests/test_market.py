@@ -0,0 +1,157 @@
+import random
+
+import brownie
+import pytest
+from brownie import accounts
+from lib import market, path_assembler
+
+NUM_TOKENS = 6
+NUM_POOLS = 9
+FEE_DENOM = int(1e18)
+
+
+@pytest.fixture(scope="module")
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def path_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosPathExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture(scope="module")
+def local_market():
+    return market.deploy_market(
+        brownie.MockERC20,
+        brownie.MockConstantProductPool,
+        accounts[0],
+        NUM_TOKENS,
+        NUM_POOLS,
+    )
+
+
+def fund(token_contracts, router, token, amount):
+    token_contracts[token].mint(accounts[0], amount, {"from": accounts[0]})
+    token_contracts[token].approve(router.address, amount, {"from": accounts[0]})
+
+
+def input_amount(local_market, rng, token_in, token_out):
+    # Between 0.01% and 10% of the input side of the first hop's deepest pool
+    route = local_market.find_route(token_in, token_out)
+    pool = local_market.pools_between(*route[:2])[0]
+    reserve_in = local_market.reserves[pool.address][
+        0 if token_in == pool.token0 else 1
+    ]
+    return int(reserve_in * 10 ** rng.uniform(-4, -1))
+
+
+def test_pool_invariant(local_market):
+    local_market, token_contracts, pool_contracts = local_market
+    pool = next(iter(local_market.pools.values()))
+    reserve0, reserve1 = local_market.reserves[pool.address]
+
+    with brownie.reverts("Insufficient input"):
+        pool_contracts[pool.address].swap(0, 1, accounts[0], {"from": accounts[0]})
+
+    # The pool pays out exactly the quoted amount and no more
+    amount_in = reserve0 // 100
+    amount_out = market.get_amount_out(amount_in, reserve0, reserve1, pool.fee)
+    token_contracts[pool.token0].mint(pool.address, amount_in, {"from": accounts[0]})
+    with brownie.reverts("K"):
+        pool_contracts[pool.address].swap(
+            0, amount_out + 1, accounts[0], {"from": accounts[0]}
+        )
+    pool_contracts[pool.address].swap(0, amount_out, accounts[0], {"from": accounts[0]})
+
+    local_market.refresh(pool_contracts)
+    assert local_market.reserves[pool.address] == [
+        reserve0 + amount_in,
+        reserve1 - amount_out,
+    ]
+
+
+def test_exact_quotes(router, path_executor, local_market):
+    local_market, token_contracts, pool_contracts = local_market
+    rng = random.Random(0)
+
+    for i in range(12):
+        token_in, token_out = rng.sample(local_market.tokens, 2)
+        amount = input_amount(local_market, rng, token_in, token_out)
+
+        # Send part of the input along the same route separately, so that later swaps
+        # through each pool see the reserves left by earlier ones
+        assembler = path_assembler.PathAssembler(1)
+        part = assembler.split(0, rng.random())
+        output = local_market.add_route(assembler, 0, token_in, token_out)
+        local_market.add_route(assembler, part, token_in, token_out, dst=output)
+        assembler.send(output, token_out)
+        path = assembler.assemble()
+
+        quote = local_market.quote_path(path, [amount])[token_out]
+        fund(token_contracts, router, token_in, amount)
+        tx = router.swap(
+            [token_in, amount, path_executor, token_out, quote, quote, accounts[0]],
+            path,
+            path_executor,
+            0,
+            {"from": accounts[0]},
+        )
+
+        assert tx.return_value == quote
+        local_market.refresh(pool_contracts)
+
+
+def test_exact_multi_quotes(router, path_executor, local_market):
+    local_market, token_contracts, pool_contracts = local_market
+    rng = random.Random(1)
+    tokens_in = local_market.tokens[:2]
+    tokens_out = local_market.tokens[2:4]
+    amounts = [
+        input_amount(local_market, rng, token, tokens_out[0]) for token in tokens_in
+    ]
+
+    # Every input is split between both outputs
+    assembler = path_assembler.PathAssembler(2)
+    outputs = [assembler.register() for token in tokens_out]
+    for i, token_in in enumerate(tokens_in):
+        part = assembler.split(i, 0.25)
+        local_market.add_route(assembler, i, token_in, tokens_out[0], dst=outputs[0])
+        local_market.add_route(assembler, part, token_in, tokens_out[1], dst=outputs[1])
+    for register, token in zip(outputs, tokens_out):
+        assembler.send(register, token)
+    path = assembler.assemble()
+
+    quotes = local_market.quote_path(path, amounts)
+    for token, amount in zip(tokens_in, amounts):
+        fund(token_contracts, router, token, amount)
+    tx = router.swapMulti(
+        [[token, amount, path_executor] for token, amount in zip(tokens_in, amounts)],
+        [[token, 1, accounts[0]] for token in tokens_out],
+        1,
+        path,
+        path_executor,
+        0,
+        {"from": accounts[0]},
+    )
+
+    swap_multi_fee = router.swapMultiFee()
+    assert tx.return_value == [
+        quotes[token] * (FEE_DENOM - swap_multi_fee) // FEE_DENOM
+        for token in tokens_out
+    ]
+    local_market.refresh(pool_contracts)
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from lib import abi_encoder, metrics, permit2
+
+ADDRESS = "0x1111111111111111111111111111111111111111"
+TOKEN_INFO = (ADDRESS, int(1e18), ADDRESS, ADDRESS, int(1e18), int(1e17), ADDRESS)
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled():
+    metrics.reset()
+    metrics.disable()
+    abi_encoder.encode_swap(TOKEN_INFO, b"\x01", ADDRESS, 0)
+    with metrics.timer("rpc", "eth_call"):
+        pass
+    metrics.count_rpc("eth_call")
+
+    assert metrics.snapshot() == {"stages": {}, "rpc_requests": {}}
+
+
+def test_instrumented(enabled_metrics):
+    for i in range(3):
+        abi_encoder.encode_swap(TOKEN_INFO, b"\x01", ADDRESS, 0)
+    permit2_hash = permit2.single_permit2_hash(ADDRESS, 1, ADDRESS, 0, 1)
+    permit2.sign_permit2("0x" + "22" * 32, permit2_hash, "0x" + "33" * 32)
+
+    stages = metrics.snapshot()["stages"]
+    assert stages["encode"]["swap"]["count"] == 3
+    assert sum(stages["encode"]["swap"]["buckets"]) == 3
+    assert stages["encode"]["swap"]["sum"] > 0
+    assert stages["permit2"]["single_hash"]["count"] == 1
+    assert stages["permit2"]["sign"]["count"] == 1
+
+
+def test_errors(enabled_metrics):
+    with pytest.raises(OverflowError):
+        abi_encoder.encode_swap(TOKEN_INFO, b"\x01", ADDRESS, 1 << 32)
+
+    @metrics.instrumented("rpc", "eth_call")
+    async def failing_call():
+        raise ConnectionError
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(failing_call())
+
+    stages = metrics.snapshot()["stages"]
+    assert stages["encode"]["swap"]["errors"] == 1
+    assert stages["rpc"]["eth_call"]["errors"] == 1
+    assert stages["rpc"]["eth_call"]["count"] == 1
+
+
+def test_quantiles():
+    histogram = metrics.Histogram()
+    assert histogram.quantile(0.5) is None
+
+    for i in range(99):
+        histogram.observe(0.000_001)
+    histogram.observe(0.3)
+    assert histogram.quantile(0.5) == metrics.BUCKETS[0]
+    assert histogram.quantile(0.99) == metrics.BUCKETS[0]
+    assert histogram.quantile(1) == 0.5
+
+    histogram.observe(100)
+    assert histogram.quantile(1) == float("inf")
+
+
+def test_render(enabled_metrics):
+    with metrics.timer("rpc", "eth_call"):
+        pass
+    metrics.count_rpc("eth_call", 3)
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE odos_client_seconds histogram" in lines
+    assert 'odos_client_seconds_count{stage="rpc",operation="eth_call"} 1' in lines
+    assert (
+        'odos_client_seconds_bucket{stage="rpc",operation="eth_call",le="+Inf"} 1'
+        in lines
+    )
+    assert 'odos_client_errors_total{stage="rpc",operation="eth_call"} 0' in lines
+    assert 'odos_client_rpc_requests_total{method="eth_call"} 3' in lines
+
+    # Buckets are cumulative
+    buckets = [
+        int(line.rsplit(" ", 1)[1])
+        for line in lines
+        if line.startswith("odos_client_seconds_bucket")
+    ]
+    assert buckets == sorted(buckets)
+    assert len(buckets) == len(metrics.BUCKETS) + 1
@@ -0,0 +1,87 @@
+import asyncio
+
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import multichain, utils
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def local_client(router, timeout=10):
+    # The local node stands in for two chains, alongside a node that never answers
+    endpoint_uri = web3.provider.endpoint_uri
+    return multichain.MultiChainClient(
+        {
+            "Ethereum": endpoint_uri,
+            "Base": endpoint_uri,
+            "Scroll": "http://127.0.0.1:8599",
+        },
+        deployments={
+            "Ethereum": (web3.eth.chain_id, router.address),
+            "Base": (web3.eth.chain_id, router.address),
+            "Scroll": (web3.eth.chain_id, router.address),
+        },
+        timeout=timeout,
+    )
+
+
+async def serve_silently():
+    async def handle(reader, writer):
+        await asyncio.sleep(60)
+
+    return await asyncio.start_server(handle, "127.0.0.1", 8599)
+
+
+def test_deployments():
+    assert len(multichain.DEPLOYMENTS) == 15
+    assert len({chain_id for chain_id, router in multichain.DEPLOYMENTS.values()}) == 15
+
+
+def test_fan_out_reads(router):
+    addresses = [utils.random_address() for i in range(3)]
+    router.writeAddressList(addresses, {"from": accounts[0]})
+
+    referral_code = router.REFERRAL_WITH_FEE_THRESHOLD() + 1
+    router.registerReferralCode(
+        referral_code, int(1e15), accounts[2], {"from": accounts[0]}
+    )
+    accounts[0].transfer(router.address, int(1e18))
+
+    async def read():
+        server = await serve_silently()
+        async with local_client(router, timeout=1) as client:
+            results = await asyncio.gather(
+                client.owners(),
+                client.swap_multi_fees(),
+                client.referral_lookups(referral_code),
+                client.address_lists(),
+                client.token_balances({"Ethereum": [multichain.ETH]}),
+            )
+        server.close()
+        return results
+
+    owners, fees, referral_infos, address_lists, balances = asyncio.run(read())
+
+    for chain in ["Ethereum", "Base"]:
+        assert owners[chain] == accounts[0].address.lower()
+        assert fees[chain] == router.swapMultiFee()
+        assert referral_infos[chain] == {
+            "referralFee": int(1e15),
+            "beneficiary": accounts[2].address.lower(),
+            "registered": True,
+        }
+        assert address_lists[chain] == addresses
+
+    assert balances["Ethereum"] == {multichain.ETH: int(1e18)}
+    assert balances["Base"] == {}
+
+    # The chain whose node does not answer times out without holding up the others
+    assert isinstance(owners["Scroll"], asyncio.TimeoutError)
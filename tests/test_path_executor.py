@@ -0,0 +1,120 @@
+import brownie
+import pytest
+from brownie import accounts
+from lib import path_assembler
+
+ETH = "0x0000000000000000000000000000000000000000"
+INPUT_AMOUNT = int(1e18)
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def path_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosPathExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def swap(router, path_executor, input_token, output_token, path, value):
+    return router.swap(
+        [
+            input_token,
+            INPUT_AMOUNT,
+            path_executor.address,
+            output_token,
+            INPUT_AMOUNT,
+            INPUT_AMOUNT - 1,
+            accounts[0],
+        ],
+        path,
+        path_executor.address,
+        0,
+        {"value": value, "from": accounts[0]},
+    )
+
+
+def test_assembler_round_trip():
+    pool = "0x" + "11" * 20
+    assembler = path_assembler.PathAssembler(2)
+    half = assembler.split(0, 0.5)
+    swapped = assembler.swap(half, pool, True, 3000)
+    assembler.merge(swapped, 1)
+    assembler.send(1, ETH)
+
+    path = assembler.assemble()
+    assert path_assembler.disassemble(path) == (
+        4,
+        [
+            ("split", (0, 2, 0x8000)),
+            ("swap", (2, 3, pool, 1, 3000)),
+            ("merge", (3, 1)),
+            ("send", (1, ETH)),
+        ],
+    )
+    # Compact swaps pad paths with zeros, which read as STOP
+    assert path_assembler.disassemble(path + "00" * 16) == path_assembler.disassemble(
+        path
+    )
+
+
+def test_split_wrap_merge(router, path_executor):
+    weth_address = path_executor.WETH()
+    WETH = brownie.interface.IWETH(weth_address)
+
+    # Wrap a third and the rest of the input separately, then merge them back together
+    assembler = path_assembler.PathAssembler(1)
+    third = assembler.split(0, 1 / 3)
+    assembler.wrap(third, third)
+    rest = assembler.wrap(0)
+    assembler.merge(third, rest)
+    assembler.send(rest, weth_address)
+
+    balance_before = WETH.balanceOf(accounts[0])
+    swap(router, path_executor, ETH, weth_address, assembler.assemble(), INPUT_AMOUNT)
+    assert WETH.balanceOf(accounts[0]) - balance_before == INPUT_AMOUNT
+    assert WETH.balanceOf(path_executor) == 0
+    assert path_executor.balance() == 0
+
+
+def test_unwrap(router, path_executor):
+    weth_address = path_executor.WETH()
+    WETH = brownie.interface.IWETH(weth_address)
+    WETH.deposit({"from": accounts[0], "value": INPUT_AMOUNT})
+    WETH.approve(router.address, INPUT_AMOUNT, {"from": accounts[0]})
+
+    assembler = path_assembler.PathAssembler(1)
+    assembler.send(assembler.unwrap(0), ETH)
+
+    balance_before = accounts[0].balance()
+    tx = swap(router, path_executor, weth_address, ETH, assembler.assemble(), 0)
+    assert (
+        accounts[0].balance() - balance_before
+        == INPUT_AMOUNT - tx.gas_used * tx.gas_price
+    )
+
+
+def test_invalid_path(router, path_executor):
+    with brownie.reverts("Invalid opcode"):
+        swap(
+            router, path_executor, ETH, path_executor.WETH(), "0x01070000", INPUT_AMOUNT
+        )
+
+    # The input must fit in the registers
+    with brownie.reverts("Too few registers"):
+        swap(router, path_executor, ETH, path_executor.WETH(), "0x00", INPUT_AMOUNT)
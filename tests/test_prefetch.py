@@ -0,0 +1,257 @@
+import asyncio
+
+import brownie
+import pytest
+from brownie import accounts, chain, web3
+from lib import calldata_service, prefetch
+
+ETH = "0x0000000000000000000000000000000000000000"
+INPUT_AMOUNT = int(1e18)
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def multicall():
+    return brownie.Multicall.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def permit2_contract():
+    return brownie.Permit2.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+
+
+@pytest.fixture
+def weth():
+    return brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+
+
+def fetch(multicall, batches, mine=False, **kwargs):
+    # Fetches each batch of reads in turn, mining a block before every batch after the
+    # first if mine is set
+
+    async def run():
+        async with prefetch.PrefetchCache(
+            web3.provider.endpoint_uri, multicall.address, **kwargs
+        ) as cache:
+            values = []
+            for i, reads in enumerate(batches):
+                if mine and i > 0:
+                    chain.mine()
+                values.append(await cache.fetch(reads))
+        return cache, values
+
+    return asyncio.run(run())
+
+
+def test_values(router, multicall, permit2_contract, weth):
+    weth.deposit({"from": accounts[1], "value": INPUT_AMOUNT})
+    weth.approve(router.address, INPUT_AMOUNT // 2, {"from": accounts[1]})
+    weth.approve(permit2_contract.address, INPUT_AMOUNT, {"from": accounts[1]})
+    permit2_contract.invalidateUnorderedNonces(1, 1 << 4, {"from": accounts[1]})
+
+    reads = prefetch.swap_reads(
+        accounts[1].address, [ETH, weth.address], router.address
+    ) + prefetch.swap_reads(
+        accounts[1].address,
+        [weth.address],
+        router.address,
+        (permit2_contract.address, 256 + 4),
+    )
+    cache, [values] = fetch(multicall, [reads])
+
+    assert values == [
+        accounts[1].balance(),
+        INPUT_AMOUNT,
+        INPUT_AMOUNT // 2,
+        INPUT_AMOUNT,
+        INPUT_AMOUNT,
+        1 << 4,
+    ]
+    assert prefetch.nonce_used(values[-1], 256 + 4)
+    assert not prefetch.nonce_used(values[-1], 256 + 5)
+    # One request for the block number and one for all of the reads
+    assert cache.round_trips == 2
+    assert cache.reads == len(reads)
+
+
+def test_failed_reads(multicall):
+    # The multicall is not a token, so its balanceOf reverts
+    cache, [values] = fetch(
+        multicall, [[prefetch.balance_read(multicall.address, accounts[0].address)]]
+    )
+    assert values == [None]
+
+
+def test_caching(multicall, weth):
+    reads = [
+        prefetch.balance_read(weth.address, account.address) for account in accounts
+    ]
+
+    cache, values = fetch(multicall, [reads, reads[:3]])
+    assert values[1] == values[0][:3]
+    assert cache.round_trips == 3
+
+    # Reads are fetched again once a newer block is seen
+    cache, values = fetch(multicall, [reads, reads[:3]], mine=True)
+    assert cache.round_trips == 4
+
+    cache, values = fetch(multicall, [reads], max_reads=3)
+    assert cache.round_trips == 1 + (len(reads) + 2) // 3
+
+
+def test_invalidation(multicall, weth):
+    read = prefetch.balance_read(weth.address, accounts[0].address)
+
+    async def run():
+        async with prefetch.PrefetchCache(
+            web3.provider.endpoint_uri, multicall.address
+        ) as cache:
+            block = web3.eth.block_number
+            [before] = await cache.fetch([read], block)
+
+            weth.deposit({"from": accounts[0], "value": INPUT_AMOUNT})
+            assert cache.cached(read) == before
+            cache.invalidate(web3.eth.block_number)
+            assert cache.cached(read) is None
+
+            [after] = await cache.fetch([read], web3.eth.block_number)
+            # Older blocks can still be read, without replacing the cache
+            [old] = await cache.fetch([read], block)
+            assert cache.cached(read) == after
+        return before, after, old
+
+    before, after, old = asyncio.run(run())
+    assert after - before == INPUT_AMOUNT
+    assert old == before
+
+
+def test_calldata_service(router, multicall, weth):
+    spec = calldata_service.SwapSpec(
+        endpoint="swap",
+        sender=accounts[1].address,
+        input_tokens=(weth.address,),
+        input_amounts=(INPUT_AMOUNT,),
+        output_tokens=(ETH,),
+        output_quotes=(INPUT_AMOUNT,),
+        max_slippage_percent=0.01,
+        executor=accounts[2].address,
+        path_definition="0x00",
+    )
+
+    async def build(prefetch_cache):
+        async with calldata_service.CalldataService(
+            web3.provider.endpoint_uri, router.address, prefetch_cache=prefetch_cache
+        ) as service:
+            calls = await service.build_many(
+                [spec, spec._replace(sender=accounts[3].address)]
+            )
+        return service, calls
+
+    async def build_with_prefetch():
+        async with prefetch.PrefetchCache(
+            web3.provider.endpoint_uri, multicall.address
+        ) as cache:
+            service, calls = await build(cache)
+        return cache, service, calls
+
+    service, calls = asyncio.run(build(None))
+    cache, prefetch_service, prefetch_calls = asyncio.run(build_with_prefetch())
+
+    assert prefetch_calls == calls
+    assert calls[0].approvals_needed == (weth.address,)
+    assert calls[0].shortfalls == (weth.address,)
+    # Every balance and allowance was read in a single eth_call
+    assert prefetch_service.batcher.batches == 0
+    assert cache.round_trips == 2
+
+
+def test_calldata_service_head(router, multicall, weth):
+    spec = calldata_service.SwapSpec(
+        endpoint="swap",
+        sender=accounts[1].address,
+        input_tokens=(weth.address,),
+        input_amounts=(INPUT_AMOUNT,),
+        output_tokens=(ETH,),
+        output_quotes=(INPUT_AMOUNT,),
+        max_slippage_percent=0.01,
+        executor=accounts[2].address,
+        path_definition="0x00",
+    )
+
+    async def run():
+        async with prefetch.PrefetchCache(
+            web3.provider.endpoint_uri, multicall.address
+        ) as cache:
+            async with calldata_service.CalldataService(
+                web3.provider.endpoint_uri, router.address, prefetch_cache=cache
+            ) as service:
+                [before] = await service.build_many([spec])
+                weth.deposit({"from": accounts[1], "value": INPUT_AMOUNT})
+                # A plain build reads the head rather than the prefetched block
+                after = await service.build(spec)
+        return before, after
+
+    before, after = asyncio.run(run())
+    assert before.shortfalls == (weth.address,)
+    assert after.shortfalls == ()
+
+
+def test_calldata_service_permit2_nonce(router, multicall, permit2_contract, weth):
+    permit2_contract.invalidateUnorderedNonces(0, 1 << 4, {"from": accounts[1]})
+    specs = [
+        calldata_service.SwapSpec(
+            endpoint="swapPermit2",
+            sender=accounts[1].address,
+            input_tokens=(weth.address,),
+            input_amounts=(INPUT_AMOUNT,),
+            output_tokens=(ETH,),
+            output_quotes=(INPUT_AMOUNT,),
+            max_slippage_percent=0.01,
+            executor=accounts[2].address,
+            path_definition="0x00",
+            permit2=(permit2_contract.address, nonce, (1 << 48) - 1, "0x" + "11" * 65),
+        )
+        for nonce in [4, 5]
+    ]
+
+    async def build(prefetch_cache):
+        async with calldata_service.CalldataService(
+            web3.provider.endpoint_uri, router.address, prefetch_cache=prefetch_cache
+        ) as service:
+            calls = await service.build_many(specs)
+        return service, calls
+
+    async def build_with_prefetch():
+        async with prefetch.PrefetchCache(
+            web3.provider.endpoint_uri, multicall.address
+        ) as cache:
+            service, calls = await build(cache)
+        return service, calls
+
+    service, calls = asyncio.run(build(None))
+    prefetch_service, prefetch_calls = asyncio.run(build_with_prefetch())
+
+    assert prefetch_calls == calls
+    assert [call.permit2_nonce_used for call in calls] == [True, False]
+    # The nonce bitmap is read in the same eth_call as the balances and allowances
+    assert prefetch_service.batcher.batches == 0
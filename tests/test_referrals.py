@@ -0,0 +1,175 @@
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import accounting, referrals, storage_layout
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def swap(router, weth_executor, referral_code, input_amount):
+    return router.swap(
+        [
+            "0x0000000000000000000000000000000000000000",
+            input_amount,
+            weth_executor.address,
+            weth_executor.WETH(),
+            input_amount,
+            1,
+            accounts[0],
+        ],
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        referral_code,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    )
+
+
+def test_registry_caching(router):
+    registry = referrals.ReferralRegistry(web3, router.address)
+    referral_code = router.REFERRAL_WITH_FEE_THRESHOLD() + 1
+
+    # Unregistered codes are only cached for the block they were read at and earlier
+    assert registry.lookup(referral_code) is None
+    assert registry.lookup(referral_code) is None
+    assert registry.reads == 1
+
+    router.registerReferralCode(
+        referral_code, int(1e15), accounts[2], {"from": accounts[0]}
+    )
+    assert registry.lookup(referral_code) == {
+        "referralFee": int(1e15),
+        "beneficiary": accounts[2].address.lower(),
+        "registered": True,
+    }
+    assert registry.reads == 2
+
+    # Registered codes are never read again
+    brownie.chain.mine()
+    assert registry.lookup(referral_code)["referralFee"] == int(1e15)
+    assert registry.reads == 2
+
+
+def test_registry_reads_getter_at_block(router):
+    registry = referrals.ReferralRegistry(web3, router.address)
+    referral_code = router.REFERRAL_WITH_FEE_THRESHOLD() + 1
+    unregistered_block = web3.eth.block_number
+
+    tx = router.registerReferralCode(
+        referral_code, int(1e15), accounts[2], {"from": accounts[0]}
+    )
+    fee, beneficiary, registered = router.referralLookup(referral_code)
+    assert registry.lookup(referral_code, tx.block_number) == {
+        "referralFee": fee,
+        "beneficiary": beneficiary.lower(),
+        "registered": registered,
+    }
+    assert registry.lookup(referral_code, tx.block_number) == {
+        "referralFee": int(1e15),
+        "beneficiary": accounts[2].address.lower(),
+        "registered": True,
+    }
+
+    # The router keeps the deployed routers' storage layout, with referralLookup in
+    # slot 3, which holds the same info
+    value = web3.eth.get_storage_at(
+        router.address,
+        storage_layout.keccak_slot(
+            referral_code.to_bytes(32, "big"), (3).to_bytes(32, "big")
+        ),
+    )
+    assert storage_layout.unpack_referral_info(
+        int.from_bytes(value, "big")
+    ) == registry.lookup(referral_code)
+
+    # Reads at an earlier block see the code as it was then
+    registry = referrals.ReferralRegistry(web3, router.address)
+    assert registry.lookup(referral_code, unregistered_block) is None
+    assert registry.lookup(0, unregistered_block) == {
+        "referralFee": 0,
+        "beneficiary": "0x" + bytes(20).hex(),
+        "registered": True,
+    }
+
+
+def test_referral_index(router, weth_executor):
+    referral_code = router.REFERRAL_WITH_FEE_THRESHOLD() + 1
+    router.registerReferralCode(
+        referral_code, int(1e15), accounts[2], {"from": accounts[0]}
+    )
+    start_block = web3.eth.block_number
+
+    first_tx = swap(router, weth_executor, referral_code, int(1e18))
+    swap(router, weth_executor, 1, int(1e18))
+    last_tx = swap(router, weth_executor, referral_code, int(2e18))
+
+    logs = web3.eth.get_logs(
+        {"address": router.address, "fromBlock": start_block + 1, "toBlock": "latest"}
+    )
+    index = referrals.ReferralIndex(referrals.ReferralRegistry(web3, router.address))
+    index.update(accounting.logs_to_events(logs))
+
+    weth_address = weth_executor.WETH().lower()
+    assert index.totals(referral_code, start_block, last_tx.block_number) == {
+        weth_address: {"volume": int(2997e15), "fees": int(3e15)}
+    }
+    assert index.totals(
+        referral_code, first_tx.block_number, first_tx.block_number
+    ) == {weth_address: {"volume": int(999e15), "fees": int(1e15)}}
+    assert index.totals(1, start_block, last_tx.block_number) == {
+        weth_address: {"volume": int(1e18), "fees": 0}
+    }
+
+
+def test_referral_index_fee_by_block(router, weth_executor):
+    referral_code = router.REFERRAL_WITH_FEE_THRESHOLD() + 1
+    start_block = web3.eth.block_number
+
+    # A code used before it is registered pays no fee
+    unregistered_tx = swap(router, weth_executor, referral_code, int(1e18))
+    router.registerReferralCode(
+        referral_code, int(1e15), accounts[2], {"from": accounts[0]}
+    )
+    registered_tx = swap(router, weth_executor, referral_code, int(1e18))
+
+    logs = web3.eth.get_logs(
+        {"address": router.address, "fromBlock": start_block + 1, "toBlock": "latest"}
+    )
+    registry = referrals.ReferralRegistry(web3, router.address)
+    # The registration is already cached from the latest block
+    assert registry.lookup(referral_code)["registered"]
+
+    index = referrals.ReferralIndex(registry)
+    index.update(accounting.logs_to_events(logs))
+
+    weth_address = weth_executor.WETH().lower()
+    assert index.totals(
+        referral_code, unregistered_tx.block_number, unregistered_tx.block_number
+    ) == {weth_address: {"volume": int(1e18), "fees": 0}}
+    assert index.totals(
+        referral_code, registered_tx.block_number, registered_tx.block_number
+    ) == {weth_address: {"volume": int(999e15), "fees": int(1e15)}}
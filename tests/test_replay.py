@@ -0,0 +1,164 @@
+import asyncio
+import random
+
+import brownie
+import pytest
+from brownie import accounts, web3
+from eth_abi import encode
+from lib import calldata_service, corpus, replay, utils
+from lib.multichain import function_selector
+
+ETH = "0x0000000000000000000000000000000000000000"
+ENDPOINTS = ["swap", "swapCompact", "swapMulti", "swapMultiCompact"]
+NUM_SWAPS = 24
+MAX_LEGS = 4
+MAX_SLIPPAGE_PERCENT = 0.05
+# MockERC20 is an OpenZeppelin ERC20, with balances and allowances in its first slots
+TOKEN_SLOTS = (0, 1)
+EXECUTOR_FUNDING = 10**30
+
+
+@pytest.fixture
+def executor():
+    executor = brownie.MockExecutor.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+    accounts[4].transfer(executor.address, 20 * 10**18)
+    return executor
+
+
+@pytest.fixture
+def tokens(executor):
+    tokens = [
+        brownie.MockERC20.deploy(f"Token {i}", f"TK{i}", 18, {"from": accounts[0]})
+        for i in range(3)
+    ]
+    for token in tokens:
+        token.mint(executor.address, EXECUTOR_FUNDING, {"from": accounts[0]})
+    return [token.address.lower() for token in tokens]
+
+
+def mock_path(output_tokens, output_amounts):
+    # An output is a token(20) followed by an amount(16)
+    return "0x" + "".join(
+        token[2:] + amount.to_bytes(16, "big").hex()
+        for token, amount in zip(output_tokens, output_amounts)
+    )
+
+
+def swap_spec(rng, senders, tokens, executor):
+    endpoint = rng.choice(ENDPOINTS)
+    if endpoint in ["swap", "swapCompact"]:
+        num_inputs = num_outputs = 1
+    else:
+        num_inputs = rng.randint(1, MAX_LEGS - 1)
+        num_outputs = rng.randint(1, MAX_LEGS - num_inputs)
+    legs = rng.sample([ETH] + tokens, num_inputs + num_outputs)
+    output_quotes = tuple(rng.randrange(10**15, 10**17) for _ in range(num_outputs))
+    return calldata_service.SwapSpec(
+        endpoint=endpoint,
+        sender=rng.choice(senders),
+        input_tokens=tuple(legs[:num_inputs]),
+        input_amounts=tuple(rng.randrange(10**15, 10**18) for _ in range(num_inputs)),
+        output_tokens=tuple(legs[num_inputs:]),
+        output_quotes=output_quotes,
+        max_slippage_percent=MAX_SLIPPAGE_PERCENT,
+        executor=executor,
+        path_definition=mock_path(legs[num_inputs:], output_quotes),
+    )
+
+
+def write_corpus(path, specs, address_list, address_table):
+    corpus.write_corpus(
+        path,
+        (
+            (
+                spec.sender,
+                sum(
+                    amount
+                    for token, amount in zip(spec.input_tokens, spec.input_amounts)
+                    if token == ETH
+                ),
+                calldata_service.encode_spec(spec, address_list, address_table),
+            )
+            for spec in specs
+        ),
+    )
+
+
+def replay_corpus(path, bytecode_a, bytecode_b, address_list, address_table, tokens):
+    async def setup(chain, router):
+        for function, addresses in [
+            ("writeAddressList(address[])", address_list),
+        ] + [("writeAddressTable(address[])", chunk) for chunk in address_table]:
+            await chain.send(
+                accounts[0].address,
+                router,
+                "0x"
+                + function_selector(function)
+                + encode(["address[]"], [addresses]).hex(),
+            )
+
+    engine = replay.ReplayEngine(
+        [web3.provider.endpoint_uri],
+        bytecode_a,
+        bytecode_b,
+        setup=setup,
+        token_slots={token: TOKEN_SLOTS for token in tokens},
+    )
+    with corpus.Corpus(path) as calls:
+        return asyncio.run(engine.replay(calls))
+
+
+def test_replay(tmp_path, executor, tokens):
+    rng = random.Random(0)
+    senders = utils.random_addresses(4, rng)
+    executor = executor.address.lower()
+    # The executor and the last two tokens are only in the address table, so that
+    # compact calls read them with table encoded addresses
+    address_list = tokens[:1]
+    address_table = [[executor] + tokens[1:]]
+    specs = [swap_spec(rng, senders, tokens, executor) for _ in range(NUM_SWAPS)]
+    assert {spec.endpoint for spec in specs} == set(ENDPOINTS)
+    assert any(
+        spec.endpoint.endswith("Compact")
+        and set(spec.input_tokens) & set(address_table[0])
+        for spec in specs
+    )
+    path = tmp_path / "corpus.bin"
+    write_corpus(path, specs, address_list, address_table)
+
+    # The same build twice
+    results = replay_corpus(
+        path,
+        brownie.OdosRouterV2.bytecode,
+        brownie.OdosRouterV2.bytecode,
+        address_list,
+        address_table,
+        tokens,
+    )
+    assert [result.index for result in results] == list(range(NUM_SWAPS))
+    # Every input was funded, including ERC20 inputs read from the address table
+    assert all(result.a.success and result.b.success for result in results)
+    report = replay.compare(results)
+    assert sorted(report) == sorted(ENDPOINTS)
+    for row in report.values():
+        assert row["mismatches"] == 0
+        assert row["mean_delta"] == 0 and row["max_delta"] == 0
+
+    # A build that emits the indexed and packed events, with the same outputs
+    results = replay_corpus(
+        path,
+        brownie.OdosRouterV2.bytecode,
+        brownie.OdosRouterV2PackedEvents.bytecode,
+        address_list,
+        address_table,
+        tokens,
+    )
+    assert all(result.a.success and result.b.success for result in results)
+    report = replay.compare(results)
+    for row in report.values():
+        assert row["mismatches"] == 0
+        assert row["mean_delta"] != 0
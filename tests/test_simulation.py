@@ -0,0 +1,266 @@
+import asyncio
+
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import calldata_service, permit2, simulation, storage_layout, utils
+
+ETH = "0x0000000000000000000000000000000000000000"
+WRAP_PATH = "0x01"
+UNWRAP_PATH = "0x00"
+INPUT_AMOUNT = int(1e18)
+DEADLINE = (1 << 48) - 1
+# WETH9 declares balanceOf and allowance after name, symbol and decimals
+WETH_SLOTS = (3, 4)
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def swap_data(router, weth_executor, input_token, output_token, path, output_min):
+    return router.swap.encode_input(
+        [
+            input_token,
+            INPUT_AMOUNT,
+            weth_executor.address,
+            output_token,
+            output_min,
+            output_min,
+            ETH,
+        ],
+        path,
+        weth_executor.address,
+        0,
+    )
+
+
+def simulate_many(router, weth_executor, simulations):
+    async def simulate():
+        async with simulation.SimulationEngine(
+            web3.provider.endpoint_uri,
+            router.address,
+            token_slots={weth_executor.WETH(): WETH_SLOTS},
+        ) as engine:
+            first = await engine.simulate_many(simulations)
+            second = await engine.simulate_many(simulations)
+        return engine, first, second
+
+    return asyncio.run(simulate())
+
+
+def test_simulate_with_overrides(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    # A synthetic sender that holds neither ETH nor WETH
+    sender = utils.random_address()
+
+    simulations = [
+        simulation.Simulation(
+            sender,
+            swap_data(
+                router, weth_executor, ETH, weth_address, WRAP_PATH, INPUT_AMOUNT
+            ),
+            INPUT_AMOUNT,
+        ),
+        simulation.Simulation(
+            sender,
+            swap_data(
+                router, weth_executor, weth_address, ETH, UNWRAP_PATH, INPUT_AMOUNT
+            ),
+            funding=((weth_address, INPUT_AMOUNT),),
+        ),
+        simulation.Simulation(
+            sender,
+            swap_data(
+                router, weth_executor, ETH, weth_address, WRAP_PATH, 2 * INPUT_AMOUNT
+            ),
+            INPUT_AMOUNT,
+        ),
+        # Without funding the sender cannot pay for the WETH input
+        simulation.Simulation(
+            sender,
+            swap_data(
+                router, weth_executor, weth_address, ETH, UNWRAP_PATH, INPUT_AMOUNT
+            ),
+        ),
+    ]
+
+    engine, results, cached_results = simulate_many(router, weth_executor, simulations)
+
+    assert results[0].success and results[0].amounts_out == (INPUT_AMOUNT,)
+    assert results[1].success and results[1].amounts_out == (INPUT_AMOUNT,)
+    assert not results[2].success
+    assert results[2].revert_reason == "Slippage Limit Exceeded"
+    assert not results[3].success
+
+    # The second round at the same block is read from the cache
+    assert cached_results == results
+    assert engine.calls == len(simulations)
+
+
+def permit2_unwrap_data(router, weth_executor, permit2_contract, account, endpoint):
+    # Spends the account's WETH through a Permit2 signature for the router
+    weth_address = weth_executor.WETH()
+    nonce = 0
+    if endpoint == "swapPermit2":
+        permit2_hash = permit2.single_permit2_hash(
+            weth_address, INPUT_AMOUNT, router.address, nonce, DEADLINE
+        )
+    else:
+        permit2_hash = permit2.batch_permit2_hash(
+            [weth_address], [INPUT_AMOUNT], router.address, nonce, DEADLINE
+        )
+    signature = permit2.sign_permit2(
+        permit2_contract.DOMAIN_SEPARATOR(), permit2_hash, account.private_key
+    )
+    spec = calldata_service.SwapSpec(
+        endpoint=endpoint,
+        sender=account.address,
+        input_tokens=(weth_address,),
+        input_amounts=(INPUT_AMOUNT,),
+        output_tokens=(ETH,),
+        output_quotes=(INPUT_AMOUNT,),
+        max_slippage_percent=0.01,
+        executor=weth_executor.address,
+        path_definition=UNWRAP_PATH,
+        permit2=(permit2_contract.address, nonce, DEADLINE, signature),
+    )
+    return calldata_service.encode_spec(spec)
+
+
+@pytest.mark.parametrize("endpoint", calldata_service.PERMIT2_ENDPOINTS)
+def test_simulate_permit2(router, weth_executor, endpoint):
+    permit2_contract = brownie.Permit2.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    # A signer that holds no WETH, has not approved Permit2 and has already used the
+    # signed nonce
+    account = accounts.add(utils.random_private_key())
+    accounts[0].transfer(account, INPUT_AMOUNT)
+    permit2_contract.invalidateUnorderedNonces(0, 1, {"from": account})
+    data = permit2_unwrap_data(
+        router, weth_executor, permit2_contract, account, endpoint
+    )
+
+    engine, results, cached_results = simulate_many(
+        router,
+        weth_executor,
+        [
+            simulation.Simulation(
+                account.address,
+                data,
+                funding=((weth_executor.WETH(), INPUT_AMOUNT),),
+            ),
+            # Another sender does not match the signature
+            simulation.Simulation(
+                accounts[1].address,
+                data,
+                funding=((weth_executor.WETH(), INPUT_AMOUNT),),
+            ),
+        ],
+    )
+
+    assert results[0].success and results[0].amounts_out == (INPUT_AMOUNT,)
+    assert not results[1].success
+
+
+def test_permit2_state_overrides():
+    router = utils.random_address()
+    weth, permit2_contract, sender = utils.random_addresses(3)
+    nonce = (5 << 8) + 3
+    data = calldata_service.encode_spec(
+        calldata_service.SwapSpec(
+            endpoint="swapPermit2",
+            sender=sender,
+            input_tokens=(weth,),
+            input_amounts=(INPUT_AMOUNT,),
+            output_tokens=(ETH,),
+            output_quotes=(INPUT_AMOUNT,),
+            max_slippage_percent=0.01,
+            executor=utils.random_address(),
+            path_definition=UNWRAP_PATH,
+            permit2=(permit2_contract, nonce, DEADLINE, "0x" + "11" * 65),
+        )
+    )
+    assert simulation.decode_permit2(data) == (permit2_contract.lower(), nonce)
+
+    engine = simulation.SimulationEngine(
+        "http://localhost:8545", router, token_slots={weth: WETH_SLOTS}
+    )
+    overrides = engine.state_overrides(
+        simulation.Simulation(sender, data, funding=((weth, INPUT_AMOUNT),))
+    )
+
+    # The allowance is for the Permit2 contract rather than the router
+    permit2_allowance = storage_layout.address_mapping_slot(
+        storage_layout.address_mapping_slot(WETH_SLOTS[1], sender), permit2_contract
+    )
+    assert set(overrides[weth]["stateDiff"]) == {
+        "0x" + slot.to_bytes(32, "big").hex()
+        for slot in [
+            storage_layout.address_mapping_slot(WETH_SLOTS[0], sender),
+            permit2_allowance,
+        ]
+    }
+    # The word of the nonce bitmap holding the nonce is cleared
+    nonce_slot = storage_layout.keccak_slot(
+        (5).to_bytes(32, "big"),
+        storage_layout.address_mapping_slot(
+            simulation.PERMIT2_NONCE_BITMAP_SLOT, sender
+        ).to_bytes(32, "big"),
+    )
+    assert overrides[permit2_contract.lower()]["stateDiff"] == {
+        "0x" + nonce_slot.to_bytes(32, "big").hex(): "0x" + bytes(32).hex()
+    }
+
+    # Other endpoints keep the allowance for the router
+    assert (
+        simulation.decode_permit2(
+            calldata_service.encode_spec(
+                calldata_service.SwapSpec(
+                    endpoint="swap",
+                    sender=sender,
+                    input_tokens=(weth,),
+                    input_amounts=(INPUT_AMOUNT,),
+                    output_tokens=(ETH,),
+                    output_quotes=(INPUT_AMOUNT,),
+                    max_slippage_percent=0.01,
+                    executor=utils.random_address(),
+                    path_definition=UNWRAP_PATH,
+                )
+            )
+        )
+        is None
+    )
+
+
+def test_decode_revert_reason():
+    assert simulation.decode_revert_reason(b"") == ""
+    assert (
+        simulation.decode_revert_reason(
+            bytes.fromhex(simulation.PANIC_SELECTOR + (0x11).to_bytes(32, "big").hex())
+        )
+        == "Panic(0x11)"
+    )
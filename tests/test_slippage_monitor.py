@@ -0,0 +1,144 @@
+import json
+import random
+
+import numpy as np
+from lib.decode_events import SwapEvent, SwapMultiEvent
+from lib.slippage_monitor import KLLSketch, SlippageMonitor, relative_slippage
+
+SENDER = "0x" + "11" * 20
+EXECUTORS = ["0x" + "e1" * 20, "0x" + "e2" * 20]
+TOKENS = ["0x" + "a1" * 20, "0x" + "a2" * 20, "0x" + "a3" * 20]
+QS = np.linspace(0.01, 0.99, 99)
+
+
+def rank_error(values, estimates, qs):
+    ranks = np.searchsorted(np.sort(values), estimates, side="right") / len(values)
+    return np.abs(ranks - qs).max()
+
+
+def swap_event(rng, pair, slippage_bps, referral_code=0):
+    quote = rng.randrange(10**18, 10**21)
+    slippage = int(quote * slippage_bps / 10_000)
+    return SwapEvent(
+        SENDER,
+        10**18,
+        TOKENS[pair[0]],
+        quote + min(slippage, 0),
+        TOKENS[pair[1]],
+        slippage,
+        referral_code,
+    )
+
+
+def test_sketch():
+    values = np.random.default_rng(0).standard_normal(200_000)
+    sketch = KLLSketch(200, seed=0)
+    sketch.update_many(values[:100_000])
+    for value in values[100_000:]:
+        sketch.update(float(value))
+
+    assert sketch.count == len(values)
+    assert sum(len(items) for items in sketch.levels) < 1_000
+    assert rank_error(values, sketch.quantiles(QS), QS) < 0.01
+    assert sketch.quantiles([0, 1]) == [values.min(), values.max()]
+    assert abs(sketch.rank(0) - np.mean(values <= 0)) < 0.01
+    assert KLLSketch().quantile(0.5) is None
+
+
+def test_sketch_merge():
+    values = np.random.default_rng(1).exponential(size=160_000)
+    parts = [KLLSketch(200, seed=i) for i in range(8)]
+    for i, part in enumerate(parts):
+        part.update_many(values[i::8])
+
+    merged = parts[0].copy()
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.count == len(values)
+    assert parts[0].count == len(values) // 8
+    assert rank_error(values, merged.quantiles(QS), QS) < 0.01
+
+    restored = KLLSketch.from_dict(json.loads(json.dumps(merged.to_dict())))
+    assert restored.quantiles(QS) == merged.quantiles(QS)
+    restored.update_many(values[:1_000])
+    assert restored.count == merged.count + 1_000
+
+
+def test_relative_slippage():
+    # Positive slippage is kept by the router, so the output is the quote
+    assert (
+        relative_slippage(SwapEvent(SENDER, 1, TOKENS[0], 1_000, TOKENS[1], 5, 0)) == 50
+    )
+    # Negative slippage is taken from the output
+    assert (
+        relative_slippage(SwapEvent(SENDER, 1, TOKENS[0], 990, TOKENS[1], -10, 0))
+        == -100
+    )
+    assert (
+        relative_slippage(SwapEvent(SENDER, 1, TOKENS[0], 0, TOKENS[1], 0, 0)) is None
+    )
+
+
+def test_monitor():
+    rng = random.Random(0)
+    # The first pair is quoted accurately, the second one pessimistically
+    events = []
+    executors = []
+    for block in range(2_000):
+        pair = rng.choice([(0, 1), (1, 2)])
+        slippage_bps = rng.gauss(0, 2) if pair == (0, 1) else rng.gauss(20, 5)
+        events.append((block, swap_event(rng, pair, slippage_bps, rng.choice([0, 7]))))
+        executors.append(EXECUTORS[pair == (1, 2)])
+    events.append(
+        (1_999, SwapMultiEvent(SENDER, [1], [TOKENS[0]], [1], [TOKENS[1]], 0))
+    )
+    executors.append(None)
+
+    monitor = SlippageMonitor(window_of=lambda block: block // 100, seed=0)
+    monitor.update(events[:1_500], executors[:1_500])
+    # Overlapping blocks are skipped
+    monitor.update(events[1_000:], executors[1_000:])
+    assert monitor.last_block == 1_999
+
+    pairs = monitor.summary("pair")
+    accurate = pairs[(TOKENS[0], TOKENS[1])]
+    pessimistic = pairs[(TOKENS[1], TOKENS[2])]
+    assert accurate["count"] + pessimistic["count"] == 2_000
+    assert abs(accurate["quantiles"][0.5]) < 1
+    assert 18 < pessimistic["quantiles"][0.5] < 22
+    assert abs(accurate["positive"] - 0.5) < 0.05
+    assert pessimistic["positive"] > 0.99
+
+    assert sorted(monitor.keys("referral_code")) == [0, 7]
+    assert sorted(monitor.keys("executor")) == EXECUTORS
+    assert monitor.summary("executor")[EXECUTORS[1]]["count"] == pessimistic["count"]
+
+    window = monitor.sketch("referral_code", 7, windows=[3])
+    assert window.count == sum(
+        1 for block, event in events[300:400] if event.referral_code == 7
+    )
+    assert monitor.sketch("pair", (TOKENS[0], TOKENS[2])) is None
+
+
+def test_monitor_merge():
+    rng = random.Random(1)
+    events = [
+        (block, swap_event(rng, (0, 1), rng.gauss(5, 3))) for block in range(3_000)
+    ]
+    values = [relative_slippage(event) for block, event in events]
+    # One monitor per chain, with the second chain's windows kept as JSON
+    first = SlippageMonitor(window_of=lambda block: block // 1_000)
+    second = SlippageMonitor(window_of=lambda block: block // 1_000)
+    first.update(events[:2_000])
+    second.update(events[2_000:])
+    first.merge(SlippageMonitor.from_dict(json.loads(json.dumps(second.to_dict()))))
+
+    sketch = first.sketch("pair", (TOKENS[0], TOKENS[1]))
+    assert sketch.count == len(events)
+    assert rank_error(values, sketch.quantiles(QS), QS) < 0.02
+    assert first.last_block == 1_999
+
+    # Only the latest windows are kept
+    bounded = SlippageMonitor(window_of=lambda block: block // 1_000, max_windows=2)
+    bounded.update(events)
+    assert sorted(bounded.sketches[("pair", (TOKENS[0], TOKENS[1]))]) == [1, 2]
@@ -0,0 +1,101 @@
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import storage_layout, utils
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def get_storage(router, slot):
+    return int.from_bytes(web3.eth.get_storage_at(router.address, slot), "big")
+
+
+def test_owner_slot(router):
+    assert get_storage(router, storage_layout.OWNER_SLOT) == int(
+        accounts[0].address, 16
+    )
+
+
+def test_swap_multi_fee_slot(router):
+    swap_multi_fee = int(1e15)
+    router.setSwapMultiFee(swap_multi_fee, {"from": accounts[0]})
+
+    assert get_storage(router, storage_layout.SWAP_MULTI_FEE_SLOT) == swap_multi_fee
+
+
+def test_deployed_layout(router):
+    # Routers already deployed keep swapMultiFee in slot 2 and referralLookup in slot
+    # 3, and readers of their storage depend on it
+    assert get_storage(router, 2) == router.swapMultiFee() == int(5e14)
+    null_referral_slot = storage_layout.keccak_slot(bytes(32), (3).to_bytes(32, "big"))
+    assert storage_layout.unpack_referral_info(
+        get_storage(router, null_referral_slot)
+    ) == {
+        "referralFee": 0,
+        "beneficiary": "0x0000000000000000000000000000000000000000",
+        "registered": True,
+    }
+
+
+def test_flags(router):
+    assert not router.packedEvents() and not router.referralFeeAccrual()
+    packed_router = brownie.OdosRouterV2PackedEvents.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+    accrual_router = brownie.OdosRouterV2ReferralAccrual.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+    assert packed_router.packedEvents() and not packed_router.referralFeeAccrual()
+    assert accrual_router.referralFeeAccrual() and not accrual_router.packedEvents()
+
+    # The flags are compiled into the variants, so their storage is the same
+    for slot in range(storage_layout.REFERRAL_FEES_RESERVED_SLOT + 1):
+        assert get_storage(packed_router, slot) == get_storage(router, slot)
+        assert get_storage(accrual_router, slot) == get_storage(router, slot)
+
+
+def test_address_list_slots(router):
+    addresses = [utils.random_address() for i in range(3)]
+    router.writeAddressList(addresses, {"from": accounts[0]})
+
+    assert get_storage(router, storage_layout.ADDRESS_LIST_SLOT) == len(addresses)
+    for i, address in enumerate(addresses):
+        assert get_storage(router, storage_layout.address_list_slot(i)) == int(
+            address, 16
+        )
+
+
+def test_address_table_slots(router):
+    router.writeAddressTable([utils.random_address()], {"from": accounts[0]})
+
+    assert get_storage(router, storage_layout.ADDRESS_TABLE_SLOT) == 1
+    assert get_storage(router, storage_layout.address_table_slot(0)) == int(
+        router.addressTable(0), 16
+    )
+
+
+def test_referral_lookup_slot(router):
+    referral_code = router.REFERRAL_WITH_FEE_THRESHOLD() + 1
+    beneficiary = utils.random_address()
+
+    router.registerReferralCode(
+        referral_code, 1_000_000, beneficiary, {"from": accounts[0]}
+    )
+    assert storage_layout.unpack_referral_info(
+        get_storage(router, storage_layout.referral_lookup_slot(referral_code))
+    ) == {
+        "referralFee": 1_000_000,
+        "beneficiary": beneficiary,
+        "registered": True,
+    }
@@ -6,7 +6,7 @@ import pytest
 from brownie import accounts
 from eth_account import Account
 from hexbytes import HexBytes
-from lib import encode_compact, permit2, utils
+from lib import decode_events, encode_compact, permit2, utils
 from web3 import Web3
 
 
@@ -19,6 +19,15 @@ def router():
     )
 
 
+@pytest.fixture
+def accrual_router():
+    return brownie.OdosRouterV2ReferralAccrual.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
 @pytest.fixture
 def weth_executor():
     WETH = brownie.WETH9.deploy(
@@ -646,3 +655,258 @@ def test_swap_compact_address_list(router, weth_executor):
     w3.eth.send_raw_transaction(signed_swap_txn.rawTransaction)
 
     assert WETH.balanceOf(test_account.address) - balance_before == input_amount
+
+
+def test_swap_compact_exponent_amounts(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    input_amount = int(1e18)
+
+    endpoint_uri = "http://localhost:8545"
+    w3 = Web3(Web3.HTTPProvider(endpoint_uri, request_kwargs={"timeout": 600}))
+
+    private_key = utils.random_private_key()
+    test_account = Account.from_key(private_key)
+    w3.eth.default_account = test_account.address
+
+    # Transfer ETH into the account
+    accounts[0].transfer(
+        test_account.address,
+        input_amount,
+    )
+    WETH = brownie.interface.IWETH(weth_address)
+    balance_before = WETH.balanceOf(test_account.address)
+
+    with open("build/contracts/OdosRouterV2.json", "r") as f:
+        router_v2_contract = w3.eth.contract(
+            abi=json.load(f)["abi"], address=router.address
+        )
+    compact_router_data = encode_compact.construct_compact_swap_data(
+        "0x01",
+        "0x0000000000000000000000000000000000000000",
+        weth_address,
+        input_amount,
+        input_amount,
+        0.01,
+        weth_executor.address,
+        weth_executor.address,
+        "msg.sender",
+        [],
+        0,
+        exponent_amounts=True,
+    )
+    # Both amounts should use the mantissa and exponent encoding
+    assert compact_router_data.count(utils.encode_exponent_amount(input_amount)) == 2
+
+    swap_compact_txn = router_v2_contract.functions.swapCompact().build_transaction(
+        {
+            "gas": 10_000_000,
+            "gasPrice": 0,
+            "value": input_amount,
+            "nonce": w3.eth.get_transaction_count(test_account.address),
+        }
+    )
+    swap_compact_txn["data"] += compact_router_data[2:]
+
+    signed_swap_txn = w3.eth.account.sign_transaction(swap_compact_txn, private_key)
+    w3.eth.send_raw_transaction(signed_swap_txn.rawTransaction)
+
+    assert WETH.balanceOf(test_account.address) - balance_before == input_amount
+
+
+def test_swap_compact_address_table(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    input_amount = int(1e18)
+
+    endpoint_uri = "http://localhost:8545"
+    w3 = Web3(Web3.HTTPProvider(endpoint_uri, request_kwargs={"timeout": 600}))
+
+    private_key = utils.random_private_key()
+    test_account = Account.from_key(private_key)
+    w3.eth.default_account = test_account.address
+
+    # Transfer ETH into the account
+    accounts[0].transfer(
+        test_account.address,
+        input_amount,
+    )
+    # Set address table chunks to be used by the compact swap function
+    address_table = [[utils.random_address(), weth_executor.address], [weth_address]]
+    for chunk in address_table:
+        router.writeAddressTable(
+            chunk,
+            {
+                "from": accounts[0],
+            },
+        )
+    WETH = brownie.interface.IWETH(weth_address)
+    balance_before = WETH.balanceOf(test_account.address)
+
+    with open("build/contracts/OdosRouterV2.json", "r") as f:
+        router_v2_contract = w3.eth.contract(
+            abi=json.load(f)["abi"], address=router.address
+        )
+    compact_router_data = encode_compact.construct_compact_swap_data(
+        "0x01",
+        "0x0000000000000000000000000000000000000000",
+        weth_address,
+        input_amount,
+        input_amount,
+        0.01,
+        weth_executor.address,
+        weth_executor.address,
+        "msg.sender",
+        [],
+        0,
+        address_table=address_table,
+    )
+    swap_compact_txn = router_v2_contract.functions.swapCompact().build_transaction(
+        {
+            "gas": 10_000_000,
+            "gasPrice": 0,
+            "value": input_amount,
+            "nonce": w3.eth.get_transaction_count(test_account.address),
+        }
+    )
+    swap_compact_txn["data"] += compact_router_data[2:]
+
+    signed_swap_txn = w3.eth.account.sign_transaction(swap_compact_txn, private_key)
+    w3.eth.send_raw_transaction(signed_swap_txn.rawTransaction)
+
+    assert WETH.balanceOf(test_account.address) - balance_before == input_amount
+
+
+def test_swap_packed_events(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    input_amount = int(1e18)
+
+    swap_args = [
+        [
+            "0x0000000000000000000000000000000000000000",
+            input_amount,
+            weth_executor.address,
+            weth_address,
+            input_amount,
+            input_amount,
+            accounts[0],
+        ],
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        0,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    ]
+    tx = router.swap(*swap_args)
+    assert "Swap" in tx.events and "SwapIndexed" not in tx.events
+    event = decode_events.decode_router_logs(tx.logs)[0]
+
+    packed_router = brownie.OdosRouterV2PackedEvents.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+    tx = packed_router.swap(*swap_args)
+    assert "SwapIndexed" in tx.events and "Swap" not in tx.events
+
+    assert decode_events.decode_router_logs(tx.logs) == [event]
+    assert event == decode_events.SwapEvent(
+        accounts[0].address.lower(),
+        input_amount,
+        "0x0000000000000000000000000000000000000000",
+        input_amount,
+        weth_address.lower(),
+        0,
+        0,
+    )
+
+
+def test_swap_referral_fee_accrual(accrual_router, weth_executor):
+    weth_address = weth_executor.WETH()
+    input_amount = int(1e18)
+
+    referral_with_fee_threshold = accrual_router.REFERRAL_WITH_FEE_THRESHOLD()
+    fee_denom = accrual_router.FEE_DENOM()
+
+    referral_code = referral_with_fee_threshold + 1
+    referral_fee = int(1e14)
+    referral_beneficiary = accounts[1]
+
+    accrual_router.registerReferralCode(
+        referral_code,
+        referral_fee,
+        referral_beneficiary,
+        {
+            "from": accounts[0],
+        },
+    )
+    WETH = brownie.interface.IWETH(weth_address)
+
+    expected_user_delta = input_amount * (fee_denom - referral_fee) // fee_denom
+    expected_beneficiary_delta = input_amount * 8 * referral_fee // (fee_denom * 10)
+
+    beneficiary_balance_before = WETH.balanceOf(referral_beneficiary)
+
+    for i in range(2):
+        accrual_router.swap(
+            [
+                "0x0000000000000000000000000000000000000000",
+                input_amount,
+                weth_executor.address,
+                weth_address,
+                expected_user_delta,
+                expected_user_delta,
+                accounts[0],
+            ],
+            "0x0100000000000000000000000000000000000000000000000000000000000000",
+            weth_executor.address,
+            referral_code,
+            {
+                "value": input_amount,
+                "from": accounts[0],
+            },
+        )
+    # The beneficiary's share is credited rather than transferred
+    assert WETH.balanceOf(referral_beneficiary) == beneficiary_balance_before
+    assert (
+        accrual_router.referralFeesOwed(referral_beneficiary, weth_address)
+        == 2 * expected_beneficiary_delta
+    )
+    assert (
+        accrual_router.referralFeesReserved(weth_address)
+        == 2 * expected_beneficiary_delta
+    )
+
+    # Transferring the full router balance leaves the unclaimed fees in the router
+    accrual_router.transferRouterFunds(
+        [weth_address],
+        [0],
+        accounts[2],
+        {
+            "from": accounts[0],
+        },
+    )
+    assert WETH.balanceOf(accrual_router.address) == 2 * expected_beneficiary_delta
+
+    with brownie.reverts("Referral fees reserved"):
+        accrual_router.transferRouterFunds(
+            [weth_address],
+            [1],
+            accounts[2],
+            {
+                "from": accounts[0],
+            },
+        )
+    tx = accrual_router.claimReferralFees(
+        [weth_address, "0x0000000000000000000000000000000000000000"],
+        {
+            "from": referral_beneficiary,
+        },
+    )
+    assert tx.return_value == [2 * expected_beneficiary_delta, 0]
+    assert (
+        WETH.balanceOf(referral_beneficiary) - beneficiary_balance_before
+        == 2 * expected_beneficiary_delta
+    )
+    assert accrual_router.referralFeesOwed(referral_beneficiary, weth_address) == 0
+    assert accrual_router.referralFeesReserved(weth_address) == 0
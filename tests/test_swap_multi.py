@@ -6,7 +6,7 @@ import pytest
 from brownie import accounts
 from eth_account import Account
 from hexbytes import HexBytes
-from lib import encode_compact, permit2, utils
+from lib import decode_events, encode_compact, permit2, utils
 from web3 import Web3
 
 
@@ -19,6 +19,15 @@ def router():
     )
 
 
+@pytest.fixture
+def accrual_router():
+    return brownie.OdosRouterV2ReferralAccrual.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
 @pytest.fixture
 def weth_executor():
     WETH = brownie.WETH9.deploy(
@@ -724,3 +733,181 @@ def test_swap_compact_address_list(router, weth_executor):
     assert (
         WETH.balanceOf(router.address) - router_balance_before == expected_router_delta
     )
+
+
+def test_swap_compact_exponent_amounts(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    input_amount = int(1e18)
+
+    endpoint_uri = "http://localhost:8545"
+    w3 = Web3(Web3.HTTPProvider(endpoint_uri, request_kwargs={"timeout": 600}))
+
+    private_key = utils.random_private_key()
+    test_account = Account.from_key(private_key)
+    w3.eth.default_account = test_account.address
+
+    accounts[0].transfer(test_account.address, input_amount)
+    WETH = brownie.interface.IWETH(weth_address)
+
+    multi_swap_fee = router.swapMultiFee()
+    fee_denom = router.FEE_DENOM()
+
+    expected_user_delta = input_amount * (fee_denom - multi_swap_fee) // fee_denom
+
+    user_balance_before = WETH.balanceOf(test_account.address)
+
+    with open("build/contracts/OdosRouterV2.json", "r") as f:
+        router_v2_contract = w3.eth.contract(
+            abi=json.load(f)["abi"], address=router.address
+        )
+    compact_router_data = encode_compact.construct_compact_swap_multi_data(
+        "0x01",
+        ["0x0000000000000000000000000000000000000000"],
+        [weth_address],
+        [input_amount],
+        [expected_user_delta],
+        [int(1e12)],
+        0.0001,
+        weth_executor.address,
+        [weth_executor.address],
+        ["msg.sender"],
+        [],
+        0,
+        exponent_amounts=True,
+    )
+    assert utils.encode_exponent_amount(input_amount) in compact_router_data
+    assert utils.encode_exponent_amount(int(1e12)) in compact_router_data
+
+    swap_compact_txn = (
+        router_v2_contract.functions.swapMultiCompact().build_transaction(
+            {
+                "gas": 10_000_000,
+                "value": input_amount,
+                "nonce": w3.eth.get_transaction_count(test_account.address),
+                "gasPrice": 0,
+            }
+        )
+    )
+    swap_compact_txn["data"] += compact_router_data[2:]
+
+    signed_swap_txn = w3.eth.account.sign_transaction(swap_compact_txn, private_key)
+    w3.eth.send_raw_transaction(signed_swap_txn.rawTransaction)
+
+    assert (
+        WETH.balanceOf(test_account.address) - user_balance_before
+        == expected_user_delta
+    )
+
+
+def test_swap_packed_events(router, weth_executor):
+    weth_address = weth_executor.WETH()
+    input_amount = int(1e18)
+
+    multi_swap_fee = router.swapMultiFee()
+    fee_denom = router.FEE_DENOM()
+
+    expected_user_delta = input_amount * (fee_denom - multi_swap_fee) // fee_denom
+
+    swap_args = [
+        [
+            [
+                "0x0000000000000000000000000000000000000000",
+                input_amount,
+                weth_executor.address,
+            ]
+        ],
+        [[weth_address, 1, accounts[0]]],
+        expected_user_delta,
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        0,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    ]
+    tx = router.swapMulti(*swap_args)
+    assert "SwapMulti" in tx.events and "SwapMultiPacked" not in tx.events
+    event = decode_events.decode_router_logs(tx.logs)[0]
+
+    packed_router = brownie.OdosRouterV2PackedEvents.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+    tx = packed_router.swapMulti(*swap_args)
+    assert "SwapMultiPacked" in tx.events and "SwapMulti" not in tx.events
+
+    assert decode_events.decode_router_logs(tx.logs) == [event]
+    assert event == decode_events.SwapMultiEvent(
+        accounts[0].address.lower(),
+        [input_amount],
+        ["0x0000000000000000000000000000000000000000"],
+        [expected_user_delta],
+        [weth_address.lower()],
+        0,
+    )
+
+
+def test_swap_referral_fee_accrual(accrual_router, weth_executor):
+    weth_address = weth_executor.WETH()
+    input_amount = int(1e18)
+
+    referral_with_fee_threshold = accrual_router.REFERRAL_WITH_FEE_THRESHOLD()
+    fee_denom = accrual_router.FEE_DENOM()
+    multi_swap_fee = accrual_router.swapMultiFee()
+
+    referral_code = referral_with_fee_threshold + 1
+    referral_fee = int(1e14)
+    referral_beneficiary = accounts[1]
+
+    accrual_router.registerReferralCode(
+        referral_code,
+        referral_fee,
+        referral_beneficiary,
+        {
+            "from": accounts[0],
+        },
+    )
+    WETH = brownie.interface.IWETH(weth_address)
+
+    amount_after_fee = input_amount * (fee_denom - multi_swap_fee) // fee_denom
+    expected_user_delta = amount_after_fee * (fee_denom - referral_fee) // fee_denom
+    expected_beneficiary_delta = amount_after_fee * 8 * referral_fee // (fee_denom * 10)
+    user_balance_before = WETH.balanceOf(accounts[0])
+    beneficiary_balance_before = WETH.balanceOf(referral_beneficiary)
+
+    accrual_router.swapMulti(
+        [
+            [
+                "0x0000000000000000000000000000000000000000",
+                input_amount,
+                weth_executor.address,
+            ]
+        ],
+        [[weth_address, 1, accounts[0]]],
+        expected_user_delta,
+        "0x0100000000000000000000000000000000000000000000000000000000000000",
+        weth_executor.address,
+        referral_code,
+        {
+            "value": input_amount,
+            "from": accounts[0],
+        },
+    )
+    assert WETH.balanceOf(accounts[0]) - user_balance_before == expected_user_delta
+    assert WETH.balanceOf(referral_beneficiary) == beneficiary_balance_before
+    assert (
+        accrual_router.referralFeesOwed(referral_beneficiary, weth_address)
+        == expected_beneficiary_delta
+    )
+    accrual_router.claimReferralFees(
+        [weth_address],
+        {
+            "from": referral_beneficiary,
+        },
+    )
+    assert (
+        WETH.balanceOf(referral_beneficiary) - beneficiary_balance_before
+        == expected_beneficiary_delta
+    )
@@ -0,0 +1,165 @@
+import asyncio
+
+import brownie
+import pytest
+from brownie import accounts, web3
+from lib import prefetch, sweep
+
+ETH = "0x0000000000000000000000000000000000000000"
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def weth_executor():
+    WETH = brownie.WETH9.deploy(
+        {
+            "from": accounts[0],
+        }
+    )
+    return brownie.OdosWETHExecutor.deploy(
+        WETH.address,
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def multicall():
+    return brownie.Multicall.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+def read_sweepable_balances(multicall, router, tokens):
+    async def run():
+        async with prefetch.PrefetchCache(
+            web3.provider.endpoint_uri, multicall.address
+        ) as cache:
+            return await sweep.read_sweepable_balances(cache, router.address, tokens)
+
+    return asyncio.run(run())
+
+
+def fund_router(router, weth_address, amount):
+    accounts[0].transfer(router.address, amount)
+
+    WETH = brownie.interface.IWETH(weth_address)
+    WETH.deposit({"from": accounts[0], "value": amount})
+    WETH.transfer(router.address, amount, {"from": accounts[0]})
+
+
+def test_read_sweepable_balances(router, weth_executor, multicall):
+    weth_address = weth_executor.WETH()
+    fund_router(router, weth_address, int(1e18))
+
+    assert read_sweepable_balances(multicall, router, [ETH, weth_address]) == {
+        ETH: int(1e18),
+        weth_address: int(1e18),
+    }
+
+
+def test_sweep_gas_model(router):
+    # Fresh tokens swept to a fresh receiver touch every slot and account cold
+    tokens = [
+        brownie.MockERC20.deploy(f"Token {i}", f"TK{i}", 18, {"from": accounts[0]})
+        for i in range(4)
+    ]
+    for token in tokens:
+        token.mint(router.address, int(1e18), {"from": accounts[0]})
+    accounts[0].transfer(router.address, int(1e18))
+
+    receiver = accounts.add()
+    for batch in [[tokens[0]], tokens[1:], [ETH]]:
+        batch = [str(token) for token in batch]
+        tx = router.transferRouterFunds(
+            batch, [0] * len(batch), receiver, {"from": accounts[0]}
+        )
+        assert tx.gas_used <= sweep.TRANSFER_ROUTER_FUNDS_BASE_GAS + sum(
+            sweep.sweep_gas(token) for token in batch
+        )
+
+
+def test_filter_dust():
+    tokens = [f"0x{i:040x}" for i in range(1, 4)]
+    amounts = {tokens[0]: 10, tokens[1]: 1000, tokens[2]: 1000}
+
+    # The token without a price and the token worth less than the threshold are dropped
+    assert sweep.filter_dust(amounts, {tokens[0]: 1, tokens[1]: 2}, 100) == [
+        (tokens[1], 1000, 2000)
+    ]
+
+
+def test_pack_batches():
+    tokens = [ETH] + [f"0x{i:040x}" for i in range(1, 10)]
+    max_gas = sweep.TRANSFER_ROUTER_FUNDS_BASE_GAS + 3 * sweep.ERC20_SWEEP_GAS
+
+    batches = sweep.pack_batches(tokens, sweep.TRANSFER_ROUTER_FUNDS_BASE_GAS, max_gas)
+
+    assert [token for batch, gas in batches for token in batch] == tokens
+    assert all(gas <= max_gas for batch, gas in batches)
+    # Sending ETH to an empty receiver costs more than an ERC20
+    assert [len(batch) for batch, gas in batches] == [2, 3, 3, 2]
+
+
+def test_sweep_transfers(router, weth_executor, multicall):
+    weth_address = weth_executor.WETH()
+    fund_router(router, weth_address, int(1e18))
+
+    WETH = brownie.interface.IWETH(weth_address)
+    eth_balance_before = accounts[1].balance()
+    weth_balance_before = WETH.balanceOf(accounts[1])
+
+    amounts = read_sweepable_balances(multicall, router, [ETH, weth_address])
+    calls = sweep.plan_transfers(
+        sweep.filter_dust(amounts, {ETH: 1, weth_address: 1}, 1),
+        accounts[1].address,
+        max_gas=sweep.TRANSFER_ROUTER_FUNDS_BASE_GAS + sweep.ERC20_SWEEP_GAS,
+    )
+    assert len(calls) == 2
+
+    router_contract = web3.eth.contract(address=router.address, abi=router.abi)
+    receipts = sweep.submit_calls(web3, router_contract, calls, accounts[0].address)
+
+    assert all(receipt["status"] == 1 for receipt in receipts)
+    assert accounts[1].balance() - eth_balance_before == int(1e18)
+    assert WETH.balanceOf(accounts[1]) - weth_balance_before == int(1e18)
+    assert router.balance() == 0
+    assert WETH.balanceOf(router.address) == 0
+
+
+def test_sweep_swaps(router, weth_executor, multicall):
+    weth_address = weth_executor.WETH()
+    accounts[0].transfer(router.address, int(1e18))
+
+    WETH = brownie.interface.IWETH(weth_address)
+    balance_before = WETH.balanceOf(accounts[1])
+
+    def quote(tokens, amounts):
+        return (
+            [[weth_address, 1, accounts[1].address]],
+            sum(amounts),
+            "0x0100000000000000000000000000000000000000000000000000000000000000",
+            weth_executor.address,
+            100_000,
+        )
+
+    amounts = read_sweepable_balances(multicall, router, [ETH])
+    calls = sweep.plan_swaps(sweep.filter_dust(amounts, {ETH: 1}, 1), quote)
+
+    router_contract = web3.eth.contract(address=router.address, abi=router.abi)
+    receipts = sweep.submit_calls(web3, router_contract, calls, accounts[0].address)
+
+    assert receipts[0]["status"] == 1
+    assert WETH.balanceOf(accounts[1]) - balance_before == int(1e18)
+    assert router.balance() == 0
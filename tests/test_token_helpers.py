@@ -0,0 +1,168 @@
+import brownie
+import pytest
+from brownie import accounts
+
+# The router reads balances and transfers tokens out with its own assembly helpers, which
+# must revert exactly like IERC20.balanceOf and SafeERC20.safeTransfer
+
+ETH = "0x0000000000000000000000000000000000000000"
+# MockNonStandardERC20.Mode
+STANDARD = 0
+NO_RETURN = 1
+FALSE_RETURN = 2
+SHORT_RETURN = 3
+NON_BOOL_RETURN = 4
+REVERT_REASON = 5
+REVERT_EMPTY = 6
+
+
+@pytest.fixture
+def router():
+    return brownie.OdosRouterV2.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+
+
+@pytest.fixture
+def executor():
+    executor = brownie.MockExecutor.deploy(
+        {
+            "from": accounts[0],
+        },
+    )
+    accounts[4].transfer(executor.address, int(1e18))
+    return executor
+
+
+@pytest.fixture
+def token(router, executor):
+    token = brownie.MockNonStandardERC20.deploy("Token", "TK", {"from": accounts[0]})
+    token.mint(router.address, int(1e18), {"from": accounts[0]})
+    token.mint(executor.address, int(1e18), {"from": accounts[0]})
+    token.mint(accounts[1], int(1e18), {"from": accounts[0]})
+    return token
+
+
+def transfer_out(router, token, amount):
+    return router.transferRouterFunds(
+        [token],
+        [amount],
+        accounts[2],
+        {"from": accounts[0]},
+    )
+
+
+def mock_path(token, amount):
+    # An output is a token(20) followed by an amount(16)
+    return "0x" + token[2:] + amount.to_bytes(16, "big").hex()
+
+
+@pytest.mark.parametrize("mode", [STANDARD, NO_RETURN])
+def test_transfer(router, token, mode):
+    token.setMode(mode, {"from": accounts[0]})
+    transfer_out(router, token, int(4e17))
+    assert token.balanceOf(accounts[2]) == int(4e17)
+
+    # A zero amount transfers the router's whole balance
+    transfer_out(router, token, 0)
+    assert token.balanceOf(accounts[2]) == int(1e18)
+    assert token.balanceOf(router.address) == 0
+
+
+def test_transfer_false_return(router, token):
+    token.setMode(FALSE_RETURN, {"from": accounts[0]})
+    with brownie.reverts("SafeERC20: ERC20 operation did not succeed"):
+        transfer_out(router, token, int(1e17))
+
+
+@pytest.mark.parametrize("mode", [SHORT_RETURN, NON_BOOL_RETURN])
+def test_transfer_malformed_return(router, token, mode):
+    # Return data that is not a bool fails to decode, which reverts with no reason
+    token.setMode(mode, {"from": accounts[0]})
+    with pytest.raises(brownie.exceptions.VirtualMachineError) as e:
+        transfer_out(router, token, int(1e17))
+    assert not e.value.revert_msg
+
+
+def test_transfer_revert_empty(router, token):
+    token.setMode(REVERT_EMPTY, {"from": accounts[0]})
+    with brownie.reverts("SafeERC20: low-level call failed"):
+        transfer_out(router, token, int(1e17))
+
+
+def test_transfer_revert_reason(router, token):
+    token.setMode(REVERT_REASON, {"from": accounts[0]})
+    with brownie.reverts("MockNonStandardERC20: transfer failed"):
+        transfer_out(router, token, int(1e17))
+
+
+def test_transfer_non_contract(router):
+    with brownie.reverts("Address: call to non-contract"):
+        transfer_out(router, accounts[3].address, int(1e17))
+
+    # Reading the balance of an account without code reverts before the transfer
+    with pytest.raises(brownie.exceptions.VirtualMachineError) as e:
+        transfer_out(router, accounts[3].address, 0)
+    assert not e.value.revert_msg
+
+
+def test_balance_short_return(router, token):
+    token.setMode(SHORT_RETURN, {"from": accounts[0]})
+    with pytest.raises(brownie.exceptions.VirtualMachineError) as e:
+        transfer_out(router, token, 0)
+    assert not e.value.revert_msg
+
+
+def test_transfer_eth(router):
+    accounts[0].transfer(router.address, int(1e18))
+    balance = accounts[2].balance()
+    transfer_out(router, ETH, int(4e17))
+    transfer_out(router, ETH, 0)
+    assert accounts[2].balance() == balance + int(1e18)
+    assert router.balance() == 0
+
+
+def swap(router, executor, input_token, input_amount, output_token, value=0):
+    return router.swap(
+        [
+            input_token,
+            input_amount,
+            executor.address,
+            output_token,
+            int(1e17),
+            int(1e17),
+            accounts[2],
+        ],
+        mock_path(str(output_token), int(1e17)),
+        executor.address,
+        0,
+        {
+            "value": value,
+            "from": accounts[1],
+        },
+    )
+
+
+@pytest.mark.parametrize("mode", [STANDARD, NO_RETURN])
+def test_swap_output(router, executor, token, mode):
+    token.setMode(mode, {"from": accounts[0]})
+    swap(router, executor, ETH, int(1e17), token.address, value=int(1e17))
+    assert token.balanceOf(accounts[2]) == int(1e17)
+
+
+def test_swap_whole_balance(router, executor, token):
+    token.approve(router.address, 2**256 - 1, {"from": accounts[1]})
+    balance = accounts[2].balance()
+    # A zero input amount swaps the sender's whole balance
+    swap(router, executor, token.address, 0, ETH)
+    assert token.balanceOf(accounts[1]) == 0
+    assert token.balanceOf(executor.address) == int(2e18)
+    assert accounts[2].balance() == balance + int(1e17)
+
+    token.mint(accounts[1], int(1e18), {"from": accounts[0]})
+    token.setMode(SHORT_RETURN, {"from": accounts[0]})
+    with pytest.raises(brownie.exceptions.VirtualMachineError) as e:
+        swap(router, executor, token.address, 0, ETH)
+    assert not e.value.revert_msg
@@ -0,0 +1,119 @@
+import random
+
+import numpy as np
+from lib import classifier, limits, utils, workload
+
+ROUTER = "0x19ceead7105607cd444f5ad10dd51356436095a1"
+NUM_SWAPS = 200_000
+
+
+def test_random_addresses():
+    addresses = utils.random_addresses(1_000, random.Random(0))
+    assert addresses == utils.random_addresses(1_000, random.Random(0))
+    assert len(set(addresses)) == 1_000
+    assert all(len(address) == 42 and address.startswith("0x") for address in addresses)
+    assert len(utils.random_private_key()) == 66
+
+
+def test_reproducible():
+    swaps = workload.Workload(1_000, seed=1)
+    same = workload.Workload(1_000, seed=1)
+    other = workload.Workload(1_000, seed=2)
+
+    assert list(swaps.specs()) == list(same.specs())
+    assert swaps.tokens == same.tokens
+    assert not np.array_equal(swaps.input_tokens, other.input_tokens)
+
+
+def test_legs():
+    swaps = workload.Workload(NUM_SWAPS)
+    config = swaps.config
+    multi = np.isin(
+        swaps.endpoints,
+        [workload.ENDPOINTS.index(endpoint) for endpoint in workload.MULTI_ENDPOINTS],
+    )
+
+    assert (swaps.input_counts[~multi] == 1).all()
+    assert (swaps.output_counts[~multi] == 1).all()
+    assert swaps.input_counts[multi].max() == config.max_legs
+    assert (
+        swaps.input_offsets[-1] == len(swaps.input_tokens) == len(swaps.input_amounts)
+    )
+    assert (
+        swaps.output_offsets[-1] == len(swaps.output_tokens) == len(swaps.output_quotes)
+    )
+
+    for i in range(0, NUM_SWAPS, 97):
+        spec = swaps.spec(i)
+        tokens = spec.input_tokens + spec.output_tokens
+        assert len(set(tokens)) == len(tokens)
+        assert min(spec.input_amounts + spec.output_quotes) >= 1
+    # Single swaps never pull ETH through Permit2
+    permit2_swaps = swaps.indices("swapPermit2")
+    assert (swaps.input_tokens[swaps.input_offsets[permit2_swaps]] != 0).all()
+
+
+def test_distributions():
+    swaps = workload.Workload(NUM_SWAPS)
+    config = swaps.config
+
+    shares = np.bincount(swaps.endpoints, minlength=len(workload.ENDPOINTS))
+    assert np.allclose(shares / NUM_SWAPS, config.endpoint_shares, atol=0.01)
+
+    # Popularity falls off as rank**-s. The most popular tokens are drawn a little less
+    # often, since swaps that draw a token twice are redrawn
+    counts = np.bincount(
+        np.concatenate([swaps.input_tokens, swaps.output_tokens]),
+        minlength=config.num_tokens,
+    )
+    ranks = np.arange(10, 500)
+    slope = np.polyfit(np.log(ranks + 1), np.log(counts[ranks]), 1)[0]
+    assert abs(slope + config.token_zipf_exponent) < 0.05
+    assert 0.5 < swaps.address_list_coverage() < 1
+
+    with_fee = swaps.referral_codes > workload.REFERRAL_WITH_FEE_THRESHOLD
+    assert abs(np.mean(swaps.referral_codes > 0) - config.referral_share) < 0.01
+    assert (
+        abs(np.mean(with_fee) - config.referral_share * config.referral_fee_share)
+        < 0.01
+    )
+
+    # Quotes keep the value of the inputs, less the discount
+    def values(tokens, amounts, offsets):
+        value = amounts / 10.0 ** swaps.decimals[tokens] * swaps.prices[tokens]
+        return np.add.reduceat(value, offsets[:-1])
+
+    input_values = values(swaps.input_tokens, swaps.input_amounts, swaps.input_offsets)
+    output_values = values(
+        swaps.output_tokens, swaps.output_quotes, swaps.output_offsets
+    )
+    assert (
+        abs(np.median(output_values / input_values) - (1 - config.quote_discount))
+        < 0.001
+    )
+
+
+def test_round_trip():
+    # Every swap decodes to its spec, with the limits derived from its quotes
+    swaps = workload.Workload(5_000)
+    transaction_classifier = classifier.TransactionClassifier(
+        ROUTER, swaps.address_list
+    )
+
+    for transaction, spec in zip(swaps.transactions(ROUTER), swaps.specs()):
+        record = transaction_classifier.classify(transaction)
+        assert record.function == spec.endpoint
+        assert record.referral_code == spec.referral_code
+        assert [(token, amount) for token, amount, receiver in record.inputs] == list(
+            zip(spec.input_tokens, spec.input_amounts)
+        )
+        assert [token for token, quote, receiver in record.outputs] == list(
+            spec.output_tokens
+        )
+
+        tolerance = limits.slippage_tolerance(spec.max_slippage_percent)
+        if spec.endpoint in workload.MULTI_ENDPOINTS:
+            quote = sum(spec.output_quotes)
+        else:
+            quote = spec.output_quotes[0]
+        assert record.min_out == limits.output_mins([quote], [tolerance])[0]